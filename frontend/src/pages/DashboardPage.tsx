@@ -10,6 +10,7 @@ import { useAuthStore } from '../stores/authStore';
 import { useAppStore } from '../stores/appStore';
 import { LoadingSpinner } from '../components/LoadingSpinner';
 import { GroupCreateModal } from '../components/GroupCreateModal';
+import { formatAmount } from '../utils/money';
 
 export function DashboardPage() {
   const { user, logout } = useAuthStore();
@@ -18,15 +19,16 @@ export function DashboardPage() {
   const navigate = useNavigate();
   const queryClient = useQueryClient();
 
-  const { data: groups, isLoading, error, refetch } = useQuery({
-    queryKey: ['groups'],
-    queryFn: () => apiService.getGroups(),
+  const { data: bootstrap, isLoading, error, refetch } = useQuery({
+    queryKey: ['bootstrap'],
+    queryFn: () => apiService.getBootstrap(),
   });
+  const groups: any[] | undefined = bootstrap?.groups;
 
   const createGroupMutation = useMutation({
     mutationFn: apiService.createGroup,
     onSuccess: (newGroup) => {
-      queryClient.invalidateQueries({ queryKey: ['groups'] });
+      queryClient.invalidateQueries({ queryKey: ['bootstrap'] });
       addNotification({
         type: 'success',
         title: 'Group Created',
@@ -255,6 +257,10 @@ export function DashboardPage() {
                           <span className="text-gray-600">Currency</span>
                           <span className="font-medium">{group.currency}</span>
                         </div>
+                        <div className="flex items-center justify-between text-sm">
+                          <span className="text-gray-600">Your balance</span>
+                          <span className="font-medium">{formatAmount(group.balance, group.currency)}</span>
+                        </div>
                         <div className="flex items-center justify-between text-sm">
                           <span className="text-gray-600">Status</span>
                           <Badge variant={group.is_active ? 'success' : 'error'}>
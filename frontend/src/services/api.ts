@@ -137,6 +137,12 @@ class ApiService {
   }
 
   // Groups endpoints
+  // Dashboard data in one request: profile, groups with balances, recent expenses, pending ledger
+  async getBootstrap(): Promise<any> {
+    const response = await this.api.get('/bootstrap/');
+    return response.data;
+  }
+
   async getGroups(): Promise<any[]> {
     const response = await this.api.get('/groups/groups/');
     return response.data.results || response.data;
@@ -237,6 +243,60 @@ class ApiService {
     return response.data;
   }
 
+  // Fetches the status once, then follows it over the event stream instead of polling
+  watchPaymentStatus(paymentId: number, onUpdate: (status: any) => void): () => void {
+    this.getPaymentStatus(paymentId).then(onUpdate).catch(() => undefined);
+    return this.subscribeToEvents({
+      payment_status: (data) => {
+        if (data.payment_id === paymentId) {
+          onUpdate(data);
+        }
+      },
+    });
+  }
+
+  // Live updates: server-sent `payment_status` and `balances` events for the current user
+  subscribeToEvents(handlers: Record<string, (data: any) => void>): () => void {
+    let source: EventSource | null = null;
+    let lastEventId = '';
+    let closed = false;
+
+    const connect = () => {
+      const token = this.getAccessToken();
+      if (!token || closed) {
+        return;
+      }
+      // EventSource cannot send an Authorization header
+      const params = new URLSearchParams({ token, last_event_id: lastEventId });
+      source = new EventSource(`${this.api.defaults.baseURL}/notifications/stream/?${params}`);
+      Object.entries(handlers).forEach(([name, handler]) => {
+        source!.addEventListener(name, (event) => {
+          const message = event as MessageEvent;
+          lastEventId = message.lastEventId;
+          handler(JSON.parse(message.data));
+        });
+      });
+      source.onerror = async () => {
+        // The browser reconnects on its own unless the server refused the (expired) token
+        if (closed || source?.readyState !== EventSource.CLOSED) {
+          return;
+        }
+        try {
+          await this.refreshAccessToken();
+          connect();
+        } catch {
+          // Logged out; the next request redirects to the login page
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      source?.close();
+    };
+  }
+
   async simulateWebhook(paymentId: number, success: boolean = true): Promise<any> {
     const response = await this.api.post(`/payments/simulate/${paymentId}/`, { success });
     return response.data;
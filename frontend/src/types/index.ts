@@ -1,3 +1,7 @@
+// Money from the API: an exact decimal string in the currency's major unit, e.g. "1234.50".
+// Parse with utils/money rather than parseFloat so sums stay exact.
+export type Amount = string;
+
 // User types
 export interface User {
   id: number;
@@ -65,9 +69,10 @@ export interface Expense {
   id: number;
   group: number;
   payer: User;
-  amount_subtotal: number;
-  amount_tax: number;
-  total_amount: number;
+  amount_subtotal: Amount;
+  amount_tax: Amount;
+  total_amount: Amount;
+  currency: string;
   vendor: string;
   gstin?: string;
   invoice_no?: string;
@@ -85,7 +90,7 @@ export interface Expense {
 export interface ExpenseSplit {
   id: number;
   member: User;
-  amount_owed: number;
+  amount_owed: Amount;
   split_type: 'equal' | 'percentage' | 'amount' | 'share_factor';
   metadata: Record<string, any>;
   is_paid: boolean;
@@ -97,7 +102,7 @@ export interface LedgerEntry {
   id: number;
   from_member: User;
   to_member: User;
-  amount: number;
+  amount: Amount;
   status: 'pending' | 'paid' | 'cancelled' | 'disputed';
   ref_expense?: Expense;
   description: string;
@@ -111,7 +116,7 @@ export interface Payment {
   method: 'UPI_DEEPLINK' | 'UPI_AUTOPAY' | 'MANUAL' | 'CASH' | 'BANK_TRANSFER';
   payment_ref: string;
   status: 'pending' | 'processing' | 'completed' | 'failed' | 'cancelled';
-  amount: number;
+  amount: Amount;
   upi_deeplink?: string;
   webhook_data: Record<string, any>;
   created_at: string;
@@ -122,7 +127,7 @@ export interface Payment {
 export interface SettlementTransaction {
   from_member: number;
   to_member: number;
-  amount: number;
+  amount: Amount;
   explanation: string;
 }
 
@@ -135,7 +140,7 @@ export interface SettlementGraph {
   edges: Array<{
     from: number;
     to: number;
-    amount: number;
+    amount: Amount;
     explanation: string;
   }>;
 }
@@ -144,11 +149,11 @@ export interface SettlementResult {
   group_id: number;
   group_name: string;
   policy_type: string;
-  total_settlement_amount: number;
+  total_settlement_amount: Amount;
   transaction_count: number;
   transactions: SettlementTransaction[];
   graph: SettlementGraph;
-  member_balances: Record<string, number>;
+  member_balances: Record<string, Amount>;
 }
 
 // Consent types
@@ -203,6 +208,7 @@ export interface AddExpenseForm {
   group_id: number;
   amount_subtotal: number;
   amount_tax: number;
+  currency?: string;
   vendor: string;
   gstin?: string;
   invoice_no?: string;
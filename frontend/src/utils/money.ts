@@ -0,0 +1,29 @@
+import type { Amount } from '../types';
+
+// Amounts arrive as exact strings ("1234.50", "-0.05"); integer paise keep sums exact
+export function toPaise(amount: Amount | null | undefined): number {
+  if (!amount) {
+    return 0;
+  }
+  const match = /^(-?)(\d+)(?:\.(\d{1,2}))?$/.exec(amount.trim());
+  if (!match) {
+    throw new Error(`Not an amount: ${amount}`);
+  }
+  const [, sign, major, minor = ''] = match;
+  const paise = Number(major) * 100 + Number(minor.padEnd(2, '0'));
+  return sign ? -paise : paise;
+}
+
+export function fromPaise(paise: number): Amount {
+  const sign = paise < 0 ? '-' : '';
+  const abs = Math.abs(paise);
+  return `${sign}${Math.floor(abs / 100)}.${String(abs % 100).padStart(2, '0')}`;
+}
+
+export function sumAmounts(amounts: Array<Amount | null | undefined>): Amount {
+  return fromPaise(amounts.reduce((sum, amount) => sum + toPaise(amount), 0));
+}
+
+export function formatAmount(amount: Amount | null | undefined, currency: string = 'INR'): string {
+  return new Intl.NumberFormat(undefined, { style: 'currency', currency }).format(toPaise(amount) / 100);
+}
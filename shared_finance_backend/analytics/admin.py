@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import MonthlyRollup
+
+
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'group', 'month', 'category', 'currency', 'paid_total', 'owed_total')
+    list_filter = ('category', 'month')
+    search_fields = ('user__username', 'group__name')
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,152 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db.models import Case, DateField, F, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from groups.models import GroupMember
+from expenses.models import Expense, ExpenseSplit
+from analytics.services import AnalyticsService, rebuild_rollups
+from shared_finance.money import Money, MoneyField
+from users.synthetic import SyntheticDataGenerator
+import random
+import statistics
+import time
+
+User = get_user_model()
+
+AMOUNTS = ('paid', 'owed', 'unsettled_paid', 'unsettled_owed')
+
+
+class LiveAnalyticsService(AnalyticsService):
+    """AnalyticsService over Expense and ExpenseSplit, bucketed as the rollups are"""
+
+    def _buckets(self):
+        expenses = Expense.objects.filter(payer=self.user)
+        splits = ExpenseSplit.objects.filter(member=self.user)
+        if self.scope.get('group_ids'):
+            expenses = expenses.filter(group_id__in=self.scope['group_ids'])
+            splits = splits.filter(expense__group_id__in=self.scope['group_ids'])
+
+        money = MoneyField()
+        paid = expenses.values(
+            'group_id', 'group__name', 'group__currency', 'category', 'currency',
+            month=TruncMonth('date', output_field=DateField()),
+        ).annotate(
+            paid=Sum('total_amount'),
+            unsettled_paid=Sum(Case(When(is_settled=False, then=F('total_amount')), default=Value(0),
+                                    output_field=money)),
+        )
+        owed = splits.values(
+            'expense__group_id', 'expense__group__name', 'expense__group__currency', 'expense__category',
+            'expense__currency', month=TruncMonth('expense__date', output_field=DateField()),
+        ).annotate(
+            owed=Sum('amount_owed'),
+            unsettled_owed=Sum(Case(When(expense__is_settled=False, then=F('amount_owed')), default=Value(0),
+                                    output_field=money)),
+        )
+        if self.scope.get('months'):
+            start = self._window_start(int(self.scope['months']))
+            paid, owed = paid.filter(month__gte=start), owed.filter(month__gte=start)
+
+        buckets = defaultdict(lambda: dict.fromkeys(AMOUNTS, Money()))
+        for row in paid:
+            buckets[(row['group_id'], row['group__name'], row['group__currency'], row['month'],
+                     row['category'], row['currency'])].update(paid=row['paid'], unsettled_paid=row['unsettled_paid'])
+        for row in owed:
+            buckets[(row['expense__group_id'], row['expense__group__name'], row['expense__group__currency'],
+                     row['month'], row['expense__category'], row['expense__currency'])].update(
+                owed=row['owed'], unsettled_owed=row['unsettled_owed'],
+            )
+        return buckets.items()
+
+    def _expense_rows(self):
+        rows = defaultdict(lambda: {'owed': Money(), 'paid': Money()})
+        for (_, _, _, month, category, currency), amounts in self._buckets():
+            row = rows[(month, category, currency)]
+            row['owed'] += amounts['owed']
+            row['paid'] += amounts['paid']
+        return [
+            {'month': month, 'category': category, 'currency': currency, **row}
+            for (month, category, currency), row in sorted(rows.items(), key=lambda item: item[0][0])
+        ]
+
+    def _balance_rows(self):
+        rows = defaultdict(Money)
+        for (group_id, group_name, group_currency, month, _, currency), amounts in self._buckets():
+            rows[(group_id, group_name, group_currency, month, currency)] += (
+                amounts['unsettled_paid'] - amounts['unsettled_owed']
+            )
+        return [
+            {'group_id': group_id, 'group__name': group_name, 'group__currency': group_currency, 'month': month,
+             'currency': currency, 'balance': balance}
+            for (group_id, group_name, group_currency, month, currency), balance in sorted(
+                rows.items(), key=lambda item: item[0][0]
+            )
+        ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark rollup-backed consent analytics against live aggregation over expenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expenses', type=int, default=1000000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--members', type=int, default=5, help='Mean members per group')
+        parser.add_argument('--samples', type=int, default=50, help='Users to query')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--skip-seed', action='store_true', help='Benchmark the existing data')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        if not options['skip_seed']:
+            started = time.perf_counter()
+            self.seed(options)
+            self.stdout.write(f'Seeded {options["expenses"]} expenses in {time.perf_counter() - started:.1f}s')
+
+            started = time.perf_counter()
+            buckets = rebuild_rollups()
+            self.stdout.write(f'Rebuilt {buckets} rollup buckets in {time.perf_counter() - started:.1f}s')
+
+        user_ids = list(
+            GroupMember.objects.filter(is_active=True).values_list('user_id', flat=True).distinct()
+        )
+        users = list(User.objects.filter(id__in=rng.sample(user_ids, min(options['samples'], len(user_ids)))))
+        if not users:
+            self.stdout.write(self.style.WARNING('No group members to benchmark'))
+            return
+
+        rollup_times, rollup_results = zip(*[self.timed(AnalyticsService, user) for user in users])
+        live_times, live_results = zip(*[self.timed(LiveAnalyticsService, user) for user in users])
+        for user, rollup, live in zip(users, rollup_results, live_results):
+            if rollup != live:
+                raise CommandError(f'Rollup analytics for {user.username} differ from live aggregation')
+
+        rollup_ms = statistics.median(rollup_times) * 1000
+        live_ms = statistics.median(live_times) * 1000
+        self.stdout.write(f'Rollups: median {rollup_ms:.2f} ms per sharing request')
+        self.stdout.write(f'Live aggregation: median {live_ms:.2f} ms per sharing request')
+        self.stdout.write(self.style.SUCCESS(
+            f'Speedup: {live_ms / rollup_ms:.1f}x, same results for {len(users)} users'
+        ))
+
+    @staticmethod
+    def timed(service_class, user):
+        """Time what a sharing request computes, and keep the result"""
+        started = time.perf_counter()
+        service = service_class(user)
+        result = service.expense_analysis(), service.settlement_summary()
+        return time.perf_counter() - started, result
+
+    def seed(self, options):
+        groups = options['groups']
+        SyntheticDataGenerator(
+            users=options['users'],
+            groups=groups,
+            members_per_group=options['members'],
+            expenses_per_group=options['expenses'] // groups,
+            seed=options['seed'],
+            prefix='bench',
+            log=self.stdout.write,
+        ).run()
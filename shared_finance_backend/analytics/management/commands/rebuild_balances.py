@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from analytics.services import balance_drift, rebuild_balances
+
+
+class Command(BaseCommand):
+    help = 'Recompute the pair balances behind /api/auth/me/balances/, or check them for drift'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Report pairs whose stored balance differs from a recomputation; change nothing')
+    
+    def handle(self, *args, **options):
+        if not options['check']:
+            count = rebuild_balances()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} pair balances'))
+            return
+        
+        drift = balance_drift()
+        for (user_a_id, user_b_id, group_id, currency), (stored, expected) in sorted(
+            drift.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or 0, item[0][3])
+        ):
+            scope = f'group {group_id}' if group_id is not None else 'ledger'
+            self.stdout.write(
+                f'users {user_a_id}/{user_b_id} ({scope}): stored {currency} {stored}, expected {currency} {expected}'
+            )
+        if drift:
+            raise CommandError(f'{len(drift)} pair balances drifted; run rebuild_balances to repair them')
+        self.stdout.write(self.style.SUCCESS('Pair balances match'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from analytics.services import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute monthly expense rollups from the expense and split tables'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, action='append', dest='group_ids',
+                            help='Only rebuild this group (repeatable)')
+    
+    def handle(self, *args, **options):
+        count = rebuild_rollups(options['group_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rollup buckets'))
@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-19 06:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('groups', '0003_group_change_seq_groupmember_change_seq'),
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PairBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pair_balances', to='groups.group')),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'analytics_pairbalance',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pairbalance',
+            index=models.Index(fields=['user_b', 'user_a'], name='analytics_p_user_b__8bd8d2_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pairbalance',
+            constraint=models.UniqueConstraint(fields=('user_a', 'user_b', 'group'), name='unique_pair_balance'),
+        ),
+        migrations.AddConstraint(
+            model_name='pairbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('group__isnull', True)), fields=('user_a', 'user_b'), name='unique_pair_ledger_balance'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+from shared_finance.money import MoneyField, decimal_to_money
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_pairbalance'),
+    ]
+
+    operations = [
+        *(
+            operation
+            for field_name in ('paid_total', 'owed_total', 'unsettled_paid', 'unsettled_owed')
+            for operation in decimal_to_money(
+                'analytics', 'monthlyrollup', field_name,
+                models.DecimalField(max_digits=14, decimal_places=2, default=0), MoneyField(default=0),
+            )
+        ),
+        *decimal_to_money('analytics', 'pairbalance', 'amount',
+                          models.DecimalField(max_digits=14, decimal_places=2, default=0), MoneyField(default=0)),
+    ]
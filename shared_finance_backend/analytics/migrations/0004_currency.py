@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-19 07:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_currency(apps, schema_editor):
+    # Rows written before expenses had their own currency were all in their group's;
+    # rebuild_rollups and rebuild_balances split any foreign-currency expenses recorded since
+    Group = apps.get_model('groups', 'Group')
+    MonthlyRollup = apps.get_model('analytics', 'MonthlyRollup')
+    PairBalance = apps.get_model('analytics', 'PairBalance')
+    group_currency = models.Subquery(Group.objects.filter(pk=models.OuterRef('group_id')).values('currency')[:1])
+    MonthlyRollup.objects.update(currency=group_currency)
+    PairBalance.objects.filter(group__isnull=False).update(currency=group_currency)
+    PairBalance.objects.filter(group__isnull=True).update(currency=settings.FX_BASE_CURRENCY)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0003_group_change_seq_groupmember_change_seq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('analytics', '0003_money_fields'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='pairbalance',
+            name='unique_pair_balance',
+        ),
+        migrations.RemoveConstraint(
+            model_name='pairbalance',
+            name='unique_pair_ledger_balance',
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='pairbalance',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.RunPython(backfill_currency, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='monthlyrollup',
+            unique_together={('user', 'group', 'month', 'category', 'currency')},
+        ),
+        migrations.AddConstraint(
+            model_name='pairbalance',
+            constraint=models.UniqueConstraint(fields=('user_a', 'user_b', 'group', 'currency'), name='unique_pair_balance'),
+        ),
+        migrations.AddConstraint(
+            model_name='pairbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('group__isnull', True)), fields=('user_a', 'user_b', 'currency'), name='unique_pair_ledger_balance'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+from groups.models import Group
+from shared_finance.money import MoneyField
+
+User = get_user_model()
+
+
+class MonthlyRollup(models.Model):
+    """
+    Per-user monthly expense totals in one currency, maintained incrementally
+    from expense and split writes; readers convert across currencies
+    """
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_rollups')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='monthly_rollups')
+    month = models.DateField()
+    category = models.CharField(max_length=20)
+    currency = models.CharField(max_length=3, default='INR')
+    paid_total = MoneyField(default=0)
+    paid_count = models.PositiveIntegerField(default=0)
+    owed_total = MoneyField(default=0)
+    owed_count = models.PositiveIntegerField(default=0)
+    unsettled_paid = MoneyField(default=0)
+    unsettled_owed = MoneyField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user_id} in {self.group_id} for {self.month:%Y-%m} ({self.category}, {self.currency})"
+    
+    class Meta:
+        db_table = 'analytics_monthlyrollup'
+        unique_together = ['user', 'group', 'month', 'category', 'currency']
+        indexes = [
+            models.Index(fields=['user', 'month']),
+            models.Index(fields=['group', 'month']),
+        ]
+
+
+class PairBalance(models.Model):
+    """
+    What ``user_b`` owes ``user_a`` (negative: what ``user_a`` owes ``user_b``)
+    in ``currency`` from the unsettled expenses of one group, or from paid
+    ledger entries when ``group`` is null. Each pair is stored once per
+    currency with ``user_a`` the lower id, and maintained incrementally from
+    expense, split and ledger writes.
+    """
+    
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='pair_balances')
+    currency = models.CharField(max_length=3, default='INR')
+    amount = MoneyField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user_b_id} owes {self.user_a_id} {self.currency} {self.amount} ({self.group_id or 'ledger'})"
+    
+    class Meta:
+        db_table = 'analytics_pairbalance'
+        constraints = [
+            models.UniqueConstraint(fields=['user_a', 'user_b', 'group', 'currency'], name='unique_pair_balance'),
+            models.UniqueConstraint(
+                fields=['user_a', 'user_b', 'currency'], condition=models.Q(group__isnull=True),
+                name='unique_pair_ledger_balance'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user_b', 'user_a']),
+        ]
@@ -0,0 +1,476 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateField, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from groups.models import Group
+from expenses.fx import ConvertedBalances
+from expenses.models import Expense, ExpenseSplit
+from payments.models import LedgerEntry
+from shared_finance.money import Money, MoneyField
+from .models import MonthlyRollup, PairBalance
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FIELDS = ('paid_total', 'paid_count', 'owed_total', 'owed_count',
+                 'unsettled_paid', 'unsettled_owed')
+
+# (user_id, group_id, month, category, currency)
+RollupKey = Tuple[int, int, date, str, str]
+# (user_a_id, user_b_id, group_id or None for the ledger, currency)
+PairKey = Tuple[int, int, Optional[int], str]
+
+
+def month_bucket(value) -> date:
+    """Return the first day of the month ``value`` falls in (in the current timezone)"""
+    if isinstance(value, str):
+        value = parse_datetime(value) or parse_date(value)
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    return value.replace(day=1)
+
+
+def month_close(month: date) -> date:
+    """Day a month bucket's amounts are converted at: its last day, or today for the current month"""
+    last_day = (month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return min(last_day, timezone.localdate())
+
+
+def converted(rows: Iterable[Dict[str, Any]], currency: str, amount: str, key: Callable[[Dict[str, Any]], Hashable],
+              day: Optional[Callable[[Dict[str, Any]], date]] = None) -> Dict[Hashable, Money]:
+    """
+    ``row[amount]`` summed by ``key(row)`` in ``currency``. Rows in another
+    ``row['currency']`` convert at the rate of ``day(row)``, by default today's.
+    """
+    balances = ConvertedBalances(currency)
+    today = timezone.localdate()
+    for row in rows:
+        balances.add(key(row), row[amount] or Money(), row['currency'], day(row) if day else today)
+    return {key: Money.of(total) for key, total in balances.balances().items()}
+
+
+def converted_total(rows: Iterable[Dict[str, Any]], currency: str, amount: str,
+                    day: Optional[Callable[[Dict[str, Any]], date]] = None) -> Money:
+    return converted(rows, currency, amount, lambda row: None, day).get(None, Money())
+
+
+def rollup_day(row: Dict[str, Any]) -> date:
+    return month_close(row['month'])
+
+
+def _money(value) -> Money:
+    return Money.of(value or 0)
+
+
+def _plus(field: str, value):
+    """``field`` plus ``value``: a count, or Money bound as the paise the column holds"""
+    if isinstance(value, Money):
+        value = Value(value, output_field=MoneyField())
+    return F(field) + value
+
+
+def expense_state(expense: Expense) -> Dict[str, Any]:
+    """Snapshot of the expense fields that feed the rollups"""
+    return {
+        'group_id': expense.group_id,
+        'payer_id': expense.payer_id,
+        'date': expense.date,
+        'category': expense.category,
+        'currency': expense.currency,
+        'is_settled': expense.is_settled,
+        'amount_subtotal': expense.amount_subtotal,
+        'amount_tax': expense.amount_tax,
+        'total_amount': expense.total_amount,
+    }
+
+
+class RollupDelta:
+    """Accumulates signed contributions per rollup bucket and applies them with F() updates"""
+
+    def __init__(self):
+        self.rows: Dict[RollupKey, Dict[str, Any]] = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+
+    @staticmethod
+    def _key(user_id: int, state: Dict[str, Any]) -> RollupKey:
+        return (user_id, state['group_id'], month_bucket(state['date']), state['category'], state['currency'])
+
+    def add_expense(self, state: Dict[str, Any], sign: int = 1):
+        """Add (or with ``sign=-1`` remove) what the payer paid"""
+        total = _money(state['total_amount'])
+        row = self.rows[self._key(state['payer_id'], state)]
+        row['paid_total'] += sign * total
+        row['paid_count'] += sign
+        if not state['is_settled']:
+            row['unsettled_paid'] += sign * total
+
+    def add_split(self, state: Dict[str, Any], member_id: int, amount_owed, sign: int = 1):
+        """Add (or with ``sign=-1`` remove) a member's share of an expense"""
+        amount = _money(amount_owed)
+        row = self.rows[self._key(member_id, state)]
+        row['owed_total'] += sign * amount
+        row['owed_count'] += sign
+        if not state['is_settled']:
+            row['unsettled_owed'] += sign * amount
+
+    def apply(self):
+        for (user_id, group_id, month, category, currency), values in self.rows.items():
+            changes = {field: value for field, value in values.items() if value}
+            if not changes:
+                continue
+
+            bucket = MonthlyRollup.objects.filter(
+                user_id=user_id, group_id=group_id, month=month, category=category, currency=currency
+            )
+            updates = {field: _plus(field, value) for field, value in changes.items()}
+            if bucket.update(**updates):
+                continue
+
+            try:
+                with transaction.atomic():
+                    MonthlyRollup.objects.create(
+                        user_id=user_id, group_id=group_id, month=month, category=category, currency=currency,
+                        **changes
+                    )
+            except IntegrityError:
+                # Another writer created the bucket in the meantime
+                bucket.update(**updates)
+
+
+def rebuild_rollups(group_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute rollups from scratch with two aggregate queries; returns the number of buckets"""
+    expenses = Expense.objects.all()
+    splits = ExpenseSplit.objects.all()
+    rollups = MonthlyRollup.objects.all()
+    if group_ids is not None:
+        group_ids = list(group_ids)
+        expenses = expenses.filter(group_id__in=group_ids)
+        splits = splits.filter(expense__group_id__in=group_ids)
+        rollups = rollups.filter(group_id__in=group_ids)
+
+    money = MoneyField()
+    total = F('total_amount')
+    paid_rows = expenses.values(
+        'payer_id', 'group_id', 'category', 'currency',
+        bucket=TruncMonth('date', output_field=DateField()),
+    ).annotate(
+        total=Sum(total, output_field=money),
+        count=Count('id'),
+        unsettled=Sum(Case(When(is_settled=False, then=total), default=Value(0), output_field=money)),
+    )
+    owed_rows = splits.values(
+        'member_id', 'expense__group_id', 'expense__category', 'expense__currency',
+        bucket=TruncMonth('expense__date', output_field=DateField()),
+    ).annotate(
+        total=Sum('amount_owed'),
+        count=Count('id'),
+        unsettled=Sum(Case(
+            When(expense__is_settled=False, then=F('amount_owed')), default=Value(0), output_field=money
+        )),
+    )
+
+    buckets: Dict[RollupKey, Dict[str, Any]] = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    for row in paid_rows:
+        values = buckets[(row['payer_id'], row['group_id'], row['bucket'], row['category'], row['currency'])]
+        values['paid_total'] = _money(row['total'])
+        values['paid_count'] = row['count']
+        values['unsettled_paid'] = _money(row['unsettled'])
+    for row in owed_rows:
+        values = buckets[(
+            row['member_id'], row['expense__group_id'], row['bucket'], row['expense__category'],
+            row['expense__currency'],
+        )]
+        values['owed_total'] = _money(row['total'])
+        values['owed_count'] = row['count']
+        values['unsettled_owed'] = _money(row['unsettled'])
+
+    with transaction.atomic():
+        rollups.delete()
+        MonthlyRollup.objects.bulk_create(
+            [
+                MonthlyRollup(
+                    user_id=user_id, group_id=group_id, month=month, category=category, currency=currency, **values
+                )
+                for (user_id, group_id, month, category, currency), values in buckets.items()
+            ],
+            batch_size=1000,
+        )
+
+    logger.info(f"Rebuilt {len(buckets)} monthly rollup buckets")
+    return len(buckets)
+
+
+def ledger_state(entry: LedgerEntry) -> Dict[str, Any]:
+    """Snapshot of the ledger entry fields that feed the pair balances"""
+    return {
+        'from_member_id': entry.from_member_id,
+        'to_member_id': entry.to_member_id,
+        'amount': entry.amount,
+        'currency': entry.currency,
+        'status': entry.status,
+    }
+
+
+class BalanceDelta:
+    """Accumulates changes to what one user owes another and applies them with F() updates"""
+
+    def __init__(self):
+        self.rows: Dict[PairKey, Money] = defaultdict(Money)
+
+    def add(self, creditor_id: int, debtor_id: int, amount, currency: str, group_id: Optional[int] = None,
+            sign: int = 1):
+        """``debtor_id`` owes ``creditor_id`` ``amount`` of ``currency`` more (less with ``sign=-1``)"""
+        if creditor_id == debtor_id:
+            return
+        amount = sign * _money(amount)
+        if creditor_id < debtor_id:
+            self.rows[(creditor_id, debtor_id, group_id, currency)] += amount
+        else:
+            self.rows[(debtor_id, creditor_id, group_id, currency)] -= amount
+
+    def add_split(self, state: Dict[str, Any], member_id: int, amount_owed, sign: int = 1):
+        """A member's share of an unsettled expense is owed to its payer"""
+        if not state['is_settled']:
+            self.add(state['payer_id'], member_id, amount_owed, state['currency'], state['group_id'], sign)
+
+    def add_ledger(self, state: Dict[str, Any], sign: int = 1):
+        """A paid ledger entry moved money from its debtor to its creditor"""
+        if state['status'] == 'paid':
+            self.add(state['from_member_id'], state['to_member_id'], state['amount'], state['currency'], None, sign)
+
+    def apply(self):
+        for (user_a_id, user_b_id, group_id, currency), amount in self.rows.items():
+            if not amount:
+                continue
+
+            pair = PairBalance.objects.filter(
+                user_a_id=user_a_id, user_b_id=user_b_id, group_id=group_id, currency=currency
+            )
+            if pair.update(amount=_plus('amount', amount)):
+                continue
+
+            try:
+                with transaction.atomic():
+                    PairBalance.objects.create(
+                        user_a_id=user_a_id, user_b_id=user_b_id, group_id=group_id, currency=currency, amount=amount
+                    )
+            except IntegrityError:
+                # Another writer created the pair in the meantime
+                pair.update(amount=_plus('amount', amount))
+
+
+def compute_pair_balances() -> Dict[PairKey, Money]:
+    """Pair balances from scratch with two aggregate queries"""
+    delta = BalanceDelta()
+    splits = ExpenseSplit.objects.filter(expense__is_settled=False).exclude(member_id=F('expense__payer_id'))
+    for row in splits.values('expense__payer_id', 'member_id', 'expense__group_id', 'expense__currency').annotate(
+        total=Sum('amount_owed')
+    ):
+        delta.add(
+            row['expense__payer_id'], row['member_id'], row['total'], row['expense__currency'], row['expense__group_id']
+        )
+    paid = LedgerEntry.objects.filter(status='paid').exclude(from_member_id=F('to_member_id'))
+    for row in paid.values('from_member_id', 'to_member_id').annotate(total=Sum('amount')):
+        delta.add(row['from_member_id'], row['to_member_id'], row['total'], settings.FX_BASE_CURRENCY)
+    return {key: amount for key, amount in delta.rows.items() if amount}
+
+
+def rebuild_balances() -> int:
+    """Recompute every pair balance; returns the number of rows"""
+    rows = compute_pair_balances()
+    with transaction.atomic():
+        PairBalance.objects.all().delete()
+        PairBalance.objects.bulk_create(
+            [
+                PairBalance(
+                    user_a_id=user_a_id, user_b_id=user_b_id, group_id=group_id, currency=currency, amount=amount
+                )
+                for (user_a_id, user_b_id, group_id, currency), amount in rows.items()
+            ],
+            batch_size=1000,
+        )
+
+    logger.info(f"Rebuilt {len(rows)} pair balances")
+    return len(rows)
+
+
+def balance_drift() -> Dict[PairKey, Tuple[Money, Money]]:
+    """Pairs whose stored balance differs from a recomputation, as (stored, expected)"""
+    expected = compute_pair_balances()
+    stored = {
+        (row['user_a_id'], row['user_b_id'], row['group_id'], row['currency']): _money(row['amount'])
+        for row in PairBalance.objects.exclude(amount=0).values(
+            'user_a_id', 'user_b_id', 'group_id', 'currency', 'amount'
+        )
+    }
+    return {
+        key: (stored.get(key, Money()), expected.get(key, Money()))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key, Money()) != expected.get(key, Money())
+    }
+
+
+class BalanceService:
+    """A user's position against everyone they share expenses or ledger entries with"""
+
+    def __init__(self, user):
+        self.user = user
+
+    def summary(self) -> Dict[str, Any]:
+        """Net position per counterparty in ``FX_BASE_CURRENCY``; other currencies convert at today's rate"""
+        rows = PairBalance.objects.filter(Q(user_a=self.user) | Q(user_b=self.user)).values(
+            'user_a_id', 'user_a__username', 'user_b_id', 'user_b__username', 'currency'
+        ).annotate(total=Sum('amount'))
+
+        users = {}
+        positions = []
+        for row in rows:
+            # Stored as what user_b owes user_a
+            amount = _money(row['total'])
+            if row['user_a_id'] == self.user.id:
+                counterparty = {'id': row['user_b_id'], 'username': row['user_b__username']}
+            else:
+                counterparty = {'id': row['user_a_id'], 'username': row['user_a__username']}
+                amount = -amount
+            users[counterparty['id']] = counterparty
+            positions.append({'user_id': counterparty['id'], 'net': amount, 'currency': row['currency']})
+
+        currency = settings.FX_BASE_CURRENCY
+        counterparties = [
+            {'user': users[user_id], 'net': net}
+            for user_id, net in converted(positions, currency, 'net', lambda row: row['user_id']).items()
+            if net
+        ]
+        counterparties.sort(key=lambda row: (-abs(row['net']), row['user']['id']))
+
+        receivable = sum((row['net'] for row in counterparties if row['net'] > 0), Money())
+        owed = -sum((row['net'] for row in counterparties if row['net'] < 0), Money())
+        return {
+            'currency': currency,
+            'total_owed': owed,
+            'total_receivable': receivable,
+            'net': receivable - owed,
+            'counterparties': counterparties,
+        }
+
+
+class AnalyticsService:
+    """
+    Expense analytics for a single user, served from the monthly rollups.
+    Totals are in ``FX_BASE_CURRENCY``; each month's amounts in other
+    currencies convert at that month's closing rate.
+    """
+
+    def __init__(self, user, scope: Optional[Dict[str, Any]] = None):
+        self.user = user
+        self.scope = scope or {}
+        self.currency = settings.FX_BASE_CURRENCY
+
+    def _rollups(self):
+        # Buckets emptied by deletes stay behind with zero counts
+        rollups = MonthlyRollup.objects.filter(user=self.user).exclude(paid_count=0, owed_count=0)
+        if self.scope.get('group_ids'):
+            rollups = rollups.filter(group_id__in=self.scope['group_ids'])
+        if self.scope.get('months'):
+            rollups = rollups.filter(month__gte=self._window_start(int(self.scope['months'])))
+        return rollups
+
+    @staticmethod
+    def _window_start(months: int) -> date:
+        start = month_bucket(timezone.now())
+        year, month = divmod(start.year * 12 + start.month - 1 - (months - 1), 12)
+        return date(year, month + 1, 1)
+
+    def _expense_rows(self) -> List[Dict[str, Any]]:
+        """Owed and paid totals per month, category and currency"""
+        return list(self._rollups().values('month', 'category', 'currency').annotate(
+            owed=Sum('owed_total'), paid=Sum('paid_total')
+        ).order_by('month'))
+
+    def _balance_rows(self) -> List[Dict[str, Any]]:
+        """Unsettled paid less owed per group, month and currency, in group order"""
+        return list(self._rollups().values('group_id', 'group__name', 'group__currency', 'month', 'currency').annotate(
+            balance=ExpressionWrapper(Sum('unsettled_paid') - Sum('unsettled_owed'), output_field=MoneyField())
+        ).order_by('group_id'))
+
+    def expense_analysis(self) -> Dict[str, Any]:
+        """Category breakdown and monthly trend of the user's share of expenses"""
+        rows = self._expense_rows()
+        category_breakdown = converted(rows, self.currency, 'owed', lambda row: row['category'], rollup_day)
+        monthly_trend = converted(rows, self.currency, 'owed', lambda row: row['month'], rollup_day)
+
+        return {
+            'currency': self.currency,
+            'total_expenses': sum(category_breakdown.values(), Money()),
+            'total_paid': converted_total(rows, self.currency, 'paid', rollup_day),
+            'category_breakdown': dict(sorted(category_breakdown.items())),
+            'monthly_trend': [
+                {'month': month.strftime('%Y-%m'), 'amount': amount}
+                for month, amount in sorted(monthly_trend.items())
+            ],
+        }
+
+    def settlement_summary(self) -> Dict[str, Any]:
+        """Outstanding balance per group, in its currency, plus the user's pending and recent ledger entries"""
+        groups = defaultdict(list)
+        for row in self._balance_rows():
+            groups[(row['group_id'], row['group__name'], row['group__currency'])].append(row)
+        group_balances = [
+            {
+                'group_id': group_id,
+                'group_name': group_name,
+                'currency': group_currency,
+                'balance': converted_total(group_rows, group_currency, 'balance', rollup_day),
+            }
+            for (group_id, group_name, group_currency), group_rows in groups.items()
+        ]
+
+        ledger = LedgerEntry.objects.filter(Q(from_member=self.user) | Q(to_member=self.user))
+        history = ledger.values('created_at', 'amount', 'status', 'from_member_id')[:10]
+
+        return {
+            'currency': self.currency,
+            'outstanding_balance': converted_total(
+                [row for group_rows in groups.values() for row in group_rows], self.currency, 'balance', rollup_day
+            ),
+            'group_balances': group_balances,
+            'pending_payments': ledger.filter(from_member=self.user, status='pending').count(),
+            'settlement_history': [
+                {
+                    'date': entry['created_at'].date().isoformat(),
+                    'amount': entry['amount'],
+                    'status': entry['status'],
+                    'direction': 'outgoing' if entry['from_member_id'] == self.user.id else 'incoming',
+                }
+                for entry in history
+            ],
+        }
+
+    def group_insights(self) -> Dict[str, Any]:
+        """Totals across every group the user is an active member of"""
+        groups = Group.objects.filter(
+            members__user=self.user, members__is_active=True, is_active=True
+        ).distinct()
+        if self.scope.get('group_ids'):
+            groups = groups.filter(id__in=self.scope['group_ids'])
+        group_names = list(groups.values_list('name', flat=True))
+
+        rows = list(MonthlyRollup.objects.filter(group__in=groups).values('month', 'currency').annotate(
+            paid=Sum('paid_total'), unsettled=Sum('unsettled_paid')
+        ))
+        paid = converted_total(rows, self.currency, 'paid', rollup_day)
+        unsettled = converted_total(rows, self.currency, 'unsettled', rollup_day)
+
+        return {
+            'group_count': len(group_names),
+            'active_groups': group_names,
+            'currency': self.currency,
+            'total_shared_expenses': paid,
+            'settlement_efficiency': round(1 - unsettled.paise / paid.paise, 4) if paid else 1.0,
+        }
@@ -0,0 +1,209 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from expenses.models import Expense, ExpenseSplit
+from expenses.signals import EXPENSE_TRACKED_FIELDS, splits_recomputed
+from payments.models import LedgerEntry
+from .services import BalanceDelta, RollupDelta, expense_state, ledger_state, month_bucket
+
+# Expense fields that change who owes whom, or in what currency, for every split
+BALANCE_EXPENSE_FIELDS = ('group_id', 'payer_id', 'currency', 'is_settled')
+
+
+def _origin_model(origin):
+    """Model class that started a delete (an instance or a queryset)"""
+    if origin is None:
+        return None
+    return getattr(origin, 'model', None) or type(origin)
+
+
+def _moves_splits(previous, current):
+    """Whether the change moves every split to another bucket or settlement state"""
+    return (
+        previous['group_id'] != current['group_id']
+        or previous['category'] != current['category']
+        or previous['currency'] != current['currency']
+        or previous['is_settled'] != current['is_settled']
+        or month_bucket(previous['date']) != month_bucket(current['date'])
+    )
+
+
+@receiver(post_save, sender=Expense)
+def expense_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_state', None)
+    current = expense_state(instance)
+    delta = RollupDelta()
+
+    if previous is None:
+        delta.add_expense(current)
+    else:
+        moves_splits = _moves_splits(previous, current)
+        if not moves_splits and all(
+            previous[field] == current[field] for field in EXPENSE_TRACKED_FIELDS if field != 'date'
+        ):
+            return
+
+        delta.add_expense(previous, -1)
+        delta.add_expense(current)
+        if moves_splits:
+            for split in instance.splits.values('member_id', 'amount_owed'):
+                delta.add_split(previous, split['member_id'], split['amount_owed'], -1)
+                delta.add_split(current, split['member_id'], split['amount_owed'])
+
+    delta.apply()
+
+
+@receiver(pre_delete, sender=Expense)
+def expense_delete_rollup(sender, instance, origin=None, **kwargs):
+    # Group deletes cascade to the rollups themselves
+    if _origin_model(origin) not in (None, Expense):
+        return
+
+    state = expense_state(instance)
+    delta = RollupDelta()
+    delta.add_expense(state, -1)
+    for split in instance.splits.values('member_id', 'amount_owed'):
+        delta.add_split(state, split['member_id'], split['amount_owed'], -1)
+    delta.apply()
+
+
+@receiver(post_save, sender=ExpenseSplit)
+def expense_split_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    delta = RollupDelta()
+    previous = getattr(instance, '_previous_state', None)
+    if previous is not None:
+        if previous['expense_id'] == instance.expense_id:
+            previous_expense = instance.expense
+        else:
+            previous_expense = Expense.objects.get(pk=previous['expense_id'])
+        delta.add_split(expense_state(previous_expense), previous['member_id'], previous['amount_owed'], -1)
+
+    delta.add_split(expense_state(instance.expense), instance.member_id, instance.amount_owed)
+    delta.apply()
+
+
+@receiver(post_delete, sender=ExpenseSplit)
+def expense_split_delete_rollup(sender, instance, origin=None, **kwargs):
+    # Expense deletes are accounted for in expense_delete_rollup
+    if _origin_model(origin) not in (None, ExpenseSplit):
+        return
+
+    expense = Expense.objects.filter(pk=instance.expense_id).first()
+    if expense is None:
+        return
+
+    delta = RollupDelta()
+    delta.add_split(expense_state(expense), instance.member_id, instance.amount_owed, -1)
+    delta.apply()
+
+
+@receiver(splits_recomputed, sender=Expense)
+def recomputed_splits_rollup(sender, expense, changes, **kwargs):
+    # Counts cancel out; only the changed amounts reach the rollups
+    state = expense_state(expense)
+    delta = RollupDelta()
+    for member_id, (previous, current) in changes.items():
+        delta.add_split(state, member_id, previous, -1)
+        delta.add_split(state, member_id, current)
+    delta.apply()
+
+
+@receiver(post_save, sender=Expense)
+def expense_pair_balances(sender, instance, created, raw=False, **kwargs):
+    # A new expense has no splits yet
+    previous = getattr(instance, '_previous_state', None)
+    if raw or previous is None:
+        return
+
+    current = expense_state(instance)
+    if all(previous[field] == current[field] for field in BALANCE_EXPENSE_FIELDS):
+        return
+
+    delta = BalanceDelta()
+    for split in instance.splits.values('member_id', 'amount_owed'):
+        delta.add_split(previous, split['member_id'], split['amount_owed'], -1)
+        delta.add_split(current, split['member_id'], split['amount_owed'])
+    delta.apply()
+
+
+@receiver(pre_delete, sender=Expense)
+def expense_delete_pair_balances(sender, instance, origin=None, **kwargs):
+    # Group and user deletes cascade to the balances themselves
+    if _origin_model(origin) not in (None, Expense):
+        return
+
+    state = expense_state(instance)
+    delta = BalanceDelta()
+    for split in instance.splits.values('member_id', 'amount_owed'):
+        delta.add_split(state, split['member_id'], split['amount_owed'], -1)
+    delta.apply()
+
+
+@receiver(post_save, sender=ExpenseSplit)
+def expense_split_pair_balances(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    delta = BalanceDelta()
+    previous = getattr(instance, '_previous_state', None)
+    if previous is not None:
+        if previous['expense_id'] == instance.expense_id:
+            previous_expense = instance.expense
+        else:
+            previous_expense = Expense.objects.get(pk=previous['expense_id'])
+        delta.add_split(expense_state(previous_expense), previous['member_id'], previous['amount_owed'], -1)
+
+    delta.add_split(expense_state(instance.expense), instance.member_id, instance.amount_owed)
+    delta.apply()
+
+
+@receiver(post_delete, sender=ExpenseSplit)
+def expense_split_delete_pair_balances(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) not in (None, ExpenseSplit):
+        return
+
+    expense = Expense.objects.filter(pk=instance.expense_id).first()
+    if expense is None:
+        return
+
+    delta = BalanceDelta()
+    delta.add_split(expense_state(expense), instance.member_id, instance.amount_owed, -1)
+    delta.apply()
+
+
+@receiver(splits_recomputed, sender=Expense)
+def recomputed_splits_pair_balances(sender, expense, changes, **kwargs):
+    state = expense_state(expense)
+    delta = BalanceDelta()
+    for member_id, (previous, current) in changes.items():
+        delta.add_split(state, member_id, previous, -1)
+        delta.add_split(state, member_id, current)
+    delta.apply()
+
+
+@receiver(post_save, sender=LedgerEntry)
+def ledger_entry_pair_balances(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    delta = BalanceDelta()
+    previous = getattr(instance, '_previous_state', None)
+    if previous is not None:
+        delta.add_ledger(previous, -1)
+    delta.add_ledger(ledger_state(instance))
+    delta.apply()
+
+
+@receiver(post_delete, sender=LedgerEntry)
+def ledger_entry_delete_pair_balances(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) not in (None, LedgerEntry):
+        return
+
+    delta = BalanceDelta()
+    delta.add_ledger(ledger_state(instance), -1)
+    delta.apply()
@@ -0,0 +1,210 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from groups.models import Group, GroupMember
+from expenses.models import Expense, ExpenseSplit
+from payments.models import LedgerEntry
+from audits.models import Consent
+from audits.views import simulate_data_sharing
+from .models import MonthlyRollup, PairBalance
+from .management.commands.benchmark_analytics import LiveAnalyticsService
+from .services import AnalyticsService, BalanceService, balance_drift, rebuild_rollups
+from io import StringIO
+from rest_framework.test import APIClient
+from datetime import datetime, timedelta
+from decimal import Decimal
+import os
+import tempfile
+
+User = get_user_model()
+
+
+class MonthlyRollupTest(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', email='user1@test.com')
+        self.user2 = User.objects.create_user(username='user2', email='user2@test.com')
+
+        self.group = Group.objects.create(name='Test Group', owner=self.user1)
+        GroupMember.objects.create(group=self.group, user=self.user1, role='owner')
+        GroupMember.objects.create(group=self.group, user=self.user2, role='member')
+
+        self.expense = Expense.objects.create(
+            group=self.group,
+            payer=self.user1,
+            amount_subtotal=Decimal('100.00'),
+            amount_tax=Decimal('18.00'),
+            category='food',
+            date=timezone.make_aware(datetime(2024, 1, 15)),
+        )
+        for user in [self.user1, self.user2]:
+            ExpenseSplit.objects.create(expense=self.expense, member=user, amount_owed=Decimal('59.00'))
+
+    def snapshot(self):
+        return sorted(
+            MonthlyRollup.objects.exclude(paid_count=0, owed_count=0).values_list(
+                'user_id', 'group_id', 'month', 'category', 'paid_total', 'paid_count',
+                'owed_total', 'owed_count', 'unsettled_paid', 'unsettled_owed'
+            )
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_create_is_rolled_up(self):
+        payer = MonthlyRollup.objects.get(user=self.user1)
+        self.assertEqual(payer.paid_total, Decimal('118.00'))
+        self.assertEqual(payer.owed_total, Decimal('59.00'))
+        self.assertEqual(payer.month.isoformat(), '2024-01-01')
+        self.assertMatchesRebuild()
+
+    def test_update_moves_buckets(self):
+        self.expense.category = 'travel'
+        self.expense.date = timezone.make_aware(datetime(2024, 2, 3))
+        self.expense.amount_subtotal = Decimal('200.00')
+        self.expense.is_settled = True
+        self.expense.save()
+
+        split = self.expense.splits.get(member=self.user2)
+        split.amount_owed = Decimal('109.00')
+        split.save()
+
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        self.expense.splits.get(member=self.user2).delete()
+        self.assertMatchesRebuild()
+
+        self.expense.delete()
+        self.assertEqual(self.snapshot(), [])
+
+    def test_live_aggregation_matches_rollups(self):
+        self.expense.splits.get(member=self.user2).delete()
+        Expense.objects.create(group=self.group, payer=self.user2, amount_subtotal=Decimal('30.00'), category='travel',
+                               is_settled=True, date=timezone.make_aware(datetime(2024, 3, 2)))
+        for user in (self.user1, self.user2):
+            rollup, live = AnalyticsService(user), LiveAnalyticsService(user)
+            self.assertEqual(rollup.expense_analysis(), live.expense_analysis())
+            self.assertEqual(rollup.settlement_summary(), live.settlement_summary())
+
+    def test_shared_data_comes_from_rollups(self):
+        consent = Consent.objects.create(
+            user=self.user2,
+            purpose='expense_analysis',
+            audience='system',
+            consent_token='TEST_TOKEN',
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+
+        expense_data = simulate_data_sharing(consent)['expense_data']
+        self.assertEqual(expense_data['total_expenses'], 59.0)
+        self.assertEqual(expense_data['category_breakdown'], {'food': 59.0})
+        self.assertEqual(expense_data['monthly_trend'], [{'month': '2024-01', 'amount': 59.0}])
+
+        consent.purpose = 'settlement_calculation'
+        settlement_data = simulate_data_sharing(consent)['settlement_data']
+        self.assertEqual(settlement_data['outstanding_balance'], -59.0)
+
+
+class PairBalanceTest(TestCase):
+    def setUp(self):
+        self.ann, self.ben, self.cat = [
+            User.objects.create_user(username=name, email=f'{name}@test.com') for name in ('ann', 'ben', 'cat')
+        ]
+        self.flat = self.group('Flat', [self.ann, self.ben])
+        self.club = self.group('Club', [self.ann, self.ben, self.cat])
+        self.rent = self.expense(self.flat, self.ann, {self.ann: '300.00', self.ben: '300.00'})
+        self.dinner = self.expense(self.club, self.ben, {self.ann: '40.00', self.ben: '40.00', self.cat: '40.00'})
+
+    def group(self, name, users):
+        group = Group.objects.create(name=name, owner=users[0])
+        for user in users:
+            GroupMember.objects.create(group=group, user=user)
+        return group
+
+    def expense(self, group, payer, shares, currency='INR'):
+        expense = Expense.objects.create(
+            group=group, payer=payer, amount_subtotal=sum(Decimal(share) for share in shares.values()),
+            currency=currency, date=timezone.now(),
+        )
+        for member, share in shares.items():
+            ExpenseSplit.objects.create(expense=expense, member=member, amount_owed=Decimal(share))
+        return expense
+
+    def summary(self, user):
+        return BalanceService(user).summary()
+
+    def test_nets_across_groups(self):
+        ben = self.summary(self.ben)
+        # Owes ann 300 for rent, is owed 40 by her for dinner
+        self.assertEqual(ben['counterparties'], [
+            {'user': {'id': self.ann.id, 'username': 'ann'}, 'net': -260.0},
+            {'user': {'id': self.cat.id, 'username': 'cat'}, 'net': 40.0},
+        ])
+        self.assertEqual((ben['total_owed'], ben['total_receivable'], ben['net']), (260.0, 40.0, -220.0))
+        self.assertEqual(self.summary(self.ann)['net'], 260.0)
+        self.assertEqual(balance_drift(), {})
+
+    def test_changes_are_applied_incrementally(self):
+        self.rent.payer = self.ben
+        self.rent.save()
+        split = self.dinner.splits.get(member=self.cat)
+        split.amount_owed = Decimal('10.00')
+        split.save()
+        self.dinner.splits.get(member=self.ann).delete()
+        self.assertEqual(balance_drift(), {})
+        self.assertEqual(self.summary(self.ann)['net'], -300.0)
+
+        entry = LedgerEntry.objects.create(from_member=self.ann, to_member=self.ben, amount=Decimal('100.00'))
+        self.assertEqual(self.summary(self.ann)['net'], -300.0)
+        entry.status = 'paid'
+        entry.save()
+        self.assertEqual(self.summary(self.ann)['net'], -200.0)
+        self.assertEqual(balance_drift(), {})
+        entry.delete()
+
+        self.rent.is_settled = True
+        self.rent.save()
+        self.assertEqual(self.summary(self.ann)['counterparties'], [])
+        self.club.delete()
+        self.assertEqual(balance_drift(), {})
+        self.assertFalse(PairBalance.objects.exclude(amount=0).exists())
+
+    def test_endpoint_and_drift_check(self):
+        client = APIClient()
+        client.force_authenticate(user=self.cat)
+        self.assertEqual(client.get('/api/auth/me/balances/').data['total_owed'], 40.0)
+
+        PairBalance.objects.filter(group=self.flat).update(amount=Decimal('1.00'))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_balances', '--check', stdout=StringIO())
+        call_command('rebuild_balances', stdout=StringIO())
+        call_command('rebuild_balances', '--check', stdout=StringIO())
+        self.assertEqual(self.summary(self.ann)['net'], 260.0)
+
+
+    def test_currencies_are_kept_apart_and_converted(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as rates:
+            rates.write('date,currency,rate\n2020-01-01,USD,80\n')
+        self.addCleanup(os.remove, path)
+        with override_settings(FX_RATES_FILE=path, FX_BASE_CURRENCY='INR'):
+            taxi = self.expense(self.flat, self.ben, {self.ann: '5.00', self.ben: '5.00'}, currency='USD')
+            self.assertEqual(
+                sorted(PairBalance.objects.filter(group=self.flat).values_list('currency', 'amount')),
+                [('INR', Decimal('300.00')), ('USD', Decimal('-5.00'))],
+            )
+            # Rent 300 less the 5 dollar taxi at 80 rupees, plus the 40 dinner
+            ann = self.summary(self.ann)
+            self.assertEqual((ann['currency'], ann['net']), ('INR', Decimal('-140.00')))
+            self.assertEqual(MonthlyRollup.objects.filter(currency='USD', user=self.ben).get().paid_total,
+                             Decimal('10.00'))
+            self.assertEqual(balance_drift(), {})
+
+            taxi.currency = 'INR'
+            taxi.save()
+            self.assertFalse(PairBalance.objects.filter(currency='USD').exclude(amount=0).exists())
+            self.assertEqual(self.summary(self.ann)['net'], Decimal('255.00'))
+            self.assertEqual(balance_drift(), {})
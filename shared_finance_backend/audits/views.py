@@ -6,6 +6,7 @@ from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
 import uuid
+from analytics.services import AnalyticsService
 from .models import Consent
 
 
@@ -144,10 +145,7 @@ def revoke_consent(request, consent_id):
 
 
 def simulate_data_sharing(consent):
-    """Simulate data sharing based on consent purpose and scope"""
-    # This is a mock implementation for demo purposes
-    # In production, you'd implement actual data sharing logic
-    
+    """Share the user's analytics for the consented purpose, limited to the consent scope"""
     shared_data = {
         'user_id': consent.user.id,
         'username': consent.user.username,
@@ -156,34 +154,15 @@ def simulate_data_sharing(consent):
         'scope': consent.scope
     }
     
+    analytics = AnalyticsService(consent.user, consent.scope)
+    
     if consent.purpose == 'expense_analysis':
-        shared_data['expense_data'] = {
-            'total_expenses': 15000.00,
-            'category_breakdown': {
-                'food': 5000.00,
-                'transport': 3000.00,
-                'utilities': 2000.00,
-                'entertainment': 5000.00
-            },
-            'monthly_trend': [1200, 1500, 1800, 2000]
-        }
+        shared_data['expense_data'] = analytics.expense_analysis()
     
     elif consent.purpose == 'settlement_calculation':
-        shared_data['settlement_data'] = {
-            'outstanding_balance': 2500.00,
-            'pending_payments': 3,
-            'settlement_history': [
-                {'date': '2024-01-01', 'amount': 500.00, 'status': 'completed'},
-                {'date': '2024-01-15', 'amount': 750.00, 'status': 'pending'}
-            ]
-        }
+        shared_data['settlement_data'] = analytics.settlement_summary()
     
     elif consent.purpose == 'group_insights':
-        shared_data['group_data'] = {
-            'group_count': 3,
-            'active_groups': ['Roommates', 'Society Committee'],
-            'total_shared_expenses': 45000.00,
-            'settlement_efficiency': 0.85
-        }
-    
-    return shared_data
\ No newline at end of file
+        shared_data['group_data'] = analytics.group_insights()
+    
+    return shared_data
@@ -0,0 +1,6 @@
+"""
+In-process API benchmarks.
+
+Run from the project directory with ``python -m benchmarks``; see
+``python -m benchmarks --help`` for options.
+"""
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import django
+
+
+def main():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shared_finance.settings')
+    django.setup()
+
+    argv = sys.argv[1:]
+    if argv[:1] == ['writes']:
+        from .writes import main as run
+        argv = argv[1:]
+    elif argv[:1] == ['concurrency']:
+        from .concurrency import main as run
+        argv = argv[1:]
+    else:
+        from .runner import main as run
+    sys.exit(run(argv))
+
+
+if __name__ == '__main__':
+    main()
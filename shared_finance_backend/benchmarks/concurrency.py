@@ -0,0 +1,236 @@
+"""
+Concurrency benchmark: real servers, many simultaneous clients.
+
+Seeds a throwaway SQLite database, starts the project under gunicorn (sync
+workers, sync DRF views) and under uvicorn (ASGI, the ``async/`` endpoints),
+then drives both with the same number of concurrent keep-alive clients for a
+fixed duration. Each client cycles through settlement compute, settlement
+graph, payment webhook and payment status, so a slow settlement blocking a
+worker shows up in the latency of the cheap status calls.
+"""
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from .runner import SCALES, build_context, percentile
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+MODES = {
+    'gunicorn-sync': {
+        'command': ['gunicorn', 'shared_finance.wsgi:application', '--workers', '{workers}',
+                    '--bind', '127.0.0.1:{port}', '--log-level', 'warning'],
+        'suffix': '',
+    },
+    'uvicorn-sync': {
+        'command': ['uvicorn', 'shared_finance.asgi:application', '--workers', '{workers}',
+                    '--port', '{port}', '--log-level', 'warning'],
+        'suffix': '',
+    },
+    'uvicorn-async': {
+        'command': ['uvicorn', 'shared_finance.asgi:application', '--workers', '{workers}',
+                    '--port', '{port}', '--log-level', 'warning'],
+        'suffix': 'async/',
+    },
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(database_url: str, scale: str, seed: int) -> Dict[str, Any]:
+    """Migrate and seed the file database; returns the requests each client will cycle through"""
+    from analytics.services import rebuild_balances, rebuild_rollups
+    from payments.models import LedgerEntry, Payment
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from shared_finance.database import database_config
+    from users.synthetic import SyntheticDataGenerator
+
+    settings.DATABASES['default'].update(database_config(PROJECT_DIR, {'DATABASE_URL': database_url}))
+    connections['default'].close()
+    del connections['default']
+
+    call_command('migrate', verbosity=0)
+    SyntheticDataGenerator(seed=seed, prefix='conc', **SCALES[scale]).run()
+    rebuild_rollups()
+    rebuild_balances()
+
+    ctx = build_context()
+    entry = LedgerEntry.objects.create(from_member=ctx['user'], to_member=ctx['counterparty'], amount='250.00')
+    payment = Payment.objects.create(ledger_entry=entry, method='UPI_DEEPLINK', amount=entry.amount)
+    token = str(RefreshToken.for_user(ctx['user']).access_token)
+    connections['default'].close()
+
+    group_id = ctx['group'].id
+    webhook = {'payment_id': payment.id, 'status': 'success', 'transaction_id': f'TXN{payment.id}BENCH'}
+    return {
+        'token': token,
+        'requests': [
+            ('settlement_compute', 'POST', f'/api/fairness/groups/{group_id}/compute_settlement/{{suffix}}',
+             {'policy_type': 'equal_split'}),
+            ('payment_status', 'GET', f'/api/payments/status/{payment.id}/{{suffix}}', None),
+            ('settlement_graph', 'GET', f'/api/fairness/groups/{group_id}/settlement_graph/{{suffix}}', None),
+            ('payment_status', 'GET', f'/api/payments/status/{payment.id}/{{suffix}}', None),
+            ('payment_webhook', 'POST', '/api/payments/webhook/{suffix}', webhook),
+            ('payment_status', 'GET', f'/api/payments/status/{payment.id}/{{suffix}}', None),
+        ],
+    }
+
+
+class HTTPClient:
+    """Minimal HTTP/1.1 client with keep-alive; reconnects when the server closes"""
+
+    def __init__(self, port: int, token: str):
+        self.port = port
+        self.token = token
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, payload=None) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        body = json.dumps(payload).encode() if payload is not None else b''
+        head = (
+            f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer {self.token}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+        )
+        self.writer.write(head.encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        else:
+            await self.reader.read()
+        if headers.get('connection', '').lower() == 'close' or 'content-length' not in headers:
+            await self.close()
+        return int(status_line.split()[1])
+
+
+async def drive(port: int, token: str, requests: List[Tuple], suffix: str, clients: int,
+                duration: float) -> Dict[str, List]:
+    samples: Dict[str, List] = {}
+    deadline = time.perf_counter() + duration
+
+    async def client(index: int):
+        http = HTTPClient(port, token)
+        i = index
+        while time.perf_counter() < deadline:
+            name, method, path, payload = requests[i % len(requests)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                status = await http.request(method, path.format(suffix=suffix), payload)
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                await http.close()
+                status = 599
+            samples.setdefault(name, []).append(((time.perf_counter() - started) * 1000, status))
+        await http.close()
+
+    await asyncio.gather(*(client(index) for index in range(clients)))
+    return samples
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server did not start on port {port}')
+
+
+def run_mode(mode: str, plan: Dict[str, Any], env: Dict[str, str], workers: int, clients: int,
+             duration: float) -> Dict[str, Any]:
+    port = free_port()
+    config = MODES[mode]
+    command = [sys.executable, '-m'] + [part.format(workers=workers, port=port) for part in config['command']]
+    process = subprocess.Popen(command, cwd=PROJECT_DIR, env=env)
+    try:
+        wait_for_port(port, process)
+        started = time.perf_counter()
+        samples = asyncio.run(drive(port, plan['token'], plan['requests'], config['suffix'], clients, duration))
+        # Requests already queued keep completing after the deadline
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    everything = [sample for values in samples.values() for sample in values]
+    status_latencies = [latency for latency, _ in samples.get('payment_status', [])]
+    return {
+        'mode': mode,
+        'requests': len(everything),
+        'errors': sum(1 for _, status in everything if status >= 400),
+        'rps': round(len(everything) / elapsed, 1),
+        'p50_ms': round(percentile([latency for latency, _ in everything], 50), 1),
+        'p95_ms': round(percentile([latency for latency, _ in everything], 95), 1),
+        'status_p95_ms': round(percentile(status_latencies, 95), 1) if status_latencies else 0.0,
+    }
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks concurrency', description=__doc__)
+    parser.add_argument('--mode', action='append', choices=sorted(MODES), dest='modes',
+                        help='Server setup to run (repeatable, default: gunicorn-sync and uvicorn-async)')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=15, help='Seconds of load per mode')
+    parser.add_argument('--workers', type=int, default=2, help='Server worker processes')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    modes = args.modes or ['gunicorn-sync', 'uvicorn-async']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f'sqlite:///{Path(tmp) / "concurrency.sqlite3"}'
+        plan = prepare_database(database_url, args.scale, args.seed)
+        env = {
+            **os.environ,
+            'DATABASE_URL': database_url,
+            'DEBUG': 'False',
+            'THROTTLE_USER_RATE': '100000000/hour',
+        }
+        results = [run_mode(mode, plan, env, args.workers, args.clients, args.duration) for mode in modes]
+
+    print(f"{args.clients} clients, {args.workers} workers, {args.duration:.0f}s per mode")
+    print(f"{'mode':<15} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'status p95':>11}")
+    for result in results:
+        print(f"{result['mode']:<15} {result['requests']:>9} {result['errors']:>7} {result['rps']:>8} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['status_p95_ms']:>11.1f}")
+    return 0
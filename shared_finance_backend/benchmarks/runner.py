@@ -0,0 +1,184 @@
+"""
+Runs the endpoint scenarios against a freshly seeded test database and
+compares p95 latency and query counts with a stored JSON baseline.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.urls import resolve
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from rest_framework.test import APIClient
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+import argparse
+import json
+import math
+import tempfile
+import time
+
+BASELINE_DIR = Path(__file__).resolve().parent / 'baselines'
+
+SCALES = {
+    'small': {'users': 200, 'groups': 40, 'members_per_group': 6, 'expenses_per_group': 40, 'payments': 200},
+    'medium': {'users': 5000, 'groups': 1000, 'members_per_group': 8, 'expenses_per_group': 80, 'payments': 5000},
+    'large': {'users': 50000, 'groups': 10000, 'members_per_group': 8, 'expenses_per_group': 100,
+              'payments': 50000},
+}
+
+# Latency differences below this are treated as noise regardless of the threshold
+NOISE_FLOOR_MS = 2.0
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def build_context() -> Dict[str, Any]:
+    """Benchmark as the owner of the largest group, the worst case for per-group endpoints"""
+    from groups.models import Group
+
+    group = Group.objects.annotate(size=Count('members')).order_by('-size', 'id').first()
+    members = list(group.members.select_related('user').order_by('id')[:2])
+    return {
+        'group': group,
+        'user': members[0].user,
+        'counterparty': members[1].user,
+        'expense': group.expenses.order_by('id').first(),
+    }
+
+
+class QueryCounter:
+    """Counts executed statements; unlike CaptureQueriesContext it is not capped at 9000"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(scenario, ctx: Dict[str, Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    client = APIClient()
+    client.force_authenticate(user=ctx['user'])
+
+    latencies, queries, sizes, statuses = [], [], [], set()
+    with scenario.context():
+        for i in range(warmup + iterations):
+            method, path, kwargs = scenario.prepare(ctx)
+            view = resolve(urlsplit(path).path).view_name
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            latencies.append(elapsed * 1000)
+            queries.append(counter.count)
+            sizes.append(len(response.content))
+            statuses.add(response.status_code)
+
+    return {
+        'view': view,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'queries': max(queries),
+        'response_bytes': max(sizes),
+        'status_codes': sorted(statuses),
+    }
+
+
+def compare(baseline: Dict[str, Any], results: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Regressions of ``results`` against ``baseline``; server errors, extra queries and
+    queries over the view's QUERY_BUDGETS entry always count
+    """
+    from shared_finance.profiling import query_budget
+
+    regressions = []
+    for name, result in results.items():
+        if any(code >= 500 for code in result['status_codes']):
+            regressions.append(f"{name}: server errors {result['status_codes']}")
+        budget = query_budget(result['view'])
+        if result['queries'] > budget:
+            regressions.append(f"{name}: {result['queries']} queries, budget for {result['view']} is {budget}")
+        base = baseline.get(name)
+        if not base:
+            continue
+        allowed_ms = max(base['p95_ms'] * (1 + threshold), base['p95_ms'] + NOISE_FLOOR_MS)
+        if result['p95_ms'] > allowed_ms:
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.2f} ms exceeds baseline {base['p95_ms']:.2f} ms "
+                f"by more than {threshold:.0%}"
+            )
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {base['queries']}")
+    return regressions
+
+
+def run(scale: str, iterations: int, warmup: int, seed: int, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    from analytics.services import rebuild_balances, rebuild_rollups
+    from users.synthetic import SyntheticDataGenerator
+    from .scenarios import SCENARIOS
+
+    scenarios = [scenario for scenario in SCENARIOS if not only or scenario.name in only]
+    rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': []}
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(REST_FRAMEWORK=rest_framework, MEDIA_ROOT=media_root):
+            SyntheticDataGenerator(seed=seed, prefix='bench', **SCALES[scale]).run()
+            rebuild_rollups()
+            rebuild_balances()
+            ctx = build_context()
+            return {scenario.name: measure(scenario, ctx, iterations, warmup) for scenario in scenarios}
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed p95 latency regression as a fraction of the baseline')
+    parser.add_argument('--scenario', action='append', dest='only', help='Only run this scenario (repeatable)')
+    parser.add_argument('--baseline', type=Path, help='Baseline JSON (default: baselines/<scale>.json)')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    baseline_path = args.baseline or BASELINE_DIR / f'{args.scale}.json'
+    results = run(args.scale, args.iterations, args.warmup, args.seed, args.only)
+
+    print(f"{'scenario':<20} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'bytes':>9}")
+    for name, result in results.items():
+        print(f"{name:<20} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+              f"{result['queries']:>8} {result['response_bytes']:>9}")
+
+    if args.update_baseline:
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        baseline.update(results)
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f"Baseline written to {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --update-baseline to create one")
+        return 0
+
+    regressions = compare(json.loads(baseline_path.read_text()), results, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
@@ -0,0 +1,118 @@
+"""
+Endpoint scenarios for the API benchmark.
+
+Each scenario's ``prepare`` runs outside the timed section and returns the
+request to issue: ``(method, path, kwargs for APIClient)``.
+"""
+from contextlib import nullcontext
+from decimal import Decimal
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from fairness.models import SettlementSnapshot
+from payments.models import LedgerEntry, Payment
+from payments.services import UPIWebhookSimulator
+from ocr.services import OCRService
+
+FAKE_RECEIPT_TEXT = """Fresh Mart Supermarket
+Invoice #: INV-20240115
+Date: 15/01/2024
+GSTIN: 27ABCDE1234F1Z5
+Total: 1180.00
+"""
+
+# 1x1 transparent PNG
+TINY_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c63000100000500010d0a2db40000000049454e44ae426082'
+)
+
+
+class Scenario:
+    def __init__(self, name, prepare, context=None):
+        self.name = name
+        self.prepare = prepare
+        self.context = context or nullcontext
+
+    def __repr__(self):
+        return f"Scenario({self.name})"
+
+
+def _new_ledger_entry(ctx):
+    return LedgerEntry.objects.create(
+        from_member=ctx['user'],
+        to_member=ctx['counterparty'],
+        amount=Decimal('250.00'),
+        description='Benchmark settlement',
+    )
+
+
+def group_list(ctx):
+    return 'get', '/api/groups/groups/', {}
+
+
+def bootstrap(ctx):
+    return 'get', '/api/bootstrap/', {}
+
+
+def expense_list(ctx):
+    return 'get', '/api/expenses/expenses/', {}
+
+
+def settlement_compute(ctx):
+    # Measure the live computation, not the snapshot the previous iteration saved
+    SettlementSnapshot.objects.filter(group=ctx['group']).delete()
+    return 'post', f"/api/fairness/groups/{ctx['group'].id}/compute_settlement/", {
+        'data': {'policy_type': 'equal_split'}, 'format': 'json'
+    }
+
+
+def settlement_graph(ctx):
+    SettlementSnapshot.objects.filter(group=ctx['group']).delete()
+    return 'get', f"/api/fairness/groups/{ctx['group'].id}/settlement_graph/", {}
+
+
+def settlement_snapshot(ctx):
+    # Served from the snapshot the warmup request saved
+    return 'post', f"/api/fairness/groups/{ctx['group'].id}/compute_settlement/", {
+        'data': {'policy_type': 'equal_split'}, 'format': 'json'
+    }
+
+
+def payment_initiate(ctx):
+    entry = _new_ledger_entry(ctx)
+    return 'post', '/api/payments/initiate/', {
+        'data': {'ledger_entry_id': entry.id, 'method': 'UPI_DEEPLINK'}, 'format': 'json'
+    }
+
+
+def payment_webhook(ctx):
+    entry = _new_ledger_entry(ctx)
+    payment = Payment.objects.create(ledger_entry=entry, method='UPI_DEEPLINK', amount=entry.amount)
+    return 'post', '/api/payments/webhook/', {
+        'data': UPIWebhookSimulator.simulate_webhook(payment.id), 'format': 'json'
+    }
+
+
+def receipt_upload(ctx):
+    receipt = SimpleUploadedFile('receipt.png', TINY_PNG, content_type='image/png')
+    return 'post', f"/api/ocr/expenses/{ctx['expense'].id}/upload_receipt/", {
+        'data': {'receipt': receipt}, 'format': 'multipart'
+    }
+
+
+def fake_ocr():
+    """Replace tesseract with canned text so the benchmark measures our code, not OCR"""
+    return mock.patch.object(OCRService, 'extract_text_from_image', return_value=FAKE_RECEIPT_TEXT)
+
+
+SCENARIOS = [
+    Scenario('group_list', group_list),
+    Scenario('expense_list', expense_list),
+    Scenario('bootstrap', bootstrap),
+    Scenario('settlement_compute', settlement_compute),
+    Scenario('settlement_graph', settlement_graph),
+    Scenario('settlement_snapshot', settlement_snapshot),
+    Scenario('payment_initiate', payment_initiate),
+    Scenario('payment_webhook', payment_webhook),
+    Scenario('receipt_upload', receipt_upload, context=fake_ocr),
+]
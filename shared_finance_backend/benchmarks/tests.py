@@ -0,0 +1,41 @@
+from django.test import SimpleTestCase, override_settings
+from .runner import compare, percentile
+
+
+class BenchmarkComparisonTest(SimpleTestCase):
+    def result(self, p95_ms, queries, status_codes=(200,), view='bench-view'):
+        return {'view': view, 'p50_ms': p95_ms, 'p95_ms': p95_ms, 'queries': queries,
+                'response_bytes': 100, 'status_codes': list(status_codes)}
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile([7.0], 95), 7.0)
+
+    def test_within_threshold(self):
+        baseline = {'group_list': self.result(100.0, 8)}
+        self.assertEqual(compare(baseline, {'group_list': self.result(120.0, 8)}, 0.25), [])
+
+    def test_latency_regression(self):
+        baseline = {'group_list': self.result(100.0, 8)}
+        regressions = compare(baseline, {'group_list': self.result(130.0, 8)}, 0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('p95', regressions[0])
+
+    def test_noise_floor(self):
+        baseline = {'payment_webhook': self.result(2.0, 6)}
+        self.assertEqual(compare(baseline, {'payment_webhook': self.result(3.5, 6)}, 0.25), [])
+
+    def test_query_and_error_regressions(self):
+        baseline = {'expense_list': self.result(100.0, 10)}
+        regressions = compare(baseline, {'expense_list': self.result(90.0, 11, (200, 500))}, 0.25)
+        self.assertEqual(len(regressions), 2)
+
+    @override_settings(QUERY_BUDGETS={'expense-list': 10})
+    def test_query_budget(self):
+        # Over budget even when the baseline recorded as many queries
+        baseline = {'expense_list': self.result(100.0, 505, view='expense-list')}
+        regressions = compare(baseline, {'expense_list': self.result(100.0, 505, view='expense-list')}, 0.25)
+        self.assertEqual(regressions, ['expense_list: 505 queries, budget for expense-list is 10'])
+        self.assertEqual(compare(baseline, {'expense_list': self.result(100.0, 7, view='expense-list')}, 0.25), [])
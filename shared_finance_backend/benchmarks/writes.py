@@ -0,0 +1,134 @@
+"""
+Concurrent write benchmark.
+
+Worker threads, each with its own database connection, hammer the payment
+initiate and webhook endpoints (ledger, payment and audit log writes)
+against a file-backed copy of the configured database. With SQLite it runs
+once with Django's stock backend and once with the tuned backend, so the
+effect of WAL, the busy timeout and ``BEGIN IMMEDIATE`` shows up as
+throughput and "database is locked" failures.
+"""
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from rest_framework.test import APIClient
+from pathlib import Path
+from typing import Any, Dict, List
+import argparse
+import tempfile
+import threading
+import time
+
+from .runner import build_context, percentile
+from .scenarios import payment_initiate, payment_webhook
+
+STOCK_SQLITE = {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}}
+
+WRITE_SEED = {'users': 60, 'groups': 10, 'members_per_group': 6, 'expenses_per_group': 10}
+
+
+def reset_connection():
+    """Drop the main thread's connection so the next one is built from the updated settings"""
+    connections['default'].close()
+    del connections['default']
+
+
+def worker(ctx: Dict[str, Any], requests: int, latencies: List[float], failures: List[str]):
+    client = APIClient(raise_request_exception=False)
+    client.force_authenticate(user=ctx['user'])
+    try:
+        for i in range(requests):
+            prepare = payment_initiate if i % 2 == 0 else payment_webhook
+            started = time.perf_counter()
+            try:
+                method, path, kwargs = prepare(ctx)
+                response = getattr(client, method)(path, **kwargs)
+            except DatabaseError as exc:
+                failures.append(str(exc))
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 500:
+                failures.append(f'HTTP {response.status_code}')
+    finally:
+        connection.close()
+
+
+def run_profile(label: str, overrides: Dict[str, Any], threads: int, requests: int, seed: int) -> Dict[str, Any]:
+    from users.synthetic import SyntheticDataGenerator
+
+    settings_dict = settings.DATABASES['default']
+    original = {key: settings_dict[key] for key in overrides}
+    settings_dict.update(overrides)
+    reset_connection()
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        SyntheticDataGenerator(seed=seed, prefix='writes', **WRITE_SEED).run()
+        ctx = build_context()
+        connection.close()
+
+        latencies: List[float] = []
+        failures: List[str] = []
+        pool = [
+            threading.Thread(target=worker, args=(ctx, requests, latencies, failures))
+            for _ in range(threads)
+        ]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        settings_dict.update(original)
+        reset_connection()
+
+    attempted = threads * requests
+    return {
+        'profile': label,
+        'requests': attempted,
+        'failed': len(failures),
+        'throughput': round((attempted - len(failures)) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+        'first_error': failures[0] if failures else '',
+    }
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks writes', description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per thread')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    settings_dict = settings.DATABASES['default']
+    rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': []}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, override_settings(REST_FRAMEWORK=rest_framework):
+        if 'sqlite3' in settings_dict['ENGINE']:
+            # The in-memory test database would hide locking; use files instead
+            def test_db(name):
+                return {'TEST': {**settings_dict['TEST'], 'NAME': str(Path(tmp) / name)}}
+            profiles = [
+                ('sqlite stock', {**STOCK_SQLITE, **test_db('stock.sqlite3')}),
+                ('sqlite tuned', test_db('tuned.sqlite3')),
+            ]
+        else:
+            profiles = [(settings_dict['ENGINE'].rsplit('.', 1)[-1], {})]
+        for label, overrides in profiles:
+            results.append(run_profile(label, overrides, args.threads, args.requests, args.seed))
+
+    print(f"{'profile':<14} {'requests':>8} {'failed':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for result in results:
+        print(f"{result['profile']:<14} {result['requests']:>8} {result['failed']:>7} {result['throughput']:>8} "
+              f"{result['p50_ms'] or 0:>9.2f} {result['p95_ms'] or 0:>9.2f}")
+        if result['first_error']:
+            print(f"  first error: {result['first_error']}")
+    return 0
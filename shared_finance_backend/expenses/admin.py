@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Expense, ExpenseSplit
+from .models import Expense, ExpenseSplit, RecurringExpense, RecurringOccurrence
 
 
 class ExpenseSplitInline(admin.TabularInline):
@@ -22,4 +22,20 @@ class ExpenseSplitAdmin(admin.ModelAdmin):
     list_display = ('expense', 'member', 'amount_owed', 'split_type', 'is_paid')
     list_filter = ('split_type', 'is_paid', 'created_at')
     search_fields = ('expense__vendor', 'member__username')
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+
+class RecurringOccurrenceInline(admin.TabularInline):
+    model = RecurringOccurrence
+    extra = 0
+    readonly_fields = ('period', 'expense', 'created_at')
+
+
+@admin.register(RecurringExpense)
+class RecurringExpenseAdmin(admin.ModelAdmin):
+    list_display = ('vendor', 'group', 'payer', 'amount_subtotal', 'cycle', 'next_period', 'is_active')
+    list_filter = ('cycle', 'is_active', 'category')
+    search_fields = ('vendor', 'description', 'group__name')
+    readonly_fields = ('created_at', 'updated_at')
+    inlines = [RecurringOccurrenceInline]
+
@@ -0,0 +1,161 @@
+"""
+Exchange rates for expenses recorded in a currency other than their group's.
+
+Rates are read once per process from ``settings.FX_RATES_FILE``, a CSV with
+``date``, ``currency`` and ``rate`` columns: the price of one unit of
+``currency`` in ``settings.FX_BASE_CURRENCY`` on that date. A lookup takes
+the latest rate on or before the requested day, and lookups are memoized in
+an LRU cache of ``FX_RATE_CACHE_SIZE`` entries.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+from shared_finance.money import Money
+import csv
+import threading
+
+CENT = Decimal('0.01')
+
+CURRENCY_SYMBOLS = {'INR': '₹', 'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥'}
+
+
+class FxRateUnavailable(Exception):
+    """No rate for a currency on or before the requested day"""
+
+
+def format_amount(amount, currency: str = 'INR') -> str:
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount}" if symbol else f"{currency} {amount}"
+
+
+class RateTable:
+    """Rates per currency, indexed by date"""
+    
+    def __init__(self, rows: Iterable[Tuple[date, str, Decimal]], base: str):
+        self.base = base
+        series = defaultdict(list)
+        for day, currency, rate in sorted(rows):
+            series[currency].append((day, rate))
+        self.dates = {currency: [day for day, _ in points] for currency, points in series.items()}
+        self.rates = {currency: [rate for _, rate in points] for currency, points in series.items()}
+    
+    @classmethod
+    def from_file(cls, path, base: str) -> 'RateTable':
+        path = Path(path)
+        if not path.exists():
+            return cls([], base)
+        rows = []
+        with path.open(newline='') as handle:
+            for line, row in enumerate(csv.DictReader(handle), start=2):
+                try:
+                    rows.append((date.fromisoformat(row['date']), row['currency'].strip().upper(), Decimal(row['rate'])))
+                except (KeyError, ValueError, InvalidOperation):
+                    raise ValueError(f'{path}, line {line}: expected date,currency,rate')
+        return cls(rows, base)
+    
+    def rate(self, currency: str, day: date) -> Decimal:
+        """Price of one ``currency`` in the base currency on ``day``"""
+        if currency == self.base:
+            return Decimal(1)
+        dates = self.dates.get(currency, [])
+        index = bisect_right(dates, day) - 1
+        if index < 0:
+            raise FxRateUnavailable(f'No {currency} rate on or before {day}')
+        return self.rates[currency][index]
+
+
+_table: Optional[RateTable] = None
+_table_lock = threading.Lock()
+
+
+def rate_table() -> RateTable:
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = RateTable.from_file(settings.FX_RATES_FILE, settings.FX_BASE_CURRENCY)
+        return _table
+
+
+@lru_cache(maxsize=settings.FX_RATE_CACHE_SIZE)
+def exchange_rate(from_currency: str, to_currency: str, day: date) -> Decimal:
+    """Units of ``to_currency`` per unit of ``from_currency`` on ``day``, unrounded"""
+    if from_currency == to_currency:
+        return Decimal(1)
+    table = rate_table()
+    return table.rate(from_currency, day) / table.rate(to_currency, day)
+
+
+def reset_rates():
+    """Reload the rate table on next use, e.g. after the file changed"""
+    global _table
+    with _table_lock:
+        _table = None
+    exchange_rate.cache_clear()
+
+
+@receiver(setting_changed)
+def rates_setting_changed(setting, **kwargs):
+    if setting in ('FX_RATES_FILE', 'FX_BASE_CURRENCY'):
+        reset_rates()
+
+
+class ConvertedBalances:
+    """
+    Net balances in one currency. Amounts already in it are summed as integer
+    paise; converted amounts are summed at full Decimal precision and each
+    member's total is rounded to paise once, so the rounding drift of the
+    whole group stays under half a paisa per member; ``rounding_drift``
+    reports it.
+    """
+    
+    def __init__(self, currency: str):
+        self.currency = currency
+        self.paise: Dict[int, int] = defaultdict(int)
+        self.exact: Dict[int, Decimal] = defaultdict(Decimal)
+        self.converted: Set[str] = set()
+    
+    def add(self, user_id: int, amount, currency: str, day: Optional[date]):
+        """
+        Add ``amount`` (Money, or a Decimal in rupees) in ``currency``; ``day``
+        is needed only for a foreign currency
+        """
+        if currency != self.currency:
+            self.exact[user_id] += Decimal(str(amount)) * exchange_rate(currency, self.currency, day)
+            self.converted.add(currency)
+        elif isinstance(amount, Money):
+            self.paise[user_id] += amount.paise
+        else:
+            self.paise[user_id] += Money.of(amount).paise
+    
+    def balance_paise(self) -> Dict[int, int]:
+        paise = dict(self.paise)
+        for user_id, amount in self.exact.items():
+            paise[user_id] = int((amount.scaleb(2) + paise.get(user_id, 0)).to_integral_value())
+        return paise
+    
+    def balances(self) -> Dict[int, Decimal]:
+        return {user_id: Decimal(paise).scaleb(-2) for user_id, paise in self.balance_paise().items()}
+    
+    @property
+    def rounding_drift(self) -> Decimal:
+        """Rounded total minus exact total; only converted amounts round"""
+        rounded = self.balance_paise()
+        drift = sum(
+            (rounded[user_id] - self.paise.get(user_id, 0) - amount.scaleb(2) for user_id, amount in self.exact.items()),
+            Decimal(0),
+        )
+        return drift.scaleb(-2)
+    
+    def report(self) -> Dict[str, object]:
+        return {
+            'currency': self.currency,
+            'converted_currencies': sorted(self.converted),
+            'rounding_drift': self.rounding_drift,
+        }
@@ -0,0 +1,28 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from expenses.recurring import RecurringExpenseService
+
+
+class Command(BaseCommand):
+    help = 'Create the expenses of every recurring expense due by today, catching up on missed periods; safe to overlap'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Materialize periods due by this day (YYYY-MM-DD) instead of today')
+        parser.add_argument('--batch-size', type=int, default=200, help='Templates per transaction')
+    
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+        
+        result = RecurringExpenseService(today=today, batch_size=options['batch_size']).run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['expenses']} expenses from {result['templates']} due recurring expenses"
+        ))
+        if result['skipped']:
+            self.stdout.write(self.style.WARNING(
+                f"Skipped {result['skipped']} recurring expenses claimed by a concurrent run"
+            ))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-19 06:30
+
+from django.db import migrations, models
+
+
+def use_group_currency(apps, schema_editor):
+    # Existing amounts were recorded in their group's currency
+    Expense = apps.get_model('expenses', 'Expense')
+    Group = apps.get_model('groups', 'Group')
+    Expense.objects.using(schema_editor.connection.alias).update(
+        currency=models.Subquery(Group.objects.filter(pk=models.OuterRef('group_id')).values('currency')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0003_group_change_seq_groupmember_change_seq'),
+        ('expenses', '0003_expense_change_seq_expensesplit_change_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.RunPython(use_group_currency, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2 on 2026-10-19 06:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0003_group_change_seq_groupmember_change_seq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('expenses', '0004_expense_currency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringExpense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('amount_tax', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('currency', models.CharField(default='INR', max_length=3)),
+                ('vendor', models.CharField(blank=True, max_length=200)),
+                ('category', models.CharField(choices=[('food', 'Food & Dining'), ('transport', 'Transportation'), ('utilities', 'Utilities'), ('rent', 'Rent & Accommodation'), ('entertainment', 'Entertainment'), ('shopping', 'Shopping'), ('healthcare', 'Healthcare'), ('education', 'Education'), ('travel', 'Travel'), ('other', 'Other')], default='other', max_length=20)),
+                ('description', models.TextField(blank=True)),
+                ('cycle', models.CharField(blank=True, choices=[('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('next_period', models.DateField(blank=True, db_index=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_expenses', to='groups.group')),
+                ('payer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_expenses', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'expenses_recurringexpense',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecurringOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expense', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_occurrence', to='expenses.expense')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='expenses.recurringexpense')),
+            ],
+            options={
+                'db_table': 'expenses_recurringoccurrence',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recurringoccurrence',
+            constraint=models.UniqueConstraint(fields=('template', 'period'), name='unique_recurring_period'),
+        ),
+    ]
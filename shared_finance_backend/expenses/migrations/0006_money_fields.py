@@ -0,0 +1,22 @@
+from django.db import migrations, models
+from shared_finance.money import MoneyField, decimal_to_money
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_recurringexpense'),
+    ]
+
+    operations = [
+        *decimal_to_money('expenses', 'expense', 'amount_subtotal',
+                          models.DecimalField(max_digits=10, decimal_places=2), MoneyField()),
+        *decimal_to_money('expenses', 'expense', 'amount_tax',
+                          models.DecimalField(max_digits=10, decimal_places=2, default=0.00), MoneyField(default=0)),
+        *decimal_to_money('expenses', 'expensesplit', 'amount_owed',
+                          models.DecimalField(max_digits=10, decimal_places=2), MoneyField()),
+        *decimal_to_money('expenses', 'recurringexpense', 'amount_subtotal',
+                          models.DecimalField(max_digits=10, decimal_places=2), MoneyField()),
+        *decimal_to_money('expenses', 'recurringexpense', 'amount_tax',
+                          models.DecimalField(max_digits=10, decimal_places=2, default=0.00), MoneyField(default=0)),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-19 07:17
+
+from django.db import migrations, models
+import shared_finance.money
+
+
+def backfill_total_amount(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    Expense.objects.using(schema_editor.connection.alias).update(
+        total_amount=models.F('amount_subtotal') + models.F('amount_tax')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0006_money_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='total_amount',
+            field=shared_finance.money.MoneyField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_total_amount, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,52 @@
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Value
 from django.contrib.auth import get_user_model
+from sync.models import ChangeTrackedModel
 from groups.models import Group
+from shared_finance.money import Money, MoneyField
+from .fx import format_amount
 
 User = get_user_model()
 
+# Expense fields that make up the stored total_amount
+AMOUNT_FIELDS = {'amount_subtotal', 'amount_tax'}
 
-class Expense(models.Model):
+
+def _amount_expression(value):
+    if hasattr(value, 'resolve_expression'):
+        return value
+    return Value(Money.of(value), output_field=MoneyField())
+
+
+class ExpenseQuerySet(models.QuerySet):
+    """Keeps the stored ``total_amount`` in step with the amounts on bulk writes, which skip ``save()``"""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for expense in objs:
+            expense.update_total_amount()
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if AMOUNT_FIELDS & set(fields):
+            for expense in objs:
+                expense.update_total_amount()
+            fields = [*fields, 'total_amount']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+    
+    def update(self, **kwargs):
+        if AMOUNT_FIELDS & kwargs.keys():
+            # Both sides of an UPDATE see the row as it was, so this adds the new amounts
+            kwargs['total_amount'] = ExpressionWrapper(
+                _amount_expression(kwargs.get('amount_subtotal', F('amount_subtotal')))
+                + _amount_expression(kwargs.get('amount_tax', F('amount_tax'))),
+                output_field=MoneyField(),
+            )
+        return super().update(**kwargs)
+
+
+class Expense(ChangeTrackedModel):
     """Expense model for tracking shared expenses"""
     
     CATEGORIES = [
@@ -23,8 +64,12 @@ class Expense(models.Model):
     
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='expenses')
     payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='paid_expenses')
-    amount_subtotal = models.DecimalField(max_digits=10, decimal_places=2)
-    amount_tax = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    amount_subtotal = MoneyField()
+    amount_tax = MoneyField(default=0)
+    # amount_subtotal + amount_tax, stored so the database can sort, filter and sum by it
+    total_amount = MoneyField(default=0, db_index=True, editable=False)
+    # Currency of the amounts; settlement converts them to the group's currency
+    currency = models.CharField(max_length=3, default='INR')
     vendor = models.CharField(max_length=200, blank=True)
     gstin = models.CharField(max_length=15, blank=True)
     invoice_no = models.CharField(max_length=100, blank=True)
@@ -37,19 +82,26 @@ class Expense(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    @property
-    def total_amount(self):
-        return self.amount_subtotal + self.amount_tax
+    objects = ExpenseQuerySet.as_manager()
+    
+    def update_total_amount(self):
+        self.total_amount = self.amount_subtotal + self.amount_tax
+    
+    def save(self, *args, **kwargs):
+        self.update_total_amount()
+        if kwargs.get('update_fields') is not None and AMOUNT_FIELDS & set(kwargs['update_fields']):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'total_amount'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"{self.vendor or 'Expense'} - ₹{self.total_amount} ({self.group.name})"
+        return f"{self.vendor or 'Expense'} - {format_amount(self.total_amount, self.currency)} ({self.group.name})"
     
     class Meta:
         db_table = 'expenses_expense'
         ordering = ['-date']
 
 
-class ExpenseSplit(models.Model):
+class ExpenseSplit(ChangeTrackedModel):
     """Expense split model for dividing expenses among group members"""
     
     SPLIT_TYPES = [
@@ -61,15 +113,77 @@ class ExpenseSplit(models.Model):
     
     expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name='splits')
     member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_splits')
-    amount_owed = models.DecimalField(max_digits=10, decimal_places=2)
+    amount_owed = MoneyField()
     split_type = models.CharField(max_length=20, choices=SPLIT_TYPES, default='equal')
     metadata = models.JSONField(default=dict, blank=True)
     is_paid = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.member.username} owes ₹{self.amount_owed} for {self.expense}"
+        return f"{self.member.username} owes {format_amount(self.amount_owed, self.expense.currency)} for {self.expense}"
     
     class Meta:
         db_table = 'expenses_expensesplit'
-        unique_together = ['expense', 'member']
\ No newline at end of file
+        unique_together = ['expense', 'member']
+
+class RecurringExpense(models.Model):
+    """
+    Template for a bill that repeats, e.g. monthly maintenance. Each period
+    from ``start_date`` becomes an expense split equally between the group's
+    active members, created by the ``materialize_recurring_expenses`` command.
+    """
+    
+    CYCLES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('quarterly', 'Quarterly'),
+        ('yearly', 'Yearly'),
+    ]
+    
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='recurring_expenses')
+    payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_expenses')
+    amount_subtotal = MoneyField()
+    amount_tax = MoneyField(default=0)
+    currency = models.CharField(max_length=3, default='INR')
+    vendor = models.CharField(max_length=200, blank=True)
+    category = models.CharField(max_length=20, choices=Expense.CATEGORIES, default='other')
+    description = models.TextField(blank=True)
+    # Blank follows the group's billing_cycle
+    cycle = models.CharField(max_length=20, choices=CYCLES, blank=True)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    # First period not materialized yet
+    next_period = models.DateField(db_index=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def save(self, *args, **kwargs):
+        if self.next_period is None:
+            self.next_period = self.start_date
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.vendor or 'Recurring expense'} - {self.cycle or 'group cycle'} ({self.group.name})"
+    
+    class Meta:
+        db_table = 'expenses_recurringexpense'
+
+
+class RecurringOccurrence(models.Model):
+    """The expense created for one period of a recurring expense; at most one per period"""
+    
+    template = models.ForeignKey(RecurringExpense, on_delete=models.CASCADE, related_name='occurrences')
+    period = models.DateField()
+    expense = models.OneToOneField(Expense, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='recurring_occurrence')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.template} for {self.period}"
+    
+    class Meta:
+        db_table = 'expenses_recurringoccurrence'
+        constraints = [
+            models.UniqueConstraint(fields=['template', 'period'], name='unique_recurring_period'),
+        ]
@@ -0,0 +1,195 @@
+"""
+Materialization of recurring expenses.
+
+One pass locks the active templates with a period due and creates all of
+their missing occurrences with a few bulk inserts: expenses, equal splits and
+occurrence rows. Templates that fell behind, e.g. because the scheduler did
+not run for a while, catch up on every missed period. The (template, period)
+unique key and the template lock make overlapping runs safe: each period is
+materialized once, by whichever run gets to it first.
+
+``bulk_create`` skips model signals, so the data they maintain is written
+here for the whole batch: change sequence stamps and group versions, monthly
+rollups and pair balances, audit log rows, notifications and live balances.
+"""
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from analytics.services import BalanceDelta, RollupDelta, expense_state
+from audits.models import AuditLog
+from groups.models import GroupMember
+from notifications.services import NotificationService
+from notifications.signals import publish_group_balances
+from sync.models import Version, bump_versions, next_change_seq
+from .models import Expense, ExpenseSplit, RecurringExpense, RecurringOccurrence
+from .services import equal_shares
+import logging
+
+logger = logging.getLogger(__name__)
+
+CYCLE_MONTHS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+
+def following_period(cycle: str, anchor: date, period: date) -> date:
+    """
+    The period after ``period`` in a schedule starting at ``anchor``. Months
+    keep the anchor's day where they have it, so a schedule on the 31st
+    falls on the last day of shorter months and returns to the 31st after.
+    """
+    if cycle == 'weekly':
+        return period + timedelta(weeks=1)
+    index = (period.year - anchor.year) * 12 + period.month - anchor.month + CYCLE_MONTHS[cycle]
+    year, month = divmod(anchor.month - 1 + index, 12)
+    year, month = anchor.year + year, month + 1
+    return date(year, month, min(anchor.day, monthrange(year, month)[1]))
+
+
+class RecurringExpenseService:
+    """Creates the due occurrences of every active recurring expense"""
+    
+    def __init__(self, today: Optional[date] = None, batch_size: int = 200):
+        self.today = today or timezone.localdate()
+        self.batch_size = batch_size
+    
+    def due_ids(self) -> List[int]:
+        return list(
+            RecurringExpense.objects.filter(is_active=True, next_period__lte=self.today).order_by('id').values_list(
+                'id', flat=True
+            )
+        )
+    
+    def run(self) -> Dict[str, int]:
+        """Materialize every due period, one transaction per batch of templates"""
+        ids = self.due_ids()
+        created = skipped = 0
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            try:
+                created += self.materialize(batch)
+            except IntegrityError:
+                # A concurrent run materialized one of these periods first; the next run picks up the rest
+                logger.info(f"Skipped {len(batch)} recurring expenses claimed by a concurrent run")
+                skipped += len(batch)
+        return {'templates': len(ids), 'expenses': created, 'skipped': skipped}
+    
+    def due_periods(self, template: RecurringExpense) -> List[date]:
+        """Periods of ``template`` due by today; advances its ``next_period``"""
+        cycle = template.cycle or template.group.billing_cycle
+        if cycle != 'weekly' and cycle not in CYCLE_MONTHS:
+            logger.warning(f"Recurring expense {template.id} has an unknown billing cycle {cycle!r}")
+            return []
+        
+        periods = []
+        period = template.next_period
+        while period <= self.today and (template.end_date is None or period <= template.end_date):
+            periods.append(period)
+            period = following_period(cycle, template.start_date, period)
+        template.next_period = period
+        if template.end_date is not None and period > template.end_date:
+            template.is_active = False
+        return periods
+    
+    def materialize(self, template_ids: Iterable[int]) -> int:
+        """Create the missing occurrences of these templates; returns the number of expenses"""
+        with transaction.atomic():
+            # Under the lock, so a concurrent run that got here first has already advanced next_period
+            templates = list(
+                RecurringExpense.objects.select_for_update(of=('self',)).filter(
+                    pk__in=list(template_ids), is_active=True, next_period__lte=self.today
+                ).select_related('group')
+            )
+            if not templates:
+                return 0
+            plan: List[Tuple[RecurringExpense, date]] = [
+                (template, period) for template in templates for period in self.due_periods(template)
+            ]
+            
+            existing = set(
+                RecurringOccurrence.objects.filter(
+                    template__in=templates, period__in={period for _, period in plan}
+                ).values_list('template_id', 'period')
+            )
+            plan = [(template, period) for template, period in plan if (template.id, period) not in existing]
+            
+            now = timezone.now()
+            for template in templates:
+                template.updated_at = now
+            RecurringExpense.objects.bulk_update(templates, ['next_period', 'is_active', 'updated_at'])
+            if not plan:
+                return 0
+            
+            members = defaultdict(list)
+            for group_id, user_id in GroupMember.objects.filter(
+                group_id__in={template.group_id for template, _ in plan}, is_active=True
+            ).order_by('joined_at', 'id').values_list('group_id', 'user_id'):
+                members[group_id].append(user_id)
+            
+            seq = next_change_seq()
+            expenses = Expense.objects.bulk_create([
+                Expense(
+                    group_id=template.group_id,
+                    payer_id=template.payer_id,
+                    amount_subtotal=template.amount_subtotal,
+                    amount_tax=template.amount_tax,
+                    currency=template.currency,
+                    vendor=template.vendor,
+                    category=template.category,
+                    description=template.description,
+                    date=timezone.make_aware(datetime.combine(period, time())),
+                    change_seq=seq,
+                )
+                for template, period in plan
+            ], batch_size=self.batch_size)
+            
+            splits = []
+            for expense in expenses:
+                member_ids = members[expense.group_id]
+                if member_ids:
+                    shares = equal_shares(expense.total_amount, len(member_ids))
+                    splits.extend(
+                        ExpenseSplit(expense=expense, member_id=member_id, amount_owed=share, split_type='equal',
+                                     change_seq=seq)
+                        for member_id, share in zip(member_ids, shares)
+                    )
+            ExpenseSplit.objects.bulk_create(splits, batch_size=self.batch_size)
+            RecurringOccurrence.objects.bulk_create([
+                RecurringOccurrence(template=template, period=period, expense=expense)
+                for (template, period), expense in zip(plan, expenses)
+            ], batch_size=self.batch_size)
+            
+            self.apply_derived(expenses, splits)
+        return len(expenses)
+    
+    @staticmethod
+    def apply_derived(expenses: List[Expense], splits: List[ExpenseSplit]):
+        """What the expense and split signals would have done, for the whole batch"""
+        states = {expense.pk: expense_state(expense) for expense in expenses}
+        rollups = RollupDelta()
+        balances = BalanceDelta()
+        for state in states.values():
+            rollups.add_expense(state)
+        for split in splits:
+            rollups.add_split(states[split.expense_id], split.member_id, split.amount_owed)
+            balances.add_split(states[split.expense_id], split.member_id, split.amount_owed)
+        rollups.apply()
+        balances.apply()
+        
+        group_ids = sorted({expense.group_id for expense in expenses})
+        bump_versions((Version.GROUP, group_id) for group_id in group_ids)
+        
+        content_type = ContentType.objects.get_for_model(Expense)
+        AuditLog.objects.bulk_create([
+            AuditLog(user_id=expense.payer_id, action='create', content_type=content_type, object_id=expense.pk)
+            for expense in expenses
+        ])
+        for expense in expenses:
+            NotificationService.notify(
+                'expense_added', expense.pk, group_id=expense.group_id, actor_id=expense.payer_id,
+                amount=expense.total_amount, currency=expense.currency,
+            )
+        for group_id in group_ids:
+            publish_group_balances(group_id)
@@ -1,7 +1,37 @@
 from rest_framework import serializers
-from .models import Expense, ExpenseSplit
+from django.utils import timezone
+from .fx import FxRateUnavailable, exchange_rate
+from .models import Expense, ExpenseSplit, RecurringExpense
+from .services import ExpenseService
+from groups.models import Group, GroupMember
 from groups.serializers import GroupSerializer
 from users.serializers import UserSerializer
+from shared_finance.money import MoneySerializerField
+
+
+def validate_group_expense(user, attrs, day):
+    """
+    Check that the user and the payer (the user by default) are active members
+    of the group, and default the currency to the group's; the currency must
+    have an exchange rate on ``day``.
+    """
+    members = GroupMember.objects.filter(group_id=attrs['group_id'], is_active=True)
+    if not members.filter(user=user).exists():
+        raise serializers.ValidationError({'group_id': 'You are not a member of this group'})
+    
+    attrs.setdefault('payer_id', user.id)
+    if attrs['payer_id'] != user.id and not members.filter(user_id=attrs['payer_id']).exists():
+        raise serializers.ValidationError({'payer_id': 'The payer must be a member of the group'})
+    
+    group_currency = Group.objects.values_list('currency', flat=True).get(pk=attrs['group_id'])
+    attrs['currency'] = (attrs.get('currency') or group_currency).upper()
+    try:
+        exchange_rate(attrs['currency'], group_currency, day)
+    except FxRateUnavailable:
+        raise serializers.ValidationError(
+            {'currency': f"No exchange rate from {attrs['currency']} to {group_currency} for this date"}
+        )
+    return attrs
 
 
 class ExpenseSplitSerializer(serializers.ModelSerializer):
@@ -21,40 +51,61 @@ class ExpenseSerializer(serializers.ModelSerializer):
     group = GroupSerializer(read_only=True)
     group_id = serializers.IntegerField(write_only=True)
     splits = ExpenseSplitSerializer(many=True, read_only=True)
-    total_amount = serializers.ReadOnlyField()
+    total_amount = MoneySerializerField(read_only=True)
     
     class Meta:
         model = Expense
         fields = ['id', 'group', 'group_id', 'payer', 'payer_id', 'amount_subtotal',
-                 'amount_tax', 'total_amount', 'vendor', 'gstin', 'invoice_no',
+                 'amount_tax', 'total_amount', 'currency', 'vendor', 'gstin', 'invoice_no',
                  'category', 'description', 'date', 'receipt_file', 'ocr_data',
                  'is_settled', 'created_at', 'updated_at', 'splits']
         read_only_fields = ['id', 'created_at', 'updated_at', 'total_amount']
+    
+    def update(self, instance, validated_data):
+        # A new total is shared out again between the splits
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        return ExpenseService.save_with_splits(instance)
 
 
 class ExpenseCreateSerializer(serializers.ModelSerializer):
+    group_id = serializers.IntegerField()
+    payer_id = serializers.IntegerField(required=False)
+    
     class Meta:
         model = Expense
-        fields = ['group_id', 'payer_id', 'amount_subtotal', 'amount_tax',
+        fields = ['id', 'group_id', 'payer_id', 'amount_subtotal', 'amount_tax', 'currency',
                  'vendor', 'gstin', 'invoice_no', 'category', 'description', 'date']
+        read_only_fields = ['id']
+    
+    def validate(self, attrs):
+        return validate_group_expense(self.context['request'].user, attrs, timezone.localdate(attrs['date']))
     
     def create(self, validated_data):
-        expense = Expense.objects.create(**validated_data)
-        
-        # Create equal splits for all group members
-        group = expense.group
-        members = group.members.filter(is_active=True)
-        total_members = members.count()
-        
-        if total_members > 0:
-            amount_per_member = expense.total_amount / total_members
-            
-            for member in members:
-                ExpenseSplit.objects.create(
-                    expense=expense,
-                    member=member.user,
-                    amount_owed=amount_per_member,
-                    split_type='equal'
-                )
-        
-        return expense
\ No newline at end of file
+        # Equal splits between the group's active members
+        return ExpenseService.create_with_equal_splits(**validated_data)
+
+
+class RecurringExpenseSerializer(serializers.ModelSerializer):
+    group_id = serializers.IntegerField()
+    payer_id = serializers.IntegerField(required=False)
+    
+    class Meta:
+        model = RecurringExpense
+        fields = ['id', 'group_id', 'payer_id', 'amount_subtotal', 'amount_tax', 'currency', 'vendor',
+                  'category', 'description', 'cycle', 'start_date', 'end_date', 'next_period', 'is_active',
+                  'created_at', 'updated_at']
+        read_only_fields = ['id', 'next_period', 'created_at', 'updated_at']
+    
+    def validate(self, attrs):
+        if self.instance is not None:
+            # A template stays in its group and keeps the start of its schedule
+            attrs.pop('start_date', None)
+            attrs = {'payer_id': self.instance.payer_id, 'currency': self.instance.currency, **attrs,
+                     'group_id': self.instance.group_id}
+        start_date = attrs.get('start_date') or self.instance.start_date
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if end_date and end_date < start_date:
+            raise serializers.ValidationError({'end_date': 'The end date must not be before the start date'})
+        day = self.instance.next_period if self.instance is not None else start_date
+        return validate_group_expense(self.context['request'].user, attrs, day)
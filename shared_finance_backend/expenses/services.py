@@ -0,0 +1,113 @@
+from decimal import InvalidOperation
+from django.db import transaction
+from typing import Dict, List, Optional, Sequence, Tuple
+from fairness.policies import WEIGHT_SCALE, allocate, to_weight
+from shared_finance.money import Money
+from sync.models import next_change_seq
+from .models import Expense, ExpenseSplit
+from .signals import splits_recomputed
+
+
+def equal_shares(total, count: int) -> List[Money]:
+    """``total`` in ``count`` shares a paisa apart at most, summing to it exactly"""
+    return Money.of(total).split(count)
+
+
+def split_weight(split: ExpenseSplit) -> Optional[int]:
+    """
+    Fixed-point weight of a split's share: 1 for an equal split, the value in
+    its metadata for a percentage or share factor split. None for a fixed
+    amount, or when the metadata has no usable weight.
+    """
+    if split.split_type == 'equal':
+        return WEIGHT_SCALE
+    if split.split_type in ('percentage', 'share_factor') and split.metadata.get(split.split_type) is not None:
+        try:
+            return to_weight(split.metadata[split.split_type])
+        except (InvalidOperation, ValueError):
+            return None
+    return None
+
+
+def split_amounts(total, splits: Sequence[ExpenseSplit]) -> List[Money]:
+    """
+    What each of ``splits`` owes of ``total``. Fixed amount splits keep their
+    amount and the other splits share the rest by ``split_weight``. If a
+    split has no weight, or the fixed amounts alone exceed the total, every
+    split keeps its proportion of what it owed before.
+    """
+    if not splits:
+        return []
+    total = Money.of(total).paise
+    fixed = [split.split_type == 'amount' for split in splits]
+    weights = [None if is_fixed else split_weight(split) for split, is_fixed in zip(splits, fixed)]
+    shared = [weight for weight, is_fixed in zip(weights, fixed) if not is_fixed]
+    fixed_total = sum(split.amount_owed.paise for split, is_fixed in zip(splits, fixed) if is_fixed)
+    
+    if shared and None not in shared and sum(shared) > 0 and fixed_total <= total:
+        shares = iter(allocate(total - fixed_total, shared))
+        return [split.amount_owed if is_fixed else Money(next(shares)) for split, is_fixed in zip(splits, fixed)]
+    
+    previous = [max(split.amount_owed.paise, 0) for split in splits]
+    if not sum(previous):
+        previous = [1] * len(splits)
+    return [Money(share) for share in allocate(total, previous)]
+
+
+class ExpenseService:
+    """Service for creating expenses with their splits"""
+    
+    @staticmethod
+    def create_with_equal_splits(**fields) -> Expense:
+        """Create an expense split equally between the group's active members"""
+        with transaction.atomic():
+            expense = Expense.objects.create(**fields)
+            member_ids = list(
+                expense.group.members.filter(is_active=True).order_by('joined_at', 'id').values_list('user_id', flat=True)
+            )
+            if member_ids:
+                shares = equal_shares(expense.total_amount, len(member_ids))
+                for member_id, share in zip(member_ids, shares):
+                    ExpenseSplit.objects.create(
+                        expense=expense,
+                        member_id=member_id,
+                        amount_owed=share,
+                        split_type='equal'
+                    )
+        return expense
+    
+    @staticmethod
+    def save_with_splits(expense: Expense) -> Expense:
+        """Save the expense and, if that changed its total, recompute its splits"""
+        with transaction.atomic():
+            expense.save()
+            previous = expense._previous_state
+            if previous is not None and previous['total_amount'] != expense.total_amount:
+                ExpenseService.recompute_splits(expense)
+        return expense
+    
+    @staticmethod
+    def recompute_splits(expense: Expense) -> Dict[int, Tuple[Money, Money]]:
+        """
+        Rewrite the expense's splits to add up to its total with one
+        bulk_update, and send ``splits_recomputed`` so the aggregates apply the
+        per-member changes; returns them as {member_id: (previous, current)}
+        """
+        with transaction.atomic():
+            splits = list(expense.splits.order_by('id'))
+            changed = [
+                (split, amount) for split, amount in zip(splits, split_amounts(expense.total_amount, splits))
+                if amount != split.amount_owed
+            ]
+            if not changed:
+                return {}
+            
+            change_seq = next_change_seq()
+            changes = {}
+            for split, amount in changed:
+                changes[split.member_id] = (split.amount_owed, amount)
+                split.amount_owed = amount
+                split.change_seq = change_seq
+            ExpenseSplit.objects.bulk_update([split for split, _ in changed], ['amount_owed', 'change_seq'])
+            splits_recomputed.send(sender=Expense, expense=expense, changes=changes)
+        return changes
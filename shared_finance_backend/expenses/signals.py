@@ -0,0 +1,31 @@
+from django.db.models.signals import pre_save
+from django.dispatch import Signal, receiver
+from .models import Expense, ExpenseSplit
+
+# Fields whose previous values downstream aggregates need in order to apply
+# deltas instead of recomputing from scratch.
+EXPENSE_TRACKED_FIELDS = ('group_id', 'payer_id', 'date', 'category', 'currency', 'is_settled',
+                          'amount_subtotal', 'amount_tax', 'total_amount')
+SPLIT_TRACKED_FIELDS = ('expense_id', 'member_id', 'amount_owed', 'is_paid')
+
+# Sent by ExpenseService.recompute_splits, whose bulk_update skips post_save,
+# with the ``expense`` and the ``changes`` it made: {member_id: (previous, current)}
+# amounts owed, for the members whose share changed.
+splits_recomputed = Signal()
+
+
+def stash_previous_state(sender, instance, fields):
+    """Attach the row as it is currently stored to ``instance._previous_state``"""
+    instance._previous_state = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_state = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(pre_save, sender=Expense)
+def expense_previous_state(sender, instance, **kwargs):
+    stash_previous_state(sender, instance, EXPENSE_TRACKED_FIELDS)
+
+
+@receiver(pre_save, sender=ExpenseSplit)
+def expense_split_previous_state(sender, instance, **kwargs):
+    stash_previous_state(sender, instance, SPLIT_TRACKED_FIELDS)
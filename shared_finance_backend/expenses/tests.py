@@ -1,3 +1,285 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from datetime import date
+from decimal import Decimal
+from analytics.models import MonthlyRollup
+from analytics.services import balance_drift, rebuild_rollups
+from audits.models import AuditLog
+from groups.models import Group, GroupMember
+from shared_finance.money import Money
+from .fx import FxRateUnavailable, RateTable, exchange_rate
+from .models import Expense, ExpenseSplit, RecurringExpense, RecurringOccurrence
+from .recurring import RecurringExpenseService, following_period
+from .services import ExpenseService, equal_shares, split_amounts
+
+import os
+import tempfile
+
+User = get_user_model()
+
+
+class ExpenseCreateTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=name, email=f'{name}@test.com') for name in ('a', 'b', 'c')]
+        self.group = Group.objects.create(name='Flat', owner=self.users[0])
+        for user in self.users:
+            GroupMember.objects.create(group=self.group, user=user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.users[0])
+    
+    def test_equal_shares_add_up(self):
+        self.assertEqual(equal_shares(Decimal('100.00'), 3), [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')])
+        self.assertEqual(sum(equal_shares(Decimal('0.05'), 7)), Decimal('0.05'))
+    
+    def test_create_splits_once(self):
+        response = self.client.post('/api/expenses/expenses/', {
+            'group_id': self.group.id, 'amount_subtotal': '90.00', 'amount_tax': '10.00',
+            'date': '2026-10-01T12:00:00Z',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        expense = Expense.objects.get(id=response.data['id'])
+        self.assertEqual(expense.payer, self.users[0])
+        self.assertEqual(expense.splits.count(), 3)
+        self.assertEqual(sum(split.amount_owed for split in expense.splits.all()), Decimal('100.00'))
+    
+    def test_create_requires_membership(self):
+        outsider = User.objects.create_user(username='d', email='d@test.com')
+        self.client.force_authenticate(user=outsider)
+        response = self.client.post('/api/expenses/expenses/', {
+            'group_id': self.group.id, 'amount_subtotal': '90.00', 'date': '2026-10-01T12:00:00Z',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TotalAmountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='a', email='a@test.com')
+        self.group = Group.objects.create(name='Flat', owner=self.user)
+        GroupMember.objects.create(group=self.group, user=self.user)
+    
+    def expense(self, subtotal, tax='0.00', **fields):
+        return Expense(group=self.group, payer=self.user, amount_subtotal=subtotal, amount_tax=tax,
+                       date='2026-10-01T12:00:00Z', **fields)
+    
+    def stored_totals(self):
+        return list(Expense.objects.order_by('id').values_list('total_amount', flat=True))
+    
+    def test_save_stores_the_total(self):
+        expense = self.expense('90.00', '10.00')
+        expense.save()
+        self.assertEqual(self.stored_totals(), [Money(10000)])
+        expense.amount_tax = Decimal('5.50')
+        expense.save(update_fields=['amount_tax'])
+        self.assertEqual(self.stored_totals(), [Money(9550)])
+    
+    def test_bulk_writes_keep_the_total(self):
+        expenses = Expense.objects.bulk_create([self.expense('10.00', '1.80'), self.expense('20.00')])
+        self.assertEqual(self.stored_totals(), [Money(1180), Money(2000)])
+        
+        expenses[0].amount_subtotal = Decimal('15.00')
+        Expense.objects.bulk_update(expenses, ['amount_subtotal'])
+        self.assertEqual(self.stored_totals(), [Money(1680), Money(2000)])
+        
+        Expense.objects.filter(id=expenses[1].id).update(amount_tax=Decimal('3.60'))
+        Expense.objects.update(amount_subtotal=Decimal('1.00'))
+        self.assertEqual(self.stored_totals(), [Money(280), Money(460)])
+    
+    def test_list_orders_and_filters_by_total(self):
+        for subtotal, tax in (('50.00', '0.00'), ('300.00', '54.00'), ('120.00', '10.00')):
+            self.expense(subtotal, tax).save()
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        
+        response = client.get('/api/expenses/expenses/', {'ordering': '-total_amount'})
+        self.assertEqual([row['total_amount'] for row in response.json()['results']], ['354.00', '130.00', '50.00'])
+        response = client.get('/api/expenses/expenses/', {'total_amount__gte': '100', 'ordering': 'total_amount'})
+        self.assertEqual([row['total_amount'] for row in response.json()['results']], ['130.00', '354.00'])
+
+
+class SplitRecomputeTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=name, email=f'{name}@test.com') for name in ('a', 'b', 'c')]
+        self.group = Group.objects.create(name='Flat', owner=self.users[0])
+        for user in self.users:
+            GroupMember.objects.create(group=self.group, user=user)
+        self.expense = ExpenseService.create_with_equal_splits(
+            group=self.group, payer=self.users[0], amount_subtotal=Decimal('90.00'), date='2026-10-01T12:00:00Z',
+        )
+    
+    def splits(self, *specs):
+        return [ExpenseSplit(member=user, amount_owed=Decimal(amount), split_type=split_type, metadata=metadata)
+                for user, (amount, split_type, metadata) in zip(self.users, specs)]
+    
+    def test_split_amounts_by_type(self):
+        splits = self.splits(('10.00', 'amount', {}), ('30.00', 'percentage', {'percentage': '75'}),
+                             ('10.00', 'percentage', {'percentage': '25'}))
+        self.assertEqual(split_amounts(Decimal('90.00'), splits), [Money(1000), Money(6000), Money(2000)])
+        # Fixed amounts above the total, or a weight missing: everyone keeps their proportion
+        self.assertEqual(split_amounts(Decimal('5.00'), splits), [Money(100), Money(300), Money(100)])
+        splits = self.splits(('10.00', 'equal', {}), ('30.00', 'share_factor', {}))
+        self.assertEqual(split_amounts(Decimal('100.01'), splits), [Money(2500), Money(7501)])
+    
+    def test_update_recomputes_splits_and_aggregates(self):
+        client = APIClient()
+        client.force_authenticate(user=self.users[0])
+        response = client.patch(f'/api/expenses/expenses/{self.expense.id}/', {'amount_tax': '10.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        owed = sorted(split['amount_owed'] for split in response.json()['splits'])
+        self.assertEqual(owed, ['33.33', '33.33', '33.34'])
+        
+        self.assertEqual(balance_drift(), {})
+        rollups = sorted(MonthlyRollup.objects.values_list('user_id', 'owed_total', 'owed_count'))
+        rebuild_rollups()
+        self.assertEqual(rollups, sorted(MonthlyRollup.objects.values_list('user_id', 'owed_total', 'owed_count')))
+    
+    def test_only_changed_members_are_sent(self):
+        self.expense.amount_subtotal = Decimal('90.01')
+        ExpenseService.save_with_splits(self.expense)
+        owed = dict(self.expense.splits.values_list('member_id', 'amount_owed'))
+        self.assertEqual(owed, dict(zip([user.id for user in self.users], [Money(3001), Money(3000), Money(3000)])))
+        self.assertEqual(ExpenseService.recompute_splits(self.expense), {})
+        self.expense.amount_subtotal = Decimal('90.02')
+        self.expense.save()
+        self.assertEqual(ExpenseService.recompute_splits(self.expense), {self.users[1].id: (Money(3000), Money(3001))})
+
+
+class FxRateTest(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as rates:
+            rates.write('date,currency,rate\n2026-01-01,USD,80\n2026-06-01,USD,85\n2026-01-01,EUR,90\n')
+        self.addCleanup(os.remove, self.path)
+        self.settings_override = override_settings(FX_RATES_FILE=self.path, FX_BASE_CURRENCY='INR')
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+    
+    def test_latest_rate_on_or_before_day(self):
+        table = RateTable.from_file(self.path, 'INR')
+        self.assertEqual(table.rate('USD', date(2026, 3, 1)), Decimal('80'))
+        self.assertEqual(table.rate('USD', date(2026, 6, 1)), Decimal('85'))
+        self.assertEqual(table.rate('INR', date(2000, 1, 1)), Decimal('1'))
+        with self.assertRaises(FxRateUnavailable):
+            table.rate('USD', date(2025, 12, 31))
+        with self.assertRaises(FxRateUnavailable):
+            table.rate('GBP', date(2026, 3, 1))
+    
+    def test_cross_rates_are_cached(self):
+        self.assertEqual(exchange_rate('EUR', 'USD', date(2026, 7, 1)), Decimal('90') / Decimal('85'))
+        self.assertEqual(exchange_rate('USD', 'INR', date(2026, 7, 1)), Decimal('85'))
+        hits = exchange_rate.cache_info().hits
+        exchange_rate('USD', 'INR', date(2026, 7, 1))
+        self.assertEqual(exchange_rate.cache_info().hits, hits + 1)
+    
+    def test_create_in_foreign_currency(self):
+        user = User.objects.create_user(username='traveller', email='traveller@test.com')
+        group = Group.objects.create(name='Trip', owner=user, currency='INR')
+        GroupMember.objects.create(group=group, user=user)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        
+        def create(**fields):
+            return client.post('/api/expenses/expenses/', {
+                'group_id': group.id, 'amount_subtotal': '10.00', 'date': '2026-07-01T12:00:00Z', **fields
+            }, format='json')
+        
+        self.assertEqual(Expense.objects.get(id=create(currency='usd').data['id']).currency, 'USD')
+        self.assertEqual(Expense.objects.get(id=create().data['id']).currency, 'INR')
+        response = create(currency='GBP')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('currency', response.data)
+
+
+class RecurringExpenseTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=name, email=f'{name}@test.com') for name in ('a', 'b', 'c')]
+        self.group = Group.objects.create(name='Society', owner=self.users[0], group_type='society')
+        for user in self.users:
+            GroupMember.objects.create(group=self.group, user=user)
+        self.template = RecurringExpense.objects.create(
+            group=self.group, payer=self.users[0], amount_subtotal=Decimal('1000.00'), vendor='Maintenance',
+            category='utilities', start_date=date(2026, 1, 31),
+        )
+    
+    def rollups(self):
+        return sorted(MonthlyRollup.objects.exclude(paid_count=0, owed_count=0).values_list(
+            'user_id', 'group_id', 'month', 'category', 'paid_total', 'owed_total', 'unsettled_paid', 'unsettled_owed'
+        ))
+    
+    def test_following_period_keeps_the_anchor_day(self):
+        anchor = date(2026, 1, 31)
+        self.assertEqual(following_period('monthly', anchor, anchor), date(2026, 2, 28))
+        self.assertEqual(following_period('monthly', anchor, date(2026, 2, 28)), date(2026, 3, 31))
+        self.assertEqual(following_period('quarterly', anchor, anchor), date(2026, 4, 30))
+        self.assertEqual(following_period('yearly', date(2028, 2, 29), date(2028, 2, 29)), date(2029, 2, 28))
+        self.assertEqual(following_period('weekly', anchor, anchor), date(2026, 2, 7))
+    
+    def test_catches_up_in_one_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = RecurringExpenseService(today=date(2026, 4, 30)).run()
+        
+        self.assertEqual(result, {'templates': 1, 'expenses': 4, 'skipped': 0})
+        self.assertEqual(
+            sorted(RecurringOccurrence.objects.values_list('period', flat=True)),
+            [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)]
+        )
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.next_period, date(2026, 5, 31))
+        
+        expenses = Expense.objects.filter(group=self.group)
+        self.assertEqual(expenses.count(), 4)
+        self.assertFalse(expenses.filter(change_seq=0).exists())
+        self.assertEqual(
+            sorted(ExpenseSplit.objects.filter(expense=expenses[0]).values_list('amount_owed', flat=True)),
+            [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')]
+        )
+        self.assertEqual(AuditLog.objects.filter(
+            content_type__model='expense', object_id__in=expenses.values('id'), action='create'
+        ).count(), 4)
+        
+        # The signals' aggregates were maintained in bulk
+        self.assertEqual(balance_drift(), {})
+        rollups = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(rollups, self.rollups())
+    
+    def test_reruns_create_nothing(self):
+        RecurringExpenseService(today=date(2026, 3, 1)).run()
+        self.assertEqual(RecurringExpenseService(today=date(2026, 3, 1)).run()['expenses'], 0)
+        
+        # A run that lost the race finds the period taken even if next_period looks stale
+        RecurringExpense.objects.filter(pk=self.template.pk).update(next_period=date(2026, 2, 28))
+        self.assertEqual(RecurringExpenseService(today=date(2026, 3, 31)).run()['expenses'], 1)
+        self.assertEqual(Expense.objects.filter(group=self.group).count(), 3)
+    
+    def test_group_cycle_and_end_date(self):
+        self.group.billing_cycle = 'quarterly'
+        self.group.save()
+        self.template.end_date = date(2026, 6, 30)
+        self.template.save()
+        
+        RecurringExpenseService(today=date(2027, 1, 1)).run()
+        self.assertEqual(sorted(RecurringOccurrence.objects.values_list('period', flat=True)),
+                         [date(2026, 1, 31), date(2026, 4, 30)])
+        self.template.refresh_from_db()
+        self.assertFalse(self.template.is_active)
+    
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(user=self.users[1])
+        response = client.post('/api/expenses/recurring/', {
+            'group_id': self.group.id, 'amount_subtotal': '4500.00', 'vendor': 'Rent', 'cycle': 'monthly',
+            'start_date': '2026-02-01',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['payer_id'], response.data['next_period'], response.data['currency']),
+                         (self.users[1].id, '2026-02-01', 'INR'))
+        self.assertEqual(len(client.get('/api/expenses/recurring/').data['results']), 2)
+        
+        outsider = User.objects.create_user(username='outsider', email='outsider@test.com')
+        client.force_authenticate(user=outsider)
+        response = client.post('/api/expenses/recurring/', {
+            'group_id': self.group.id, 'amount_subtotal': '1.00', 'start_date': '2026-02-01',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
 
-# Create your tests here.
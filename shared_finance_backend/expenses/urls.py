@@ -5,6 +5,7 @@ from . import views
 router = DefaultRouter()
 router.register(r'expenses', views.ExpenseViewSet)
 router.register(r'splits', views.ExpenseSplitViewSet)
+router.register(r'recurring', views.RecurringExpenseViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
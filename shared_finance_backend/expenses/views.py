@@ -3,46 +3,37 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import Expense, ExpenseSplit
-from .serializers import ExpenseSerializer, ExpenseSplitSerializer, ExpenseCreateSerializer
+from sync.conditional import ConditionalGetMixin
+from .models import Expense, ExpenseSplit, RecurringExpense
+from .serializers import ExpenseSerializer, ExpenseSplitSerializer, ExpenseCreateSerializer, RecurringExpenseSerializer
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Expense model"""
     queryset = Expense.objects.all()
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
+    version_group_lookup = 'group__expenses'
+    # ?ordering=-total_amount&total_amount__gte=500 run on the indexed total_amount column
+    ordering_fields = ['date', 'total_amount', 'created_at']
+    filterset_fields = {
+        'total_amount': ['gte', 'lte'],
+        'group': ['exact'],
+        'category': ['exact'],
+        'is_settled': ['exact'],
+    }
     
     def get_queryset(self):
         return Expense.objects.filter(
             group__members__user=self.request.user,
             group__members__is_active=True
-        ).select_related('payer', 'group').prefetch_related('splits__member')
+        ).select_related('payer', 'group__owner').prefetch_related('splits__member', 'group__members__user')
     
     def get_serializer_class(self):
         if self.action == 'create':
             return ExpenseCreateSerializer
         return ExpenseSerializer
     
-    def perform_create(self, serializer):
-        expense = serializer.save()
-        
-        # Create equal splits for all group members
-        group = expense.group
-        members = group.members.filter(is_active=True)
-        total_members = members.count()
-        
-        if total_members > 0:
-            amount_per_member = expense.total_amount / total_members
-            
-            for member in members:
-                ExpenseSplit.objects.create(
-                    expense=expense,
-                    member=member.user,
-                    amount_owed=amount_per_member,
-                    split_type='equal'
-                )
-    
     @action(detail=True, methods=['post'])
     def mark_settled(self, request, pk=None):
         """Mark expense as settled"""
@@ -69,11 +60,12 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ExpenseSplitViewSet(viewsets.ModelViewSet):
+class ExpenseSplitViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for ExpenseSplit model"""
     queryset = ExpenseSplit.objects.all()
     serializer_class = ExpenseSplitSerializer
     permission_classes = [IsAuthenticated]
+    version_group_lookup = 'group__expenses__splits'
     
     def get_queryset(self):
         return ExpenseSplit.objects.filter(
@@ -96,4 +88,18 @@ class ExpenseSplitViewSet(viewsets.ModelViewSet):
         split.is_paid = True
         split.save()
         
-        return Response({'message': 'Split marked as paid'})
\ No newline at end of file
+        return Response({'message': 'Split marked as paid'})
+
+
+class RecurringExpenseViewSet(viewsets.ModelViewSet):
+    """Recurring expense templates of the user's groups"""
+    queryset = RecurringExpense.objects.all()
+    serializer_class = RecurringExpenseSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return RecurringExpense.objects.filter(
+            group__members__user=self.request.user,
+            group__members__is_active=True
+        ).order_by('id')
+
@@ -1,3 +1,22 @@
 from django.contrib import admin
+from .models import GlobalSettlement, SettlementAllocation, SettlementSnapshot
 
-# Register your models here.
+
+class SettlementAllocationInline(admin.TabularInline):
+    model = SettlementAllocation
+    extra = 0
+    readonly_fields = ('ledger_entry', 'from_member', 'to_member', 'from_group', 'to_group', 'amount')
+
+
+@admin.register(GlobalSettlement)
+class GlobalSettlementAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_by', 'transfer_count', 'total_amount', 'created_at')
+    readonly_fields = ('created_at',)
+    inlines = [SettlementAllocationInline]
+
+
+@admin.register(SettlementSnapshot)
+class SettlementSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'group', 'version', 'computed_at')
+    list_filter = ('computed_at',)
+    readonly_fields = ('computed_at',)
@@ -0,0 +1,107 @@
+from groups.models import Group
+from shared_finance.async_utils import aget_object_or_404, api_response, async_api_view, run_cpu_bound
+from .services import SOLVERS, SettlementService
+from .snapshots import asave_snapshot, settlement_key
+from .views import INVALID_SETTINGS, VALID_POLICIES, settings_error, settlement_groups, simulation_options
+import asyncio
+
+
+async def _member_group(request, group_id, snapshot=None):
+    """
+    The group if the user is an active member, else an error response. With
+    ``snapshot`` the group carries that field of its current snapshot.
+    """
+    if snapshot:
+        group = await aget_object_or_404(settlement_groups(request.user, snapshot), id=group_id)
+        is_member = group.is_member
+    else:
+        group = await aget_object_or_404(Group, id=group_id)
+        is_member = await group.members.filter(user=request.user, is_active=True).aexists()
+    if not is_member:
+        return None, api_response({'error': 'You are not a member of this group'}, status=403)
+    return group, None
+
+
+@async_api_view(['POST'])
+async def compute_settlement(request, group_id):
+    """Compute settlement for a group (async)"""
+    group, error = await _member_group(request, group_id, snapshot='settlements')
+    if error:
+        return error
+    
+    policy_type = request.data.get('policy_type', 'equal_split')
+    if policy_type not in VALID_POLICIES:
+        return api_response(
+            {'error': f'Invalid policy type. Must be one of: {VALID_POLICIES}'},
+            status=400
+        )
+    solver = request.data.get('solver', 'greedy')
+    if solver not in SOLVERS:
+        return api_response({'error': f'Invalid solver. Must be one of: {list(SOLVERS)}'}, status=400)
+    
+    key = settlement_key(policy_type, solver)
+    if group.snapshot and key in group.snapshot:
+        return api_response(group.snapshot[key])
+    
+    try:
+        settlement_service = await SettlementService.acreate(group)
+        balances = await settlement_service.acompute_net_balances()
+        parameters = await settlement_service.apolicy_parameters(policy_type)
+        settlement = await run_cpu_bound(settlement_service.settle, balances, policy_type, parameters, solver)
+        graph = await run_cpu_bound(settlement_service.settlement_graph, balances)
+        await asave_snapshot(group, graph, {**(group.snapshot or {}), key: settlement})
+        return api_response(settlement)
+    
+    except INVALID_SETTINGS as e:
+        return api_response(settings_error(e), status=400)
+    
+    except Exception as e:
+        return api_response({'error': f'Error computing settlement: {str(e)}'}, status=500)
+
+
+@async_api_view(['GET'])
+async def get_settlement_graph(request, group_id):
+    """Get settlement graph for a group (async)"""
+    group, error = await _member_group(request, group_id, snapshot='graph')
+    if error:
+        return error
+    if group.snapshot is not None:
+        return api_response(group.snapshot)
+    
+    try:
+        settlement_service = await SettlementService.acreate(group)
+        balances = await settlement_service.acompute_net_balances()
+        graph = await run_cpu_bound(settlement_service.settlement_graph, balances)
+        await asave_snapshot(group, graph)
+        return api_response(graph)
+    
+    except Exception as e:
+        return api_response({'error': f'Error generating settlement graph: {str(e)}'}, status=500)
+
+
+@async_api_view(['POST'])
+async def simulate_settlement(request, group_id):
+    """Compare policies and solvers on the group's current balances (async)"""
+    group, error = await _member_group(request, group_id)
+    if error:
+        return error
+    
+    policy_types, solvers, message = simulation_options(request.data)
+    if message:
+        return api_response({'error': message}, status=400)
+    
+    try:
+        settlement_service = await SettlementService.acreate(group)
+        balances = await settlement_service.acompute_net_balances()
+        parameters = await settlement_service.apolicy_parameter_sets(policy_types)
+        runs = await asyncio.gather(*[
+            run_cpu_bound(settlement_service.simulate_policy, balances, policy_type, solvers, parameters[policy_type])
+            for policy_type in policy_types
+        ])
+        return api_response(settlement_service.simulation(balances, runs))
+    
+    except INVALID_SETTINGS as e:
+        return api_response(settings_error(e), status=400)
+    
+    except Exception as e:
+        return api_response({'error': f'Error simulating settlement: {str(e)}'}, status=500)
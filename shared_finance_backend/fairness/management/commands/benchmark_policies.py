@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from decimal import Decimal
+from groups.models import GroupMember
+from fairness.policies import POLICIES, get_policy
+import random
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = 'Time each fairness policy over a synthetic group in memory and check that it nets to zero'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        members = [
+            GroupMember(
+                user_id=user_id,
+                share_factor=Decimal(rng.randint(50, 300)) / 100,
+                income_bracket=rng.choice(['low', 'medium', 'high']),
+            )
+            for user_id in range(1, options['members'] + 1)
+        ]
+        balances = {member.user_id: Decimal(rng.randint(-500000, 500000)) / 100 for member in members}
+        parameters = {'bracket_weights': {'low': '0.5'}}
+        
+        for policy_type in POLICIES:
+            policy = get_policy(policy_type, parameters)
+            times = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = policy.apply(balances, members)
+                times.append(time.perf_counter() - started)
+            if sum(result.values()) != 0:
+                raise CommandError(f'{policy_type} left {sum(result.values())} unsettled')
+            self.stdout.write(
+                f'{policy_type}: median {statistics.median(times) * 1000:.1f} ms for {len(members)} members'
+            )
+        self.stdout.write(self.style.SUCCESS('Every policy nets to zero paise'))
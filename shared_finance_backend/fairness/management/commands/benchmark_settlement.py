@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from collections import defaultdict
+from decimal import Decimal
+from expenses.fx import ConvertedBalances
+from fairness.services import SettlementService
+from shared_finance.money import Money
+import random
+import statistics
+import time
+
+CENT = Decimal('0.01')
+
+
+def decimal_balances(rows):
+    """Net balances as they were summed before MoneyField: a Decimal per row, quantized to paise"""
+    balances = defaultdict(Decimal)
+    for user_id, amount in rows:
+        balances[user_id] += amount.quantize(CENT)
+    return dict(balances)
+
+
+def decimal_netting(balances):
+    """Greedy netting over Decimal amounts, as it ran before integer paise"""
+    debtors = sorted(((user_id, -amount) for user_id, amount in balances.items() if amount < 0),
+                     key=lambda x: x[1], reverse=True)
+    creditors = sorted(((user_id, amount) for user_id, amount in balances.items() if amount > 0),
+                       key=lambda x: x[1], reverse=True)
+    transactions = []
+    debtor_idx = creditor_idx = 0
+    while debtor_idx < len(debtors) and creditor_idx < len(creditors):
+        debtor_id, debt_amount = debtors[debtor_idx]
+        creditor_id, credit_amount = creditors[creditor_idx]
+        amount = min(debt_amount, credit_amount)
+        transactions.append((debtor_id, creditor_id, amount))
+        debtors[debtor_idx] = (debtor_id, debt_amount - amount)
+        creditors[creditor_idx] = (creditor_id, credit_amount - amount)
+        if debtors[debtor_idx][1] == 0:
+            debtor_idx += 1
+        if creditors[creditor_idx][1] == 0:
+            creditor_idx += 1
+    return transactions
+
+
+def money_balances(rows):
+    balances = ConvertedBalances('INR')
+    for user_id, amount in rows:
+        balances.add(user_id, amount, 'INR', None)
+    return balances.balances()
+
+
+class Command(BaseCommand):
+    help = 'Time settlement over Decimal amounts against integer paise on synthetic expense rows'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=2000)
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user_ids = range(1, options['members'] + 1)
+        # What the aggregate queries return per row: paid totals and (negated) owed totals
+        decimal_rows = []
+        for _ in range(options['rows'] // 2):
+            paise = rng.randint(100, 500000)
+            decimal_rows.append((rng.choice(user_ids), Decimal(paise) / 100))
+            decimal_rows.append((rng.choice(user_ids), -Decimal(paise) / 100))
+        money_rows = [(user_id, Money.of(amount)) for user_id, amount in decimal_rows]
+        
+        def run(compute):
+            times = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = compute()
+                times.append(time.perf_counter() - started)
+            return statistics.median(times), result
+        
+        decimal_time, reference = run(lambda: decimal_netting(decimal_balances(decimal_rows)))
+        money_time, transactions = run(lambda: SettlementService.greedy_netting(money_balances(money_rows)))
+        
+        if [(t['from_member'], t['to_member'], t['amount']) for t in transactions] != reference:
+            raise CommandError('Integer paise settlement differs from the Decimal one')
+        self.stdout.write(
+            f'decimal: median {decimal_time * 1000:.1f} ms, integer paise: median {money_time * 1000:.1f} ms '
+            f'for {len(decimal_rows)} rows, {len(transactions)} transfers ({decimal_time / money_time:.2f}x)'
+        )
+        self.stdout.write(self.style.SUCCESS('Both settle to the same transfers'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from collections import defaultdict
+from decimal import Decimal
+from fairness.routing import PaymentRoutes
+from fairness.services import SOLVERS
+import random
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = 'Time each settlement solver over a synthetic group with payment routes and check its transfers'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--cash-only', type=float, default=0.2,
+                            help='Share of members who can only pay a few others')
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user_ids = list(range(1, options['members'] + 1))
+        balances = {user_id: Decimal(rng.randint(-500000, 500000)) / 100 for user_id in user_ids}
+        # Net to zero paise, as the policies leave them
+        balances[user_ids[-1]] -= sum(balances.values())
+        
+        config = {'default_fee_percent': '1', 'members': {}, 'routes': []}
+        for user_id in user_ids:
+            if rng.random() < options['cash_only']:
+                config['members'][str(user_id)] = {'pays': rng.sample(user_ids, 10), 'fee_percent': '0'}
+            elif rng.random() < 0.5:
+                config['members'][str(user_id)] = {'fee_percent': str(rng.choice([0, 0.5, 2]))}
+        routes = PaymentRoutes(config)
+        
+        for solver, netting in SOLVERS.items():
+            times = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                transactions = netting(balances, 'INR', routes)
+                times.append(time.perf_counter() - started)
+            
+            settled = defaultdict(Decimal)
+            for t in transactions:
+                settled[t['from_member']] += t['amount']
+                settled[t['to_member']] -= t['amount']
+            unsettled = sum(abs(amount + settled[user_id]) for user_id, amount in balances.items())
+            if unsettled:
+                raise CommandError(f'{solver} left {unsettled} unsettled')
+            fees = sum(routes.fee_amount(t['from_member'], t['to_member'], int(t['amount'] * 100)) for t in transactions)
+            outside = sum(not routes.allows(t['from_member'], t['to_member']) for t in transactions)
+            self.stdout.write(
+                f'{solver}: median {statistics.median(times) * 1000:.1f} ms for {len(balances)} members, '
+                f'{len(transactions)} transfers, {fees} in fees, {outside} outside the payment routes'
+            )
+        self.stdout.write(self.style.SUCCESS('Every solver settles every balance'))
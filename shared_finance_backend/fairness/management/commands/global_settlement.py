@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from expenses.fx import format_amount
+from groups.models import Group
+from fairness.services import GlobalSettlementService, SettlementAlreadyRecorded
+
+
+class Command(BaseCommand):
+    help = 'Net outstanding balances across all active groups, one connected component of users and groups at a time'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--create-ledger-entries', action='store_true',
+                            help='Write the transfers to the ledger as pending entries')
+    
+    def handle(self, *args, **options):
+        service = GlobalSettlementService(Group.objects.filter(is_active=True).values_list('id', flat=True))
+        result = service.compute()
+        for component in result['components']:
+            self.stdout.write(
+                f"groups {', '.join(str(group_id) for group_id in component['groups'])}: "
+                f"{component['transaction_count']} transfers (per group: {component['group_transaction_count']})"
+            )
+        self.stdout.write(
+            f"{len(result['components'])} components, {result['transaction_count']} transfers "
+            f"instead of {result['group_transaction_count']}, "
+            f"{format_amount(result['total_settlement_amount'], result['currency'])} in total"
+        )
+        if options['create_ledger_entries']:
+            try:
+                settlement = service.record(result)
+            except SettlementAlreadyRecorded as e:
+                raise CommandError(f'Nothing to record: {e}')
+            self.stdout.write(self.style.SUCCESS(
+                f'Recorded global settlement {settlement.id} with {settlement.transfer_count} ledger entries'
+            ))
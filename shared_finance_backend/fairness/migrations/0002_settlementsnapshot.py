@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-19 06:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0003_group_change_seq_groupmember_change_seq'),
+        ('fairness', '0001_globalsettlement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+                ('graph', models.JSONField()),
+                ('settlements', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlement_snapshots', to='groups.group')),
+            ],
+            options={
+                'db_table': 'fairness_settlementsnapshot',
+                'unique_together': {('group', 'version')},
+            },
+        ),
+    ]
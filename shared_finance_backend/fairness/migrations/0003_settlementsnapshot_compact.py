@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-19 06:48
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def pack_existing(apps, schema_editor):
+    # Precomputed snapshots hold the settlement graph, which has the balances and transfers to pack
+    SettlementSnapshot = apps.get_model('fairness', 'SettlementSnapshot')
+    snapshots = list(SettlementSnapshot.objects.using(schema_editor.connection.alias).select_related('group'))
+    paise = lambda amount: int((Decimal(str(amount)) * 100).to_integral_value())  # noqa: E731
+    for snapshot in snapshots:
+        balances = sorted((int(user_id), paise(amount)) for user_id, amount in snapshot.graph['member_balances'].items())
+        snapshot.currency = snapshot.group.currency
+        snapshot.member_ids = [user_id for user_id, _ in balances]
+        snapshot.balances = [amount for _, amount in balances]
+        snapshot.transfers = [
+            value for edge in snapshot.graph['graph']['edges']
+            for value in (edge['from'], edge['to'], paise(edge['amount']))
+        ]
+    SettlementSnapshot.objects.using(schema_editor.connection.alias).bulk_update(
+        snapshots, ['currency', 'member_ids', 'balances', 'transfers'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fairness', '0002_settlementsnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='settlementsnapshot',
+            options={'ordering': ['group', '-version']},
+        ),
+        migrations.AddField(
+            model_name='settlementsnapshot',
+            name='balances',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='settlementsnapshot',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='settlementsnapshot',
+            name='member_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='settlementsnapshot',
+            name='transfers',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AlterField(
+            model_name='settlementsnapshot',
+            name='graph',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+from shared_finance.money import MoneyField, decimal_to_money
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fairness', '0003_settlementsnapshot_compact'),
+    ]
+
+    operations = [
+        *decimal_to_money('fairness', 'globalsettlement', 'total_amount',
+                          models.DecimalField(max_digits=14, decimal_places=2, default=0), MoneyField(default=0)),
+        *decimal_to_money('fairness', 'settlementallocation', 'amount',
+                          models.DecimalField(max_digits=10, decimal_places=2), MoneyField()),
+    ]
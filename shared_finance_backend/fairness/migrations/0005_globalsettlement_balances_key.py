@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fairness', '0004_money_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globalsettlement',
+            name='balances_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -1,3 +1,88 @@
+from django.conf import settings
 from django.db import models
+from django.contrib.auth import get_user_model
+from expenses.fx import format_amount
+from groups.models import Group
+from payments.models import LedgerEntry
+from shared_finance.money import MoneyField
 
-# Create your models here.
+User = get_user_model()
+
+
+class GlobalSettlement(models.Model):
+    """A cross-group settlement whose transfers were written to the ledger"""
+    
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='global_settlements'
+    )
+    group_ids = models.JSONField(default=list)
+    # Fingerprint of the group set and netted balances the transfers settle
+    balances_key = models.CharField(max_length=64, blank=True, db_index=True)
+    transfer_count = models.PositiveIntegerField(default=0)
+    total_amount = MoneyField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        total = format_amount(self.total_amount, settings.FX_BASE_CURRENCY)
+        return f"Global settlement {self.id}: {self.transfer_count} transfers of {total}"
+    
+    class Meta:
+        db_table = 'fairness_globalsettlement'
+        ordering = ['-created_at']
+
+
+class SettlementAllocation(models.Model):
+    """
+    Part of a global settlement attributed to the group whose debt it pays
+    (``from_group``) and the group whose credit it receives (``to_group``).
+    Offsets between one member's own groups have no ledger entry and the
+    same member on both sides.
+    """
+    
+    settlement = models.ForeignKey(GlobalSettlement, on_delete=models.CASCADE, related_name='allocations')
+    ledger_entry = models.ForeignKey(
+        LedgerEntry, on_delete=models.CASCADE, null=True, blank=True, related_name='allocations'
+    )
+    from_member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    to_member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    from_group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='+')
+    to_group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='+')
+    amount = MoneyField()
+    
+    def __str__(self):
+        amount = format_amount(self.amount, settings.FX_BASE_CURRENCY)
+        return f"{amount} from group {self.from_group_id} to group {self.to_group_id}"
+    
+    class Meta:
+        db_table = 'fairness_settlementallocation'
+
+
+class SettlementSnapshot(models.Model):
+    """
+    A group's settlement at one group version. ``member_ids``, ``balances``
+    and ``transfers`` record it compactly and are kept for every version, so
+    two snapshots can be diffed without recomputing either. ``graph`` and
+    ``settlements`` hold the endpoint responses, served while the group's
+    version is still ``version``; they are cleared once superseded.
+    """
+    
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='settlement_snapshots')
+    version = models.BigIntegerField()
+    currency = models.CharField(max_length=3, default='INR')
+    # Sorted user ids, and each one's net balance in paise (positive = owed money)
+    member_ids = models.JSONField(default=list)
+    balances = models.JSONField(default=list)
+    # Greedy netting of the balances, flattened: [from_user_id, to_user_id, paise, ...]
+    transfers = models.JSONField(default=list)
+    graph = models.JSONField(null=True, blank=True)
+    # Policy type -> compute_settlement response
+    settlements = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Settlement snapshot of group {self.group_id} at {self.version}"
+    
+    class Meta:
+        db_table = 'fairness_settlementsnapshot'
+        unique_together = ['group', 'version']
+        ordering = ['group', '-version']
@@ -0,0 +1,173 @@
+"""
+Fairness policies: per-member weights on what each debtor owes.
+
+A policy turns the group's members into one weight per member, read from
+the member rows and the parameters of the group's active ``FairnessPolicy``.
+Applying it redistributes the total owed to the creditors over the debtors,
+in proportion to debt times weight, in whole paise. Creditors keep their
+balances and the result always nets to exactly zero, so ``greedy_netting``
+settles every paisa.
+"""
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Type
+from shared_finance.money import Money
+
+CENT = Decimal('0.01')
+
+# Weights are fixed-point integers with this many parts per unit
+WEIGHT_SCALE = 10000
+
+
+def to_paise(amount) -> int:
+    return Money.of(amount).paise
+
+
+def to_weight(weight) -> int:
+    """A weight as a fixed-point integer; negative weights count as zero"""
+    return max(int((Decimal(str(weight)) * WEIGHT_SCALE).to_integral_value()), 0)
+
+
+class PolicyParameterError(Exception):
+    """A FairnessPolicy parameter that is not a usable weight"""
+    
+    def __init__(self, key: str, error: str):
+        super().__init__(f'{key}: {error}')
+        self.key = key
+        self.error = error
+
+
+def parse_weight(value, key: str) -> Decimal:
+    """``value`` as a finite Decimal, or PolicyParameterError naming ``key``"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, Decimal)):
+        raise PolicyParameterError(key, 'must be a number')
+    try:
+        weight = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise PolicyParameterError(key, 'must be a number')
+    if not weight.is_finite():
+        raise PolicyParameterError(key, 'must be a finite number')
+    return weight
+
+
+def allocate(total: int, weights: List[int]) -> List[int]:
+    """
+    Split ``total`` paise in proportion to non-negative integer ``weights``
+    by the largest remainder method: the shares sum to ``total`` exactly and
+    each is within a paisa of its exact quota. Ties go to the earlier index.
+    """
+    denominator = sum(weights)
+    if denominator <= 0:
+        raise ValueError('Weights must have a positive sum')
+    quotas = [total * weight for weight in weights]
+    shares = [quota // denominator for quota in quotas]
+    remainders = [quota - share * denominator for quota, share in zip(quotas, shares)]
+    for index in sorted(range(len(weights)), key=lambda i: (-remainders[i], i))[:total - sum(shares)]:
+        shares[index] += 1
+    return shares
+
+
+class Policy:
+    """Equal weights; subclasses override ``weights``"""
+    
+    # Whether ``weights`` reads the group's FairnessPolicy parameters
+    uses_parameters = False
+    # Parameters holding a mapping of weights
+    weight_parameters = ()
+    
+    def __init__(self, parameters: Optional[Dict[str, Any]] = None):
+        self.parameters = self.clean_parameters(parameters)
+    
+    @classmethod
+    def clean_parameters(cls, parameters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """``parameters`` with every weight parsed; raises PolicyParameterError at the first bad key"""
+        if not parameters:
+            return {}
+        if not isinstance(parameters, dict):
+            raise PolicyParameterError('parameters', 'must be an object')
+        cleaned = dict(parameters)
+        for name in cls.weight_parameters:
+            weights = parameters.get(name, {})
+            if not isinstance(weights, dict):
+                raise PolicyParameterError(name, 'must be an object')
+            cleaned[name] = {str(key): parse_weight(value, f'{name}.{key}') for key, value in weights.items()}
+        return cleaned
+    
+    def weights(self, members: List[Any]) -> List[Decimal]:
+        """Weight of each of ``members`` (GroupMember rows), in order"""
+        return [Decimal(1)] * len(members)
+    
+    def apply(self, balances: Dict[int, Decimal], members: List[Any]) -> Dict[int, Decimal]:
+        """Rebalanced ``balances`` (user id -> amount, positive = owed money) netting to zero"""
+        # One index over the members; users with a balance but no membership weigh 1
+        index = {member.user_id: position for position, member in enumerate(members)}
+        member_weights = [to_weight(weight) for weight in self.weights(members)]
+        
+        user_ids = list(balances)
+        paise = [to_paise(balances[user_id]) for user_id in user_ids]
+        weights = [
+            member_weights[index[user_id]] if user_id in index else WEIGHT_SCALE
+            for user_id in user_ids
+        ]
+        
+        credit = sum(amount for amount in paise if amount > 0)
+        debtors = [position for position, amount in enumerate(paise) if amount < 0]
+        if debtors:
+            burden = [-paise[position] * weights[position] for position in debtors]
+            if sum(burden) <= 0:
+                # Every debtor weighs nothing: spread the debt as it stands
+                burden = [-paise[position] for position in debtors]
+            for position, share in zip(debtors, allocate(credit, burden)):
+                paise[position] = -share
+        return {user_id: Decimal(amount).scaleb(-2) for user_id, amount in zip(user_ids, paise)}
+
+
+POLICIES: Dict[str, Type[Policy]] = {}
+
+
+def register(policy_type: str):
+    """Class decorator adding a policy under ``policy_type``"""
+    def decorator(cls: Type[Policy]) -> Type[Policy]:
+        POLICIES[policy_type] = cls
+        return cls
+    return decorator
+
+
+register('equal_split')(Policy)
+
+
+@register('income_based')
+class IncomeBasedPolicy(Policy):
+    """
+    Weights by income bracket. ``parameters['bracket_weights']`` overrides
+    the defaults, e.g. ``{"low": "0.5"}``.
+    """
+    
+    uses_parameters = True
+    weight_parameters = ('bracket_weights',)
+    BRACKET_WEIGHTS = {'low': Decimal('0.8'), 'medium': Decimal(1), 'high': Decimal(1)}
+    
+    def weights(self, members: List[Any]) -> List[Decimal]:
+        brackets = {**self.BRACKET_WEIGHTS, **self.parameters.get('bracket_weights', {})}
+        return [brackets.get(member.income_bracket, Decimal(1)) for member in members]
+
+
+@register('custom_share')
+class CustomSharePolicy(Policy):
+    """
+    Weights by each member's ``share_factor``, or by
+    ``parameters['share_factors']`` (user id -> factor) where given.
+    """
+    
+    uses_parameters = True
+    weight_parameters = ('share_factors',)
+    
+    def weights(self, members: List[Any]) -> List[Decimal]:
+        factors = self.parameters.get('share_factors', {})
+        return [factors.get(str(member.user_id), Decimal(str(member.share_factor))) for member in members]
+
+
+register('proportional')(Policy)
+
+
+def get_policy(policy_type: str, parameters: Optional[Dict[str, Any]] = None) -> Policy:
+    return POLICIES[policy_type](parameters)
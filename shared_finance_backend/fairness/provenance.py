@@ -0,0 +1,174 @@
+"""
+Provenance of settlement transfers: the expenses behind each one.
+
+One pass streams the group's unsettled expenses and splits ordered by date
+and keeps, per member, the contributions still outstanding as lots: what an
+expense left them owed (positive) or owing (negative), in the group's
+currency. A contribution of the other sign pays off the member's oldest lots
+first, so at the end a debtor's lots are the expenses they still owe for and
+a creditor's the expenses they are still owed for. Each member keeps at most
+``max_lots`` lots; past that the two oldest merge into one lot of earlier
+expenses, which bounds memory by members rather than by expenses.
+
+A transfer from a debtor to a creditor is then drawn from the debtor's
+oldest lots and the creditor's, in the order the transfers are made.
+"""
+from collections import deque
+from decimal import Decimal
+from django.utils import timezone
+from heapq import merge
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from expenses.fx import exchange_rate
+from expenses.models import Expense, ExpenseSplit
+from .policies import CENT
+from .services import SettlementService
+
+MAX_LOTS = 50
+
+
+class Lots:
+    """A member's outstanding contributions, all of one sign, oldest first"""
+    
+    def __init__(self, max_lots: int = MAX_LOTS):
+        self.max_lots = max_lots
+        # [expense_id, expense_count, amount]; merged lots have no expense id
+        self.lots = deque()
+        self.total = Decimal(0)
+    
+    def add(self, expense_id: int, amount: Decimal):
+        self.total += amount
+        remaining = amount
+        # The opposite sign pays off the oldest lots first
+        while remaining and self.lots and (self.lots[0][2] > 0) != (remaining > 0):
+            lot = self.lots[0]
+            if abs(lot[2]) <= abs(remaining):
+                remaining += lot[2]
+                self.lots.popleft()
+            else:
+                lot[2] += remaining
+                remaining = Decimal(0)
+        if remaining:
+            self.lots.append([expense_id, 1, remaining])
+            if len(self.lots) > self.max_lots:
+                oldest = self.lots.popleft()
+                self.lots[0] = [None, oldest[1] + self.lots[0][1], oldest[2] + self.lots[0][2]]
+    
+    def take(self, amount: Decimal) -> List[Tuple[Optional[int], int, Decimal]]:
+        """Draw ``amount`` (a magnitude) from the oldest lots"""
+        taken = []
+        while amount > 0 and self.lots:
+            lot = self.lots[0]
+            part = min(abs(lot[2]), amount)
+            taken.append((lot[0], lot[1], part))
+            amount -= part
+            if part == abs(lot[2]):
+                self.lots.popleft()
+            else:
+                lot[2] -= part if lot[2] > 0 else -part
+        return taken
+
+
+class ProvenanceTracker:
+    """Lots of every member of one group, fed one expense at a time"""
+    
+    def __init__(self, currency: str, max_lots: int = MAX_LOTS):
+        self.currency = currency
+        self.max_lots = max_lots
+        self.members: Dict[int, Lots] = {}
+    
+    @staticmethod
+    def rows(group_id: int) -> Iterator[Tuple]:
+        """
+        The group's unsettled expenses and splits merged in (date, expense id)
+        order, streamed in chunks: ``(date, expense_id, user_id, amount, currency)``
+        with the payer's row positive
+        """
+        paid = Expense.objects.filter(group_id=group_id, is_settled=False).order_by('date', 'id').values_list(
+            'date', 'id', 'payer_id', 'total_amount', 'currency'
+        )
+        owed = ExpenseSplit.objects.filter(expense__group_id=group_id, expense__is_settled=False).order_by(
+            'expense__date', 'expense_id'
+        ).values_list('expense__date', 'expense_id', 'member_id', 'amount_owed', 'expense__currency')
+        return merge(
+            ((day, expense_id, payer_id, total.decimal, currency)
+             for day, expense_id, payer_id, total, currency in paid.iterator(chunk_size=2000)),
+            ((day, expense_id, member_id, -amount.decimal, currency)
+             for day, expense_id, member_id, amount, currency in owed.iterator(chunk_size=2000)),
+            key=lambda row: (row[0], row[1]),
+        )
+    
+    def feed(self, rows: Iterable[Tuple]):
+        """Consume ``rows`` as produced by ``rows()``, netting each expense per member first"""
+        current, contributions = None, {}
+        for day, expense_id, user_id, amount, currency in rows:
+            if expense_id != current:
+                self.add_expense(current, contributions)
+                current, contributions = expense_id, {}
+            if currency != self.currency:
+                amount = amount * exchange_rate(currency, self.currency, timezone.localdate(day))
+            contributions[user_id] = contributions.get(user_id, Decimal(0)) + amount
+        self.add_expense(current, contributions)
+    
+    def add_expense(self, expense_id: Optional[int], contributions: Dict[int, Decimal]):
+        for user_id, amount in contributions.items():
+            if amount:
+                if user_id not in self.members:
+                    self.members[user_id] = Lots(self.max_lots)
+                self.members[user_id].add(expense_id, amount)
+    
+    def balances(self) -> Dict[int, Decimal]:
+        """Net balances, rounded once per member as settlement rounds them"""
+        return {user_id: lots.total.quantize(CENT) for user_id, lots in self.members.items()}
+    
+    def attribute(self, transfers: Iterable[Tuple[int, int, Decimal]]) -> List[Dict[str, Any]]:
+        """Expenses behind each ``(from_member, to_member, amount)`` transfer, in order"""
+        empty = Lots(self.max_lots)
+        explained = []
+        for from_member, to_member, amount in transfers:
+            explained.append({
+                'from_member': from_member,
+                'to_member': to_member,
+                'amount': amount,
+                'debtor_expenses': self.members.get(from_member, empty).take(amount),
+                'creditor_expenses': self.members.get(to_member, empty).take(amount),
+            })
+        return explained
+
+
+def explain(group_id: int, currency: str, transfers: Optional[List[Tuple[int, int, Decimal]]] = None,
+            max_lots: int = MAX_LOTS) -> List[Dict[str, Any]]:
+    """
+    Provenance of ``transfers``, by default the greedy netting of the
+    streamed balances; expenses come with their date and vendor, read in one
+    more query for just the expenses cited
+    """
+    tracker = ProvenanceTracker(currency, max_lots)
+    tracker.feed(tracker.rows(group_id))
+    if transfers is None:
+        transfers = [
+            (t['from_member'], t['to_member'], t['amount'])
+            for t in SettlementService.greedy_netting(tracker.balances(), currency)
+        ]
+    explained = tracker.attribute(transfers)
+    
+    cited = {
+        expense_id for transfer in explained
+        for side in ('debtor_expenses', 'creditor_expenses') for expense_id, _, _ in transfer[side]
+        if expense_id is not None
+    }
+    details = {
+        expense_id: {'date': day, 'vendor': vendor}
+        for expense_id, day, vendor in Expense.objects.filter(id__in=cited).values_list('id', 'date', 'vendor')
+    }
+    for transfer in explained:
+        for side in ('debtor_expenses', 'creditor_expenses'):
+            transfer[side] = [
+                {
+                    'expense_id': expense_id,
+                    'expense_count': count,
+                    **details.get(expense_id, {'date': None, 'vendor': 'Earlier expenses'}),
+                    'amount': amount.quantize(CENT),
+                }
+                for expense_id, count, amount in transfer[side]
+            ]
+    return explained
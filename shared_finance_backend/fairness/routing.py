@@ -0,0 +1,240 @@
+"""
+Settlement over payment routes: who can pay whom, and at what fee.
+
+A group's routes live in ``Group.settings['payment_routes']``::
+
+    {
+        "default_fee_percent": "0",
+        "members": {"12": {"pays": [14, 15], "fee_percent": "1.5"}},
+        "routes": [{"from": 12, "to": 14, "fee_percent": "0"}]
+    }
+
+``pays`` limits the members someone can send money to (cash only, no UPI);
+members without it can pay anyone. Fees are a percentage of the amount sent:
+a route's own fee, else the sender's, else the default.
+
+``min_cost_flow`` turns balances into a flow network with one node per
+member and one edge per allowed route, and solves it with networkx's
+network simplex in whole paise. Edge costs rank total fees first and the
+total amount moved second, so money only passes through a third member when
+that saves fees or a direct route is not allowed. Network simplex returns a
+spanning-forest solution, so there is at most one transfer fewer than the
+members involved; an exact-match pass then cuts transfers where it can at
+no extra fee (see :func:`min_cost_flow`).
+"""
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from expenses.fx import format_amount
+from .policies import CENT, PolicyParameterError, parse_weight, to_paise
+import networkx as nx
+
+# Fees are whole basis points of the amount sent
+BASIS_POINTS = 10000
+
+# Absorbs the paise a group's balances are off from netting to zero
+DUST = 'dust'
+
+
+class RoutesUnfeasible(Exception):
+    """No settlement fits the payment routes"""
+
+
+class PaymentRoutesError(Exception):
+    """A group's ``payment_routes`` setting that cannot be parsed; ``key`` is its path in the settings"""
+    
+    def __init__(self, key: str, error: str):
+        super().__init__(f'{key}: {error}')
+        self.key = key
+        self.error = error
+
+
+def _object(value, key: str) -> Dict[str, Any]:
+    if not isinstance(value, dict):
+        raise PaymentRoutesError(key, 'must be an object')
+    return value
+
+
+def _member_id(value, key: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise PaymentRoutesError(key, 'must be a member id')
+    try:
+        return int(value)
+    except ValueError:
+        raise PaymentRoutesError(key, 'must be a member id')
+
+
+def _basis_points(percent, key: str) -> int:
+    try:
+        percent = parse_weight(percent, key)
+    except PolicyParameterError as e:
+        raise PaymentRoutesError(e.key, e.error)
+    if percent < 0:
+        raise PaymentRoutesError(key, 'must not be negative')
+    return int((percent * 100).to_integral_value())
+
+
+class PaymentRoutes:
+    """
+    Allowed counterparties and fees, parsed from a group's settings; raises
+    PaymentRoutesError naming the first value it cannot use
+    """
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None, member_ids: Iterable[int] = ()):
+        config = _object(config or {}, 'payment_routes')
+        # Members who can pass money on without a balance of their own
+        self.member_ids = set(member_ids)
+        self.default_fee = _basis_points(config.get('default_fee_percent', 0), 'payment_routes.default_fee_percent')
+        self.allowed: Dict[int, set] = {}
+        self.sender_fees: Dict[int, int] = {}
+        members = _object(config.get('members') or {}, 'payment_routes.members')
+        for user_id, member in members.items():
+            key = f'payment_routes.members.{user_id}'
+            sender = _member_id(user_id, key)
+            member = _object(member, key)
+            if 'pays' in member:
+                if not isinstance(member['pays'], list):
+                    raise PaymentRoutesError(f'{key}.pays', 'must be a list of member ids')
+                self.allowed[sender] = {_member_id(other, f'{key}.pays') for other in member['pays']}
+            if 'fee_percent' in member:
+                self.sender_fees[sender] = _basis_points(member['fee_percent'], f'{key}.fee_percent')
+        routes = config.get('routes') or []
+        if not isinstance(routes, list):
+            raise PaymentRoutesError('payment_routes.routes', 'must be a list')
+        self.route_fees: Dict[tuple, int] = {}
+        for index, route in enumerate(routes):
+            key = f'payment_routes.routes.{index}'
+            route = _object(route, key)
+            for end in ('from', 'to'):
+                if end not in route:
+                    raise PaymentRoutesError(f'{key}.{end}', 'is required')
+            pair = (_member_id(route['from'], f'{key}.from'), _member_id(route['to'], f'{key}.to'))
+            self.route_fees[pair] = _basis_points(route.get('fee_percent', 0), f'{key}.fee_percent')
+    
+    @classmethod
+    def for_group(cls, group, member_ids: Iterable[int] = ()) -> 'PaymentRoutes':
+        settings = group.settings or {}
+        return cls(settings.get('payment_routes') if isinstance(settings, dict) else None, member_ids)
+    
+    def allows(self, from_member: int, to_member: int) -> bool:
+        return from_member not in self.allowed or to_member in self.allowed[from_member]
+    
+    def fee(self, from_member: int, to_member: int) -> int:
+        """Fee of the route in basis points"""
+        if (from_member, to_member) in self.route_fees:
+            return self.route_fees[from_member, to_member]
+        return self.sender_fees.get(from_member, self.default_fee)
+    
+    def fee_amount(self, from_member: int, to_member: int, paise: int) -> Decimal:
+        return (Decimal(paise * self.fee(from_member, to_member)) / BASIS_POINTS * CENT).quantize(CENT)
+
+
+def _flows(demands: Dict[int, int], routes: PaymentRoutes) -> List[Tuple[int, int, int]]:
+    """(from, to, paise) transfers meeting ``demands`` at the least fee, then the least money moved"""
+    members = sorted(demands)
+    debt = sum(-paise for paise in demands.values() if paise < 0)
+    
+    # Any fee outweighs the most money a forest of transfers can move
+    scale = debt * max(len(members) - 1, 1) + 1
+    network = nx.DiGraph()
+    for user_id in members:
+        network.add_node(user_id, demand=demands[user_id])
+    for from_member in members:
+        for to_member in members:
+            if from_member != to_member and routes.allows(from_member, to_member):
+                network.add_edge(from_member, to_member, weight=routes.fee(from_member, to_member) * scale + 1)
+    
+    # Rounding can leave the balances a few paise off zero; the dust node takes up the difference
+    imbalance = sum(demands.values())
+    if imbalance:
+        network.add_node(DUST, demand=-imbalance)
+        for user_id in members:
+            if imbalance > 0:
+                network.add_edge(DUST, user_id, weight=0)
+            else:
+                network.add_edge(user_id, DUST, weight=0)
+    
+    try:
+        _, flows = nx.network_simplex(network)
+    except (nx.NetworkXUnfeasible, nx.NetworkXUnbounded) as error:
+        raise RoutesUnfeasible(str(error))
+    return [
+        (from_member, to_member, paise)
+        for from_member in members
+        for to_member, paise in sorted(flows[from_member].items(), key=lambda item: str(item[0]))
+        if paise > 0 and to_member != DUST
+    ]
+
+
+def _exact_pairs(demands: Dict[int, int], routes: PaymentRoutes) -> List[Tuple[int, int, int]]:
+    """Debtors paired with a creditor owed exactly their debt, over the cheapest allowed route"""
+    creditors: Dict[int, List[int]] = {}
+    for user_id in sorted(demands):
+        if demands[user_id] > 0:
+            creditors.setdefault(demands[user_id], []).append(user_id)
+    pairs = []
+    for user_id in sorted(demands):
+        if demands[user_id] >= 0:
+            continue
+        candidates = creditors.get(-demands[user_id], [])
+        allowed = [creditor for creditor in candidates if routes.allows(user_id, creditor)]
+        if allowed:
+            # The cheapest route, then the lowest id
+            match = min(allowed, key=lambda creditor: routes.fee(user_id, creditor))
+            candidates.remove(match)
+            pairs.append((user_id, match, -demands[user_id]))
+    return pairs
+
+
+def _total_fee(transfers: List[Tuple[int, int, int]], routes: PaymentRoutes) -> int:
+    return sum(paise * routes.fee(from_member, to_member) for from_member, to_member, paise in transfers)
+
+
+def min_cost_flow(balances: Dict[int, Decimal], currency: str = 'INR',
+                  routes: Optional[PaymentRoutes] = None) -> List[Dict[str, Any]]:
+    """
+    Transactions settling ``balances`` over ``routes`` at the least total fee,
+    then, as far as the exact-match pass finds them, the fewest transactions.
+    Raises RoutesUnfeasible if the routes cannot carry every debt to a
+    creditor.
+
+    The flow network can only weigh money, not transfers: a per-transfer
+    charge makes the problem a fixed-charge flow, and fewest transfers alone
+    is already subset-sum hard. Edge costs therefore break fee ties on money
+    moved, which keeps relays out but may spread one debt over several
+    creditors. A second solve settles every debtor who owes exactly what a
+    creditor is owed directly and routes the rest; it replaces the first
+    when it costs no more in fees and needs fewer transfers.
+    """
+    routes = routes or PaymentRoutes()
+    demands = {user_id: 0 for user_id in routes.member_ids}
+    demands.update((user_id, to_paise(amount)) for user_id, amount in balances.items())
+    transfers = _flows(demands, routes)
+    
+    pairs = _exact_pairs(demands, routes)
+    if pairs:
+        # Paired members stay in the network, with nothing left to settle, and can still relay
+        rest = {**demands, **{user_id: 0 for pair in pairs for user_id in pair[:2]}}
+        try:
+            split = pairs + _flows(rest, routes)
+        except RoutesUnfeasible:
+            split = None
+        if split and len(split) < len(transfers) and _total_fee(split, routes) <= _total_fee(transfers, routes):
+            transfers = sorted(split, key=lambda t: (t[0], str(t[1])))
+    
+    transactions = []
+    for from_member, to_member, paise in transfers:
+        amount = paise * CENT
+        fee = routes.fee_amount(from_member, to_member, paise)
+        explanation = f"Debt settlement of {format_amount(amount, currency)}"
+        if fee:
+            explanation += f" ({format_amount(fee, currency)} fee)"
+        transactions.append({
+            'from_member': from_member,
+            'to_member': to_member,
+            'amount': amount,
+            'fee': fee,
+            'explanation': explanation,
+        })
+    # Largest first, like greedy netting
+    transactions.sort(key=lambda t: t['amount'], reverse=True)
+    return transactions
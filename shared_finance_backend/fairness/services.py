@@ -1,48 +1,133 @@
 import networkx as nx
 from decimal import Decimal
 from collections import defaultdict
-from typing import List, Dict, Tuple, Any
-from groups.models import Group, GroupMember
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DateField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils.functional import cached_property
+from typing import Callable, Iterable, List, Dict, Optional, Tuple, Any
+from groups.models import FairnessPolicy, Group, GroupMember
+from expenses.fx import ConvertedBalances, format_amount
 from expenses.models import Expense, ExpenseSplit
 from payments.models import LedgerEntry
+from shared_finance.money import Money
+from .models import GlobalSettlement, SettlementAllocation
+from .policies import POLICIES, get_policy
+from .routing import PaymentRoutes, RoutesUnfeasible, min_cost_flow
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _conversion_day(currency: str, prefix: str = ''):
+    """Day of the expense for amounts to convert into ``currency``, None for amounts already in it"""
+    return Case(
+        When(**{f'{prefix}currency': currency}, then=Value(None)),
+        default=TruncDate(f'{prefix}date'),
+        output_field=DateField(),
+    )
+
+
+def total_amount(transactions: List[Dict[str, Any]], field: str = 'amount') -> Decimal:
+    """Sum of ``field`` over ``transactions``, a Decimal amount even when there are none"""
+    return sum((t.get(field, 0) for t in transactions), Decimal('0.00'))
+
+
 class SettlementService:
     """Service for computing fair settlements using networkx"""
     
-    def __init__(self, group: Group):
+    def __init__(self, group: Group, members: Optional[List[GroupMember]] = None):
         self.group = group
-        self.members = list(group.members.filter(is_active=True).select_related('user'))
+        if members is None:
+            members = list(group.members.filter(is_active=True).select_related('user'))
+        self.members = members
         self.member_ids = [member.user.id for member in self.members]
+        # Currency conversion behind the last computed balances
+        self.conversion: Optional[ConvertedBalances] = None
+    
+    @classmethod
+    async def acreate(cls, group: Group) -> 'SettlementService':
+        """Async constructor: loads the active members without blocking the event loop"""
+        members = [
+            member async for member in group.members.filter(is_active=True).select_related('user')
+        ]
+        return cls(group, members)
+    
+    @cached_property
+    def routes(self) -> PaymentRoutes:
+        """The group's payment routes; raises PaymentRoutesError if its settings hold bad ones"""
+        return PaymentRoutes.for_group(self.group, self.member_ids)
+    
+    def solve(self, solver: str, balances: Dict[int, Decimal]) -> List[Dict[str, Any]]:
+        """Transactions settling ``balances`` with ``solver``; only solvers that use routes parse them"""
+        routes = self.routes if solver in ROUTED_SOLVERS else None
+        return SOLVERS[solver](balances, self.group.currency, routes)
     
     def compute_net_balances(self) -> Dict[int, Decimal]:
-        """Compute net balance for each member (positive = owed money, negative = owes money)"""
-        balances = defaultdict(Decimal)
-        
-        # Get all expenses and their splits
-        expenses = Expense.objects.filter(
-            group=self.group,
-            is_settled=False
-        ).prefetch_related('splits')
-        
-        for expense in expenses:
-            # Add what the payer paid
-            balances[expense.payer.id] += expense.total_amount
-            
-            # Subtract what each member owes
-            for split in expense.splits.all():
-                balances[split.member.id] -= split.amount_owed
-        
-        return dict(balances)
+        """Net balance for each member (positive = owed money, negative = owes money), summed in the database"""
+        return self.aggregate_net_balances()
     
-    def greedy_netting(self, balances: Dict[int, Decimal]) -> List[Dict[str, Any]]:
-        """Greedy netting algorithm to minimize transactions"""
+    @staticmethod
+    def balance_querysets(group_id: int, currency: str):
+        """
+        Per-payer totals paid and per-member totals owed over the group's unsettled
+        expenses, by currency; amounts not in ``currency`` are also split by day
+        """
+        paid = Expense.objects.filter(group_id=group_id, is_settled=False).values(
+            'payer_id', 'currency', day=_conversion_day(currency)
+        ).annotate(total=Sum('total_amount'))
+        owed = ExpenseSplit.objects.filter(
+            expense__group_id=group_id, expense__is_settled=False
+        ).values('member_id', 'expense__currency', day=_conversion_day(currency, 'expense__')).annotate(
+            total=Sum('amount_owed')
+        )
+        return paid, owed
+    
+    @staticmethod
+    def _converted(currency: str, paid: Iterable[Dict[str, Any]], owed: Iterable[Dict[str, Any]]) -> ConvertedBalances:
+        """Net balances from the rows of ``balance_querysets``"""
+        balances = ConvertedBalances(currency)
+        for row in paid:
+            balances.add(row['payer_id'], row['total'], row['currency'], row['day'])
+        for row in owed:
+            balances.add(row['member_id'], -row['total'], row['expense__currency'], row['day'])
+        return balances
+    
+    @staticmethod
+    def group_conversion(group_id: int, currency: Optional[str] = None) -> ConvertedBalances:
+        """The group's net balances aggregated in the database (two queries), with their conversion"""
+        if currency is None:
+            currency = Group.objects.values_list('currency', flat=True).get(pk=group_id)
+        return SettlementService._converted(currency, *SettlementService.balance_querysets(group_id, currency))
+    
+    @staticmethod
+    def group_balances(group_id: int, currency: Optional[str] = None) -> Dict[int, Decimal]:
+        """Net balances aggregated in the database; used for live balance updates"""
+        return SettlementService.group_conversion(group_id, currency).balances()
+    
+    def aggregate_net_balances(self) -> Dict[int, Decimal]:
+        """Net balances from two aggregate queries over the stored ``total_amount`` and split amounts"""
+        self.conversion = self.group_conversion(self.group.id, self.group.currency)
+        return self.conversion.balances()
+    
+    async def acompute_net_balances(self) -> Dict[int, Decimal]:
+        """Same balances as aggregate_net_balances, with async queries"""
+        paid, owed = self.balance_querysets(self.group.id, self.group.currency)
+        self.conversion = self._converted(
+            self.group.currency, [row async for row in paid], [row async for row in owed]
+        )
+        return self.conversion.balances()
+    
+    @staticmethod
+    def greedy_netting(balances: Dict[int, Decimal], currency: str = 'INR') -> List[Dict[str, Any]]:
+        """Greedy netting algorithm to minimize transactions; integer paise throughout"""
         # Separate debtors and creditors
-        debtors = [(user_id, abs(amount)) for user_id, amount in balances.items() if amount < 0]
-        creditors = [(user_id, amount) for user_id, amount in balances.items() if amount > 0]
+        paise = {user_id: Money.of(amount).paise for user_id, amount in balances.items()}
+        debtors = [[user_id, -amount] for user_id, amount in paise.items() if amount < 0]
+        creditors = [[user_id, amount] for user_id, amount in paise.items() if amount > 0]
         
         # Sort by amount (largest first)
         debtors.sort(key=lambda x: x[1], reverse=True)
@@ -53,28 +138,27 @@ class SettlementService:
         creditor_idx = 0
         
         while debtor_idx < len(debtors) and creditor_idx < len(creditors):
-            debtor_id, debt_amount = debtors[debtor_idx]
-            creditor_id, credit_amount = creditors[creditor_idx]
+            debtor = debtors[debtor_idx]
+            creditor = creditors[creditor_idx]
             
             # Calculate transaction amount
-            transaction_amount = min(debt_amount, credit_amount)
+            transaction_paise = min(debtor[1], creditor[1])
+            amount = Decimal(transaction_paise).scaleb(-2)
+            transactions.append({
+                'from_member': debtor[0],
+                'to_member': creditor[0],
+                'amount': amount,
+                'explanation': f"Debt settlement of {format_amount(amount, currency)}"
+            })
             
-            if transaction_amount > 0:
-                transactions.append({
-                    'from_member': debtor_id,
-                    'to_member': creditor_id,
-                    'amount': transaction_amount,
-                    'explanation': f"Debt settlement of ₹{transaction_amount}"
-                })
-                
-                # Update remaining amounts
-                debtors[debtor_idx] = (debtor_id, debt_amount - transaction_amount)
-                creditors[creditor_idx] = (creditor_id, credit_amount - transaction_amount)
+            # Update remaining amounts
+            debtor[1] -= transaction_paise
+            creditor[1] -= transaction_paise
             
             # Move to next debtor or creditor if current one is settled
-            if debtors[debtor_idx][1] == 0:
+            if debtor[1] == 0:
                 debtor_idx += 1
-            if creditors[creditor_idx][1] == 0:
+            if creditor[1] == 0:
                 creditor_idx += 1
         
         return transactions
@@ -109,84 +193,419 @@ class SettlementService:
             ],
             'edges': [
                 {
-                    'from': edge[0],
-                    'to': edge[1],
+                    'from': from_member,
+                    'to': to_member,
                     'amount': data['amount'],
                     'explanation': data['explanation']
                 }
-                for edge, data in G.edges(data=True)
+                for from_member, to_member, data in G.edges(data=True)
             ]
         }
     
-    def compute_settlement(self, policy_type: str = 'equal_split') -> Dict[str, Any]:
+    def settlement_graph(self, balances: Dict[int, Decimal]) -> Dict[str, Any]:
+        """Greedy settlement graph for precomputed balances; no database access"""
+        transactions = self.greedy_netting(balances, self.group.currency)
+        return {
+            'group_id': self.group.id,
+            'group_name': self.group.name,
+            'graph': self.create_settlement_graph(transactions),
+            'member_balances': {str(user_id): amount for user_id, amount in balances.items()},
+        }
+    
+    def compute_settlement(self, policy_type: str = 'equal_split', solver: str = 'greedy') -> Dict[str, Any]:
         """Compute settlement based on fairness policy"""
+        return self.settle(self.compute_net_balances(), policy_type, self.policy_parameters(policy_type), solver)
+    
+    def policy_parameters(self, policy_type: str) -> Dict[str, Any]:
+        """
+        Parameters of the group's active FairnessPolicy of this type, if the
+        policy reads any, parsed; raises PolicyParameterError for a bad weight.
+        """
+        if not POLICIES[policy_type].uses_parameters:
+            return {}
+        return POLICIES[policy_type].clean_parameters(self._policy_parameters(policy_type).first())
+    
+    async def apolicy_parameters(self, policy_type: str) -> Dict[str, Any]:
+        if not POLICIES[policy_type].uses_parameters:
+            return {}
+        return POLICIES[policy_type].clean_parameters(await self._policy_parameters(policy_type).afirst())
+    
+    def _policy_parameters(self, policy_type: str):
+        return FairnessPolicy.objects.filter(
+            group=self.group, policy_type=policy_type, is_active=True
+        ).order_by('-created_at', '-id').values_list('parameters', flat=True)
+    
+    def policy_parameter_sets(self, policy_types: List[str]) -> Dict[str, Dict[str, Any]]:
+        """``policy_parameters`` for several policy types in one query"""
+        parameters = {policy_type: {} for policy_type in policy_types}
+        for policy_type, values in self._parameter_sets(policy_types) or ():
+            parameters[policy_type] = values
+        return {
+            policy_type: POLICIES[policy_type].clean_parameters(values) for policy_type, values in parameters.items()
+        }
+    
+    async def apolicy_parameter_sets(self, policy_types: List[str]) -> Dict[str, Dict[str, Any]]:
+        parameters = {policy_type: {} for policy_type in policy_types}
+        queryset = self._parameter_sets(policy_types)
+        if queryset is not None:
+            async for policy_type, values in queryset:
+                parameters[policy_type] = values
+        return {
+            policy_type: POLICIES[policy_type].clean_parameters(values) for policy_type, values in parameters.items()
+        }
+    
+    def _parameter_sets(self, policy_types: List[str]):
+        wanted = [policy_type for policy_type in policy_types if POLICIES[policy_type].uses_parameters]
+        if not wanted:
+            return None
+        # Oldest first, so the latest active policy of each type wins
+        return FairnessPolicy.objects.filter(
+            group=self.group, policy_type__in=wanted, is_active=True
+        ).order_by('created_at', 'id').values_list('policy_type', 'parameters')
+    
+    def simulate_policy(self, balances: Dict[int, Decimal], policy_type: str, solvers: List[str],
+                        parameters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        What-if settlement of ``balances`` under one policy, once per solver;
+        no database access, so policies can run in parallel.
+        """
+        adjusted = get_policy(policy_type, parameters).apply(balances, self.members)
+        deltas = {
+            str(user_id): amount - balances.get(user_id, Decimal('0.00'))
+            for user_id, amount in adjusted.items()
+        }
+        runs = []
+        for solver in solvers:
+            transactions = self.solve(solver, adjusted)
+            runs.append({
+                'policy_type': policy_type,
+                'solver': solver,
+                'transaction_count': len(transactions),
+                'total_settlement_amount': total_amount(transactions),
+                'total_fees': total_amount(transactions, 'fee'),
+                'transactions': transactions,
+                'member_balances': {str(user_id): amount for user_id, amount in adjusted.items()},
+                'member_deltas': deltas,
+            })
+        return runs
+    
+    def simulation(self, balances: Dict[int, Decimal], runs: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Side-by-side response for the ``simulate_policy`` results of several policies"""
+        return {
+            'group_id': self.group.id,
+            'group_name': self.group.name,
+            'base_balances': {str(user_id): amount for user_id, amount in balances.items()},
+            'fx': self.fx_report(),
+            'simulations': [run for policy_runs in runs for run in policy_runs],
+        }
+    
+    def fx_report(self) -> Dict[str, Any]:
+        """Currency, converted currencies and rounding drift of the last computed balances"""
+        return (self.conversion or ConvertedBalances(self.group.currency)).report()
+    
+    def settle(self, balances: Dict[int, Decimal], policy_type: str = 'equal_split',
+               parameters: Optional[Dict[str, Any]] = None, solver: str = 'greedy') -> Dict[str, Any]:
+        """Apply the policy to precomputed balances and net them with ``solver``; no database access"""
         try:
-            # Get net balances
-            balances = self.compute_net_balances()
+            # Reweight debts by the policy; the result nets to zero paise
+            balances = get_policy(policy_type, parameters).apply(balances, self.members)
             
-            # Apply fairness policy
-            if policy_type == 'income_based':
-                balances = self._apply_income_based_policy(balances)
-            elif policy_type == 'custom_share':
-                balances = self._apply_custom_share_policy(balances)
-            # For equal_split and proportional, use current balances as-is
-            
-            # Compute transactions using greedy netting
-            transactions = self.greedy_netting(balances)
+            # Compute transactions using the requested netting algorithm
+            transactions = self.solve(solver, balances)
             
             # Create settlement graph
             graph = self.create_settlement_graph(transactions)
             
-            # Calculate total settlement amount
-            total_amount = sum(t['amount'] for t in transactions)
-            
             return {
                 'group_id': self.group.id,
                 'group_name': self.group.name,
                 'policy_type': policy_type,
-                'total_settlement_amount': float(total_amount),
+                'solver': solver,
+                'total_settlement_amount': total_amount(transactions),
+                'total_fees': total_amount(transactions, 'fee'),
                 'transaction_count': len(transactions),
                 'transactions': transactions,
                 'graph': graph,
-                'member_balances': {
-                    str(user_id): float(amount) 
-                    for user_id, amount in balances.items()
-                }
+                'fx': self.fx_report(),
+                'member_balances': {str(user_id): amount for user_id, amount in balances.items()},
             }
-            
+        
         except Exception as e:
             logger.error(f"Error computing settlement: {e}")
             raise
+
+
+def greedy(balances: Dict[int, Decimal], currency: str = 'INR',
+           routes: Optional[PaymentRoutes] = None) -> List[Dict[str, Any]]:
+    """Greedy netting; ignores payment routes"""
+    return SettlementService.greedy_netting(balances, currency)
+
+
+def min_cost_netting(balances: Dict[int, Decimal], currency: str = 'INR',
+                     routes: Optional[PaymentRoutes] = None) -> List[Dict[str, Any]]:
+    """
+    Least-fee settlement over the group's payment routes; greedy netting, with
+    the fees its transfers would cost, when no settlement fits the routes
+    """
+    routes = routes or PaymentRoutes()
+    try:
+        return min_cost_flow(balances, currency, routes)
+    except RoutesUnfeasible as e:
+        logger.warning(f"No settlement fits the payment routes, falling back to greedy netting: {e}")
+    transactions = SettlementService.greedy_netting(balances, currency)
+    for t in transactions:
+        t['fee'] = routes.fee_amount(t['from_member'], t['to_member'], Money.of(t['amount']).paise)
+        t['explanation'] += ' (outside the payment routes)'
+    return transactions
+
+
+# Netting algorithms by name: balances, their currency and the group's payment routes in, transactions out
+SOLVERS = {
+    'greedy': greedy,
+    'min_cost_flow': min_cost_netting,
+}
+# Solvers that read the group's payment routes
+ROUTED_SOLVERS = {'min_cost_flow'}
+
+
+def _match_legs(debits: List[list], credits: List[list], limit: Optional[Decimal] = None) -> List[Tuple[int, int, Decimal]]:
+    """
+    Pair [group_id, remaining] debit legs with credit legs, same group first,
+    consuming up to ``limit`` from both. Returns (from_group, to_group, amount).
+    """
+    matched = []
+    remaining = limit
+    for same_group in (True, False):
+        for debit in debits:
+            for credit in credits:
+                if remaining is not None and remaining <= 0:
+                    return matched
+                if same_group and debit[0] != credit[0]:
+                    continue
+                amount = min(debit[1], credit[1]) if remaining is None else min(debit[1], credit[1], remaining)
+                if amount <= 0:
+                    continue
+                debit[1] -= amount
+                credit[1] -= amount
+                if remaining is not None:
+                    remaining -= amount
+                matched.append((debit[0], credit[0], amount))
+    return matched
+
+
+class SettlementAlreadyRecorded(Exception):
+    """Every transfer of a global settlement is already in the ledger from an earlier one"""
+    
+    def __init__(self, settlement_id: int):
+        super().__init__(f'Already recorded by global settlement {settlement_id}')
+        self.settlement_id = settlement_id
+
+
+class GlobalSettlementService:
+    """
+    Nets balances across groups that share members, so two people in several
+    groups together settle with one transfer instead of one per group.
+
+    Users and groups form a graph with an edge wherever a user has a balance
+    in a group; each connected component is settled on its own, from the sum
+    of its members' balances. Every transfer is attributed back to the groups
+    whose debts and credits it clears.
+    """
+    
+    def __init__(self, group_ids: Iterable[int], currency: Optional[str] = None):
+        self.group_ids = sorted(set(group_ids))
+        # Groups may keep accounts in different currencies; transfers are in this one
+        self.currency = currency or settings.FX_BASE_CURRENCY
+    
+    def group_balances(self) -> Dict[int, Dict[int, Decimal]]:
+        """Non-zero net balances per group over unsettled expenses, in ``currency`` (two queries)"""
+        balances = defaultdict(lambda: ConvertedBalances(self.currency))
+        paid = Expense.objects.filter(group_id__in=self.group_ids, is_settled=False).values(
+            'group_id', 'payer_id', 'currency', day=_conversion_day(self.currency)
+        ).annotate(total=Sum('total_amount'))
+        owed = ExpenseSplit.objects.filter(
+            expense__group_id__in=self.group_ids, expense__is_settled=False
+        ).values(
+            'expense__group_id', 'member_id', 'expense__currency', day=_conversion_day(self.currency, 'expense__')
+        ).annotate(total=Sum('amount_owed'))
+        for row in paid:
+            balances[row['group_id']].add(row['payer_id'], row['total'], row['currency'], row['day'])
+        for row in owed:
+            balances[row['expense__group_id']].add(
+                row['member_id'], -row['total'], row['expense__currency'], row['day']
+            )
+        return {
+            group_id: {user_id: amount for user_id, amount in converted.balances().items() if amount}
+            for group_id, converted in balances.items()
+        }
+    
+    @staticmethod
+    def components(balances: Dict[int, Dict[int, Decimal]]) -> List[List[int]]:
+        """Group ids of each connected component of the user–group graph; settled groups drop out"""
+        graph = nx.Graph()
+        for group_id, members in balances.items():
+            for user_id in members:
+                graph.add_edge(('group', group_id), ('user', user_id))
+        return sorted(
+            sorted(node_id for kind, node_id in component if kind == 'group')
+            for component in nx.connected_components(graph)
+        )
     
-    def _apply_income_based_policy(self, balances: Dict[int, Decimal]) -> Dict[int, Decimal]:
-        """Apply income-based fairness policy"""
-        # This is a simplified implementation
-        # In a real system, you'd have more sophisticated income-based calculations
-        adjusted_balances = {}
+    @staticmethod
+    def settle_component(balances: Dict[int, Dict[int, Decimal]], currency: str = 'INR') -> Dict[str, Any]:
+        """Net one component's per-group balances (group -> user -> amount); no database access"""
+        totals = defaultdict(Decimal)
+        debits = defaultdict(list)
+        credits = defaultdict(list)
+        for group_id in sorted(balances):
+            for user_id, amount in sorted(balances[group_id].items()):
+                totals[user_id] += amount
+                if amount < 0:
+                    debits[user_id].append([group_id, -amount])
+                elif amount > 0:
+                    credits[user_id].append([group_id, amount])
         
-        for user_id, amount in balances.items():
-            member = next((m for m in self.members if m.user.id == user_id), None)
-            if member and member.income_bracket == 'low':
-                # Reduce debt for low-income members
-                adjusted_balances[user_id] = amount * Decimal('0.8')
-            else:
-                adjusted_balances[user_id] = amount
+        # A member's credit in one group first pays their own debt in another
+        offsets = [
+            {'member': user_id, 'from_group': from_group, 'to_group': to_group, 'amount': amount}
+            for user_id in sorted(set(debits) & set(credits))
+            for from_group, to_group, amount in _match_legs(debits[user_id], credits[user_id])
+        ]
         
-        return adjusted_balances
-    
-    def _apply_custom_share_policy(self, balances: Dict[int, Decimal]) -> Dict[int, Decimal]:
-        """Apply custom share factor policy"""
-        adjusted_balances = {}
+        transactions = SettlementService.greedy_netting(dict(totals), currency)
+        for transfer in transactions:
+            transfer['allocations'] = [
+                {'from_group': from_group, 'to_group': to_group, 'amount': amount}
+                for from_group, to_group, amount in _match_legs(
+                    debits[transfer['from_member']], credits[transfer['to_member']], transfer['amount']
+                )
+            ]
         
-        for user_id, amount in balances.items():
-            member = next((m for m in self.members if m.user.id == user_id), None)
-            if member:
-                # Adjust based on share factor
-                adjusted_balances[user_id] = amount * member.share_factor
-            else:
-                adjusted_balances[user_id] = amount
+        return {
+            'groups': sorted(balances),
+            'member_balances': {str(user_id): amount for user_id, amount in sorted(totals.items())},
+            'transactions': transactions,
+            'offsets': offsets,
+            'transaction_count': len(transactions),
+            # What settling each group on its own would have taken
+            'group_transaction_count': sum(
+                len(SettlementService.greedy_netting(members, currency)) for members in balances.values()
+            ),
+        }
+    
+    def compute(self) -> Dict[str, Any]:
+        """Settlement preview for every component of the selected groups"""
+        balances = self.group_balances()
+        components = [
+            self.settle_component({group_id: balances[group_id] for group_id in group_ids}, self.currency)
+            for group_ids in self.components(balances)
+        ]
+        transactions = [t for component in components for t in component['transactions']]
+        return {
+            'group_ids': self.group_ids,
+            'currency': self.currency,
+            'components': components,
+            'transaction_count': len(transactions),
+            'group_transaction_count': sum(component['group_transaction_count'] for component in components),
+            'total_settlement_amount': total_amount(transactions),
+        }
+    
+    @staticmethod
+    def balances_key(result: Dict[str, Any]) -> str:
+        """Fingerprint of the groups, currency and netted balances of a computed settlement"""
+        payload = {
+            'group_ids': result['group_ids'],
+            'currency': result['currency'],
+            'balances': [component['member_balances'] for component in result['components']],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    
+    @staticmethod
+    def record(result: Dict[str, Any], created_by=None,
+               may_record: Optional[Callable[[int, int, List[int]], bool]] = None):
+        """
+        Write a computed settlement to the ledger: one pending entry per
+        transfer, with the per-group allocations behind it and the offsets.
+        Adds ``ledger_entry_id`` to each transfer of ``result`` it writes.
         
-        return adjusted_balances
+        Transfers that ``may_record`` (from member, to member, groups) refuses
+        are left out, as are transfers and offsets an earlier settlement of
+        the same balances wrote and nobody cancelled; raises
+        SettlementAlreadyRecorded when that leaves none of the transfers.
+        """
+        key = GlobalSettlementService.balances_key(result)
+        may_record = may_record or (lambda from_member, to_member, groups: True)
+        with transaction.atomic():
+            # Settlements of the same groups are recorded one at a time
+            list(Group.objects.select_for_update().filter(id__in=result['group_ids']).values_list('id', flat=True))
+            entries = LedgerEntry.objects.filter(allocations__settlement__balances_key=key).exclude(status='cancelled')
+            recorded = {
+                (from_member, to_member): settlement_id
+                for from_member, to_member, settlement_id in entries.values_list(
+                    'from_member_id', 'to_member_id', 'allocations__settlement_id'
+                )
+            }
+            offsets_recorded = set(
+                SettlementAllocation.objects.filter(
+                    settlement__balances_key=key, ledger_entry__isnull=True
+                ).values_list('from_member_id', 'from_group_id', 'to_group_id')
+            )
+            permitted = [
+                (component, transfer)
+                for component in result['components']
+                for transfer in component['transactions']
+                if may_record(transfer['from_member'], transfer['to_member'], transfer_groups(transfer))
+            ]
+            pending = [
+                (component, transfer) for component, transfer in permitted
+                if (transfer['from_member'], transfer['to_member']) not in recorded
+            ]
+            if permitted and not pending:
+                transfer = permitted[0][1]
+                raise SettlementAlreadyRecorded(recorded[transfer['from_member'], transfer['to_member']])
+            
+            settlement = GlobalSettlement.objects.create(
+                created_by=created_by,
+                group_ids=result['group_ids'],
+                balances_key=key,
+                transfer_count=len(pending),
+                total_amount=total_amount([transfer for _, transfer in pending]),
+            )
+            allocations = []
+            for component, transfer in pending:
+                groups = transfer_groups(transfer)
+                entry = LedgerEntry.objects.create(
+                    from_member_id=transfer['from_member'],
+                    to_member_id=transfer['to_member'],
+                    amount=transfer['amount'],
+                    description=f"Global settlement {settlement.id} across groups "
+                                f"{', '.join(str(group_id) for group_id in groups)}",
+                )
+                transfer['ledger_entry_id'] = entry.id
+                allocations.extend(
+                    SettlementAllocation(
+                        settlement=settlement, ledger_entry=entry,
+                        from_member_id=transfer['from_member'], to_member_id=transfer['to_member'],
+                        from_group_id=a['from_group'], to_group_id=a['to_group'], amount=a['amount'],
+                    )
+                    for a in transfer['allocations']
+                )
+            allocations.extend(
+                SettlementAllocation(
+                    settlement=settlement, from_member_id=offset['member'], to_member_id=offset['member'],
+                    from_group_id=offset['from_group'], to_group_id=offset['to_group'], amount=offset['amount'],
+                )
+                for component in result['components']
+                for offset in component['offsets']
+                if (offset['member'], offset['from_group'], offset['to_group']) not in offsets_recorded
+            )
+            SettlementAllocation.objects.bulk_create(allocations)
+        return settlement
+
+
+def transfer_groups(transfer: Dict[str, Any]) -> List[int]:
+    """Groups whose debts or credits a global settlement transfer clears"""
+    return sorted({a['from_group'] for a in transfer['allocations']} | {a['to_group'] for a in transfer['allocations']})
 
 
 # ILP Solver stub (for future implementation)
@@ -0,0 +1,309 @@
+"""
+Settlement snapshots.
+
+A SettlementSnapshot records a group's settlement at one group version: the
+members' balances and the greedy transfers as compact integer arrays (user
+ids and paise), plus the full endpoint responses while the snapshot is the
+group's latest. Every live computation by the settlement endpoints is saved
+as one, and ``precompute_settlements`` snapshots every active group written
+to since its latest snapshot, e.g. nightly. Groups are split into shards
+computed in a process pool; each worker reads a shard with a few queries per
+group and returns plain JSON, and the parent writes it.
+
+The endpoints read the snapshot at the group's current version along with
+the group itself, so serving one costs no extra query and a group changed
+since is computed live. Superseded snapshots keep only the compact arrays,
+which ``diff_snapshots`` compares in time linear in the number of members.
+"""
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from typing import Any, Dict, Iterator, List, Optional
+from groups.models import Group, GroupMember
+from shared_finance.money import Money, MoneyJSONEncoder
+from sync.models import Version
+from .models import SettlementSnapshot
+from .policies import POLICIES, PolicyParameterError, to_paise
+from .routing import PaymentRoutesError
+from .services import SettlementService
+import django
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+PACKED_FIELDS = ['currency', 'member_ids', 'balances', 'transfers']
+
+
+def group_version(field: str = 'pk'):
+    """Current version of the group whose id is the outer query's ``field``; 0 if never written"""
+    return Coalesce(
+        Subquery(Version.objects.filter(scope=Version.GROUP, object_id=OuterRef(field)).values('value')[:1]),
+        Value(0),
+        output_field=models.BigIntegerField(),
+    )
+
+
+def with_snapshot(groups, field: str):
+    """
+    ``groups`` annotated with their current ``version`` and ``snapshot``:
+    ``field`` of the snapshot at that version, or None
+    """
+    return groups.annotate(
+        version=group_version(),
+        snapshot=Subquery(
+            SettlementSnapshot.objects.filter(group_id=OuterRef('pk'), version=group_version('group_id')).values(
+                field
+            )[:1],
+            output_field=models.JSONField(),
+        ),
+    )
+
+
+def settlement_key(policy_type: str, solver: str = 'greedy') -> str:
+    """Key of a settlement in ``SettlementSnapshot.settlements``"""
+    return policy_type if solver == 'greedy' else f'{policy_type}/{solver}'
+
+
+def stale_group_ids() -> List[int]:
+    """Active groups without a snapshot at their current version"""
+    return list(
+        Group.objects.filter(is_active=True).annotate(version=group_version()).filter(
+            ~Exists(SettlementSnapshot.objects.filter(group_id=OuterRef('pk'), version=OuterRef('version')))
+        ).order_by('id').values_list('id', flat=True)
+    )
+
+
+def plain(data):
+    """``data`` with amounts as strings, exactly as the endpoints render them"""
+    return json.loads(json.dumps(data, cls=MoneyJSONEncoder))
+
+
+def pack(graph: Dict[str, Any]) -> Dict[str, List[int]]:
+    """Compact balances and transfers of a ``settlement_graph`` response"""
+    balances = sorted((int(user_id), to_paise(amount)) for user_id, amount in graph['member_balances'].items())
+    return {
+        'member_ids': [user_id for user_id, _ in balances],
+        'balances': [amount for _, amount in balances],
+        'transfers': [
+            value for edge in graph['graph']['edges'] for value in (edge['from'], edge['to'], to_paise(edge['amount']))
+        ],
+    }
+
+
+def snapshot_row(group: Group, graph: Dict[str, Any], settlements: Optional[Dict[str, Any]] = None) -> SettlementSnapshot:
+    """Snapshot of ``group`` at ``group.version`` (annotated by ``with_snapshot``)"""
+    graph = plain(graph)
+    return SettlementSnapshot(
+        group_id=group.id, version=group.version, currency=group.currency, graph=graph,
+        settlements=plain(settlements or {}), **pack(graph),
+    )
+
+
+def _saved_fields(row: SettlementSnapshot, settlements: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # The graph endpoint leaves the settlements of an existing snapshot alone
+    fields = PACKED_FIELDS + ['graph'] + (['settlements'] if settlements is not None else [])
+    return {field: getattr(row, field) for field in fields}
+
+
+def save_snapshot(group: Group, graph: Dict[str, Any], settlements: Optional[Dict[str, Any]] = None):
+    """
+    Keep what an endpoint computed live at ``group.version``. ``group.snapshot``
+    tells whether a snapshot exists at that version, so this is one UPDATE
+    or INSERT outside a transaction. ``settlements`` replaces the snapshot's;
+    pass the ones already stored along with the new policy's.
+    """
+    row = snapshot_row(group, graph, settlements)
+    if group.snapshot is not None:
+        SettlementSnapshot.objects.filter(group_id=group.id, version=group.version).update(
+            **_saved_fields(row, settlements)
+        )
+        return
+    try:
+        row.save(force_insert=True)
+    except IntegrityError:
+        # A concurrent request saved this version first, from the same data
+        pass
+
+
+async def asave_snapshot(group: Group, graph: Dict[str, Any], settlements: Optional[Dict[str, Any]] = None):
+    row = snapshot_row(group, graph, settlements)
+    if group.snapshot is not None:
+        await SettlementSnapshot.objects.filter(group_id=group.id, version=group.version).aupdate(
+            **_saved_fields(row, settlements)
+        )
+        return
+    try:
+        await row.asave(force_insert=True)
+    except IntegrityError:
+        pass
+
+
+def compute_snapshots(group_ids: List[int]) -> List[Dict[str, Any]]:
+    """
+    Snapshots of ``group_ids`` as plain JSON; runs in the pool workers. Each
+    version is read before the balances, so a write racing the computation
+    leaves the snapshot stale rather than labelled with a version it predates.
+    """
+    groups = list(Group.objects.filter(id__in=group_ids).annotate(version=group_version()).order_by('id'))
+    members = defaultdict(list)
+    for member in GroupMember.objects.filter(group_id__in=group_ids, is_active=True).select_related('user'):
+        members[member.group_id].append(member)
+    
+    snapshots = []
+    for group in groups:
+        try:
+            service = SettlementService(group, members[group.id])
+            parameters = service.policy_parameter_sets(list(POLICIES))
+        except (PolicyParameterError, PaymentRoutesError) as e:
+            # Left without a snapshot, the group's settlements are computed live and answer 400
+            logger.warning('Skipping settlement snapshot of group %s: invalid setting %s', group.id, e)
+            continue
+        balances = service.aggregate_net_balances()
+        graph = plain(service.settlement_graph(balances))
+        snapshots.append({
+            'group_id': group.id,
+            'version': group.version,
+            'currency': group.currency,
+            'graph': graph,
+            'settlements': plain({
+                policy_type: service.settle(balances, policy_type, parameters[policy_type])
+                for policy_type in POLICIES
+            }),
+            **pack(graph),
+        })
+    return snapshots
+
+
+def compact_superseded(group_ids: Optional[List[int]] = None) -> int:
+    """Drop the responses of snapshots older than their group's latest; the packed arrays stay"""
+    snapshots = SettlementSnapshot.objects.filter(graph__isnull=False)
+    if group_ids is not None:
+        snapshots = snapshots.filter(group_id__in=group_ids)
+    return snapshots.filter(
+        version__lt=Subquery(
+            SettlementSnapshot.objects.filter(group_id=OuterRef('group_id')).order_by('-version').values('version')[:1]
+        )
+    ).update(graph=None, settlements={})
+
+
+def store_snapshots(snapshots: List[Dict[str, Any]]) -> int:
+    """Write ``snapshots`` and compact the ones they supersede"""
+    with transaction.atomic():
+        SettlementSnapshot.objects.bulk_create(
+            [SettlementSnapshot(**snapshot) for snapshot in snapshots],
+            update_conflicts=True, unique_fields=['group', 'version'],
+            update_fields=PACKED_FIELDS + ['graph', 'settlements', 'computed_at'],
+        )
+        compact_superseded([snapshot['group_id'] for snapshot in snapshots])
+    return len(snapshots)
+
+
+def _init_worker():
+    # A no-op after fork; spawned workers start without the app registry
+    django.setup()
+
+
+def _computed_shards(shards: List[List[int]], workers: int) -> Iterator[List[Dict[str, Any]]]:
+    if workers <= 1 or len(shards) <= 1:
+        yield from map(compute_snapshots, shards)
+        return
+    # Forked workers must open their own connections rather than share the parent's
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        yield from pool.map(compute_snapshots, shards)
+
+
+def precompute_settlements(group_ids: Optional[List[int]] = None, workers: Optional[int] = None,
+                           shard_size: int = 50) -> Dict[str, Any]:
+    """
+    Snapshot ``group_ids`` (by default every stale group) in shards of
+    ``shard_size`` across ``workers`` processes; returns a throughput report.
+    """
+    started = time.perf_counter()
+    if group_ids is None:
+        group_ids = stale_group_ids()
+    workers = workers or os.cpu_count() or 1
+    shards = [group_ids[start:start + shard_size] for start in range(0, len(group_ids), shard_size)]
+    
+    stored = 0
+    for snapshots in _computed_shards(shards, workers):
+        stored += store_snapshots(snapshots)
+    # Also compacts what the endpoints saved since the last run
+    compact_superseded()
+    
+    seconds = time.perf_counter() - started
+    return {
+        'groups': stored,
+        'shards': len(shards),
+        'workers': min(workers, len(shards)) if len(shards) > 1 else 1,
+        'seconds': round(seconds, 3),
+        'groups_per_second': round(stored / seconds, 1) if seconds else 0.0,
+    }
+
+
+def _amount(paise: int) -> Money:
+    return Money(paise)
+
+
+def _transfer(from_member: int, to_member: int, paise: int) -> Dict[str, Any]:
+    return {'from_member': from_member, 'to_member': to_member, 'amount': _amount(paise)}
+
+
+def _triples(transfers: List[int]) -> Counter:
+    return Counter(zip(transfers[0::3], transfers[1::3], transfers[2::3]))
+
+
+def diff_snapshots(before: SettlementSnapshot, after: SettlementSnapshot) -> Dict[str, Any]:
+    """
+    Balances that changed between two snapshots of a group, and the
+    transfers added and removed. ``member_ids`` are sorted, so the balances
+    merge in one pass; transfers are compared as multisets.
+    """
+    balances = []
+    old_ids, new_ids = before.member_ids, after.member_ids
+    i = j = 0
+    while i < len(old_ids) or j < len(new_ids):
+        if j == len(new_ids) or (i < len(old_ids) and old_ids[i] < new_ids[j]):
+            user_id, old, new = old_ids[i], before.balances[i], 0
+            i += 1
+        elif i == len(old_ids) or new_ids[j] < old_ids[i]:
+            user_id, old, new = new_ids[j], 0, after.balances[j]
+            j += 1
+        else:
+            user_id, old, new = old_ids[i], before.balances[i], after.balances[j]
+            i += 1
+            j += 1
+        if old != new:
+            balances.append({
+                'member': user_id, 'before': _amount(old), 'after': _amount(new), 'change': _amount(new - old),
+            })
+    
+    old_transfers, new_transfers = _triples(before.transfers), _triples(after.transfers)
+    return {
+        'group_id': after.group_id,
+        'currency': after.currency,
+        'from_version': before.version,
+        'to_version': after.version,
+        'from_computed_at': before.computed_at,
+        'to_computed_at': after.computed_at,
+        'balances': balances,
+        'added_transfers': [_transfer(*key) for key in (new_transfers - old_transfers).elements()],
+        'removed_transfers': [_transfer(*key) for key in (old_transfers - new_transfers).elements()],
+        'unchanged_transfer_count': sum((old_transfers & new_transfers).values()),
+    }
+
+
+def snapshot_summary(snapshot: SettlementSnapshot) -> Dict[str, Any]:
+    return {
+        'version': snapshot.version,
+        'computed_at': snapshot.computed_at,
+        'currency': snapshot.currency,
+        'member_count': len(snapshot.member_ids),
+        'transfer_count': len(snapshot.transfers) // 3,
+        'total_settlement_amount': _amount(sum(snapshot.transfers[2::3])),
+    }
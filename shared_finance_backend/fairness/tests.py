@@ -1,14 +1,32 @@
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from groups.models import Group, GroupMember
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from groups.models import FairnessPolicy, Group, GroupMember
 from expenses.models import Expense, ExpenseSplit
-from .services import SettlementService
+from expenses.services import ExpenseService
+from payments.models import LedgerEntry
+from .models import SettlementAllocation, SettlementSnapshot
+from .policies import POLICIES, allocate, get_policy, to_paise
+from .provenance import Lots, explain
+from .routing import PaymentRoutes, PaymentRoutesError, min_cost_flow
+from .services import SOLVERS, GlobalSettlementService, SettlementService, min_cost_netting
+from .snapshots import diff_snapshots, precompute_settlements, stale_group_ids
+from contextlib import contextmanager
 from decimal import Decimal
+import io
+import os
+import random
+import tempfile
 
 User = get_user_model()
 
 
-class SettlementServiceTest(TestCase):
+class SettlementFixtureMixin:
     def setUp(self):
         # Create test users
         self.user1 = User.objects.create_user(username='user1', email='user1@test.com')
@@ -34,7 +52,8 @@ class SettlementServiceTest(TestCase):
             amount_subtotal=Decimal('300.00'),
             amount_tax=Decimal('54.00'),
             vendor='Test Vendor 1',
-            category='food'
+            category='food',
+            date=timezone.now()
         )
         
         self.expense2 = Expense.objects.create(
@@ -43,21 +62,24 @@ class SettlementServiceTest(TestCase):
             amount_subtotal=Decimal('200.00'),
             amount_tax=Decimal('36.00'),
             vendor='Test Vendor 2',
-            category='transport'
+            category='transport',
+            date=timezone.now()
         )
         
-        # Create equal splits
+        # Create equal splits (the payer owes their own share too)
         for expense in [self.expense1, self.expense2]:
             amount_per_member = expense.total_amount / 3
             for user in [self.user1, self.user2, self.user3]:
-                if user != expense.payer:
-                    ExpenseSplit.objects.create(
-                        expense=expense,
-                        member=user,
-                        amount_owed=amount_per_member,
-                        split_type='equal'
-                    )
-    
+                ExpenseSplit.objects.create(
+                    expense=expense,
+                    member=user,
+                    amount_owed=amount_per_member,
+                    split_type='equal'
+                )
+
+
+
+class SettlementServiceTest(SettlementFixtureMixin, TestCase):
     def test_compute_net_balances(self):
         service = SettlementService(self.group)
         balances = service.compute_net_balances()
@@ -91,4 +113,702 @@ class SettlementServiceTest(TestCase):
         self.assertIn('transactions', settlement)
         self.assertIn('graph', settlement)
         self.assertEqual(settlement['group_id'], self.group.id)
-        self.assertGreater(settlement['transaction_count'], 0)
\ No newline at end of file
+        self.assertGreater(settlement['transaction_count'], 0)
+
+
+class AsyncSettlementViewTest(SettlementFixtureMixin, TestCase):
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    
+    def test_async_views_match_sync_views(self):
+        base = f'/api/fairness/groups/{self.group.id}'
+        for policy in ['equal_split', 'custom_share']:
+            sync = self.client.post(f'{base}/compute_settlement/', {'policy_type': policy},
+                                    content_type='application/json', **self.auth(self.user1))
+            native = self.client.post(f'{base}/compute_settlement/async/', {'policy_type': policy},
+                                      content_type='application/json', **self.auth(self.user1))
+            self.assertEqual(native.status_code, 200)
+            self.assertEqual(native.json(), sync.json())
+        
+        sync = self.client.get(f'{base}/settlement_graph/', **self.auth(self.user2))
+        native = self.client.get(f'{base}/settlement_graph/async/', **self.auth(self.user2))
+        self.assertEqual(native.status_code, 200)
+        self.assertEqual(native.json(), sync.json())
+    
+    def test_async_view_errors(self):
+        url = f'/api/fairness/groups/{self.group.id}/compute_settlement/async/'
+        self.assertEqual(self.client.post(url).status_code, 401)
+        
+        outsider = User.objects.create_user(username='outsider', email='outsider@test.com')
+        self.assertEqual(self.client.post(url, **self.auth(outsider)).status_code, 403)
+        
+        response = self.client.post(url, {'policy_type': 'bogus'}, content_type='application/json',
+                                    **self.auth(self.user1))
+        self.assertEqual(response.status_code, 400)
+        
+        missing = self.client.get('/api/fairness/groups/999999/settlement_graph/async/', **self.auth(self.user1))
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(self.client.get(url, **self.auth(self.user1)).status_code, 405)
+
+
+class GlobalSettlementTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@test.com')
+        self.bob = User.objects.create_user(username='bob', email='bob@test.com')
+        self.carol = User.objects.create_user(username='carol', email='carol@test.com')
+        self.dave = User.objects.create_user(username='dave', email='dave@test.com')
+        self.home = self.make_group('Flat', [self.alice, self.bob])
+        self.club = self.make_group('Club', [self.alice, self.bob])
+        self.other = self.make_group('Other', [self.carol, self.dave])
+        
+        # Bob owes Alice 50 for the flat, Alice owes Bob 30 for the club
+        self.spend(self.home, self.alice, '100.00')
+        self.spend(self.club, self.bob, '60.00')
+        self.spend(self.other, self.carol, '40.00')
+    
+    def make_group(self, name, users):
+        group = Group.objects.create(name=name, owner=users[0], currency='INR')
+        for user in users:
+            GroupMember.objects.create(group=group, user=user, role='owner' if user == users[0] else 'member')
+        return group
+    
+    def spend(self, group, payer, amount):
+        ExpenseService.create_with_equal_splits(
+            group=group, payer=payer, amount_subtotal=Decimal(amount), vendor='Shop', category='food',
+            date=timezone.now()
+        )
+    
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    
+    def test_shared_groups_net_to_one_transfer(self):
+        result = GlobalSettlementService([self.home.id, self.club.id, self.other.id]).compute()
+        
+        self.assertEqual([c['groups'] for c in result['components']],
+                         [sorted([self.home.id, self.club.id]), [self.other.id]])
+        self.assertEqual(result['transaction_count'], 2)
+        self.assertEqual(result['group_transaction_count'], 3)
+        
+        shared = result['components'][0]
+        self.assertEqual(len(shared['transactions']), 1)
+        transfer = shared['transactions'][0]
+        self.assertEqual((transfer['from_member'], transfer['to_member'], transfer['amount']),
+                         (self.bob.id, self.alice.id, Decimal('20.00')))
+        self.assertEqual(transfer['allocations'],
+                         [{'from_group': self.home.id, 'to_group': self.home.id, 'amount': Decimal('20.00')}])
+        
+        # The rest of the flat debt is covered by each member's club balance
+        self.assertEqual(sorted((o['member'], o['from_group'], o['to_group'], o['amount']) for o in shared['offsets']), [
+            (self.alice.id, self.club.id, self.home.id, Decimal('30.00')),
+            (self.bob.id, self.home.id, self.club.id, Decimal('30.00')),
+        ])
+    
+    def test_allocations_cover_each_group_balance(self):
+        self.spend(self.club, self.alice, '90.00')
+        self.spend(self.home, self.bob, '10.00')
+        result = GlobalSettlementService([self.home.id, self.club.id]).compute()
+        balances = GlobalSettlementService([self.home.id, self.club.id]).group_balances()
+        
+        cleared = {}
+        for component in result['components']:
+            for transfer in component['transactions']:
+                self.assertEqual(sum(a['amount'] for a in transfer['allocations']), transfer['amount'])
+                for a in transfer['allocations']:
+                    for key in [(transfer['from_member'], a['from_group']), (transfer['to_member'], a['to_group'])]:
+                        cleared[key] = cleared.get(key, Decimal('0')) + a['amount']
+            for offset in component['offsets']:
+                for key in [(offset['member'], offset['from_group']), (offset['member'], offset['to_group'])]:
+                    cleared[key] = cleared.get(key, Decimal('0')) + offset['amount']
+        
+        self.assertEqual(cleared, {
+            (user_id, group_id): abs(amount)
+            for group_id, members in balances.items() for user_id, amount in members.items()
+        })
+    
+    def test_endpoint_records_ledger_entries(self):
+        url = '/api/fairness/global_settlement/'
+        preview = self.client.post(url, {}, content_type='application/json', **self.auth(self.bob))
+        self.assertEqual(preview.status_code, 200)
+        self.assertEqual(preview.json()['group_ids'], sorted([self.home.id, self.club.id]))
+        self.assertFalse(LedgerEntry.objects.exists())
+        
+        response = self.client.post(url, {'create_ledger_entries': True}, content_type='application/json',
+                                    **self.auth(self.bob))
+        self.assertEqual(response.status_code, 201)
+        entry = LedgerEntry.objects.get()
+        self.assertEqual((entry.from_member, entry.to_member, entry.amount, entry.status),
+                         (self.bob, self.alice, Decimal('20.00'), 'pending'))
+        self.assertEqual(response.json()['components'][0]['transactions'][0]['ledger_entry_id'], entry.id)
+        self.assertEqual(SettlementAllocation.objects.filter(settlement_id=response.json()['settlement_id']).count(), 3)
+        self.assertEqual(entry.allocations.get().from_group, self.home)
+    
+    def test_recording_is_limited_and_idempotent(self):
+        url = '/api/fairness/global_settlement/'
+        GroupMember.objects.create(group=self.home, user=self.dave, role='member')
+        body = {'group_ids': [self.home.id], 'create_ledger_entries': True}
+        
+        # Dave has no part in Bob's debt to Alice and does not manage the flat
+        response = self.client.post(url, body, content_type='application/json', **self.auth(self.dave))
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(LedgerEntry.objects.exists())
+        
+        # Alice owns the flat; a second post of the same balances writes nothing
+        first = self.client.post(url, body, content_type='application/json', **self.auth(self.alice))
+        self.assertEqual(first.status_code, 201)
+        again = self.client.post(url, body, content_type='application/json', **self.auth(self.bob))
+        self.assertEqual(again.status_code, 409)
+        self.assertEqual(again.json()['settlement_id'], first.json()['settlement_id'])
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+        
+        # Once the entry is cancelled the transfer can be recorded again
+        LedgerEntry.objects.update(status='cancelled')
+        response = self.client.post(url, body, content_type='application/json', **self.auth(self.bob))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(LedgerEntry.objects.filter(status='pending').count(), 1)
+    
+    def test_endpoint_rejects_foreign_groups(self):
+        url = '/api/fairness/global_settlement/'
+        response = self.client.post(url, {'group_ids': [self.home.id, self.other.id]}, content_type='application/json',
+                                    **self.auth(self.bob))
+        self.assertEqual(response.status_code, 403)
+        for group_ids in ('all', [True], [self.home.id, False]):
+            response = self.client.post(url, {'group_ids': group_ids}, content_type='application/json',
+                                        **self.auth(self.bob))
+            self.assertEqual(response.status_code, 400)
+
+
+class PolicyEngineTest(SettlementFixtureMixin, TestCase):
+    def test_allocate_is_exact(self):
+        self.assertEqual(allocate(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(allocate(7, [0, 5, 2]), [0, 5, 2])
+        self.assertEqual(allocate(10, [3, 3]), [5, 5])
+    
+    def test_policies_net_to_zero_paise(self):
+        """Property: over random groups, every policy nets to zero and leaves creditors alone"""
+        rng = random.Random(7)
+        for _ in range(200):
+            size = rng.randint(1, 12)
+            members = [
+                GroupMember(
+                    user_id=user_id,
+                    share_factor=Decimal(rng.randint(0, 300)) / 100,
+                    income_bracket=rng.choice(['low', 'medium', 'high']),
+                )
+                for user_id in range(1, size + 1)
+            ]
+            # Some balances belong to users who left the group, and inputs need not net to zero
+            balances = {
+                user_id: Decimal(rng.randint(-100000, 100000)) / rng.choice([100, 300])
+                for user_id in rng.sample(range(1, size + 3), rng.randint(1, size + 2))
+            }
+            parameters = {'bracket_weights': {'low': str(Decimal(rng.randint(0, 100)) / 100)}}
+            
+            for policy_type in POLICIES:
+                result = get_policy(policy_type, parameters).apply(balances, members)
+                self.assertEqual(set(result), set(balances))
+                if any(amount < 0 for amount in result.values()):
+                    self.assertEqual(sum(result.values()), 0)
+                for user_id, amount in result.items():
+                    self.assertEqual(amount, amount.quantize(Decimal('0.01')))
+                    if balances[user_id] > 0:
+                        self.assertEqual(amount, balances[user_id].quantize(Decimal('0.01')))
+                    else:
+                        self.assertLessEqual(amount, 0)
+    
+    def test_income_based_reads_group_parameters(self):
+        low = self.group.members.get(user=self.user3)
+        low.income_bracket = 'low'
+        low.save()
+        self.user4 = User.objects.create_user(username='user4', email='user4@test.com')
+        GroupMember.objects.create(group=self.group, user=self.user4, role='member', income_bracket='high')
+        balances = {self.user1.id: Decimal('100.00'), self.user3.id: Decimal('-50.00'),
+                    self.user4.id: Decimal('-50.00')}
+        
+        service = SettlementService(self.group)
+        FairnessPolicy.objects.create(group=self.group, policy_type='income_based', created_by=self.user1,
+                                      parameters={'bracket_weights': {'low': '0.25'}})
+        settlement = service.settle(balances, 'income_based', service.policy_parameters('income_based'))
+        
+        self.assertEqual(settlement['member_balances'],
+                         {str(self.user1.id): 100.0, str(self.user3.id): -20.0, str(self.user4.id): -80.0})
+        self.assertEqual(sum(t['amount'] for t in settlement['transactions']), Decimal('100.00'))
+    
+    def test_invalid_policy_parameters_answer_400(self):
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user1).access_token}'}
+        response = self.client.post('/api/groups/policies/', {
+            'group': self.group.id, 'policy_type': 'custom_share',
+            'parameters': {'share_factors': {str(self.user2.id): 'abc'}},
+        }, content_type='application/json', **auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['parameters'], {f'share_factors.{self.user2.id}': 'must be a number'})
+        
+        # A policy stored before validation existed fails the settlement with the key, not a 500
+        FairnessPolicy.objects.create(group=self.group, policy_type='income_based', created_by=self.user1,
+                                      parameters={'bracket_weights': {'low': 'NaN'}})
+        base = f'/api/fairness/groups/{self.group.id}'
+        for url in [f'{base}/compute_settlement/', f'{base}/compute_settlement/async/']:
+            response = self.client.post(url, {'policy_type': 'income_based'}, content_type='application/json',
+                                        **auth)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['parameter'], 'bracket_weights.low')
+        for url in [f'{base}/simulate/', f'{base}/simulate/async/']:
+            response = self.client.post(url, {}, content_type='application/json', **auth)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['parameter'], 'bracket_weights.low')
+    
+    def test_settlement_settles_every_paisa(self):
+        # The fixture's thirds round so that balances miss zero by a paisa
+        for policy_type in POLICIES:
+            settlement = SettlementService(self.group).compute_settlement(policy_type)
+            credit = sum(Decimal(str(amount)) for amount in settlement['member_balances'].values() if amount > 0)
+            self.assertEqual(sum(t['amount'] for t in settlement['transactions']), credit)
+            self.assertEqual(sum(Decimal(str(amount)) for amount in settlement['member_balances'].values()), 0)
+
+
+class SimulationTest(SettlementFixtureMixin, TestCase):
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    
+    def test_simulate_compares_policies(self):
+        member = self.group.members.get(user=self.user3)
+        member.income_bracket = 'low'
+        member.save()
+        FairnessPolicy.objects.create(group=self.group, policy_type='income_based', created_by=self.user1,
+                                      parameters={'bracket_weights': {'low': '0.5'}})
+        url = f'/api/fairness/groups/{self.group.id}/simulate/'
+        
+        with self.assertNumQueries(7):
+            # User, group, membership, members, two balance aggregates, policy parameters
+            response = self.client.post(url, {}, content_type='application/json', **self.auth(self.user2))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([(run['policy_type'], run['solver']) for run in data['simulations']],
+                         [(policy_type, solver) for policy_type in POLICIES for solver in SOLVERS])
+        
+        for run in data['simulations']:
+            self.assertEqual(sum(Decimal(str(amount)) for amount in run['member_balances'].values()), 0)
+            for user_id, delta in run['member_deltas'].items():
+                self.assertEqual(Decimal(data['base_balances'][user_id]) + Decimal(delta),
+                                 Decimal(run['member_balances'][user_id]))
+            # Each run matches a plain compute_settlement with the same policy and solver
+            settlement = self.client.post(f'/api/fairness/groups/{self.group.id}/compute_settlement/',
+                                          {'policy_type': run['policy_type'], 'solver': run['solver']},
+                                          content_type='application/json', **self.auth(self.user2)).json()
+            self.assertEqual(run['transaction_count'], settlement['transaction_count'])
+            self.assertEqual(run['member_balances'], settlement['member_balances'])
+        
+        native = self.client.post(f'{url}async/', {}, content_type='application/json', **self.auth(self.user2))
+        self.assertEqual(native.status_code, 200)
+        self.assertEqual(native.json(), data)
+    
+    def test_simulate_options(self):
+        url = f'/api/fairness/groups/{self.group.id}/simulate/'
+        response = self.client.post(url, {'policies': ['custom_share', 'custom_share'], 'solvers': ['greedy']},
+                                    content_type='application/json', **self.auth(self.user1))
+        self.assertEqual([run['policy_type'] for run in response.json()['simulations']], ['custom_share'])
+        
+        for body in [{'policies': ['bogus']}, {'policies': []}, {'solvers': 'greedy'}, {'solvers': ['ilp']}]:
+            response = self.client.post(url, body, content_type='application/json', **self.auth(self.user1))
+            self.assertEqual(response.status_code, 400)
+        
+        outsider = User.objects.create_user(username='outsider', email='outsider@test.com')
+        self.assertEqual(self.client.post(url, **self.auth(outsider)).status_code, 403)
+
+
+class PaymentRoutingTest(SettlementFixtureMixin, TestCase):
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    
+    def transfers(self, transactions):
+        return [(t['from_member'], t['to_member'], t['amount'], t['fee']) for t in transactions]
+    
+    def test_fees_are_minimised_then_money_moved(self):
+        balances = {1: Decimal('-100.00'), 3: Decimal('60.00'), 4: Decimal('40.00')}
+        # Without fees nobody relays
+        self.assertEqual(self.transfers(min_cost_flow(balances, routes=PaymentRoutes({}, [1, 2, 3, 4]))),
+                         [(1, 3, Decimal('60.00'), 0), (1, 4, Decimal('40.00'), 0)])
+        
+        # Member 1 pays 2% except to member 2, who pays for free
+        config = {'members': {'1': {'fee_percent': '2'}}, 'routes': [{'from': 1, 'to': 2, 'fee_percent': '0'}]}
+        self.assertEqual(self.transfers(min_cost_flow(balances, routes=PaymentRoutes(config, [1, 2, 3, 4]))),
+                         [(1, 2, Decimal('100.00'), 0), (2, 3, Decimal('60.00'), 0), (2, 4, Decimal('40.00'), 0)])
+        # Member 2 can only relay as a member of the group
+        self.assertEqual(self.transfers(min_cost_flow(balances, routes=PaymentRoutes(config))),
+                         [(1, 3, Decimal('60.00'), Decimal('1.20')), (1, 4, Decimal('40.00'), Decimal('0.80'))])
+    
+    def test_fees_then_fewest_transfers(self):
+        # Every settlement without relays moves 16.00, so money moved cannot tell three transfers from four
+        balances = {1: Decimal('-10.00'), 2: Decimal('-6.00'), 3: Decimal('6.00'), 4: Decimal('4.00'),
+                     5: Decimal('6.00')}
+        self.assertEqual(self.transfers(min_cost_flow(balances)),
+                         [(1, 5, Decimal('6.00'), 0), (2, 3, Decimal('6.00'), 0), (1, 4, Decimal('4.00'), 0)])
+        # The exact match takes the free route
+        config = {'routes': [{'from': 2, 'to': 3, 'fee_percent': '1'}]}
+        self.assertEqual(self.transfers(min_cost_flow(balances, routes=PaymentRoutes(config))),
+                         [(1, 3, Decimal('6.00'), 0), (2, 5, Decimal('6.00'), 0), (1, 4, Decimal('4.00'), 0)])
+        # Fees still come first: a cheaper settlement with more transfers wins over an exact match
+        config = {'default_fee_percent': '1', 'members': {'1': {'fee_percent': '0'}},
+                  'routes': [{'from': 3, 'to': 2, 'fee_percent': '0'}]}
+        balances = {1: Decimal('-10.00'), 2: Decimal('10.00'), 3: Decimal('-5.00'), 4: Decimal('5.00')}
+        self.assertEqual(self.transfers(min_cost_flow(balances, routes=PaymentRoutes(config))),
+                         [(1, 2, Decimal('5.00'), 0), (1, 4, Decimal('5.00'), 0), (3, 2, Decimal('5.00'), 0)])
+    
+    def test_unfeasible_routes_fall_back_to_greedy(self):
+        balances = {1: Decimal('-100.00'), 2: Decimal('100.00')}
+        routes = PaymentRoutes({'default_fee_percent': '1', 'members': {'1': {'pays': []}}})
+        with self.assertLogs('fairness.services', 'WARNING'):
+            transactions = min_cost_netting(balances, 'INR', routes)
+        self.assertEqual(self.transfers(transactions), [(1, 2, Decimal('100.00'), Decimal('1.00'))])
+        self.assertIn('outside the payment routes', transactions[0]['explanation'])
+    
+    def test_invalid_routes_answer_400(self):
+        bad = {
+            'members': {'x': {'pays': [1]}},
+            'default_fee_percent': 'abc',
+            'routes': [{'from': 1}],
+        }
+        for key, value in bad.items():
+            response = self.client.patch(f'/api/groups/groups/{self.group.id}/',
+                                         {'settings': {'payment_routes': {key: value}}},
+                                         content_type='application/json', **self.auth(self.user1))
+            self.assertEqual(response.status_code, 400, key)
+            self.assertEqual(len(response.json()['settings']), 1)
+        with self.assertRaises(PaymentRoutesError) as raised:
+            PaymentRoutes({'members': {'1': {'pays': 5}}})
+        self.assertEqual(raised.exception.key, 'payment_routes.members.1.pays')
+        
+        # Settings stored before validation only fail the solver that reads them
+        Group.objects.filter(id=self.group.id).update(settings={'payment_routes': {'members': {'x': {}}}})
+        base = f'/api/fairness/groups/{self.group.id}'
+        for suffix in ('', 'async/'):
+            greedy = self.client.post(f'{base}/compute_settlement/{suffix}', {'policy_type': 'equal_split'},
+                                      content_type='application/json', **self.auth(self.user1))
+            self.assertEqual(greedy.status_code, 200)
+            graph = self.client.get(f'{base}/settlement_graph/{suffix}', **self.auth(self.user1))
+            self.assertEqual(graph.status_code, 200)
+            for url in (f'{base}/compute_settlement/{suffix}', f'{base}/simulate/{suffix}'):
+                response = self.client.post(url, {'policy_type': 'equal_split', 'solver': 'min_cost_flow'},
+                                            content_type='application/json', **self.auth(self.user1))
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['parameter'], 'payment_routes.members.x')
+        
+        # Snapshots hold greedy settlements, so the group still gets one
+        SettlementSnapshot.objects.all().delete()
+        self.assertEqual(precompute_settlements(workers=1)['groups'], 1)
+    
+    def test_compute_settlement_with_routes(self):
+        # user3 owes both others but can only pay user2
+        self.group.settings = {'payment_routes': {'members': {str(self.user3.id): {'pays': [self.user2.id]}}}}
+        self.group.save()
+        url = f'/api/fairness/groups/{self.group.id}/compute_settlement/'
+        body = {'policy_type': 'equal_split', 'solver': 'min_cost_flow'}
+        
+        response = self.client.post(url, body, content_type='application/json', **self.auth(self.user1))
+        self.assertEqual(response.status_code, 200)
+        settlement = response.json()
+        self.assertEqual(settlement['solver'], 'min_cost_flow')
+        self.assertEqual([(t['from_member'], t['to_member']) for t in settlement['transactions']],
+                         [(self.user3.id, self.user2.id), (self.user2.id, self.user1.id)])
+        self.assertEqual(settlement['total_fees'], '0.00')
+        
+        # Kept next to the greedy settlement, and served from the snapshot
+        snapshot = SettlementSnapshot.objects.get(group=self.group)
+        self.assertEqual(list(snapshot.settlements), ['equal_split/min_cost_flow'])
+        native = self.client.post(f'{url}async/', body, content_type='application/json', **self.auth(self.user1))
+        self.assertEqual(native.json(), settlement)
+        greedy = self.client.post(url, {'policy_type': 'equal_split'}, content_type='application/json',
+                                  **self.auth(self.user1)).json()
+        self.assertEqual(greedy['solver'], 'greedy')
+        self.assertEqual(greedy['transaction_count'], 2)
+        
+        for path in (url, f'{url}async/'):
+            response = self.client.post(path, {'solver': 'ilp'}, content_type='application/json',
+                                        **self.auth(self.user1))
+            self.assertEqual(response.status_code, 400)
+
+
+class MultiCurrencySettlementTest(SettlementFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as rates:
+            rates.write('date,currency,rate\n2020-01-01,USD,83.2157\n2020-01-01,EUR,91.0311\n')
+        self.addCleanup(os.remove, path)
+        override = override_settings(FX_RATES_FILE=path, FX_BASE_CURRENCY='INR')
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        # A dinner abroad paid by user3, split three ways in dollars
+        dinner = Expense.objects.create(group=self.group, payer=self.user3, amount_subtotal=Decimal('100.00'),
+                                        currency='USD', vendor='Diner', category='food', date=timezone.now())
+        for user, share in zip([self.user1, self.user2, self.user3], ['33.34', '33.33', '33.33']):
+            ExpenseSplit.objects.create(expense=dinner, member=user, amount_owed=Decimal(share), split_type='equal')
+    
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    
+    def test_balances_are_converted_to_group_currency(self):
+        service = SettlementService(self.group)
+        balances = service.compute_net_balances()
+        
+        rate = Decimal('83.2157')
+        self.assertEqual(balances[self.user3.id], (Decimal('-196.67') + Decimal('66.67') * rate).quantize(Decimal('0.01')))
+        self.assertEqual(balances, SettlementService.group_balances(self.group.id))
+        
+        report = service.fx_report()
+        self.assertEqual((report['currency'], report['converted_currencies']), ('INR', ['USD']))
+        # Each member's total is rounded once
+        self.assertLessEqual(abs(report['rounding_drift']), 0.005 * len(balances))
+    
+    def test_settlement_reports_conversion(self):
+        url = f'/api/fairness/groups/{self.group.id}/compute_settlement/'
+        settlement = self.client.post(url, {}, content_type='application/json', **self.auth(self.user1)).json()
+        self.assertEqual(settlement['fx']['converted_currencies'], ['USD'])
+        self.assertTrue(all(t['explanation'].startswith('Debt settlement of ₹') for t in settlement['transactions']))
+        
+        native = self.client.post(f'{url}async/', {}, content_type='application/json', **self.auth(self.user1))
+        self.assertEqual(native.json(), settlement)
+    
+    def test_global_settlement_converts_each_group(self):
+        trip = Group.objects.create(name='Trip', owner=self.user1, currency='EUR')
+        for user in [self.user1, self.user2]:
+            GroupMember.objects.create(group=trip, user=user)
+        ExpenseService.create_with_equal_splits(group=trip, payer=self.user2, amount_subtotal=Decimal('10.00'),
+                                                currency='EUR', date=timezone.now())
+        
+        result = GlobalSettlementService([self.group.id, trip.id]).compute()
+        self.assertEqual(result['currency'], 'INR')
+        balances = GlobalSettlementService([trip.id]).group_balances()[trip.id]
+        self.assertEqual(balances[self.user2.id], (Decimal('5.00') * Decimal('91.0311')).quantize(Decimal('0.01')))
+
+
+class SettlementSnapshotTest(SettlementFixtureMixin, TestCase):
+    def setUp(self):
+        with self.commit():
+            super().setUp()
+    
+    @contextmanager
+    def commit(self):
+        """A transaction whose on_commit callbacks run, so each one moves the group's version"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                yield
+    
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    
+    def responses(self):
+        base = f'/api/fairness/groups/{self.group.id}'
+        responses = {}
+        for suffix in ('', 'async/'):
+            for policy in POLICIES:
+                responses[policy, suffix] = self.client.post(
+                    f'{base}/compute_settlement/{suffix}', {'policy_type': policy},
+                    content_type='application/json', **self.auth(self.user1)
+                ).json()
+            responses['graph', suffix] = self.client.get(f'{base}/settlement_graph/{suffix}', **self.auth(self.user1)).json()
+        return responses
+    
+    def test_snapshots_are_served_until_the_group_changes(self):
+        live = self.responses()
+        # The endpoints keep what they computed
+        self.assertEqual(stale_group_ids(), [])
+        SettlementSnapshot.objects.all().delete()
+        self.assertEqual(stale_group_ids(), [self.group.id])
+        
+        report = precompute_settlements(workers=1)
+        self.assertEqual((report['groups'], report['workers']), (1, 1))
+        self.assertEqual(stale_group_ids(), [])
+        self.assertEqual(precompute_settlements(workers=1)['groups'], 0)
+        
+        url = f'/api/fairness/groups/{self.group.id}/compute_settlement/'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'policy_type': 'income_based'}, content_type='application/json',
+                                        **self.auth(self.user1))
+        self.assertEqual(response.json(), live['income_based', ''])
+        # Authentication, the group with its snapshot and the membership check
+        self.assertLessEqual(len(queries), 3)
+        self.assertEqual(self.responses(), live)
+        
+        # A new parameter set for a policy makes the snapshot stale, like any write to the group
+        with self.commit():
+            FairnessPolicy.objects.create(group=self.group, policy_type='income_based', created_by=self.user1,
+                                          parameters={'bracket_weights': {'medium': '3'}})
+        self.assertEqual(stale_group_ids(), [self.group.id])
+        with self.commit():
+            ExpenseService.create_with_equal_splits(
+                group=self.group, payer=self.user3, amount_subtotal=Decimal('90.00'), vendor='Late', category='food',
+                date=timezone.now()
+            )
+        graph = self.client.get(f'/api/fairness/groups/{self.group.id}/settlement_graph/', **self.auth(self.user1))
+        self.assertEqual(graph.json()['member_balances'][str(self.user3.id)], '-136.67')
+        
+        precompute_settlements(workers=1)
+        previous, latest = SettlementSnapshot.objects.filter(group=self.group).order_by('version')
+        self.assertIsNone(previous.graph)
+        self.assertEqual(len(previous.balances), 3)
+        self.assertIsNotNone(latest.graph)
+    
+    def test_invalid_policy_parameters_skip_the_snapshot(self):
+        with self.commit():
+            FairnessPolicy.objects.create(group=self.group, policy_type='custom_share', created_by=self.user1,
+                                          parameters={'share_factors': {str(self.user2.id): 'two'}})
+        SettlementSnapshot.objects.all().delete()
+        with self.assertLogs('fairness.snapshots', 'WARNING'):
+            self.assertEqual(precompute_settlements(workers=1)['groups'], 0)
+        self.assertEqual(stale_group_ids(), [self.group.id])
+    
+    def test_command_reports_throughput(self):
+        out = io.StringIO()
+        call_command('precompute_settlements', '--workers', '1', stdout=out)
+        self.assertIn('Precomputed 1 groups', out.getvalue())
+        self.assertIn('groups/s', out.getvalue())
+        
+        out = io.StringIO()
+        call_command('precompute_settlements', '--workers', '1', '--all', stdout=out)
+        self.assertIn('Precomputed 1 groups', out.getvalue())
+
+
+class SettlementSnapshotDiffTest(SettlementSnapshotTest):
+    def settle(self, policy='equal_split'):
+        return self.client.post(f'/api/fairness/groups/{self.group.id}/compute_settlement/', {'policy_type': policy},
+                                content_type='application/json', **self.auth(self.user1))
+    
+    def test_live_settlements_are_kept_compactly(self):
+        settlement = self.settle().json()
+        snapshot = SettlementSnapshot.objects.get(group=self.group)
+        self.assertEqual(snapshot.member_ids, sorted([self.user1.id, self.user2.id, self.user3.id]))
+        self.assertEqual(dict(zip(snapshot.member_ids, snapshot.balances)), {
+            self.user1.id: 15733, self.user2.id: 3933, self.user3.id: -19667,
+        })
+        self.assertEqual(
+            snapshot.transfers,
+            [value for t in settlement['transactions'] for value in (t['from_member'], t['to_member'], to_paise(t['amount']))]
+        )
+        self.assertEqual(list(snapshot.settlements), ['equal_split'])
+        
+        # Another policy at the same version joins the snapshot
+        self.settle('income_based')
+        self.assertEqual(sorted(SettlementSnapshot.objects.get(group=self.group).settlements),
+                         ['equal_split', 'income_based'])
+    
+    def test_diff_endpoint(self):
+        self.settle()
+        with self.commit():
+            ExpenseService.create_with_equal_splits(
+                group=self.group, payer=self.user3, amount_subtotal=Decimal('300.00'), vendor='Rent', category='rent',
+                date=timezone.now()
+            )
+        self.settle()
+        before, after = SettlementSnapshot.objects.filter(group=self.group).order_by('version')
+        
+        url = f'/api/fairness/groups/{self.group.id}/snapshots/'
+        listed = self.client.get(url, **self.auth(self.user2)).json()['snapshots']
+        self.assertEqual([row['version'] for row in listed], [after.version, before.version])
+        self.assertEqual(listed[1]['total_settlement_amount'], '196.66')
+        
+        diff = self.client.get(f'{url}diff/', **self.auth(self.user2)).json()
+        self.assertEqual((diff['from_version'], diff['to_version']), (before.version, after.version))
+        self.assertEqual(
+            {row['member']: row['change'] for row in diff['balances']},
+            {self.user1.id: '-100.00', self.user2.id: '-100.00', self.user3.id: '200.00'}
+        )
+        self.assertEqual(diff['removed_transfers'], [
+            {'from_member': self.user3.id, 'to_member': self.user1.id, 'amount': '157.33'},
+            {'from_member': self.user3.id, 'to_member': self.user2.id, 'amount': '39.33'},
+        ])
+        self.assertEqual(diff['added_transfers'], [
+            {'from_member': self.user2.id, 'to_member': self.user1.id, 'amount': '57.33'},
+            {'from_member': self.user2.id, 'to_member': self.user3.id, 'amount': '3.33'},
+        ])
+        
+        # Explicit versions, either way round
+        reverse = self.client.get(f'{url}diff/?from={after.version}&to={before.version}', **self.auth(self.user2))
+        self.assertEqual(reverse.json()['added_transfers'], diff['removed_transfers'])
+        
+        self.assertEqual(self.client.get(f'{url}diff/?from=x', **self.auth(self.user2)).status_code, 400)
+        self.assertEqual(self.client.get(f'{url}diff/?to={before.version}', **self.auth(self.user2)).status_code, 404)
+        outsider = User.objects.create_user(username='outsider', email='outsider@test.com')
+        self.assertEqual(self.client.get(f'{url}diff/', **self.auth(outsider)).status_code, 403)
+    
+    def test_diff_merges_members_and_transfer_multisets(self):
+        before = SettlementSnapshot(group_id=self.group.id, version=1, member_ids=[1, 3, 5], balances=[500, 0, -500],
+                                    transfers=[5, 1, 250, 5, 1, 250])
+        after = SettlementSnapshot(group_id=self.group.id, version=2, member_ids=[1, 4, 5], balances=[500, -100, -400],
+                                   transfers=[5, 1, 250, 5, 1, 150, 4, 1, 100])
+        diff = diff_snapshots(before, after)
+        self.assertEqual(diff['balances'], [
+            {'member': 4, 'before': 0.0, 'after': -1.0, 'change': -1.0},
+            {'member': 5, 'before': -5.0, 'after': -4.0, 'change': 1.0},
+        ])
+        self.assertEqual(diff['removed_transfers'], [{'from_member': 5, 'to_member': 1, 'amount': 2.5}])
+        self.assertEqual([t['amount'] for t in diff['added_transfers']], [1.5, 1.0])
+        self.assertEqual(diff['unchanged_transfer_count'], 1)
+
+
+class ProvenanceTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=name, email=f'{name}@test.com') for name in ('a', 'b', 'c')]
+        self.group = Group.objects.create(name='Trip', owner=self.users[0])
+        for user in self.users:
+            GroupMember.objects.create(group=self.group, user=user)
+        start = timezone.now() - timezone.timedelta(days=10)
+        # a pays 300 for everyone, then b pays 90 for everyone
+        self.hotel = ExpenseService.create_with_equal_splits(
+            group=self.group, payer=self.users[0], amount_subtotal=Decimal('300.00'), vendor='Hotel',
+            category='travel', date=start
+        )
+        self.dinner = ExpenseService.create_with_equal_splits(
+            group=self.group, payer=self.users[1], amount_subtotal=Decimal('90.00'), vendor='Dinner',
+            category='food', date=start + timezone.timedelta(days=1)
+        )
+    
+    def test_lots_pay_off_the_oldest_first_and_stay_bounded(self):
+        lots = Lots(max_lots=2)
+        for expense_id in (1, 2, 3):
+            lots.add(expense_id, Decimal('-10'))
+        self.assertEqual(list(lots.lots), [[None, 2, Decimal('-20')], [3, 1, Decimal('-10')]])
+        lots.add(4, Decimal('25'))
+        self.assertEqual(list(lots.lots), [[3, 1, Decimal('-5')]])
+        lots.add(5, Decimal('15'))
+        self.assertEqual((list(lots.lots), lots.total), ([[5, 1, Decimal('10')]], Decimal('10')))
+    
+    def test_transfers_are_attributed_to_outstanding_expenses(self):
+        a, b, c = (user.id for user in self.users)
+        explained = explain(self.group.id, 'INR')
+        summary = [
+            (t['from_member'], t['to_member'], t['amount'],
+             [(e['vendor'], e['amount']) for e in t['debtor_expenses']],
+             [(e['vendor'], e['amount']) for e in t['creditor_expenses']])
+            for t in explained
+        ]
+        # b's dinner paid off part of b's hotel share and part of what a was owed for it
+        self.assertEqual(summary, [
+            (c, a, 130.0, [('Hotel', 100.0), ('Dinner', 30.0)], [('Hotel', 130.0)]),
+            (b, a, 40.0, [('Hotel', 40.0)], [('Hotel', 40.0)]),
+        ])
+    
+    def test_explain_endpoint(self):
+        a, b, c = self.users
+        client = APIClient()
+        client.force_authenticate(user=b)
+        url = f'/api/fairness/groups/{self.group.id}/explain/'
+        
+        response = client.get(url, {'from_member': c.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t['to_member'] for t in response.data['transfers']], [a.id])
+        self.assertEqual(response.data['transfers'][0]['debtor_expenses'][0]['expense_id'], self.hotel.id)
+        
+        # Once the graph has been served, its transfers are the ones explained
+        graph = client.get(f'/api/fairness/groups/{self.group.id}/settlement_graph/').data
+        explained = client.get(url).data['transfers']
+        self.assertEqual(
+            [(t['from_member'], t['to_member'], t['amount']) for t in explained],
+            [(edge['from'], edge['to'], float(edge['amount'])) for edge in graph['graph']['edges']]
+        )
+        
+        self.assertEqual(client.get(url, {'to_member': 'x'}).status_code, 400)
+        outsider = User.objects.create_user(username='outsider', email='outsider@test.com')
+        client.force_authenticate(user=outsider)
+        self.assertEqual(client.get(url).status_code, 403)
+
@@ -1,7 +1,20 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('groups/<int:group_id>/compute_settlement/', views.compute_settlement, name='compute-settlement'),
     path('groups/<int:group_id>/settlement_graph/', views.get_settlement_graph, name='settlement-graph'),
+    path('groups/<int:group_id>/simulate/', views.simulate_settlement, name='simulate-settlement'),
+    path('groups/<int:group_id>/explain/', views.explain_settlement, name='settlement-explain'),
+    path('groups/<int:group_id>/snapshots/', views.settlement_snapshots, name='settlement-snapshots'),
+    path('groups/<int:group_id>/snapshots/diff/', views.settlement_snapshot_diff, name='settlement-snapshot-diff'),
+    path('global_settlement/', views.global_settlement, name='global-settlement'),
+    
+    # Native async variants, for ASGI deployments
+    path('groups/<int:group_id>/compute_settlement/async/', async_views.compute_settlement,
+         name='compute-settlement-async'),
+    path('groups/<int:group_id>/settlement_graph/async/', async_views.get_settlement_graph,
+         name='settlement-graph-async'),
+    path('groups/<int:group_id>/simulate/async/', async_views.simulate_settlement,
+         name='simulate-settlement-async'),
 ]
\ No newline at end of file
@@ -2,19 +2,45 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from decimal import Decimal
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
-from groups.models import Group
-from .services import SettlementService
+from django.views.decorators.http import condition
+from groups.models import Group, GroupMember
+from shared_finance.async_utils import cpu_executor
+from sync.conditional import member_group_etag
+from .policies import CENT, POLICIES, PolicyParameterError
+from .provenance import explain
+from .routing import PaymentRoutesError
+from .services import (
+    SOLVERS, GlobalSettlementService, SettlementAlreadyRecorded, SettlementService, transfer_groups
+)
+from .models import SettlementSnapshot
+from .snapshots import diff_snapshots, save_snapshot, settlement_key, snapshot_summary, with_snapshot
+
+VALID_POLICIES = list(POLICIES)
+# Roles that may write ledger entries between other members of a group
+LEDGER_ROLES = {'owner', 'treasurer'}
+
+
+def settlement_groups(user, snapshot: str):
+    """
+    Groups with ``snapshot`` (that field of the current snapshot), their
+    version and whether ``user`` is an active member, read in one query
+    """
+    return with_snapshot(Group.objects.all(), snapshot).annotate(
+        is_member=Exists(GroupMember.objects.filter(group_id=OuterRef('pk'), user=user, is_active=True))
+    )
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def compute_settlement(request, group_id):
-    """Compute settlement for a group"""
-    group = get_object_or_404(Group, id=group_id)
+    """Compute settlement for a group, or serve the snapshot if the group has not changed since"""
+    group = get_object_or_404(settlement_groups(request.user, 'settlements'), id=group_id)
     
     # Check if user is a member of the group
-    if not group.members.filter(user=request.user, is_active=True).exists():
+    if not group.is_member:
         return Response(
             {'error': 'You are not a member of this group'},
             status=status.HTTP_403_FORBIDDEN
@@ -23,19 +49,38 @@ def compute_settlement(request, group_id):
     policy_type = request.data.get('policy_type', 'equal_split')
     
     # Validate policy type
-    valid_policies = ['equal_split', 'income_based', 'custom_share', 'proportional']
-    if policy_type not in valid_policies:
+    if policy_type not in VALID_POLICIES:
+        return Response(
+            {'error': f'Invalid policy type. Must be one of: {VALID_POLICIES}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    solver = request.data.get('solver', 'greedy')
+    if solver not in SOLVERS:
         return Response(
-            {'error': f'Invalid policy type. Must be one of: {valid_policies}'},
+            {'error': f'Invalid solver. Must be one of: {list(SOLVERS)}'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    key = settlement_key(policy_type, solver)
+    if group.snapshot and key in group.snapshot:
+        return Response(group.snapshot[key])
+    
     try:
         settlement_service = SettlementService(group)
-        settlement = settlement_service.compute_settlement(policy_type)
+        balances = settlement_service.aggregate_net_balances()
+        settlement = settlement_service.settle(
+            balances, policy_type, settlement_service.policy_parameters(policy_type), solver
+        )
+        save_snapshot(
+            group, settlement_service.settlement_graph(balances), {**(group.snapshot or {}), key: settlement}
+        )
         
         return Response(settlement)
     
+    except INVALID_SETTINGS as e:
+        return Response(settings_error(e), status=status.HTTP_400_BAD_REQUEST)
+    
     except Exception as e:
         return Response(
             {'error': f'Error computing settlement: {str(e)}'},
@@ -45,35 +90,243 @@ def compute_settlement(request, group_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=member_group_etag)
 def get_settlement_graph(request, group_id):
-    """Get settlement graph for a group"""
-    group = get_object_or_404(Group, id=group_id)
+    """Get settlement graph for a group, from the snapshot if the group has not changed since"""
+    group = get_object_or_404(settlement_groups(request.user, 'graph'), id=group_id)
     
     # Check if user is a member of the group
-    if not group.members.filter(user=request.user, is_active=True).exists():
+    if not group.is_member:
         return Response(
             {'error': 'You are not a member of this group'},
             status=status.HTTP_403_FORBIDDEN
         )
     
+    if group.snapshot is not None:
+        return Response(group.snapshot)
+    
     try:
         settlement_service = SettlementService(group)
-        balances = settlement_service.compute_net_balances()
-        transactions = settlement_service.greedy_netting(balances)
-        graph = settlement_service.create_settlement_graph(transactions)
-        
-        return Response({
-            'group_id': group.id,
-            'group_name': group.name,
-            'graph': graph,
-            'member_balances': {
-                str(user_id): float(amount) 
-                for user_id, amount in balances.items()
-            }
-        })
+        balances = settlement_service.aggregate_net_balances()
+        graph = settlement_service.settlement_graph(balances)
+        save_snapshot(group, graph)
+        return Response(graph)
     
     except Exception as e:
         return Response(
             {'error': f'Error generating settlement graph: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@condition(etag_func=member_group_etag)
+def explain_settlement(request, group_id):
+    """
+    The expenses behind each transfer of the group's settlement graph, apart
+    from the settlement itself to keep that small. ``?from_member=`` and
+    ``?to_member=`` narrow the transfers returned.
+    """
+    group = get_object_or_404(settlement_groups(request.user, 'transfers'), id=group_id)
+    
+    if not group.is_member:
+        return Response(
+            {'error': 'You are not a member of this group'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    members = {}
+    for field in ('from_member', 'to_member'):
+        value = request.query_params.get(field)
+        if value is not None and not value.isdigit():
+            return Response({'error': f'{field} must be a user id'}, status=status.HTTP_400_BAD_REQUEST)
+        members[field] = int(value) if value is not None else None
+    
+    # Explain the transfers the graph endpoint served, if the group has not changed since
+    transfers = None
+    if group.snapshot is not None:
+        transfers = [
+            (from_member, to_member, Decimal(paise) * CENT)
+            for from_member, to_member, paise in zip(group.snapshot[0::3], group.snapshot[1::3], group.snapshot[2::3])
+        ]
+    explained = [
+        transfer for transfer in explain(group.id, group.currency, transfers)
+        if all(value is None or transfer[field] == value for field, value in members.items())
+    ]
+    return Response({'group_id': group.id, 'currency': group.currency, 'transfers': explained})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def settlement_snapshots(request, group_id):
+    """The group's settlement snapshots, newest first"""
+    group = get_object_or_404(Group, id=group_id)
+    
+    if not group.members.filter(user=request.user, is_active=True).exists():
+        return Response(
+            {'error': 'You are not a member of this group'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    snapshots = SettlementSnapshot.objects.filter(group=group).only(
+        'group_id', 'version', 'computed_at', 'currency', 'member_ids', 'transfers'
+    )[:50]
+    return Response({'group_id': group.id, 'snapshots': [snapshot_summary(snapshot) for snapshot in snapshots]})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def settlement_snapshot_diff(request, group_id):
+    """
+    What changed between two settlement snapshots, ``?from=<version>`` and
+    ``?to=<version>``: by default the latest against the one before it
+    """
+    group = get_object_or_404(Group, id=group_id)
+    
+    if not group.members.filter(user=request.user, is_active=True).exists():
+        return Response(
+            {'error': 'You are not a member of this group'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    versions = {}
+    for field in ('from', 'to'):
+        value = request.query_params.get(field)
+        if value is not None and not value.isdigit():
+            return Response({'error': f'{field} must be a snapshot version'}, status=status.HTTP_400_BAD_REQUEST)
+        versions[field] = int(value) if value is not None else None
+    
+    snapshots = SettlementSnapshot.objects.filter(group=group).only(
+        'group_id', 'version', 'computed_at', 'currency', 'member_ids', 'balances', 'transfers'
+    )
+    after = snapshots.filter(**({'version': versions['to']} if versions['to'] is not None else {})).first()
+    if after is None:
+        return Response({'error': 'Snapshot not found'}, status=status.HTTP_404_NOT_FOUND)
+    if versions['from'] is None:
+        before = snapshots.filter(version__lt=after.version).first()
+    else:
+        before = snapshots.filter(version=versions['from']).first()
+    if before is None:
+        return Response({'error': 'No earlier snapshot to compare with'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response(diff_snapshots(before, after))
+
+
+# Group settings a settlement cannot use; answered with 400 naming the bad key
+INVALID_SETTINGS = (PolicyParameterError, PaymentRoutesError)
+
+
+def settings_error(error):
+    """Body of the 400 for a FairnessPolicy weight or payment route the settlement cannot use"""
+    setting = 'payment route setting' if isinstance(error, PaymentRoutesError) else 'fairness policy parameter'
+    return {'error': f'Invalid {setting} {error.key}: {error.error}', 'parameter': error.key}
+
+
+def simulation_options(data):
+    """Requested policy types and solvers (all by default), or an error message"""
+    options = []
+    for field, known in (('policies', POLICIES), ('solvers', SOLVERS)):
+        values = data.get(field)
+        if values is None:
+            values = list(known)
+        if not isinstance(values, list) or not values or not all(value in known for value in values):
+            return None, None, f'{field} must be a non-empty list of: {list(known)}'
+        options.append(list(dict.fromkeys(values)))
+    return options[0], options[1], None
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def simulate_settlement(request, group_id):
+    """
+    Compare policies and solvers side by side on the group's current
+    balances, computed once; each policy runs in the CPU pool.
+    """
+    group = get_object_or_404(Group, id=group_id)
+    
+    if not group.members.filter(user=request.user, is_active=True).exists():
+        return Response(
+            {'error': 'You are not a member of this group'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    policy_types, solvers, error = simulation_options(request.data)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        settlement_service = SettlementService(group)
+        balances = settlement_service.aggregate_net_balances()
+        parameters = settlement_service.policy_parameter_sets(policy_types)
+        runs = list(cpu_executor().map(
+            lambda policy_type: settlement_service.simulate_policy(
+                balances, policy_type, solvers, parameters[policy_type]
+            ),
+            policy_types
+        ))
+        return Response(settlement_service.simulation(balances, runs))
+    
+    except INVALID_SETTINGS as e:
+        return Response(settings_error(e), status=status.HTTP_400_BAD_REQUEST)
+    
+    except Exception as e:
+        return Response(
+            {'error': f'Error simulating settlement: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def global_settlement(request):
+    """
+    Net the user's balances across groups with shared members. Covers all of
+    the user's groups unless ``group_ids`` narrows them; with
+    ``create_ledger_entries`` the transfers are written to the ledger: those
+    the user takes part in, and any between groups they own or keep the
+    books of. Recording the same balances twice answers 409.
+    """
+    roles = dict(
+        GroupMember.objects.filter(user=request.user, is_active=True).values_list('group_id', 'role')
+    )
+    member_of = set(roles)
+    group_ids = request.data.get('group_ids')
+    if group_ids is None:
+        group_ids = member_of
+    elif not isinstance(group_ids, list) or not all(
+        isinstance(group_id, int) and not isinstance(group_id, bool) for group_id in group_ids
+    ):
+        return Response(
+            {'error': 'group_ids must be a list of group ids'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    elif not set(group_ids) <= member_of:
+        return Response(
+            {'error': 'You are not a member of all of these groups'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    service = GlobalSettlementService(group_ids)
+    result = service.compute()
+    if request.data.get('create_ledger_entries'):
+        managed = {group_id for group_id, role in roles.items() if role in LEDGER_ROLES}
+        
+        def may_record(from_member, to_member, groups):
+            return request.user.id in (from_member, to_member) or set(groups) <= managed
+        
+        transfers = [t for component in result['components'] for t in component['transactions']]
+        if transfers and not any(may_record(t['from_member'], t['to_member'], transfer_groups(t)) for t in transfers):
+            return Response(
+                {'error': 'You can only record transfers you take part in or between groups you manage'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            result['settlement_id'] = service.record(result, created_by=request.user, may_record=may_record).id
+        except SettlementAlreadyRecorded as e:
+            return Response(
+                {'error': 'These balances are already recorded in the ledger', 'settlement_id': e.settlement_id},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(result, status=status.HTTP_201_CREATED)
+    return Response(result)
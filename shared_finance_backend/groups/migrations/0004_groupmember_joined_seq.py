@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-19 08:18
+
+from django.db import migrations, models
+
+
+def backfill_joined_seq(apps, schema_editor):
+    GroupMember = apps.get_model('groups', 'GroupMember')
+    GroupMember.objects.using(schema_editor.connection.alias).update(joined_seq=models.F('change_seq'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0003_group_change_seq_groupmember_change_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupmember',
+            name='joined_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_joined_seq, migrations.RunPython.noop),
+    ]
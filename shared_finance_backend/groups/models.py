@@ -1,11 +1,12 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from sync.models import ChangeTrackedModel
 import json
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class Group(ChangeTrackedModel):
     """Group model for expense sharing groups"""
     
     GROUP_TYPES = [
@@ -37,7 +38,7 @@ class Group(models.Model):
         db_table = 'groups_group'
 
 
-class GroupMember(models.Model):
+class GroupMember(ChangeTrackedModel):
     """Group membership model"""
     
     ROLES = [
@@ -60,6 +61,8 @@ class GroupMember(models.Model):
     income_bracket = models.CharField(max_length=20, choices=INCOME_BRACKETS, default='medium')
     joined_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    # change_seq of the save that created or reactivated the membership; sync resends the group's history past it
+    joined_seq = models.BigIntegerField(default=0, editable=False)
     
     def __str__(self):
         return f"{self.user.username} in {self.group.name} ({self.role})"
@@ -1,6 +1,19 @@
 from rest_framework import serializers
 from .models import Group, GroupMember, FairnessPolicy
 from users.serializers import UserSerializer
+from fairness.policies import POLICIES, PolicyParameterError
+from fairness.routing import PaymentRoutes, PaymentRoutesError
+
+
+def validate_group_settings(value):
+    """Group settings with their ``payment_routes`` checked, so settlements can parse them"""
+    if not isinstance(value, dict):
+        raise serializers.ValidationError('Settings must be an object')
+    try:
+        PaymentRoutes(value.get('payment_routes'))
+    except PaymentRoutesError as e:
+        raise serializers.ValidationError({e.key: e.error})
+    return value
 
 
 class GroupMemberSerializer(serializers.ModelSerializer):
@@ -27,8 +40,12 @@ class GroupSerializer(serializers.ModelSerializer):
                  'created_at', 'updated_at', 'members', 'member_count']
         read_only_fields = ['id', 'created_at', 'updated_at', 'member_count']
     
+    def validate_settings(self, value):
+        return validate_group_settings(value)
+    
     def get_member_count(self, obj):
-        return obj.members.filter(is_active=True).count()
+        # Counted from the members the serializer renders anyway, prefetched by list views
+        return sum(1 for member in obj.members.all() if member.is_active)
 
 
 class FairnessPolicySerializer(serializers.ModelSerializer):
@@ -39,10 +56,22 @@ class FairnessPolicySerializer(serializers.ModelSerializer):
         fields = ['id', 'group', 'policy_type', 'parameters', 'is_active',
                  'created_at', 'created_by']
         read_only_fields = ['id', 'created_at']
+    
+    def validate(self, attrs):
+        policy_type = attrs.get('policy_type', getattr(self.instance, 'policy_type', None))
+        parameters = attrs.get('parameters', getattr(self.instance, 'parameters', None))
+        try:
+            POLICIES[policy_type].clean_parameters(parameters)
+        except PolicyParameterError as e:
+            raise serializers.ValidationError({'parameters': {e.key: e.error}})
+        return attrs
 
 
 class GroupCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Group
         fields = ['name', 'description', 'group_type', 'settings', 'currency',
-                 'billing_cycle', 'gst_mode']
\ No newline at end of file
+                 'billing_cycle', 'gst_mode']
+    
+    def validate_settings(self, value):
+        return validate_group_settings(value)
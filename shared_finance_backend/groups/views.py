@@ -3,15 +3,17 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from sync.conditional import ConditionalGetMixin
 from .models import Group, GroupMember, FairnessPolicy
 from .serializers import GroupSerializer, GroupMemberSerializer, FairnessPolicySerializer, GroupCreateSerializer
 
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Group model"""
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
     permission_classes = [IsAuthenticated]
+    version_group_lookup = 'group'
     
     def get_queryset(self):
         return Group.objects.filter(
@@ -1,3 +1,16 @@
 from django.contrib import admin
+from .models import Notification, UnreadCounter
 
-# Register your models here.
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('title', 'recipient', 'kind', 'group', 'count', 'is_read', 'updated_at')
+    list_filter = ('kind', 'is_read', 'created_at')
+    search_fields = ('title', 'recipient__username', 'group__name')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(UnreadCounter)
+class UnreadCounterAdmin(admin.ModelAdmin):
+    list_display = ('user', 'unread')
+    search_fields = ('user__username',)
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from shared_finance.async_utils import async_api_view
+from shared_finance.events import get_broker
+import asyncio
+import time
+
+
+def _last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+@async_api_view(['GET'], query_token=True)
+async def event_stream(request):
+    """Server-sent events with the user's payment status and group balance changes (ASGI only)"""
+    broker = get_broker()
+    subscription = broker.subscribe(request.user.id, _last_event_id(request))
+    heartbeat = settings.EVENT_STREAM_HEARTBEAT_SECONDS
+    # Streams end periodically so the client reconnects and its token is checked again
+    deadline = time.monotonic() + settings.EVENT_STREAM_MAX_SECONDS
+
+    async def stream():
+        try:
+            yield f'retry: {settings.EVENT_STREAM_RETRY_MS}\n\n'
+            while time.monotonic() < deadline:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield event.encode()
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    # Servers close the response when the client goes away, even if the generator is never resumed
+    response._resource_closers.append(lambda: broker.unsubscribe(subscription))
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
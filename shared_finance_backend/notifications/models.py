@@ -1,3 +1,55 @@
 from django.db import models
+from django.contrib.auth import get_user_model
+from groups.models import Group
 
-# Create your models here.
+User = get_user_model()
+
+
+class Notification(models.Model):
+    """In-app notification; bursts of the same kind in a group are coalesced into one row"""
+    
+    KINDS = [
+        ('expense_added', 'Expense Added'),
+        ('expense_updated', 'Expense Updated'),
+        ('ledger_created', 'Debt Recorded'),
+        ('ledger_status', 'Debt Status Changed'),
+        ('payment_completed', 'Payment Completed'),
+        ('payment_failed', 'Payment Failed'),
+    ]
+    
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=30, choices=KINDS)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    count = models.PositiveIntegerField(default=1)
+    data = models.JSONField(default=dict, blank=True)
+    coalesce_key = models.CharField(max_length=100)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.title} for {self.recipient}"
+    
+    class Meta:
+        db_table = 'notifications_notification'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['recipient', '-id']),
+            models.Index(fields=['recipient', 'coalesce_key', 'is_read']),
+        ]
+
+
+class UnreadCounter(models.Model):
+    """Per-user unread notification count, maintained alongside Notification writes"""
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    unread = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.user}: {self.unread} unread"
+    
+    class Meta:
+        db_table = 'notifications_unreadcounter'
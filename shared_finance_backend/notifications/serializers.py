@@ -0,0 +1,10 @@
+from rest_framework import serializers
+from .models import Notification
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ['id', 'kind', 'group', 'actor', 'title', 'body', 'count', 'data',
+                 'is_read', 'created_at', 'updated_at']
+        read_only_fields = fields
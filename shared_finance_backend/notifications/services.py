@@ -0,0 +1,215 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from expenses.fx import format_amount
+from groups.models import Group, GroupMember
+from shared_finance.money import Money
+from shared_finance.transactions import TransactionBatch
+from .models import Notification, UnreadCounter
+import logging
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Ids of the underlying objects kept on a coalesced notification
+MAX_OBJECT_IDS = 20
+
+TITLES = {
+    # kind: (single, coalesced)
+    'expense_added': ('New expense in {group}', '{count} new expenses in {group}'),
+    'expense_updated': ('Expense updated in {group}', '{count} expenses updated in {group}'),
+    'ledger_created': ('You owe {counterparty}', '{count} new debts recorded'),
+    'ledger_status': ('Debt marked {status}', '{count} debts changed status'),
+    'payment_completed': ('Payment received from {counterparty}', '{count} payments received'),
+    'payment_failed': ('Payment to {counterparty} failed', '{count} payments failed'),
+}
+
+
+def coalesce_window() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_SECONDS', 600))
+
+
+class NotificationBatch(TransactionBatch):
+    """
+    Events raised inside one transaction, fanned out when it commits.
+
+    Events for the same recipient, kind and group collapse into a single
+    notification, and unread notifications of the same key from the last
+    ``NOTIFICATION_COALESCE_SECONDS`` absorb new events instead of adding
+    rows, so a 50-expense import is one "50 new expenses" entry per member.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._members: Dict[int, List[int]] = {}
+
+    def group_members(self, group_id: int) -> List[int]:
+        if group_id not in self._members:
+            self._members[group_id] = list(
+                GroupMember.objects.filter(group_id=group_id, is_active=True).values_list('user_id', flat=True)
+            )
+        return self._members[group_id]
+
+    def add(self, kind: str, recipients: Iterable[int], object_id: int, group_id: Optional[int] = None,
+            actor_id: Optional[int] = None, amount: Optional[Decimal] = None, currency: Optional[str] = None,
+            **context):
+        key = f'{kind}:{group_id or 0}'
+        for recipient_id in recipients:
+            if recipient_id is None or recipient_id == actor_id:
+                continue
+            entry = self.entries.setdefault((recipient_id, key), {
+                'kind': kind, 'group_id': group_id, 'count': 0, 'object_ids': [], 'totals': {},
+            })
+            entry['count'] += 1
+            entry['object_ids'].append(object_id)
+            entry['actor_id'] = actor_id
+            entry['context'] = context
+            if amount is not None:
+                # Money or a Decimal amount, totalled per currency
+                entry['totals'][currency] = entry['totals'].get(currency, Money()) + Money.of(amount)
+
+    def flush(self):
+        self.flushed = True
+        if not self.entries:
+            return
+        try:
+            NotificationService.deliver(self.entries)
+        except Exception as e:
+            # Notifications must never break the write that caused them
+            logger.error(f"Error delivering notifications: {e}")
+        self.entries = {}
+
+
+class NotificationService:
+    """Fan-out of model changes to per-recipient notifications"""
+
+    @staticmethod
+    def current_batch() -> NotificationBatch:
+        """The batch for the open transaction, or a fresh one flushed by the caller in autocommit"""
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            return NotificationBatch()
+        return NotificationBatch.current()
+
+    @staticmethod
+    def notify(kind: str, object_id: int, recipients: Optional[Iterable[int]] = None,
+               group_id: Optional[int] = None, **kwargs):
+        """Queue a notification; ``recipients`` defaults to the group's active members"""
+        connection = transaction.get_connection()
+        batch = NotificationService.current_batch()
+        if recipients is None:
+            recipients = batch.group_members(group_id)
+        batch.add(kind, recipients, object_id, group_id=group_id, **kwargs)
+        if not connection.in_atomic_block:
+            batch.flush()
+
+    @staticmethod
+    def deliver(entries: Dict[Tuple[int, str], Dict[str, Any]]):
+        """Merge entries into recent unread notifications or bulk-create new ones"""
+        now = timezone.now()
+        recipient_ids = {recipient_id for recipient_id, _ in entries}
+        keys = {key for _, key in entries}
+
+        existing = {}
+        recent = Notification.objects.filter(
+            recipient_id__in=recipient_ids, coalesce_key__in=keys, is_read=False,
+            updated_at__gte=now - coalesce_window(),
+        ).order_by('id')
+        for notification in recent:
+            existing[(notification.recipient_id, notification.coalesce_key)] = notification
+
+        group_names = dict(Group.objects.filter(
+            id__in={entry['group_id'] for entry in entries.values() if entry['group_id']}
+        ).values_list('id', 'name'))
+        usernames = dict(User.objects.filter(
+            id__in={entry['context'].get('counterparty_id') for entry in entries.values()} - {None}
+        ).values_list('id', 'username'))
+
+        to_create, to_update = [], []
+        for (recipient_id, key), entry in entries.items():
+            notification = existing.get((recipient_id, key))
+            if notification is None:
+                notification = Notification(
+                    recipient_id=recipient_id, kind=entry['kind'], group_id=entry['group_id'],
+                    coalesce_key=key, count=0, data={'object_ids': [], 'totals': {}},
+                )
+                to_create.append(notification)
+            else:
+                to_update.append(notification)
+
+            notification.count += entry['count']
+            notification.actor_id = entry['actor_id']
+            totals = {currency: Money.of(total) for currency, total in notification.data.get('totals', {}).items()}
+            for currency, total in entry['totals'].items():
+                totals[currency] = totals.get(currency, Money()) + total
+            notification.data = {
+                'object_ids': (notification.data.get('object_ids', []) + entry['object_ids'])[-MAX_OBJECT_IDS:],
+                'totals': {currency: str(total) for currency, total in sorted(totals.items())},
+                **entry['context'],
+            }
+            NotificationService._render(notification, group_names, usernames)
+            notification.updated_at = now
+
+        with transaction.atomic():
+            Notification.objects.bulk_create(to_create)
+            if to_update:
+                Notification.objects.bulk_update(to_update, ['count', 'actor', 'data', 'title', 'body', 'updated_at'])
+            NotificationService._increment_unread(
+                [notification.recipient_id for notification in to_create]
+            )
+
+    @staticmethod
+    def _render(notification: Notification, group_names: Dict[int, str], usernames: Dict[int, str]):
+        single, coalesced = TITLES[notification.kind]
+        values = {
+            'count': notification.count,
+            'group': group_names.get(notification.group_id, 'your group'),
+            'counterparty': usernames.get(notification.data.get('counterparty_id'), 'a member'),
+            'status': notification.data.get('status', ''),
+        }
+        notification.title = (single if notification.count == 1 else coalesced).format(**values)
+        totals = [
+            format_amount(Money.of(total), currency)
+            for currency, total in notification.data['totals'].items() if Money.of(total)
+        ]
+        notification.body = f"Total {' + '.join(totals)}" if totals else ''
+
+    @staticmethod
+    def _increment_unread(recipient_ids: List[int]):
+        increments = defaultdict(int)
+        for recipient_id in recipient_ids:
+            increments[recipient_id] += 1
+        if not increments:
+            return
+        UnreadCounter.objects.bulk_create(
+            [UnreadCounter(user_id=user_id, unread=0) for user_id in increments], ignore_conflicts=True
+        )
+        by_amount = defaultdict(list)
+        for user_id, amount in increments.items():
+            by_amount[amount].append(user_id)
+        for amount, user_ids in by_amount.items():
+            UnreadCounter.objects.filter(user_id__in=user_ids).update(unread=F('unread') + amount)
+
+    @staticmethod
+    def unread_count(user) -> int:
+        return UnreadCounter.objects.filter(user=user).values_list('unread', flat=True).first() or 0
+
+    @staticmethod
+    def mark_read(user, notification_ids: Optional[List[int]] = None) -> int:
+        """Mark the given (or all) unread notifications read; returns how many changed"""
+        with transaction.atomic():
+            unread = Notification.objects.filter(recipient=user, is_read=False)
+            if notification_ids is not None:
+                unread = unread.filter(id__in=notification_ids)
+            changed = unread.update(is_read=True)
+            if changed:
+                UnreadCounter.objects.filter(user=user).update(unread=Greatest(F('unread') - changed, 0))
+        return changed
@@ -0,0 +1,146 @@
+from decimal import Decimal
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from expenses.models import Expense, ExpenseSplit
+from fairness.services import SettlementService
+from groups.models import GroupMember
+from payments.models import LedgerEntry, Payment
+from payments.services import PaymentService
+from shared_finance import events
+from .services import NotificationService
+
+# Ledger transitions worth telling both parties about; 'paid' is covered by the payment
+LEDGER_NOTIFY_STATUSES = ('cancelled', 'disputed')
+
+
+@receiver(post_save, sender=Expense)
+def expense_notification(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    
+    previous = getattr(instance, '_previous_state', None)
+    if not created and previous is not None and (
+        previous['amount_subtotal'] == instance.amount_subtotal
+        and previous['amount_tax'] == instance.amount_tax
+        and previous['payer_id'] == instance.payer_id
+    ):
+        # Only amount or payer changes are worth a notification
+        return
+    
+    NotificationService.notify(
+        'expense_added' if created else 'expense_updated', instance.pk,
+        group_id=instance.group_id, actor_id=instance.payer_id, amount=instance.total_amount,
+        currency=instance.currency,
+    )
+
+
+@receiver(post_save, sender=LedgerEntry)
+def ledger_entry_notification(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    
+    if created:
+        NotificationService.notify(
+            'ledger_created', instance.pk, recipients=[instance.from_member_id],
+            amount=instance.amount, currency=instance.currency, counterparty_id=instance.to_member_id,
+        )
+        return
+    
+    previous = getattr(instance, '_previous_state', None)
+    if previous and previous['status'] != instance.status and instance.status in LEDGER_NOTIFY_STATUSES:
+        NotificationService.notify(
+            'ledger_status', instance.pk, recipients=[instance.from_member_id, instance.to_member_id],
+            amount=instance.amount, currency=instance.currency, status=instance.status,
+        )
+
+
+@receiver(post_save, sender=Payment)
+def payment_notification(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    
+    previous = getattr(instance, '_previous_state', None)
+    if previous is None or previous['status'] == instance.status:
+        return
+    
+    if instance.status in ('completed', 'failed'):
+        entry = instance.ledger_entry
+        if instance.status == 'completed':
+            recipient, counterparty = entry.to_member_id, entry.from_member_id
+        else:
+            recipient, counterparty = entry.from_member_id, entry.to_member_id
+        NotificationService.notify(
+            f'payment_{instance.status}', instance.pk, recipients=[recipient],
+            amount=instance.amount, currency=instance.currency, counterparty_id=counterparty,
+        )
+
+
+# Live updates for open event streams
+
+def publish_group_balances(group_id: int):
+    """After commit, push the group's net balances to its members if any of them is streaming"""
+    def send():
+        broker = events.get_broker()
+        member_ids = list(
+            GroupMember.objects.filter(group_id=group_id, is_active=True).values_list('user_id', flat=True)
+        )
+        if not broker.has_subscribers(member_ids):
+            return
+        balances = SettlementService.group_balances(group_id)
+        broker.publish(member_ids, 'balances', {
+            'group_id': group_id,
+            'balances': {str(user_id): balances.get(user_id, Decimal('0.00')) for user_id in member_ids},
+        })
+    
+    # Once per group per transaction, however many rows changed
+    events.publish_on_commit(send, key=('balances', group_id))
+
+
+@receiver(post_save, sender=Payment)
+def payment_status_event(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    
+    previous = getattr(instance, '_previous_state', None)
+    if not created and (previous is None or previous['status'] == instance.status):
+        return
+    
+    entry = instance.ledger_entry
+    events.publish(
+        [entry.from_member_id, entry.to_member_id], 'payment_status', PaymentService.status_payload(instance)
+    )
+
+
+@receiver(post_save, sender=Expense)
+def expense_balance_event(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    
+    previous = getattr(instance, '_previous_state', None)
+    if previous is not None and previous['group_id'] != instance.group_id:
+        publish_group_balances(previous['group_id'])
+    publish_group_balances(instance.group_id)
+
+
+@receiver(post_delete, sender=Expense)
+def expense_delete_balance_event(sender, instance, **kwargs):
+    publish_group_balances(instance.group_id)
+
+
+@receiver(post_save, sender=ExpenseSplit)
+def expense_split_balance_event(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    
+    publish_group_balances(instance.expense.group_id)
+
+
+@receiver(post_delete, sender=ExpenseSplit)
+def expense_split_delete_balance_event(sender, instance, origin=None, **kwargs):
+    # Expense (and group) deletes publish from expense_delete_balance_event
+    if origin is not None and (getattr(origin, 'model', None) or type(origin)) is not ExpenseSplit:
+        return
+    
+    group_id = Expense.objects.filter(pk=instance.expense_id).values_list('group_id', flat=True).first()
+    if group_id is not None:
+        publish_group_balances(group_id)
@@ -1,3 +1,224 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from decimal import Decimal
+from unittest import mock
+from shared_finance import events
+from shared_finance.events import InProcessBroker
+from expenses.models import Expense
+from groups.models import Group, GroupMember
+from payments.models import LedgerEntry, Payment
+from payments.services import UPIWebhookSimulator
+from .models import Notification, UnreadCounter
+from .services import NotificationService
+import asyncio
+import json
 
-# Create your tests here.
+User = get_user_model()
+
+
+class NotificationFixtureMixin:
+    def setUp(self):
+        self.payer = User.objects.create_user(username='payer', email='payer@test.com')
+        self.alice = User.objects.create_user(username='alice', email='alice@test.com')
+        self.bob = User.objects.create_user(username='bob', email='bob@test.com')
+        self.group = Group.objects.create(name='Flat', owner=self.payer)
+        for user, role in ((self.payer, 'owner'), (self.alice, 'member'), (self.bob, 'member')):
+            GroupMember.objects.create(group=self.group, user=user, role=role)
+
+    def add_expense(self, amount='10.00'):
+        return Expense.objects.create(
+            group=self.group, payer=self.payer, amount_subtotal=Decimal(amount), date=timezone.now()
+        )
+
+
+class NotificationServiceTest(NotificationFixtureMixin, TestCase):
+    def test_bulk_import_coalesces_per_recipient(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for _ in range(50):
+                    self.add_expense()
+
+        self.assertFalse(Notification.objects.filter(recipient=self.payer).exists())
+        for user in (self.alice, self.bob):
+            notifications = list(Notification.objects.filter(recipient=user))
+            self.assertEqual(len(notifications), 1)
+            self.assertEqual(notifications[0].count, 50)
+            self.assertEqual(notifications[0].title, '50 new expenses in Flat')
+            self.assertEqual(notifications[0].data['totals'], {'INR': '500.00'})
+            self.assertEqual(NotificationService.unread_count(user), 1)
+
+    def test_separate_commits_merge_into_unread_notification(self):
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    self.add_expense()
+
+        notification = Notification.objects.get(recipient=self.alice)
+        self.assertEqual(notification.count, 3)
+        self.assertEqual(NotificationService.unread_count(self.alice), 1)
+
+        # Once read, the next expense starts a fresh notification
+        NotificationService.mark_read(self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_expense()
+        self.assertEqual(Notification.objects.filter(recipient=self.alice).count(), 2)
+        self.assertEqual(NotificationService.unread_count(self.alice), 1)
+
+    def test_rolled_back_transaction_sends_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.add_expense()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertFalse(Notification.objects.exists())
+
+    def test_completed_payment_notifies_payee(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = LedgerEntry.objects.create(from_member=self.alice, to_member=self.payer, amount=Decimal('250.00'))
+            payment = Payment.objects.create(ledger_entry=entry, method='UPI_DEEPLINK', amount=entry.amount)
+
+        client = APIClient()
+        client.force_authenticate(user=self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/payments/webhook/', UPIWebhookSimulator.simulate_webhook(payment.id),
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+
+        notification = Notification.objects.get(recipient=self.payer, kind='payment_completed')
+        self.assertEqual(notification.title, 'Payment received from alice')
+        self.assertEqual(notification.data['object_ids'], [payment.id])
+        self.assertTrue(Notification.objects.filter(recipient=self.alice, kind='ledger_created').exists())
+
+
+class NotificationInboxTest(NotificationFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+        for index in range(25):
+            Notification.objects.create(
+                recipient=self.alice, kind='expense_added', group=self.group, title=f'Expense {index}',
+                coalesce_key=f'test:{index}',
+            )
+        UnreadCounter.objects.create(user=self.alice, unread=25)
+
+    def test_cursor_pagination(self):
+        first = self.client.get('/api/notifications/notifications/').json()
+        self.assertEqual(len(first['results']), 20)
+        self.assertNotIn('count', first)
+        self.assertEqual(first['results'][0]['title'], 'Expense 24')
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual([item['title'] for item in second['results']], [f'Expense {i}' for i in range(4, -1, -1)])
+        self.assertIsNone(second['next'])
+
+    def test_unread_count_and_mark_read(self):
+        self.assertEqual(self.client.get('/api/notifications/notifications/unread_count/').json(), {'unread': 25})
+
+        latest = Notification.objects.filter(recipient=self.alice).first()
+        response = self.client.post(f'/api/notifications/notifications/{latest.id}/mark_read/')
+        self.assertEqual(response.json(), {'unread': 24})
+        unread = self.client.get('/api/notifications/notifications/?unread=true').json()
+        self.assertNotIn(latest.id, [item['id'] for item in unread['results']])
+
+        response = self.client.post('/api/notifications/notifications/mark_all_read/')
+        self.assertEqual(response.json(), {'marked': 24, 'unread': 0})
+
+        other = Notification.objects.create(recipient=self.bob, kind='expense_added', title='Not yours',
+                                            coalesce_key='x')
+        self.assertEqual(self.client.post(f'/api/notifications/notifications/{other.id}/mark_read/').status_code, 404)
+
+
+class LiveEventTest(NotificationFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = InProcessBroker()
+        patcher = mock.patch.object(events, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_broker_delivers_and_replays(self):
+        async def scenario():
+            subscription = self.broker.subscribe(self.alice.id)
+            self.assertTrue(self.broker.has_subscribers([self.bob.id, self.alice.id]))
+            # Publishing from a worker thread hands the event to the subscriber's loop
+            await asyncio.to_thread(self.broker.publish, [self.alice.id, self.bob.id], 'ping', {'n': 1})
+            first = await asyncio.wait_for(subscription.get(), timeout=1)
+            self.broker.publish([self.alice.id], 'ping', {'n': 2})
+            self.broker.unsubscribe(subscription)
+            self.assertFalse(self.broker.has_subscribers([self.alice.id]))
+
+            replay = self.broker.subscribe(self.alice.id, last_event_id=first.id)
+            missed = await asyncio.wait_for(replay.get(), timeout=1)
+            self.broker.unsubscribe(replay)
+            return first, missed
+
+        first, missed = asyncio.run(scenario())
+        self.assertEqual((first.name, first.data), ('ping', {'n': 1}))
+        self.assertEqual(missed.data, {'n': 2})
+        self.assertTrue(missed.encode().startswith(f'id: {missed.id}\nevent: ping\ndata: '))
+
+    def test_payment_transition_published_to_both_parties(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = LedgerEntry.objects.create(from_member=self.alice, to_member=self.payer, amount=Decimal('250.00'))
+            payment = Payment.objects.create(ledger_entry=entry, method='UPI_DEEPLINK', amount=entry.amount)
+
+        with mock.patch.object(self.broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                payment.status = 'completed'
+                payment.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                payment.save()
+
+        publish.assert_called_once()
+        user_ids, name, data = publish.call_args.args
+        self.assertEqual(sorted(user_ids), sorted([self.alice.id, self.payer.id]))
+        self.assertEqual((name, data['payment_id'], data['status']), ('payment_status', payment.id, 'completed'))
+
+    def test_balances_published_once_per_transaction_when_streaming(self):
+        with mock.patch.object(self.broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_expense()
+            publish.assert_not_called()
+
+            with mock.patch.object(self.broker, 'has_subscribers', return_value=True), \
+                    self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for _ in range(5):
+                        self.add_expense('30.00')
+
+        publish.assert_called_once()
+        user_ids, name, data = publish.call_args.args
+        self.assertEqual(name, 'balances')
+        self.assertEqual(set(user_ids), {self.payer.id, self.alice.id, self.bob.id})
+        # Expenses without splits: the payer is owed everything they paid
+        self.assertEqual(data, {'group_id': self.group.id, 'balances': {
+            str(self.payer.id): 160.0, str(self.alice.id): 0.0, str(self.bob.id): 0.0,
+        }})
+
+    @override_settings(EVENT_STREAM_HEARTBEAT_SECONDS=0.2, EVENT_STREAM_MAX_SECONDS=1)
+    async def test_event_stream(self):
+        token = RefreshToken.for_user(self.alice).access_token
+        self.assertEqual((await self.async_client.get('/api/notifications/stream/')).status_code, 401)
+
+        response = await self.async_client.get(f'/api/notifications/stream/?token={token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+
+        self.broker.publish([self.alice.id], 'payment_status', {'payment_id': 7, 'status': 'completed'})
+        event = (await anext(chunks)).decode()
+        self.assertIn('event: payment_status\n', event)
+        self.assertEqual(json.loads(event.split('data: ')[1]), {'payment_id': 7, 'status': 'completed'})
+        self.assertEqual(await anext(chunks), b': keepalive\n\n')
+
+        # The stream ends after EVENT_STREAM_MAX_SECONDS so the client reconnects with a fresh token
+        self.assertEqual({chunk async for chunk in chunks}, {b': keepalive\n\n'})
+        self.assertFalse(self.broker.has_subscribers([self.alice.id]))
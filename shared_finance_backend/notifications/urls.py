@@ -0,0 +1,13 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from . import async_views, views
+
+router = DefaultRouter()
+router.register(r'notifications', views.NotificationViewSet, basename='notification')
+
+urlpatterns = [
+    path('', include(router.urls)),
+    
+    # Server-sent events, for ASGI deployments
+    path('stream/', async_views.event_stream, name='event-stream'),
+]
@@ -1,3 +1,48 @@
-from django.shortcuts import render
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .models import Notification
+from .serializers import NotificationSerializer
+from .services import NotificationService
 
-# Create your views here.
+
+class InboxPagination(CursorPagination):
+    """Stable paging while new notifications arrive; no COUNT(*) per page"""
+    ordering = '-id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    """Inbox of the current user's notifications"""
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = InboxPagination
+    filter_backends = []
+    
+    def get_queryset(self):
+        queryset = Notification.objects.filter(recipient=self.request.user)
+        if self.request.query_params.get('unread') == 'true':
+            queryset = queryset.filter(is_read=False)
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """Unread notifications, from the per-user counter"""
+        return Response({'unread': NotificationService.unread_count(request.user)})
+    
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        """Mark one notification as read"""
+        notification = self.get_object()
+        NotificationService.mark_read(request.user, [notification.id])
+        return Response({'unread': NotificationService.unread_count(request.user)})
+    
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """Mark every notification as read"""
+        marked = NotificationService.mark_read(request.user)
+        return Response({'marked': marked, 'unread': NotificationService.unread_count(request.user)})
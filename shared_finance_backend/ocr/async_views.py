@@ -0,0 +1,35 @@
+from asgiref.sync import sync_to_async
+from expenses.models import Expense
+from expenses.services import ExpenseService
+from shared_finance.async_utils import aget_object_or_404, api_response, async_api_view, run_cpu_bound
+from .services import OCRService
+
+
+@async_api_view(['POST'])
+async def upload_receipt(request, expense_id):
+    """Upload receipt and process with OCR (async); tesseract runs in the bounded CPU pool"""
+    expense = await aget_object_or_404(Expense.objects.select_related('group'), id=expense_id)
+    
+    # Check if user has permission to modify this expense
+    if (expense.payer_id != request.user.id
+            and not await expense.group.members.filter(user=request.user).aexists()):
+        return api_response({'error': 'You do not have permission to modify this expense'}, status=403)
+    
+    if 'receipt' not in request.FILES:
+        return api_response({'error': 'No receipt file provided'}, status=400)
+    
+    # Store the file for OCR (storage writes are blocking); the row is written once, with the extracted data
+    receipt_file = request.FILES['receipt']
+    await sync_to_async(expense.receipt_file.save)(receipt_file.name, receipt_file, save=False)
+    
+    try:
+        ocr_data = await run_cpu_bound(OCRService.process_receipt, expense.receipt_file.path)
+        OCRService.apply_to_expense(expense, ocr_data)
+        await sync_to_async(ExpenseService.save_with_splits)(expense)
+        
+        return api_response(OCRService.receipt_response(expense))
+    
+    except Exception as e:
+        # Keep the receipt, but not any partly applied OCR data
+        await expense.asave(update_fields=['receipt_file'])
+        return api_response({'error': f'Error processing receipt: {str(e)}'}, status=500)
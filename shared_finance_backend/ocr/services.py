@@ -115,4 +115,40 @@ class OCRService:
         # Parse data
         parsed_data = OCRService.parse_receipt_data(text)
         
-        return parsed_data
\ No newline at end of file
+        return parsed_data
+    
+    @staticmethod
+    def apply_to_expense(expense, ocr_data):
+        """Copy extracted fields onto the expense (not saved) and store the raw OCR data"""
+        if ocr_data.get('vendor'):
+            expense.vendor = ocr_data['vendor']
+        if ocr_data.get('invoice_no'):
+            expense.invoice_no = ocr_data['invoice_no']
+        if ocr_data.get('date'):
+            expense.date = ocr_data['date']
+        if ocr_data.get('amount'):
+            expense.amount_subtotal = ocr_data['amount']
+        if ocr_data.get('gstin'):
+            expense.gstin = ocr_data['gstin']
+        
+        # Store raw OCR data (dates and amounts as strings for the JSON field)
+        expense.ocr_data = {
+            **ocr_data,
+            'date': ocr_data['date'].isoformat() if ocr_data.get('date') else None,
+            'amount': str(ocr_data['amount']) if ocr_data.get('amount') is not None else None,
+        }
+    
+    @staticmethod
+    def receipt_response(expense):
+        return {
+            'message': 'Receipt processed successfully',
+            'extracted_data': expense.ocr_data,
+            'expense': {
+                'id': expense.id,
+                'vendor': expense.vendor,
+                'amount': str(expense.total_amount),
+                'invoice_no': expense.invoice_no,
+                'date': expense.date,
+                'gstin': expense.gstin,
+            }
+        }
@@ -1,3 +1,71 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from unittest import mock
+from decimal import Decimal
+from groups.models import Group, GroupMember
+from expenses.models import Expense, ExpenseSplit
+from .services import OCRService
+import shutil
+import tempfile
 
-# Create your tests here.
+User = get_user_model()
+
+RECEIPT_TEXT = """Fresh Mart Supermarket
+Invoice #: INV-20240115
+Date: 15/01/2024
+Total: 1180.00
+"""
+
+
+class AsyncUploadReceiptTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        
+        self.user = User.objects.create_user(username='payer', email='payer@test.com')
+        group = Group.objects.create(name='Flat', owner=self.user)
+        GroupMember.objects.create(group=group, user=self.user, role='owner')
+        self.expense = Expense.objects.create(
+            group=group, payer=self.user, amount_subtotal=Decimal('10.00'), date=timezone.now()
+        )
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+    
+    def test_upload_applies_ocr_data(self):
+        receipt = SimpleUploadedFile('receipt.png', b'not really a png', content_type='image/png')
+        with override_settings(MEDIA_ROOT=self.media_root), \
+                mock.patch.object(OCRService, 'extract_text_from_image', return_value=RECEIPT_TEXT):
+            response = self.client.post(
+                f'/api/ocr/expenses/{self.expense.id}/upload_receipt/async/', {'receipt': receipt}, **self.headers
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['expense']['amount'], '1180.00')
+        self.expense.refresh_from_db()
+        self.assertEqual(self.expense.vendor, 'Fresh Mart Supermarket')
+        self.assertEqual(self.expense.invoice_no, 'INV-20240115')
+        self.assertEqual(self.expense.ocr_data['date'], '2024-01-15')
+    
+    def test_upload_recomputes_splits(self):
+        flatmate = User.objects.create_user(username='flatmate', email='flatmate@test.com')
+        GroupMember.objects.create(group=self.expense.group, user=flatmate)
+        for user in (self.user, flatmate):
+            ExpenseSplit.objects.create(expense=self.expense, member=user, amount_owed=Decimal('5.00'))
+        
+        receipt = SimpleUploadedFile('receipt.png', b'not really a png', content_type='image/png')
+        with override_settings(MEDIA_ROOT=self.media_root), \
+                mock.patch.object(OCRService, 'extract_text_from_image', return_value=RECEIPT_TEXT):
+            response = self.client.post(
+                f'/api/ocr/expenses/{self.expense.id}/upload_receipt/async/', {'receipt': receipt}, **self.headers
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(self.expense.splits.values_list('amount_owed', flat=True)), [Decimal('590.00'), Decimal('590.00')]
+        )
+    
+    def test_missing_file(self):
+        response = self.client.post(f'/api/ocr/expenses/{self.expense.id}/upload_receipt/async/', **self.headers)
+        self.assertEqual(response.status_code, 400)
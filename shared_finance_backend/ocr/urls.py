@@ -1,6 +1,8 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('expenses/<int:expense_id>/upload_receipt/', views.upload_receipt, name='upload-receipt'),
+    path('expenses/<int:expense_id>/upload_receipt/async/', async_views.upload_receipt,
+         name='upload-receipt-async'),
 ]
\ No newline at end of file
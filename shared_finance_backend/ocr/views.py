@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from expenses.models import Expense
+from expenses.services import ExpenseService
 from .services import OCRService
 
 
@@ -11,10 +12,10 @@ from .services import OCRService
 @permission_classes([IsAuthenticated])
 def upload_receipt(request, expense_id):
     """Upload receipt and process with OCR"""
-    expense = get_object_or_404(Expense, id=expense_id)
+    expense = get_object_or_404(Expense.objects.select_related('group'), id=expense_id)
     
     # Check if user has permission to modify this expense
-    if expense.payer != request.user and not expense.group.members.filter(user=request.user).exists():
+    if expense.payer_id != request.user.id and not expense.group.members.filter(user=request.user).exists():
         return Response(
             {'error': 'You do not have permission to modify this expense'},
             status=status.HTTP_403_FORBIDDEN
@@ -28,44 +29,20 @@ def upload_receipt(request, expense_id):
     
     receipt_file = request.FILES['receipt']
     
-    # Save the file
-    expense.receipt_file = receipt_file
-    expense.save()
+    # Store the file for OCR; the row is written once, with the extracted data
+    expense.receipt_file.save(receipt_file.name, receipt_file, save=False)
     
     # Process with OCR
     try:
         ocr_data = OCRService.process_receipt(expense.receipt_file.path)
+        OCRService.apply_to_expense(expense, ocr_data)
+        ExpenseService.save_with_splits(expense)
         
-        # Update expense with extracted data
-        if ocr_data.get('vendor'):
-            expense.vendor = ocr_data['vendor']
-        if ocr_data.get('invoice_no'):
-            expense.invoice_no = ocr_data['invoice_no']
-        if ocr_data.get('date'):
-            expense.date = ocr_data['date']
-        if ocr_data.get('amount'):
-            expense.amount_subtotal = ocr_data['amount']
-        if ocr_data.get('gstin'):
-            expense.gstin = ocr_data['gstin']
-        
-        # Store raw OCR data
-        expense.ocr_data = ocr_data
-        expense.save()
-        
-        return Response({
-            'message': 'Receipt processed successfully',
-            'extracted_data': ocr_data,
-            'expense': {
-                'id': expense.id,
-                'vendor': expense.vendor,
-                'amount': str(expense.total_amount),
-                'invoice_no': expense.invoice_no,
-                'date': expense.date,
-                'gstin': expense.gstin,
-            }
-        })
+        return Response(OCRService.receipt_response(expense))
     
     except Exception as e:
+        # Keep the receipt, but not any partly applied OCR data
+        expense.save(update_fields=['receipt_file'])
         return Response(
             {'error': f'Error processing receipt: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
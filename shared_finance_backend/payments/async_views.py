@@ -0,0 +1,30 @@
+from shared_finance.async_utils import aget_object_or_404, api_response, async_api_view
+from .models import Payment
+from .services import PaymentService
+
+
+@async_api_view(['POST'])
+async def payment_webhook(request):
+    """Handle payment webhook (async)"""
+    try:
+        result = await PaymentService.aprocess_webhook(request.data)
+        
+        if 'error' in result:
+            return api_response(result, status=400)
+        
+        return api_response(result)
+    
+    except Exception as e:
+        return api_response({'error': f'Error processing webhook: {str(e)}'}, status=500)
+
+
+@async_api_view(['GET'])
+async def payment_status(request, payment_id):
+    """Get payment status (async)"""
+    payment = await aget_object_or_404(Payment.objects.select_related('ledger_entry'), id=payment_id)
+    
+    # Check if user is involved in this payment
+    if request.user.id not in (payment.ledger_entry.from_member_id, payment.ledger_entry.to_member_id):
+        return api_response({'error': 'You are not authorized to view this payment'}, status=403)
+    
+    return api_response(PaymentService.status_payload(payment))
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+from shared_finance.money import MoneyField, decimal_to_money
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_ledgerentry_change_seq_payment_change_seq'),
+    ]
+
+    operations = [
+        *decimal_to_money('payments', 'ledgerentry', 'amount',
+                          models.DecimalField(max_digits=10, decimal_places=2), MoneyField()),
+        *decimal_to_money('payments', 'payment', 'amount',
+                          models.DecimalField(max_digits=10, decimal_places=2), MoneyField()),
+    ]
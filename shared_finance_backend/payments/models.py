@@ -1,11 +1,15 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
+from sync.models import ChangeTrackedModel
+from expenses.fx import format_amount
 from expenses.models import Expense
+from shared_finance.money import MoneyField
 
 User = get_user_model()
 
 
-class LedgerEntry(models.Model):
+class LedgerEntry(ChangeTrackedModel):
     """Ledger entry for tracking debts between users"""
     
     STATUS_CHOICES = [
@@ -17,7 +21,7 @@ class LedgerEntry(models.Model):
     
     from_member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='debts')
     to_member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='credits')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     ref_expense = models.ForeignKey(Expense, on_delete=models.SET_NULL, null=True, blank=True)
     description = models.TextField(blank=True)
@@ -25,14 +29,19 @@ class LedgerEntry(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.from_member.username} owes {self.to_member.username} ₹{self.amount}"
+        return f"{self.from_member.username} owes {self.to_member.username} {format_amount(self.amount, self.currency)}"
+    
+    @property
+    def currency(self) -> str:
+        """Ledger amounts are in the base currency, in which global settlement nets"""
+        return settings.FX_BASE_CURRENCY
     
     class Meta:
         db_table = 'payments_ledgerentry'
         ordering = ['-created_at']
 
 
-class Payment(models.Model):
+class Payment(ChangeTrackedModel):
     """Payment model for tracking actual payments"""
     
     PAYMENT_METHODS = [
@@ -55,14 +64,19 @@ class Payment(models.Model):
     method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     payment_ref = models.CharField(max_length=200, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
     upi_deeplink = models.URLField(blank=True, null=True)
     webhook_data = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"Payment of ₹{self.amount} via {self.method} - {self.status}"
+        return f"Payment of {format_amount(self.amount, self.currency)} via {self.method} - {self.status}"
+    
+    @property
+    def currency(self) -> str:
+        """A payment settles a ledger entry, in its currency"""
+        return settings.FX_BASE_CURRENCY
     
     class Meta:
         db_table = 'payments_payment'
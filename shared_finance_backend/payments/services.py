@@ -1,7 +1,9 @@
 import uuid
 from decimal import Decimal
 from typing import Dict, Any
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import transaction
 from .models import Payment, LedgerEntry
 import logging
 
@@ -22,65 +24,107 @@ class PaymentService:
     @staticmethod
     def initiate_payment(ledger_entry: LedgerEntry, method: str) -> Dict[str, Any]:
         """Initiate a payment"""
+        # The deeplink is built first so the payment is written once
+        upi_link = None
+        if method == 'UPI_DEEPLINK':
+            upi_link = PaymentService.generate_upi_deeplink(
+                ledger_entry.amount,
+                ledger_entry.from_member.username,
+                ledger_entry.to_member.username
+            )
+        
         payment = Payment.objects.create(
             ledger_entry=ledger_entry,
             method=method,
             amount=ledger_entry.amount,
-            status='pending'
+            status='pending',
+            upi_deeplink=upi_link
         )
         
         response_data = {
             'payment_id': payment.id,
-            'amount': float(payment.amount),
+            'amount': payment.amount,
             'method': payment.method,
             'status': payment.status,
             'created_at': payment.created_at
         }
         
-        if method == 'UPI_DEEPLINK':
-            upi_link = PaymentService.generate_upi_deeplink(
-                payment.amount,
-                ledger_entry.from_member.username,
-                ledger_entry.to_member.username
-            )
-            payment.upi_deeplink = upi_link
-            payment.save()
+        if upi_link:
             response_data['upi_deeplink'] = upi_link
         
         return response_data
     
+    @staticmethod
+    def _apply_webhook(payment: Payment, webhook_data: Dict[str, Any]) -> bool:
+        """Update payment (and its ledger entry) in memory; returns whether the ledger entry changed"""
+        status = webhook_data.get('status')
+        payment.webhook_data = webhook_data
+        payment.payment_ref = webhook_data.get('transaction_id') or payment.payment_ref
+        
+        if status == 'success':
+            payment.status = 'completed'
+            # Update ledger entry
+            payment.ledger_entry.status = 'paid'
+            return True
+        elif status == 'failed':
+            payment.status = 'failed'
+        else:
+            payment.status = 'processing'
+        return False
+    
+    @staticmethod
+    def _save_webhook(payment: Payment, ledger_changed: bool):
+        """Save the payment and its ledger entry together, so neither is updated without the other"""
+        with transaction.atomic():
+            if ledger_changed:
+                payment.ledger_entry.save()
+            payment.save()
+    
+    @staticmethod
+    def _webhook_result(payment: Payment, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'payment_id': payment.id,
+            'status': payment.status,
+            'message': f"Payment {webhook_data.get('status')}"
+        }
+    
     @staticmethod
     def process_webhook(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process payment webhook"""
         payment_id = webhook_data.get('payment_id')
         status = webhook_data.get('status')
-        transaction_id = webhook_data.get('transaction_id')
         
         if not payment_id or not status:
             return {'error': 'Invalid webhook data'}
         
         try:
-            payment = Payment.objects.get(id=payment_id)
-            payment.webhook_data = webhook_data
-            payment.payment_ref = transaction_id or payment.payment_ref
+            payment = Payment.objects.select_related('ledger_entry').get(id=payment_id)
+            PaymentService._save_webhook(payment, PaymentService._apply_webhook(payment, webhook_data))
             
-            if status == 'success':
-                payment.status = 'completed'
-                # Update ledger entry
-                payment.ledger_entry.status = 'paid'
-                payment.ledger_entry.save()
-            elif status == 'failed':
-                payment.status = 'failed'
-            else:
-                payment.status = 'processing'
+            return PaymentService._webhook_result(payment, webhook_data)
             
-            payment.save()
+        except Payment.DoesNotExist:
+            return {'error': 'Payment not found'}
+        except Exception as e:
+            logger.error(f"Error processing webhook: {e}")
+            return {'error': 'Internal server error'}
+    
+    @staticmethod
+    async def aprocess_webhook(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async process_webhook for the ASGI endpoint"""
+        payment_id = webhook_data.get('payment_id')
+        status = webhook_data.get('status')
+        
+        if not payment_id or not status:
+            return {'error': 'Invalid webhook data'}
+        
+        try:
+            payment = await Payment.objects.select_related('ledger_entry').aget(id=payment_id)
+            await sync_to_async(PaymentService._save_webhook)(
+                payment, PaymentService._apply_webhook(payment, webhook_data)
+            )
             
-            return {
-                'payment_id': payment.id,
-                'status': payment.status,
-                'message': f'Payment {status}'
-            }
+            return PaymentService._webhook_result(payment, webhook_data)
             
         except Payment.DoesNotExist:
             return {'error': 'Payment not found'}
@@ -88,19 +132,22 @@ class PaymentService:
             logger.error(f"Error processing webhook: {e}")
             return {'error': 'Internal server error'}
     
+    @staticmethod
+    def status_payload(payment: Payment) -> Dict[str, Any]:
+        return {
+            'payment_id': payment.id,
+            'status': payment.status,
+            'amount': payment.amount,
+            'method': payment.method,
+            'created_at': payment.created_at,
+            'updated_at': payment.updated_at
+        }
+    
     @staticmethod
     def get_payment_status(payment_id: int) -> Dict[str, Any]:
         """Get payment status"""
         try:
-            payment = Payment.objects.get(id=payment_id)
-            return {
-                'payment_id': payment.id,
-                'status': payment.status,
-                'amount': float(payment.amount),
-                'method': payment.method,
-                'created_at': payment.created_at,
-                'updated_at': payment.updated_at
-            }
+            return PaymentService.status_payload(Payment.objects.get(id=payment_id))
         except Payment.DoesNotExist:
             return {'error': 'Payment not found'}
 
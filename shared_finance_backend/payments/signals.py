@@ -0,0 +1,18 @@
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from expenses.signals import stash_previous_state
+from .models import LedgerEntry, Payment
+
+# Previous values needed by notifications and live updates to detect transitions
+LEDGER_TRACKED_FIELDS = ('from_member_id', 'to_member_id', 'amount', 'status')
+PAYMENT_TRACKED_FIELDS = ('ledger_entry_id', 'amount', 'status')
+
+
+@receiver(pre_save, sender=LedgerEntry)
+def ledger_entry_previous_state(sender, instance, **kwargs):
+    stash_previous_state(sender, instance, LEDGER_TRACKED_FIELDS)
+
+
+@receiver(pre_save, sender=Payment)
+def payment_previous_state(sender, instance, **kwargs):
+    stash_previous_state(sender, instance, PAYMENT_TRACKED_FIELDS)
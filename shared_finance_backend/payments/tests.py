@@ -1,3 +1,51 @@
 from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import RefreshToken
+from decimal import Decimal
+from .models import LedgerEntry, Payment
+from .services import UPIWebhookSimulator
 
-# Create your tests here.
+User = get_user_model()
+
+
+class AsyncPaymentViewTest(TestCase):
+    def setUp(self):
+        self.payer = User.objects.create_user(username='payer', email='payer@test.com')
+        self.payee = User.objects.create_user(username='payee', email='payee@test.com')
+        self.entry = LedgerEntry.objects.create(
+            from_member=self.payer, to_member=self.payee, amount=Decimal('250.00')
+        )
+        self.payment = Payment.objects.create(
+            ledger_entry=self.entry, method='UPI_DEEPLINK', amount=self.entry.amount
+        )
+    
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    
+    def test_webhook_completes_payment(self):
+        response = self.client.post(
+            '/api/payments/webhook/async/', UPIWebhookSimulator.simulate_webhook(self.payment.id),
+            content_type='application/json', **self.auth(self.payer)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'completed')
+        
+        self.payment.refresh_from_db()
+        self.entry.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertTrue(self.payment.payment_ref.startswith('TXN'))
+        self.assertEqual(self.entry.status, 'paid')
+        
+        invalid = self.client.post('/api/payments/webhook/async/', {'payment_id': 999999, 'status': 'success'},
+                                   content_type='application/json', **self.auth(self.payer))
+        self.assertEqual(invalid.status_code, 400)
+    
+    def test_status_matches_sync_view(self):
+        sync = self.client.get(f'/api/payments/status/{self.payment.id}/', **self.auth(self.payee))
+        native = self.client.get(f'/api/payments/status/{self.payment.id}/async/', **self.auth(self.payee))
+        self.assertEqual(native.status_code, 200)
+        self.assertEqual(native.json(), sync.json())
+        
+        outsider = User.objects.create_user(username='outsider', email='outsider@test.com')
+        forbidden = self.client.get(f'/api/payments/status/{self.payment.id}/async/', **self.auth(outsider))
+        self.assertEqual(forbidden.status_code, 403)
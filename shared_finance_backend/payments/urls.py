@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'ledger', views.LedgerEntryViewSet)
@@ -12,4 +12,8 @@ urlpatterns = [
     path('webhook/', views.payment_webhook, name='payment-webhook'),
     path('status/<int:payment_id>/', views.payment_status, name='payment-status'),
     path('simulate/<int:payment_id>/', views.simulate_webhook, name='simulate-webhook'),
+    
+    # Native async variants, for ASGI deployments
+    path('webhook/async/', async_views.payment_webhook, name='payment-webhook-async'),
+    path('status/<int:payment_id>/async/', async_views.payment_status, name='payment-status-async'),
 ]
\ No newline at end of file
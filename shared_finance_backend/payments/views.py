@@ -3,16 +3,19 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from sync.conditional import ConditionalGetMixin
 from .models import Payment, LedgerEntry
 from .serializers import PaymentSerializer, LedgerEntrySerializer, PaymentCreateSerializer
 from .services import PaymentService, UPIWebhookSimulator
 
 
-class LedgerEntryViewSet(viewsets.ModelViewSet):
+class LedgerEntryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for LedgerEntry model"""
     queryset = LedgerEntry.objects.all()
     serializer_class = LedgerEntrySerializer
     permission_classes = [IsAuthenticated]
+    # Entries embed their expense, so the user's groups count too
+    version_user_scope = True
     
     def get_queryset(self):
         return LedgerEntry.objects.filter(
@@ -20,11 +23,12 @@ class LedgerEntryViewSet(viewsets.ModelViewSet):
         ).select_related('from_member', 'to_member', 'ref_expense')
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Payment model"""
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    version_user_scope = True
     
     def get_queryset(self):
         return Payment.objects.filter(
@@ -40,8 +44,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
     def status(self, request, pk=None):
         """Get payment status"""
         payment = self.get_object()
-        result = PaymentService.get_payment_status(payment.id)
-        return Response(result)
+        return Response(PaymentService.status_payload(payment))
     
     @action(detail=True, methods=['post'])
     def simulate_webhook(self, request, pk=None):
@@ -138,18 +141,16 @@ def payment_webhook(request):
 def payment_status(request, payment_id):
     """Get payment status"""
     try:
-        payment = get_object_or_404(Payment, id=payment_id)
+        payment = get_object_or_404(Payment.objects.select_related('ledger_entry'), id=payment_id)
         
         # Check if user is involved in this payment
-        if (payment.ledger_entry.from_member != request.user and 
-            payment.ledger_entry.to_member != request.user):
+        if request.user.id not in (payment.ledger_entry.from_member_id, payment.ledger_entry.to_member_id):
             return Response(
                 {'error': 'You are not authorized to view this payment'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        result = PaymentService.get_payment_status(payment_id)
-        return Response(result)
+        return Response(PaymentService.status_payload(payment))
     
     except Exception as e:
         return Response(
@@ -0,0 +1,126 @@
+"""
+Helpers for native async views served under ASGI (``shared_finance.asgi``).
+
+DRF 3.14 views are synchronous, so the async endpoints are plain Django
+coroutines wrapped in :func:`async_api_view`, which mirrors what
+``@api_view`` + ``IsAuthenticated`` give the sync views: JWT
+authentication, throttling, JSON/multipart request parsing, DRF-style JSON
+responses and CSRF exemption.
+
+CPU-bound work (settlement netting, OCR) goes through :func:`run_cpu_bound`,
+a thread pool capped at ``ASYNC_CPU_WORKERS`` so a burst of heavy requests
+queues instead of spawning unbounded threads.
+"""
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from functools import partial, wraps
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .money import MoneyJSONEncoder
+import json
+import threading
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def cpu_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASYNC_CPU_WORKERS', 4), thread_name_prefix='cpu-bound'
+            )
+        return _executor
+
+
+async def run_cpu_bound(func, *args, **kwargs):
+    """Run ``func`` in the bounded CPU pool; it must not touch the ORM"""
+    return await sync_to_async(partial(func, *args, **kwargs), thread_sensitive=False, executor=cpu_executor())()
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """Async ``get_object_or_404`` (Django 4.2 has none); accepts a model or a queryset"""
+    if hasattr(queryset, '_default_manager'):
+        queryset = queryset._default_manager.all()
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+def api_response(data, status=200) -> JsonResponse:
+    """JSON response encoded the way the API's JSONRenderer encodes it (Money as a string, ISO datetimes)"""
+    return JsonResponse(data, status=status, encoder=MoneyJSONEncoder, safe=False)
+
+
+def _authenticate(request, query_token=False):
+    authentication = JWTAuthentication()
+    result = authentication.authenticate(request)
+    if result is None and query_token and request.GET.get('token'):
+        # EventSource cannot send headers, so streams may pass the access token as ?token=
+        return authentication.get_user(authentication.get_validated_token(request.GET['token']))
+    return result[0] if result else None
+
+
+def _parse_body(request):
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    # Form and multipart bodies; files end up in request.FILES
+    return request.POST
+
+
+def _throttle_wait(request):
+    """Seconds to wait if any default DRF throttle rejects the request, else None"""
+    waits = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            waits.append(throttle.wait() or 0)
+    return max(waits) if waits else None
+
+
+def async_api_view(methods, query_token=False):
+    """
+    Async counterpart of ``@api_view(methods)`` + ``@permission_classes([IsAuthenticated])``.
+    With ``query_token`` the JWT may also be given as ``?token=``.
+    """
+    allowed = [method.upper() for method in methods]
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in allowed:
+                return api_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+            try:
+                user = await sync_to_async(_authenticate)(request, query_token)
+            except exceptions.AuthenticationFailed as exc:
+                return api_response({'detail': exc.detail}, status=exc.status_code)
+            if user is None:
+                return api_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+            request.user = user
+
+            wait = await sync_to_async(_throttle_wait)(request)
+            if wait is not None:
+                return api_response({'detail': f'Request was throttled. Expected available in {int(wait)} seconds.'},
+                                    status=429)
+
+            try:
+                request.data = await sync_to_async(_parse_body, thread_sensitive=False)(request)
+            except ValueError:
+                return api_response({'detail': 'JSON parse error'}, status=400)
+
+            try:
+                return await view(request, *args, **kwargs)
+            except Http404:
+                return api_response({'detail': 'Not found.'}, status=404)
+
+        # JWT-authenticated like the DRF views, so no CSRF token is involved
+        wrapped.csrf_exempt = True
+        return wrapped
+
+    return decorator
@@ -0,0 +1,113 @@
+"""
+PostgreSQL with an in-process connection pool.
+
+Django 4.2 has no built-in pooling: with ``CONN_MAX_AGE`` each thread keeps
+its own connection, and without it every request pays a TCP + auth
+handshake. This backend keeps up to ``POOL['max_size']`` connections per
+process; ``close()`` at the end of a request hands the connection back
+instead of disconnecting, and a request waits up to ``POOL['timeout']``
+seconds when all connections are checked out. Use it with
+``CONN_MAX_AGE = 0`` (``DATABASE_URL`` + ``DB_POOL_SIZE`` sets this up).
+"""
+from django.db import OperationalError
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL = {'max_size': 10, 'timeout': 10.0}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """LIFO pool of open DB-API connections, bounded by a semaphore"""
+
+    def __init__(self, max_size: int, timeout: float):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self, connect):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'Connection pool exhausted: {self.max_size} connections in use for {self.timeout}s'
+            )
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return connect()
+                if not connection.closed:
+                    return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, discard: bool = False):
+        try:
+            if not discard and not connection.closed:
+                try:
+                    # Never hand out a connection with an open transaction
+                    connection.rollback()
+                    self._idle.put(connection)
+                    return
+                except Exception:
+                    logger.warning('Discarding pooled connection that failed to reset', exc_info=True)
+            if not connection.closed:
+                connection.close()
+        finally:
+            self._slots.release()
+
+    def close_idle(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def get_pool(settings_dict) -> ConnectionPool:
+    key = tuple(str(settings_dict.get(field)) for field in ('NAME', 'USER', 'HOST', 'PORT'))
+    with _pools_lock:
+        if key not in _pools:
+            config = {**DEFAULT_POOL, **settings_dict.get('POOL', {})}
+            _pools[key] = ConnectionPool(int(config['max_size']), float(config['timeout']))
+        return _pools[key]
+
+
+def close_idle_connections():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would make DROP DATABASE fail
+        close_idle_connections()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.settings_dict)
+        connection = pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # Normally set by the parent while connecting; reused connections skip that
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            get_pool(self.settings_dict).release(self.connection, discard=self.errors_occurred)
@@ -0,0 +1,47 @@
+"""
+SQLite tuned for a single-node deployment with concurrent writers.
+
+On top of Django's backend, each connection switches the journal to WAL
+(readers no longer block the writer), relaxes ``synchronous`` to NORMAL
+(durable across application crashes, fsync only at checkpoints) and waits
+``timeout`` seconds on a locked database. Transactions opened by
+``atomic()`` take the write lock up front (``BEGIN IMMEDIATE``) so they
+queue on the busy timeout instead of failing with "database is locked"
+when a read transaction later tries to write.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+TRANSACTION_MODES = {'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE'}
+
+
+def _option(options, key, default, allowed):
+    value = str(options.get(key, default)).upper()
+    if value not in allowed:
+        raise ImproperlyConfigured(f"Invalid SQLite {key} '{value}', expected one of {sorted(allowed)}")
+    return value
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.journal_mode = _option(options, 'journal_mode', 'WAL', JOURNAL_MODES)
+        self.synchronous = _option(options, 'synchronous', 'NORMAL', SYNCHRONOUS_MODES)
+        self.transaction_mode = _option(options, 'transaction_mode', 'IMMEDIATE', TRANSACTION_MODES)
+
+        params = super().get_connection_params()
+        for key in ('journal_mode', 'synchronous', 'transaction_mode'):
+            params.pop(key, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f"PRAGMA busy_timeout = {int(conn_params.get('timeout', 5) * 1000)}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,160 @@
+"""
+Per-user live events for the server-sent events stream.
+
+Writers call :func:`publish` (or :func:`publish_on_commit` for payloads
+built at commit time); once the transaction commits the event goes to the
+broker named by ``EVENT_BROKER``, which fans it out to the open streams of
+the given users. The default :class:`InProcessBroker` only
+reaches streams served by the same process, so run a single ASGI worker or
+point ``EVENT_BROKER`` at a class with the same interface backed by a local
+broker (Redis pub/sub, Postgres ``LISTEN``/``NOTIFY``).
+"""
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, Optional, Set
+from .money import MoneyJSONEncoder
+from .transactions import TransactionBatch
+import asyncio
+import itertools
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    name: str
+    data: Dict[str, Any]
+
+    def encode(self) -> str:
+        """SSE wire format"""
+        return f"id: {self.id}\nevent: {self.name}\ndata: {json.dumps(self.data, cls=MoneyJSONEncoder)}\n\n"
+
+
+class Subscription:
+    """One open stream; events are handed over to the stream's event loop"""
+
+    def __init__(self, user_id: int, max_pending: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+
+    def put(self, event: Event):
+        # Runs on the subscriber's loop; a slow client loses its oldest events, not the newest
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Event:
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Broker for streams served by this process; thread-safe, publishes from sync or async code"""
+
+    def __init__(self, replay_size: int = 100, max_pending: int = 100):
+        self.replay_size = replay_size
+        self.max_pending = max_pending
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._recent: Dict[int, Deque[Event]] = {}
+
+    def subscribe(self, user_id: int, last_event_id: Optional[int] = None) -> Subscription:
+        """Open a subscription; events after ``last_event_id`` still in the replay buffer are queued first"""
+        subscription = Subscription(user_id, self.max_pending)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+            self._recent.setdefault(user_id, deque(maxlen=self.replay_size))
+            missed = [event for event in self._recent.get(user_id, ()) if last_event_id is not None
+                      and event.id > last_event_id]
+        for event in missed:
+            subscription.put(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def has_subscribers(self, user_ids: Iterable[int]) -> bool:
+        with self._lock:
+            return any(user_id in self._subscriptions for user_id in user_ids)
+
+    def publish(self, user_ids: Iterable[int], name: str, data: Dict[str, Any]):
+        with self._lock:
+            targets = []
+            for user_id in set(user_ids):
+                recent = self._recent.get(user_id)
+                if recent is None:
+                    # Replay is kept only for users who have streamed from this process
+                    continue
+                event = Event(next(self._ids), name, data)
+                recent.append(event)
+                targets.extend((subscription, event) for subscription in self._subscriptions.get(user_id, ()))
+        for subscription, event in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The stream's loop has shut down; it unsubscribes on its way out
+                pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            broker_class = import_string(getattr(settings, 'EVENT_BROKER', 'shared_finance.events.InProcessBroker'))
+            _broker = broker_class(replay_size=getattr(settings, 'EVENT_REPLAY_SIZE', 100))
+        return _broker
+
+
+class PendingEvents(TransactionBatch):
+    """Callbacks queued by one transaction, keyed so repeated changes publish once"""
+
+    def __init__(self):
+        self.callbacks: Dict[Hashable, Callable[[], None]] = {}
+
+    def flush(self):
+        self.flushed = True
+        callbacks, self.callbacks = list(self.callbacks.values()), {}
+        for callback in callbacks:
+            _run(callback)
+
+
+def _run(callback: Callable[[], None]):
+    try:
+        callback()
+    except Exception as e:
+        # Live updates must never break the write that caused them
+        logger.error(f"Error publishing live event: {e}")
+
+
+def publish_on_commit(callback: Callable[[], None], key: Optional[Hashable] = None):
+    """
+    Run ``callback`` once the current transaction commits (immediately in autocommit).
+    A later callback with the same ``key`` in the same transaction replaces the earlier one.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _run(callback)
+        return
+    PendingEvents.current().callbacks[key if key is not None else object()] = callback
+
+
+def publish(user_ids: List[int], name: str, data: Dict[str, Any]):
+    """Queue ``data`` as event ``name`` for ``user_ids`` after commit"""
+    publish_on_commit(lambda: get_broker().publish(user_ids, name, data))
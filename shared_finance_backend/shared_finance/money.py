@@ -0,0 +1,276 @@
+"""
+Money as integer paise.
+
+``Money`` is an amount in the minor unit of its currency (paise for INR,
+cents for USD). Sums and differences are exact integer arithmetic, which is
+what balance computation and splitting do in their inner loops; scaling by
+anything but an int gives the exact Decimal to round back with
+``Money.of``.
+
+``MoneyField`` stores it in a BIGINT column, so database sums are exact
+integers too. Model attributes are always Money: Decimals, strings and ints
+assigned to them are read as amounts in the currency's major unit (rupees)
+and rounded to paise half-even, as the DecimalFields they replace rounded.
+
+The API renders Money as an exact string, ``"1234.50"``: serializers through
+``MoneySerializerField``, and anything else through ``MoneyJSONEncoder``,
+which renders Decimal amounts the same way rather than as lossy floats.
+"""
+from decimal import Decimal, InvalidOperation
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Round
+from django.db.models.query_utils import DeferredAttribute
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from typing import Any, List, Optional
+import numbers
+
+
+class Money:
+    """An exact amount in paise"""
+    
+    __slots__ = ('paise',)
+    
+    def __init__(self, paise: int = 0):
+        self.paise = paise
+    
+    @classmethod
+    def of(cls, value: Any) -> 'Money':
+        """``value`` in rupees (a Decimal, str, int or float) as Money; Money passes through"""
+        if isinstance(value, Money):
+            return value
+        if isinstance(value, int):
+            return cls(value * 100)
+        if not isinstance(value, Decimal):
+            try:
+                value = Decimal(str(value).strip())
+            except InvalidOperation:
+                raise ValueError(f'{value!r} is not an amount')
+        if not value.is_finite():
+            raise ValueError(f'{value!r} is not an amount')
+        return cls(int(value.scaleb(2).to_integral_value()))
+    
+    @property
+    def decimal(self) -> Decimal:
+        """The amount in rupees, with two decimal places"""
+        return Decimal(self.paise).scaleb(-2)
+    
+    def split(self, count: int) -> List['Money']:
+        """``count`` shares a paisa apart at most, summing to this amount exactly; larger shares first"""
+        base, extra = divmod(self.paise, count)
+        return [Money(base + 1) if index < extra else Money(base) for index in range(count)]
+    
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.paise + other.paise)
+        if other == 0:
+            # sum() starts from 0
+            return self
+        return NotImplemented
+    
+    __radd__ = __add__
+    
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.paise - other.paise)
+        if other == 0:
+            return self
+        return NotImplemented
+    
+    def __rsub__(self, other):
+        if other == 0:
+            return -self
+        return NotImplemented
+    
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return Money(self.paise * other)
+        if isinstance(other, (Decimal, numbers.Rational)):
+            return self.decimal * other
+        return NotImplemented
+    
+    __rmul__ = __mul__
+    
+    def __truediv__(self, other):
+        """An exact Decimal: a share of money is rounded back to paise when stored"""
+        if isinstance(other, (int, Decimal)):
+            return self.decimal / other
+        return NotImplemented
+    
+    def __neg__(self):
+        return Money(-self.paise)
+    
+    def __pos__(self):
+        return self
+    
+    def __abs__(self):
+        return Money(abs(self.paise))
+    
+    def __bool__(self):
+        return self.paise != 0
+    
+    def __float__(self):
+        return self.paise / 100
+    
+    def _compare(self, other) -> Optional[tuple]:
+        # Money compares with Money by paise, and with plain numbers as an amount in rupees
+        if isinstance(other, Money):
+            return self.paise, other.paise
+        if isinstance(other, (int, Decimal)):
+            return self.paise, other * 100
+        if isinstance(other, float):
+            return self.paise / 100, other
+        return None
+    
+    def __eq__(self, other):
+        pair = self._compare(other)
+        return NotImplemented if pair is None else pair[0] == pair[1]
+    
+    def __lt__(self, other):
+        pair = self._compare(other)
+        return NotImplemented if pair is None else pair[0] < pair[1]
+    
+    def __le__(self, other):
+        pair = self._compare(other)
+        return NotImplemented if pair is None else pair[0] <= pair[1]
+    
+    def __gt__(self, other):
+        pair = self._compare(other)
+        return NotImplemented if pair is None else pair[0] > pair[1]
+    
+    def __ge__(self, other):
+        pair = self._compare(other)
+        return NotImplemented if pair is None else pair[0] >= pair[1]
+    
+    def __hash__(self):
+        # Equal to the Decimal of the same amount, so hashed like it
+        return hash(self.decimal)
+    
+    def __str__(self):
+        sign = '-' if self.paise < 0 else ''
+        rupees, paise = divmod(abs(self.paise), 100)
+        return f'{sign}{rupees}.{paise:02d}'
+    
+    def __repr__(self):
+        return f"Money('{self}')"
+    
+    def __format__(self, spec):
+        return format(self.decimal, spec) if spec else str(self)
+    
+    def __reduce__(self):
+        return Money, (self.paise,)
+
+
+class MoneyAttribute(DeferredAttribute):
+    """Keeps the model attribute a Money whatever is assigned, as the column will store it"""
+    
+    def __set__(self, instance, value):
+        if value is not None and not hasattr(value, 'resolve_expression'):
+            value = Money.of(value)
+        instance.__dict__[self.field.attname] = value
+
+
+class MoneyField(models.BigIntegerField):
+    """An amount stored as integer paise"""
+    
+    description = 'Amount in paise'
+    descriptor_class = MoneyAttribute
+    
+    @cached_property
+    def validators(self):
+        # BigIntegerField's range limits are in paise; Money compares with numbers in rupees
+        return [*self.default_validators, *self._validators]
+    
+    def from_db_value(self, value, expression, connection):
+        # SQLite sums of integers are integers; PostgreSQL sums bigints as numeric
+        return None if value is None else Money(int(value))
+    
+    def to_python(self, value):
+        if value is None:
+            return value
+        try:
+            return Money.of(value)
+        except ValueError:
+            raise ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+    
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return Money.of(value).paise
+    
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return None if value is None else str(value)
+    
+    def formfield(self, **kwargs):
+        # Rupees with paise in forms, without BigIntegerField's paise range
+        return models.Field.formfield(self, **{'form_class': forms.DecimalField, 'decimal_places': 2, **kwargs})
+
+
+def decimal_to_money(app_label: str, model_name: str, field_name: str, decimal_field: models.DecimalField,
+                     money_field: MoneyField) -> List[migrations.operations.base.Operation]:
+    """
+    Migration operations turning ``decimal_field`` into ``money_field`` with
+    its data: the amounts are copied as paise into a new column, which then
+    takes the old column's name. Unlike altering the column type in place this
+    works on every database, and it reverses.
+    """
+    temporary = f'{field_name}_paise'
+    
+    def to_paise(apps, schema_editor):
+        apps.get_model(app_label, model_name).objects.update(
+            **{temporary: Cast(Round(F(field_name) * 100), models.BigIntegerField())}
+        )
+    
+    def to_decimal(apps, schema_editor):
+        apps.get_model(app_label, model_name).objects.update(**{field_name: F(temporary) / Value(100.0)})
+    
+    nullable = decimal_field.clone()
+    nullable.null = True
+    return [
+        migrations.AddField(model_name, temporary, MoneyField(default=0)),
+        # Nullable while the amounts move, so that reversing can add it back to a table with rows
+        migrations.AlterField(model_name, field_name, nullable),
+        migrations.RunPython(to_paise, to_decimal),
+        migrations.RemoveField(model_name, field_name),
+        migrations.RenameField(model_name, temporary, field_name),
+        migrations.AlterField(model_name, field_name, money_field),
+    ]
+
+
+class MoneySerializerField(serializers.DecimalField):
+    """A MoneyField in the API: an exact string out, a number or string of rupees in"""
+    
+    def __init__(self, max_digits: int = 10, decimal_places: int = 2, **kwargs):
+        super().__init__(max_digits, decimal_places, **kwargs)
+    
+    def to_internal_value(self, data):
+        return Money.of(super().to_internal_value(data))
+    
+    def to_representation(self, value):
+        return str(Money.of(value))
+
+
+# ModelSerializers pick MoneySerializerField for MoneyField
+serializers.ModelSerializer.serializer_field_mapping[MoneyField] = MoneySerializerField
+
+
+class MoneyJSONEncoder(JSONEncoder):
+    """DRF's encoder with Money and Decimals as exact strings"""
+    
+    def default(self, obj):
+        if isinstance(obj, Money):
+            return str(obj)
+        if isinstance(obj, Decimal) and obj.is_finite():
+            # Amounts in rupees as Money renders them; finer values (FX rounding drift) in full
+            return str(Money.of(obj)) if obj.as_tuple().exponent >= -2 else format(obj, 'f')
+        return super().default(obj)
+
+
+class MoneyJSONRenderer(JSONRenderer):
+    encoder_class = MoneyJSONEncoder
@@ -0,0 +1,274 @@
+"""
+Opt-in per-view SQL profiling.
+
+Enable with ``QUERY_PROFILING=True``. Every request records its query
+count, total database time, repeated query fingerprints (the N+1 pattern)
+and time spent rendering DRF serializers. Totals are aggregated per view
+in-process and exposed in Prometheus text format at ``/metrics``; each
+gunicorn worker reports its own counters.
+
+The middleware runs under WSGI and ASGI. Queries are charged to the request
+through a context variable, which ``sync_to_async`` carries into its worker
+threads, so ORM calls from async views count too.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from django.utils.crypto import constant_time_compare
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from typing import Dict, Optional
+import hashlib
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_active_profile: ContextVar[Optional['RequestProfile']] = ContextVar('active_query_profile', default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+# Number of repeated fingerprints kept per view
+TOP_DUPLICATES = 10
+
+
+def fingerprint(sql: str) -> str:
+    """Normalise literals and IN-lists so queries differing only in parameters compare equal"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class RequestProfile:
+    """Statistics for a single request, fed by a database execute wrapper"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.fingerprints: Counter = Counter()
+        # Async views can run queries in several worker threads at once
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.db_time += elapsed
+                self.queries += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self) -> Dict[str, int]:
+        """Fingerprints executed more than once, with the number of repeats"""
+        return {sql: count - 1 for sql, count in self.fingerprints.items() if count > 1}
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.duration_seconds = 0.0
+        self.budget_exceeded = 0
+        self.duplicates: Counter = Counter()
+
+
+class ProfileRegistry:
+    """Process-wide per-view aggregates"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views: Dict[str, ViewStats] = defaultdict(ViewStats)
+
+    def record(self, view: str, profile: RequestProfile, duration: float, over_budget: bool):
+        with self._lock:
+            stats = self.views[view]
+            stats.requests += 1
+            stats.queries += profile.queries
+            stats.db_seconds += profile.db_time
+            stats.serializer_seconds += profile.serializer_time
+            stats.duration_seconds += duration
+            stats.budget_exceeded += int(over_budget)
+            stats.duplicates.update(profile.duplicates)
+            # Keep label cardinality bounded
+            if len(stats.duplicates) > TOP_DUPLICATES * 2:
+                stats.duplicates = Counter(dict(stats.duplicates.most_common(TOP_DUPLICATES)))
+
+    def reset(self):
+        with self._lock:
+            self.views.clear()
+
+    def render(self) -> str:
+        metrics = [
+            ('requests_total', 'counter', 'Requests profiled', 'requests'),
+            ('queries_total', 'counter', 'SQL statements executed', 'queries'),
+            ('db_seconds_total', 'counter', 'Time spent in the database', 'db_seconds'),
+            ('serializer_seconds_total', 'counter', 'Time spent rendering serializers', 'serializer_seconds'),
+            ('duration_seconds_total', 'counter', 'Total request time', 'duration_seconds'),
+            ('query_budget_exceeded_total', 'counter', 'Requests over their query budget', 'budget_exceeded'),
+        ]
+        with self._lock:
+            views = sorted(self.views.items())
+            lines = []
+            for name, kind, help_text, attr in metrics:
+                lines.append(f'# HELP shared_finance_view_{name} {help_text}')
+                lines.append(f'# TYPE shared_finance_view_{name} {kind}')
+                for view, stats in views:
+                    lines.append(f'shared_finance_view_{name}{{view="{_escape(view)}"}} {getattr(stats, attr)}')
+
+            lines.append('# HELP shared_finance_view_duplicate_queries_total Repeated executions of one query shape')
+            lines.append('# TYPE shared_finance_view_duplicate_queries_total counter')
+            for view, stats in views:
+                for sql, count in stats.duplicates.most_common(TOP_DUPLICATES):
+                    digest = hashlib.sha1(sql.encode()).hexdigest()[:12]
+                    lines.append(
+                        f'shared_finance_view_duplicate_queries_total{{view="{_escape(view)}",'
+                        f'fingerprint="{digest}",sql="{_escape(sql[:200])}"}} {count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = ProfileRegistry()
+
+
+def _install_serializer_timer():
+    """Time top-level ``serializer.data`` calls and charge them to the active request"""
+    from rest_framework.serializers import BaseSerializer
+
+    data = BaseSerializer.data
+    if getattr(data.fget, 'profiled', False):
+        return
+
+    def timed_data(self):
+        profile = _active_profile.get()
+        if profile is None:
+            return data.fget(self)
+        started = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            profile.serializer_time += time.perf_counter() - started
+
+    timed_data.profiled = True
+    BaseSerializer.data = property(timed_data)
+
+
+def query_budget(view: str) -> int:
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view, settings.QUERY_BUDGET_DEFAULT)
+
+
+def _profiled_execute(execute, sql, params, many, context):
+    profile = _active_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def _install_execute_wrapper(sender=None, connection=None, **kwargs):
+    """Add the profiling wrapper to ``connection``, or to this thread's open connections"""
+    for conn in [connection] if connection is not None else connections.all(initialized_only=True):
+        if _profiled_execute not in conn.execute_wrappers:
+            conn.execute_wrappers.append(_profiled_execute)
+
+
+class QueryProfilingMiddleware:
+    """
+    Records per-request query statistics; removed from the stack unless QUERY_PROFILING_ENABLED.
+
+    Connections are wrapped as they open, in every thread, and queries are
+    charged to whichever request is active in the calling context.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        _install_serializer_timer()
+        connection_created.connect(_install_execute_wrapper, dispatch_uid='query_profiling')
+        _install_execute_wrapper()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        self.record(request, profile, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        self.record(request, profile, time.perf_counter() - started)
+        return response
+
+    def record(self, request, profile: RequestProfile, duration: float):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match.route) if match else 'unresolved'
+        budget = query_budget(view)
+        over_budget = profile.queries > budget
+        registry.record(view, profile, duration, over_budget)
+
+        if over_budget:
+            worst = max(profile.duplicates.items(), key=lambda item: item[1], default=None)
+            logger.warning(
+                f"{view} ran {profile.queries} queries (budget {budget}) in {profile.db_time * 1000:.1f} ms"
+                + (f"; repeated {worst[1]}x: {worst[0][:200]}" if worst else '')
+            )
+
+
+def _metrics_allowed(request) -> bool:
+    """``METRICS_TOKEN`` as a bearer token, or a staff user by session or JWT"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return True
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        user = authenticated[0] if authenticated else None
+    return bool(user and user.is_active and user.is_staff)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the per-view aggregates; never public, even without METRICS_TOKEN"""
+    if not getattr(settings, 'QUERY_PROFILING_ENABLED', False):
+        return HttpResponseNotFound()
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from .database import database_config
 
 # Load environment variables
 load_dotenv()
@@ -59,9 +60,12 @@ INSTALLED_APPS = [
     'ocr',
     'audits',
     'notifications',
+    'analytics',
+    'sync',
 ]
 
 MIDDLEWARE = [
+    'shared_finance.profiling.QueryProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -95,12 +99,10 @@ WSGI_APPLICATION = 'shared_finance.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# Configured from DATABASE_URL (SQLite db.sqlite3 by default), see shared_finance/database.py
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
 
@@ -161,6 +163,10 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'shared_finance.money.MoneyJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -225,6 +231,51 @@ REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = [
     'rest_framework.throttling.UserRateThrottle'
 ]
 REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {
-    'anon': '100/hour',
-    'user': '1000/hour'
+    'anon': os.getenv('THROTTLE_ANON_RATE', '100/hour'),
+    'user': os.getenv('THROTTLE_USER_RATE', '1000/hour')
+}
+
+# Unread notifications of the same kind and group within this window are merged
+NOTIFICATION_COALESCE_SECONDS = int(os.getenv('NOTIFICATION_COALESCE_SECONDS', '600'))
+
+# Live event stream. The in-process broker only reaches streams served by the same
+# process; point EVENT_BROKER at a broker-backed class when running several ASGI workers
+EVENT_BROKER = os.getenv('EVENT_BROKER', 'shared_finance.events.InProcessBroker')
+EVENT_REPLAY_SIZE = int(os.getenv('EVENT_REPLAY_SIZE', '100'))
+EVENT_STREAM_HEARTBEAT_SECONDS = int(os.getenv('EVENT_STREAM_HEARTBEAT_SECONDS', '15'))
+EVENT_STREAM_MAX_SECONDS = int(os.getenv('EVENT_STREAM_MAX_SECONDS', '300'))
+EVENT_STREAM_RETRY_MS = int(os.getenv('EVENT_STREAM_RETRY_MS', '3000'))
+
+# Delta sync: changes per /api/sync/ page (a single transaction is never split)
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', '500'))
+
+# Dashboard bootstrap: recent expenses returned by /api/bootstrap/
+BOOTSTRAP_RECENT_EXPENSES = int(os.getenv('BOOTSTRAP_RECENT_EXPENSES', '20'))
+
+# Offline replay: operations accepted per /api/sync/batch/ request
+SYNC_BATCH_MAX_OPERATIONS = int(os.getenv('SYNC_BATCH_MAX_OPERATIONS', '200'))
+
+# Exchange rates for foreign-currency expenses: a CSV of date,currency,rate, where rate is the
+# price of one unit of currency in FX_BASE_CURRENCY on that date
+FX_RATES_FILE = os.getenv('FX_RATES_FILE', str(BASE_DIR / 'fx_rates.csv'))
+FX_BASE_CURRENCY = os.getenv('FX_BASE_CURRENCY', 'INR')
+FX_RATE_CACHE_SIZE = int(os.getenv('FX_RATE_CACHE_SIZE', '4096'))
+
+# Async views: worker threads for CPU-bound work (settlement netting, OCR) per process
+ASYNC_CPU_WORKERS = int(os.getenv('ASYNC_CPU_WORKERS', '4'))
+
+
+# Query profiling (opt-in): per-view query counts, DB and serializer time at /metrics
+QUERY_PROFILING_ENABLED = os.getenv('QUERY_PROFILING', 'False').lower() == 'true'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', '30'))
+QUERY_BUDGETS = {
+    'group-list': 10,
+    'expense-list': 10,
+    'compute-settlement': 15,
+    'settlement-graph': 15,
+    'initiate-payment': 10,
+    # Fixed write work: the payment, its ledger entries, rollups and notifications
+    'payment-webhook': 20,
+    'upload-receipt': 15,
 }
@@ -0,0 +1,61 @@
+"""
+State shared by the writes of one transaction and handed over once it commits.
+
+Signal handlers fire once per row, but live events, notifications and the
+change sequence number are per transaction. Each keeps a
+:class:`TransactionBatch` on the connection, registered with a single
+``on_commit`` callback.
+"""
+from django.db import transaction
+from typing import Callable, Optional, Type, TypeVar
+import weakref
+
+B = TypeVar('B', bound='TransactionBatch')
+
+
+def on_commit_ref(callback: Callable[[], None], using: Optional[str] = None) -> weakref.ref:
+    """
+    Register ``callback`` with ``transaction.on_commit`` and return a weak reference to it.
+
+    Django holds the only strong reference, so the weak reference dies when a
+    rollback of the transaction, or of a savepoint it was registered under,
+    discards the callback. Pass a fresh callable (a bound method or a lambda).
+    """
+    transaction.on_commit(callback, using=using)
+    return weakref.ref(callback)
+
+
+class TransactionBatch:
+    """
+    Per-transaction state with one ``on_commit`` callback that calls :meth:`flush`.
+
+    ``scheduled`` is true from :meth:`schedule` until the batch is flushed or
+    a rollback discards its callback; in either case :meth:`current` starts a
+    fresh batch.
+    """
+
+    flushed = False
+    _callback: Optional[weakref.ref] = None
+
+    def flush(self):
+        raise NotImplementedError
+
+    def schedule(self, using: Optional[str] = None):
+        self._callback = on_commit_ref(self.flush, using)
+
+    @property
+    def scheduled(self) -> bool:
+        return not self.flushed and self._callback is not None and self._callback() is not None
+
+    @classmethod
+    def current(cls: Type[B], using: Optional[str] = None) -> B:
+        """The batch of the open transaction on ``using``"""
+        connection = transaction.get_connection(using)
+        batches = getattr(connection, '_transaction_batches', None)
+        if batches is None:
+            batches = connection._transaction_batches = {}
+        batch = batches.get(cls)
+        if batch is None or not batch.scheduled:
+            batch = batches[cls] = cls()
+            batch.schedule(using)
+        return batch
@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from users.views import bootstrap
+from .profiling import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -35,6 +37,12 @@ urlpatterns = [
     path('api/fairness/', include('fairness.urls')),
     path('api/ocr/', include('ocr.urls')),
     path('api/consents/', include('audits.urls')),
+    path('api/notifications/', include('notifications.urls')),
+    path('api/sync/', include('sync.urls')),
+    path('api/bootstrap/', bootstrap, name='bootstrap'),
+    
+    # Query profiling metrics (Prometheus text format)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import AppliedOperation, Tombstone
+
+
+@admin.register(Tombstone)
+class TombstoneAdmin(admin.ModelAdmin):
+    list_display = ('model', 'object_id', 'group_id', 'user_id', 'change_seq', 'deleted_at')
+    list_filter = ('model',)
+    readonly_fields = ('deleted_at',)
+
+
+@admin.register(AppliedOperation)
+class AppliedOperationAdmin(admin.ModelAdmin):
+    list_display = ('key', 'operation', 'user', 'status_code', 'created_at')
+    list_filter = ('operation', 'status_code')
+    search_fields = ('key', 'user__username')
+    readonly_fields = ('created_at',)
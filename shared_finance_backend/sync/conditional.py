@@ -0,0 +1,92 @@
+from django.db.models import OuterRef, Q, Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from functools import reduce
+from typing import Optional
+from groups.models import GroupMember
+from .models import Version
+import hashlib
+import operator
+
+
+def member_groups(user):
+    """Ids of the user's active groups, as a subquery"""
+    return GroupMember.objects.filter(user=user, is_active=True).values('group_id')
+
+
+def version_etag(request, user=None, groups=None, extra=None) -> str:
+    """
+    ETag for a response built from ``user``'s ledger and payments and from
+    the data of ``groups`` (ids or a subquery), read in one query. The
+    requesting user and the full path are part of it, so users, pages and
+    filters of the same list never share a tag. ``extra`` folds in inputs
+    that no version covers.
+    """
+    conditions = []
+    if user is not None:
+        conditions.append(Q(scope=Version.USER, object_id=user.pk))
+    if groups is not None:
+        conditions.append(Q(scope=Version.GROUP, object_id__in=groups))
+    versions = sorted(
+        Version.objects.filter(reduce(operator.or_, conditions)).values_list('scope', 'object_id', 'value')
+    ) if conditions else []
+    return _etag(request, versions, extra)
+
+
+def member_group_etag(request, group_id) -> Optional[str]:
+    """
+    ETag for a response built from one group's data, or None unless the
+    requesting user is an active member, so that only responses they may
+    see are tagged. Membership and version are read in one query.
+    """
+    rows = list(
+        member_groups(request.user).filter(group_id=group_id).annotate(
+            version=Subquery(Version.objects.filter(scope=Version.GROUP, object_id=OuterRef('group_id')).values('value'))
+        ).values_list('version', flat=True)[:1]
+    )
+    if not rows:
+        return None
+    versions = [(Version.GROUP, int(group_id), rows[0])] if rows[0] is not None else []
+    return _etag(request, versions)
+
+
+def _etag(request, versions, extra=None) -> str:
+    digest = hashlib.sha1(repr((request.user.pk, request.get_full_path(), versions, extra)).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+class ConditionalGetMixin:
+    """
+    ETags for ``list`` and ``retrieve`` from data versions. A matching
+    ``If-None-Match`` gets a 304 before the queryset or the serializer runs.
+
+    The tag covers the user's active groups. ``version_group_lookup`` narrows
+    ``retrieve`` to the group of the object (a path from GroupMember to the
+    object, e.g. ``'group__expenses'``), and ``version_user_scope`` adds the
+    user's ledger and payments.
+    """
+
+    version_group_lookup = None
+    version_user_scope = False
+
+    def get_etag(self, request) -> str:
+        groups = member_groups(request.user)
+        if self.action == 'retrieve' and self.version_group_lookup:
+            lookup = str(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, ''))
+            groups = groups.filter(**{self.version_group_lookup: lookup}) if lookup.isdigit() else groups.none()
+        return version_etag(request, user=request.user if self.version_user_scope else None, groups=groups)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag) or handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-19 05:57
+
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    ChangeCounter = apps.get_model('sync', 'ChangeCounter')
+    ChangeCounter.objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'sync_changecounter',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('change_seq', models.BigIntegerField(db_index=True)),
+                ('model', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('group_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('user_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'sync_tombstone',
+            },
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-19 07:38
+
+from django.db import migrations, models
+import shared_finance.money
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0003_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appliedoperation',
+            name='result',
+            field=models.JSONField(default=dict, encoder=shared_finance.money.MoneyJSONEncoder),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 09:12
+
+from django.db import migrations
+
+
+def create_sequence(apps, schema_editor):
+    # PostgreSQL draws change_seq values from a sequence; SQLite keeps the counter row
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    ChangeCounter = apps.get_model('sync', 'ChangeCounter')
+    value = ChangeCounter.objects.using(schema_editor.connection.alias).filter(pk=1).values_list(
+        'value', flat=True
+    ).first() or 0
+    schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS sync_change_seq START WITH {value + 1}')
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT last_value, is_called FROM sync_change_seq')
+        last_value, is_called = cursor.fetchone()
+    ChangeCounter = apps.get_model('sync', 'ChangeCounter')
+    ChangeCounter.objects.using(schema_editor.connection.alias).update_or_create(
+        pk=1, defaults={'value': last_value if is_called else last_value - 1}
+    )
+    schema_editor.execute('DROP SEQUENCE sync_change_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0004_appliedoperation_result_money'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
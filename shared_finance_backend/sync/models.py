@@ -0,0 +1,240 @@
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.db.models import F
+from typing import Iterable, Optional, Tuple
+from shared_finance.money import MoneyJSONEncoder
+from shared_finance.transactions import TransactionBatch, on_commit_ref
+import weakref
+
+
+# PostgreSQL sequence that hands out change_seq values (see migration 0005)
+CHANGE_SEQUENCE = 'sync_change_seq'
+
+# First key of the advisory lock each PostgreSQL transaction takes, with its backend pid, before
+# allocating its number; the number itself is held as a bigint advisory lock until the transaction ends
+ALLOCATING_LOCK = 0x5359
+
+
+class ChangeCounter(models.Model):
+    """Single-row source of ``change_seq`` values on SQLite, which runs one writer at a time anyway"""
+    
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Change sequence at {self.value}"
+    
+    class Meta:
+        db_table = 'sync_changecounter'
+
+
+class _TransactionSeq(TransactionBatch):
+    """Sequence number shared by every write in one transaction"""
+    
+    def __init__(self, value: int):
+        self.value = value
+        # Version keys written in this transaction, each with a weak reference to the on_commit marker of its write
+        self.bumped = {}
+    
+    def flush(self):
+        self.flushed = True
+
+
+def _increment_counter(connection) -> int:
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # Two statements so the pid lock is held before nextval() runs; see _postgresql_bound()
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock({lock}, pg_backend_pid()); '
+                "SELECT value FROM (SELECT nextval('{sequence}') AS value) allocated, "
+                'LATERAL pg_advisory_xact_lock(value) AS held'.format(lock=ALLOCATING_LOCK, sequence=CHANGE_SEQUENCE)
+            )
+            return cursor.fetchone()[0]
+    
+    # UPDATE ... RETURNING is available wherever INSERT ... RETURNING is (SQLite 3.35+)
+    if connection.features.can_return_columns_from_insert:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE {table} SET value = value + 1 WHERE id = 1 RETURNING value'.format(
+                    table=connection.ops.quote_name(ChangeCounter._meta.db_table)
+                )
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            return row[0]
+    
+    counters = ChangeCounter.objects.using(connection.alias)
+    if not counters.filter(pk=1).update(value=F('value') + 1):
+        counters.get_or_create(pk=1)
+        counters.filter(pk=1).update(value=F('value') + 1)
+    return counters.values_list('value', flat=True).get(pk=1)
+
+
+def _postgresql_bound(connection) -> int:
+    """
+    Highest number below which no transaction is still open.
+
+    The sequence is read first, then the advisory locks of open transactions.
+    A transaction that drew a number up to that value already held its pid
+    lock, so it either shows its number lock too, or is between the two and
+    the locks are read again.
+    """
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute('SELECT last_value, is_called FROM {sequence}'.format(
+                sequence=connection.ops.quote_name(CHANGE_SEQUENCE)
+            ))
+            last_value, is_called = cursor.fetchone()
+            allocated = last_value if is_called else last_value - 1
+            cursor.execute(
+                "SELECT pid, objsubid, (classid::bigint << 32) | objid::bigint FROM pg_locks "
+                "WHERE locktype = 'advisory' AND database = "
+                "(SELECT oid FROM pg_database WHERE datname = current_database()) "
+                "AND (objsubid = 1 OR classid = %s)",
+                [ALLOCATING_LOCK],
+            )
+            allocating, held = set(), {}
+            for pid, subid, key in cursor.fetchall():
+                if subid == 1:
+                    # A transaction that drew again after a savepoint rollback holds two numbers
+                    held[pid] = min(key, held.get(pid, key))
+                else:
+                    allocating.add(pid)
+            if allocating <= held.keys():
+                return min([allocated, *(value - 1 for value in held.values())])
+
+
+def next_change_seq(using: str = 'default') -> int:
+    """
+    Allocate the change sequence number for the current transaction.
+
+    Must be called inside ``transaction.atomic``. Every write in the same
+    transaction shares one number. On PostgreSQL the number comes from a
+    sequence, so concurrent writers never wait on each other; the
+    transaction holds an advisory lock on it until it ends, and
+    :func:`current_change_seq` stays below the lowest number still held. On
+    SQLite the counter row is incremented, which holds the write lock the
+    transaction takes anyway.
+    """
+    connection = connections[using]
+    current = getattr(connection, '_change_seq', None)
+    # A rolled back transaction drops its on_commit callback along with its number
+    if current is not None and current.scheduled:
+        return current.value
+    
+    current = _TransactionSeq(_increment_counter(connection))
+    current.schedule(using)
+    connection._change_seq = current
+    return current.value
+
+
+def current_change_seq(using: str = 'default') -> int:
+    """Highest sequence number at or below which every transaction has ended"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        return _postgresql_bound(connection)
+    return ChangeCounter.objects.using(using).filter(pk=1).values_list('value', flat=True).first() or 0
+
+
+class Version(models.Model):
+    """
+    Change sequence number of the last transaction that wrote a group's data
+    (``group``) or a user's ledger entries and payments (``user``).
+    """
+    
+    GROUP = 'group'
+    USER = 'user'
+    
+    scope = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.scope} {self.object_id} at {self.value}"
+    
+    class Meta:
+        db_table = 'sync_version'
+        unique_together = ['scope', 'object_id']
+
+
+def _alive(marker: Optional[weakref.ref]) -> bool:
+    return marker is not None and marker() is not None
+
+
+def bump_versions(keys: Iterable[Tuple[str, Optional[int]]], using: str = 'default'):
+    """
+    Move the versions of ``keys`` ((scope, object_id) pairs) to the current
+    transaction's change sequence number.
+
+    Each key is written once per transaction, with one upsert for all of
+    ``keys``. A savepoint rollback drops the write's on_commit marker along
+    with the write, so the key is written again by the next change to it.
+    """
+    with transaction.atomic(using=using, savepoint=False):
+        seq = next_change_seq(using)
+        connection = connections[using]
+        current = connection._change_seq
+        keys = {key for key in keys if key[1] is not None and not _alive(current.bumped.get(key))}
+        if not keys:
+            return
+        
+        Version.objects.using(using).bulk_create(
+            [Version(scope=scope, object_id=object_id, value=seq) for scope, object_id in keys],
+            update_conflicts=True, unique_fields=['scope', 'object_id'], update_fields=['value'],
+        )
+        current.bumped.update(dict.fromkeys(keys, on_commit_ref(lambda: None, using)))
+
+
+class ChangeTrackedModel(models.Model):
+    """Rows stamped with the change sequence of the transaction that last saved them"""
+    
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+    
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            self.change_seq = next_change_seq(using)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'change_seq'}
+            super().save(*args, **kwargs)
+    
+    class Meta:
+        abstract = True
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row for delta sync. Group-scoped rows are visible to
+    the group's members through ``group_id``; ledger entries and payments get
+    one tombstone per party through ``user_id``.
+    """
+    
+    change_seq = models.BigIntegerField(db_index=True)
+    model = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    group_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    user_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted at {self.change_seq}"
+    
+    class Meta:
+        db_table = 'sync_tombstone'
+
+
+class AppliedOperation(models.Model):
+    """Result of a replayed offline write, kept under the client's idempotency key"""
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='applied_operations')
+    key = models.CharField(max_length=64)
+    operation = models.CharField(max_length=30)
+    status_code = models.PositiveSmallIntegerField()
+    result = models.JSONField(default=dict, encoder=MoneyJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.operation} {self.key} by {self.user_id}"
+    
+    class Meta:
+        db_table = 'sync_appliedoperation'
+        unique_together = ['user', 'key']
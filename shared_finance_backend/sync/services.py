@@ -0,0 +1,311 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Tuple
+from expenses.models import Expense, ExpenseSplit
+from expenses.serializers import ExpenseCreateSerializer
+from groups.models import Group, GroupMember
+from payments.models import LedgerEntry, Payment
+from payments.services import PaymentService
+from .models import AppliedOperation, Tombstone, current_change_seq, next_change_seq
+
+# Client collection name: (model, fields sent)
+SYNC_COLLECTIONS = {
+    'groups': (Group, (
+        'id', 'name', 'description', 'group_type', 'owner_id', 'currency', 'billing_cycle', 'gst_mode',
+        'is_active', 'created_at', 'updated_at',
+    )),
+    'group_members': (GroupMember, (
+        'id', 'group_id', 'user_id', 'role', 'share_factor', 'income_bracket', 'joined_at', 'is_active',
+    )),
+    'expenses': (Expense, (
+        'id', 'group_id', 'payer_id', 'amount_subtotal', 'amount_tax', 'total_amount', 'currency', 'vendor', 'gstin',
+        'invoice_no', 'category', 'description', 'date', 'is_settled', 'created_at', 'updated_at',
+    )),
+    'expense_splits': (ExpenseSplit, (
+        'id', 'expense_id', 'member_id', 'amount_owed', 'split_type', 'is_paid', 'created_at',
+    )),
+    'ledger_entries': (LedgerEntry, (
+        'id', 'from_member_id', 'to_member_id', 'amount', 'status', 'ref_expense_id', 'description',
+        'created_at', 'updated_at',
+    )),
+    'payments': (Payment, (
+        'id', 'ledger_entry_id', 'method', 'payment_ref', 'status', 'amount', 'created_at', 'updated_at',
+    )),
+}
+
+# Collections that are wholly scoped to one group, resent in full when the user joins it
+GROUP_FIELD = {
+    'groups': 'id',
+    'group_members': 'group_id',
+    'expenses': 'group_id',
+    'expense_splits': 'expense__group_id',
+}
+
+TOMBSTONE_COLLECTIONS = {model._meta.model_name: name for name, (model, _) in SYNC_COLLECTIONS.items()}
+
+
+class SyncService:
+    """Delta sync of everything a user can see, driven by ``change_seq``"""
+    
+    def __init__(self, user, page_size: Optional[int] = None):
+        self.user = user
+        self.page_size = page_size or getattr(settings, 'SYNC_PAGE_SIZE', 500)
+    
+    def visible(self, group_ids: List[int]) -> Dict[str, Any]:
+        """Querysets of the rows the user can see, per collection"""
+        mine = Q(from_member=self.user) | Q(to_member=self.user)
+        return {
+            'groups': Group.objects.filter(id__in=group_ids),
+            'group_members': GroupMember.objects.filter(group_id__in=group_ids),
+            'expenses': Expense.objects.filter(group_id__in=group_ids),
+            'expense_splits': ExpenseSplit.objects.filter(expense__group_id__in=group_ids),
+            'ledger_entries': LedgerEntry.objects.filter(mine),
+            'payments': Payment.objects.filter(
+                Q(ledger_entry__from_member=self.user) | Q(ledger_entry__to_member=self.user)
+            ),
+        }
+    
+    def changes(self, since: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Rows changed and deleted after ``since`` (everything when ``since`` is None).
+
+        Only sequence numbers up to the committed counter value are read: every
+        transaction at or below it has committed, so nothing below the returned
+        cursor can appear later. At most ``page_size`` changes are returned
+        (more when one transaction changed more rows); ``has_more`` asks the
+        client to call again with the new cursor.
+        """
+        bound = current_change_seq()
+        after = -1 if since is None else since
+        
+        memberships = list(GroupMember.objects.filter(user=self.user).values(
+            'group_id', 'is_active', 'change_seq', 'joined_seq'
+        ))
+        group_ids = [m['group_id'] for m in memberships if m['is_active']]
+        querysets = self.visible(group_ids)
+        tombstones = Tombstone.objects.filter(Q(group_id__in=group_ids) | Q(user_id=self.user.id))
+        
+        # Pick the upper bound of this page without splitting a transaction across pages
+        window = Q(change_seq__gt=after, change_seq__lte=bound)
+        seqs, has_more = [], False
+        for queryset in [*querysets.values(), tombstones]:
+            found = list(queryset.filter(window).order_by('change_seq').values_list('change_seq', flat=True)[
+                :self.page_size + 1
+            ])
+            has_more = has_more or len(found) > self.page_size
+            seqs.extend(found)
+        seqs.sort()
+        upper = bound
+        if len(seqs) > self.page_size:
+            upper = seqs[self.page_size - 1]
+            has_more = has_more or seqs[-1] > upper
+        else:
+            has_more = False
+        window = Q(change_seq__gt=after, change_seq__lte=upper)
+        
+        # Groups the user (re)joined since the cursor: their history predates it
+        joined = [] if since is None else [
+            m['group_id'] for m in memberships if m['is_active'] and after < m['joined_seq'] <= upper
+        ]
+        
+        changes = {}
+        for name, (model, fields) in SYNC_COLLECTIONS.items():
+            condition = window
+            if joined and name in GROUP_FIELD:
+                condition |= Q(**{f'{GROUP_FIELD[name]}__in': joined, 'change_seq__lte': upper})
+            changes[name] = list(querysets[name].filter(condition).order_by('id').values(*fields))
+        
+        deleted = defaultdict(set)
+        for model, object_id, group_id, user_id in tombstones.filter(window).values_list(
+            'model', 'object_id', 'group_id', 'user_id'
+        ):
+            deleted[TOMBSTONE_COLLECTIONS[model]].add(object_id)
+            if model == 'groupmember' and user_id == self.user.id and group_id not in group_ids:
+                deleted['groups'].add(group_id)
+        # Deactivated memberships hide the group without deleting anything
+        deleted['groups'].update(
+            m['group_id'] for m in memberships if not m['is_active'] and after < m['change_seq'] <= upper
+        )
+        
+        return {
+            'cursor': upper,
+            'has_more': has_more,
+            'changes': changes,
+            'deleted': {name: sorted(deleted[name]) for name in SYNC_COLLECTIONS},
+        }
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class OperationError(Exception):
+    """A replayed operation that cannot be applied; reported in its result"""
+    
+    def __init__(self, status_code: int, error: str, **extra):
+        super().__init__(error)
+        self.status_code = status_code
+        self.body = {'error': error, **extra}
+
+
+class ReplayService:
+    """
+    Applies a batch of writes the client queued while offline.
+
+    Operations run strictly in the order they were queued, so one can rely
+    on the writes of those before it. Consecutive operations on the same
+    group share a transaction; the client usually queues a group's writes
+    together, so a batch costs one transaction per group. Every
+    operation has its own savepoint, so an invalid or conflicting one is
+    rolled back and reported without affecting the rest. ``version`` is the
+    ``change_seq`` the client last saw for the row being modified; a newer
+    row is a conflict and its current state is returned. Applied results are
+    kept under the client's idempotency key, so replaying a key returns the
+    stored result instead of writing twice.
+    """
+    
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+        self.handlers = {
+            'create_expense': self.create_expense,
+            'mark_split_paid': self.mark_split_paid,
+            'initiate_payment': self.initiate_payment,
+        }
+    
+    def replay(self, operations: List[Any]) -> List[Dict[str, Any]]:
+        """One result per operation, in the order given"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(operations)
+        parsed = []
+        for index, operation in enumerate(operations):
+            try:
+                parsed.append((index, self.parse(operation)))
+            except OperationError as error:
+                results[index] = self.result(operation if isinstance(operation, dict) else {}, error.status_code, error.body)
+        
+        self.group_ids = set(
+            GroupMember.objects.filter(user=self.user, is_active=True).values_list('group_id', flat=True)
+        )
+        split_ids = [_as_int(op['args'].get('split_id')) for _, op in parsed if op['op'] == 'mark_split_paid']
+        split_groups = dict(
+            ExpenseSplit.objects.filter(id__in=[i for i in split_ids if i is not None]).values_list('id', 'expense__group_id')
+        )
+        applied = {
+            stored.key: stored
+            for stored in AppliedOperation.objects.filter(user=self.user, key__in=[op['key'] for _, op in parsed])
+        }
+        
+        def group_of(item: Tuple[int, Dict[str, Any]]) -> Optional[int]:
+            op = item[1]
+            if op['op'] == 'create_expense':
+                return _as_int(op['args'].get('group_id'))
+            if op['op'] == 'mark_split_paid':
+                return split_groups.get(_as_int(op['args'].get('split_id')))
+            # Ledger entries are between two people, outside any group
+            return None
+        
+        for _, run in groupby(parsed, key=group_of):
+            with transaction.atomic():
+                for index, op in run:
+                    results[index] = self.apply(op, applied)
+        return results
+    
+    def parse(self, operation: Any) -> Dict[str, Any]:
+        if not isinstance(operation, dict):
+            raise OperationError(400, 'Each operation must be an object')
+        key = operation.get('key')
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            raise OperationError(400, 'key must be a string of at most 64 characters')
+        if operation.get('op') not in self.handlers:
+            raise OperationError(400, f'op must be one of: {list(self.handlers)}')
+        args = operation.get('args', {})
+        if not isinstance(args, dict):
+            raise OperationError(400, 'args must be an object')
+        version = operation.get('version')
+        if version is not None and (isinstance(version, bool) or not isinstance(version, int)):
+            raise OperationError(400, 'version must be the change_seq of the row being modified')
+        return {'key': key, 'op': operation['op'], 'args': args, 'version': version}
+    
+    def result(self, op: Dict[str, Any], status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+        return {'key': op.get('key'), 'op': op.get('op'), 'status': status_code, 'result': body}
+    
+    def apply(self, op: Dict[str, Any], applied: Dict[str, AppliedOperation]) -> Dict[str, Any]:
+        stored = applied.get(op['key'])
+        if stored is None:
+            try:
+                with transaction.atomic():
+                    status_code, body = self.handlers[op['op']](op['args'], op['version'])
+                    stored = AppliedOperation.objects.create(
+                        user=self.user, key=op['key'], operation=op['op'], status_code=status_code, result=body
+                    )
+            except OperationError as error:
+                return self.result(op, error.status_code, error.body)
+            except ValidationError as error:
+                return self.result(op, 400, {'error': error.detail})
+            except IntegrityError:
+                # Another request applied the same key first
+                stored = AppliedOperation.objects.filter(user=self.user, key=op['key']).first()
+                if stored is None:
+                    raise
+            else:
+                applied[op['key']] = stored
+                return self.result(op, stored.status_code, stored.result)
+            applied[op['key']] = stored
+        
+        if stored.operation != op['op']:
+            return self.result(op, 422, {'error': 'This key was already used for a different operation'})
+        return {**self.result(op, stored.status_code, stored.result), 'replayed': True}
+    
+    def check_version(self, instance, version: Optional[int], collection: str):
+        if version is not None and instance.change_seq != version:
+            fields = SYNC_COLLECTIONS[collection][1]
+            raise OperationError(
+                409, 'Changed since the client last synced',
+                current={field: getattr(instance, field) for field in fields}
+            )
+    
+    def create_expense(self, args: Dict[str, Any], version: Optional[int]) -> Tuple[int, Dict[str, Any]]:
+        serializer = ExpenseCreateSerializer(data=args, context={'request': self.request})
+        serializer.is_valid(raise_exception=True)
+        expense = serializer.save()
+        return 201, {'id': expense.id, 'version': expense.change_seq}
+    
+    def mark_split_paid(self, args: Dict[str, Any], version: Optional[int]) -> Tuple[int, Dict[str, Any]]:
+        split = ExpenseSplit.objects.select_for_update(of=('self',)).filter(
+            id=_as_int(args.get('split_id')), expense__group_id__in=self.group_ids
+        ).first()
+        if split is None:
+            raise OperationError(404, 'Split not found')
+        if split.member_id != self.user.id:
+            raise OperationError(403, 'You can only mark your own splits as paid')
+        self.check_version(split, version, 'expense_splits')
+        
+        split.is_paid = True
+        split.save()
+        return 200, {'id': split.id, 'version': split.change_seq}
+    
+    def initiate_payment(self, args: Dict[str, Any], version: Optional[int]) -> Tuple[int, Dict[str, Any]]:
+        method = args.get('method', 'UPI_DEEPLINK')
+        if method not in dict(Payment.PAYMENT_METHODS):
+            raise OperationError(400, f'Invalid payment method. Must be one of: {[m for m, _ in Payment.PAYMENT_METHODS]}')
+        entry = LedgerEntry.objects.select_for_update(of=('self',)).select_related('from_member', 'to_member').filter(
+            id=_as_int(args.get('ledger_entry_id'))
+        ).first()
+        if entry is None:
+            raise OperationError(404, 'Ledger entry not found')
+        if self.user.id not in (entry.from_member_id, entry.to_member_id):
+            raise OperationError(403, 'You are not authorized to initiate this payment')
+        self.check_version(entry, version, 'ledger_entries')
+        if entry.payments.filter(status__in=['pending', 'processing', 'completed']).exists():
+            raise OperationError(409, 'Payment already exists for this ledger entry')
+        
+        payment_data = PaymentService.initiate_payment(entry, method)
+        # Every row written in this transaction carries its sequence number
+        return 201, {**payment_data, 'version': next_change_seq()}
@@ -0,0 +1,165 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from expenses.models import Expense, ExpenseSplit
+from expenses.signals import splits_recomputed, stash_previous_state
+from groups.models import FairnessPolicy, Group, GroupMember
+from payments.models import LedgerEntry, Payment
+from .models import Tombstone, Version, bump_versions, next_change_seq
+
+User = get_user_model()
+
+
+def _origin_model(origin):
+    """Model class that started a delete (an instance or a queryset)"""
+    if origin is None:
+        return None
+    return getattr(origin, 'model', None) or type(origin)
+
+
+def record_deletion(instance, group_id=None, user_ids=(), using='default'):
+    """Tombstone for ``instance``, visible to the group's members or to each of ``user_ids``"""
+    seq = next_change_seq(using)
+    model = instance._meta.model_name
+    if group_id is not None:
+        Tombstone.objects.using(using).create(change_seq=seq, model=model, object_id=instance.pk, group_id=group_id)
+    Tombstone.objects.using(using).bulk_create([
+        Tombstone(change_seq=seq, model=model, object_id=instance.pk, user_id=user_id) for user_id in set(user_ids)
+    ])
+
+
+@receiver(post_delete, sender=Group)
+def group_tombstone(sender, instance, using, **kwargs):
+    record_deletion(instance, group_id=instance.pk, using=using)
+
+
+@receiver(post_delete, sender=GroupMember)
+def group_member_tombstone(sender, instance, using, **kwargs):
+    # Also tells the removed member to drop the group, including when the whole group goes
+    Tombstone.objects.using(using).create(
+        change_seq=next_change_seq(using), model='groupmember', object_id=instance.pk,
+        group_id=instance.group_id, user_id=instance.user_id,
+    )
+
+
+@receiver(post_delete, sender=Expense)
+def expense_tombstone(sender, instance, using, origin=None, **kwargs):
+    # A group tombstone covers everything in the group
+    if _origin_model(origin) is Group:
+        return
+    
+    record_deletion(instance, group_id=instance.group_id, using=using)
+
+
+@receiver(post_delete, sender=ExpenseSplit)
+def expense_split_tombstone(sender, instance, using, origin=None, **kwargs):
+    if _origin_model(origin) in (Group, Expense):
+        return
+    
+    group_id = Expense.objects.using(using).filter(pk=instance.expense_id).values_list('group_id', flat=True).first()
+    if group_id is not None:
+        record_deletion(instance, group_id=group_id, using=using)
+
+
+@receiver(post_delete, sender=LedgerEntry)
+def ledger_entry_tombstone(sender, instance, using, **kwargs):
+    record_deletion(instance, user_ids=(instance.from_member_id, instance.to_member_id), using=using)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_tombstone(sender, instance, using, origin=None, **kwargs):
+    # A ledger entry tombstone covers its payments
+    if _origin_model(origin) is LedgerEntry:
+        return
+    
+    parties = LedgerEntry.objects.using(using).filter(pk=instance.ledger_entry_id).values_list(
+        'from_member_id', 'to_member_id'
+    ).first()
+    if parties is not None:
+        record_deletion(instance, user_ids=parties, using=using)
+
+
+def _expense_group_id(split, using):
+    if ExpenseSplit.expense.is_cached(split):
+        return split.expense.group_id
+    return Expense.objects.using(using).filter(pk=split.expense_id).values_list('group_id', flat=True).first()
+
+
+def _payment_parties(payment, using):
+    if Payment.ledger_entry.is_cached(payment):
+        return payment.ledger_entry.from_member_id, payment.ledger_entry.to_member_id
+    return LedgerEntry.objects.using(using).filter(pk=payment.ledger_entry_id).values_list(
+        'from_member_id', 'to_member_id'
+    ).first() or ()
+
+
+@receiver(pre_save, sender=GroupMember)
+def group_member_previous_state(sender, instance, **kwargs):
+    stash_previous_state(sender, instance, ('is_active',))
+
+
+@receiver(post_save, sender=GroupMember)
+def group_member_joined(sender, instance, created, using, **kwargs):
+    # Only a new or reactivated membership resends the group's history; role and share edits don't
+    previous = instance._previous_state
+    if not instance.is_active or not (created or previous is None or not previous['is_active']):
+        return
+    
+    instance.joined_seq = instance.change_seq
+    GroupMember.objects.using(using).filter(pk=instance.pk).update(joined_seq=instance.joined_seq)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_version(sender, instance, using, **kwargs):
+    bump_versions([(Version.GROUP, instance.pk)], using)
+
+
+@receiver(post_save, sender=GroupMember)
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=FairnessPolicy)
+@receiver(post_delete, sender=GroupMember)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=FairnessPolicy)
+def group_row_version(sender, instance, using, **kwargs):
+    bump_versions([(Version.GROUP, instance.group_id)], using)
+
+
+@receiver(post_save, sender=ExpenseSplit)
+@receiver(post_delete, sender=ExpenseSplit)
+def expense_split_version(sender, instance, using, origin=None, **kwargs):
+    if _origin_model(origin) in (Group, Expense):
+        return
+    
+    bump_versions([(Version.GROUP, _expense_group_id(instance, using))], using)
+
+
+@receiver(splits_recomputed, sender=Expense)
+def recomputed_splits_version(sender, expense, **kwargs):
+    # The splits were stamped with the transaction's change_seq by bulk_update
+    bump_versions([(Version.GROUP, expense.group_id)])
+
+
+@receiver(post_save, sender=LedgerEntry)
+@receiver(post_delete, sender=LedgerEntry)
+def ledger_entry_version(sender, instance, using, **kwargs):
+    bump_versions([(Version.USER, instance.from_member_id), (Version.USER, instance.to_member_id)], using)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def payment_version(sender, instance, using, origin=None, **kwargs):
+    if _origin_model(origin) is LedgerEntry:
+        return
+    
+    bump_versions([(Version.USER, user_id) for user_id in _payment_parties(instance, using)], using)
+
+
+@receiver(post_save, sender=User)
+def user_version(sender, instance, created, update_fields=None, using='default', **kwargs):
+    # Profiles are shown in group, expense and ledger responses; logins only touch last_login
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    
+    group_ids = GroupMember.objects.using(using).filter(user=instance).values_list('group_id', flat=True)
+    bump_versions([(Version.USER, instance.pk), *((Version.GROUP, group_id) for group_id in group_ids)], using)
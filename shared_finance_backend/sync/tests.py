@@ -0,0 +1,490 @@
+from contextlib import contextmanager
+from unittest import mock, skipUnless
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIClient
+from decimal import Decimal
+from expenses.models import Expense, ExpenseSplit
+from groups.models import Group, GroupMember
+from payments.models import LedgerEntry, Payment
+from .models import (
+    ALLOCATING_LOCK, AppliedOperation, Version, _postgresql_bound, bump_versions, current_change_seq,
+    next_change_seq,
+)
+from .services import SyncService
+import threading
+
+User = get_user_model()
+
+
+class SyncFixtureMixin:
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@test.com')
+        self.bob = User.objects.create_user(username='bob', email='bob@test.com')
+        self.carol = User.objects.create_user(username='carol', email='carol@test.com')
+        with self.commit():
+            self.flat = Group.objects.create(name='Flat', owner=self.alice)
+            GroupMember.objects.create(group=self.flat, user=self.alice, role='owner')
+            GroupMember.objects.create(group=self.flat, user=self.bob)
+            self.other = Group.objects.create(name='Other', owner=self.carol)
+            GroupMember.objects.create(group=self.other, user=self.carol, role='owner')
+    
+    @contextmanager
+    def commit(self):
+        """A transaction whose on_commit callbacks run, as in production"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                yield
+    
+    def add_expense(self, group, payer, amount='90.00', members=()):
+        expense = Expense.objects.create(group=group, payer=payer, amount_subtotal=Decimal(amount),
+                                         date=timezone.now())
+        for member in members:
+            ExpenseSplit.objects.create(expense=expense, member=member,
+                                        amount_owed=Decimal(amount) / len(members))
+        return expense
+    
+    def ids(self, result, name):
+        return [row['id'] for row in result['changes'][name]]
+
+
+class SyncTestCase(SyncFixtureMixin, TestCase):
+    pass
+
+
+class CommittedSyncTestCase(SyncFixtureMixin, TransactionTestCase):
+    """
+    For tests of cursors. Each transaction commits for real, so on PostgreSQL
+    it releases its advisory locks and current_change_seq() moves past it;
+    inside a TestCase the outer transaction would hold them to the end.
+    """
+    
+    @contextmanager
+    def commit(self):
+        with transaction.atomic():
+            yield
+
+
+class ChangeSequenceTest(CommittedSyncTestCase):
+    def test_one_number_per_transaction(self):
+        with self.commit():
+            expense = self.add_expense(self.flat, self.alice, members=[self.alice, self.bob])
+            first = next_change_seq()
+        self.assertEqual(expense.change_seq, first)
+        self.assertEqual({split.change_seq for split in expense.splits.all()}, {first})
+        self.assertEqual(current_change_seq(), first)
+        
+        with self.commit():
+            expense.description = 'Groceries'
+            expense.save(update_fields=['description'])
+        expense.refresh_from_db()
+        self.assertEqual(expense.change_seq, first + 1)
+        
+        try:
+            with self.commit():
+                self.add_expense(self.flat, self.bob)
+                raise ValueError
+        except ValueError:
+            pass
+        if connection.vendor == 'postgresql':
+            # The sequence never hands the number out again; once its transaction ended the bound passes it
+            self.assertEqual(current_change_seq(), first + 2)
+        else:
+            # The counter row rolls back with the transaction, so the number is reused
+            self.assertEqual(current_change_seq(), first + 1)
+    
+    @skipUnless(connection.vendor == 'postgresql', 'advisory locks are PostgreSQL only')
+    def test_bound_waits_for_open_transactions(self):
+        drawn, release = threading.Event(), threading.Event()
+        numbers = []
+        
+        def writer():
+            try:
+                with transaction.atomic():
+                    numbers.append(next_change_seq())
+                    drawn.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+        
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            self.assertTrue(drawn.wait(10))
+            with transaction.atomic():
+                later = next_change_seq()
+            # A later number committed first stays hidden behind the open one
+            self.assertGreater(later, numbers[0])
+            self.assertEqual(current_change_seq(), numbers[0] - 1)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(current_change_seq(), later)
+
+
+class ScriptedCursor:
+    """Cursor replaying query results, for the PostgreSQL-only bound"""
+    
+    def __init__(self, results):
+        self.results = list(results)
+        self.queries = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def execute(self, sql, params=None):
+        self.queries += 1
+        self.rows = self.results.pop(0)
+    
+    def fetchone(self):
+        return self.rows[0]
+    
+    def fetchall(self):
+        return self.rows
+
+
+class PostgresqlBoundTest(TestCase):
+    def bound(self, *results):
+        cursor = ScriptedCursor(results)
+        connection = mock.Mock(cursor=lambda: cursor)
+        return _postgresql_bound(connection), cursor.queries
+    
+    def test_stops_below_open_transactions(self):
+        # A fresh sequence starts at 1 with nothing drawn
+        self.assertEqual(self.bound([(1, False)], []), (0, 2))
+        self.assertEqual(self.bound([(9, True)], []), (9, 2))
+        # Transactions holding 7 and 8 are still open
+        self.assertEqual(self.bound([(9, True)], [
+            (101, 2, ALLOCATING_LOCK), (101, 1, 8), (102, 2, ALLOCATING_LOCK), (102, 1, 7),
+        ]), (6, 2))
+        # A number drawn after the sequence was read doesn't raise the bound
+        self.assertEqual(self.bound([(9, True)], [(101, 2, ALLOCATING_LOCK), (101, 1, 12)]), (9, 2))
+        # A transaction that drew again after a savepoint rollback is bounded by its first number
+        for locks in ([(101, 1, 5), (101, 1, 8)], [(101, 1, 8), (101, 1, 5)]):
+            self.assertEqual(self.bound([(9, True)], [(101, 2, ALLOCATING_LOCK), *locks]), (4, 2))
+    
+    def test_rereads_while_a_number_is_being_drawn(self):
+        self.assertEqual(self.bound(
+            [(9, True)], [(101, 2, ALLOCATING_LOCK)],
+            [(9, True)], [(101, 2, ALLOCATING_LOCK), (101, 1, 9)],
+        ), (8, 4))
+
+
+class SyncServiceTest(CommittedSyncTestCase):
+    def test_full_then_delta(self):
+        with self.commit():
+            dinner = self.add_expense(self.flat, self.alice, members=[self.alice, self.bob])
+            self.add_expense(self.other, self.carol, members=[self.carol])
+        
+        full = SyncService(self.bob).changes()
+        self.assertEqual(self.ids(full, 'groups'), [self.flat.id])
+        self.assertEqual(self.ids(full, 'expenses'), [dinner.id])
+        self.assertEqual(len(full['changes']['expense_splits']), 2)
+        self.assertEqual(full['cursor'], current_change_seq())
+        self.assertFalse(full['has_more'])
+        
+        # Nothing new: an empty delta at the same cursor
+        empty = SyncService(self.bob).changes(full['cursor'])
+        self.assertEqual(empty['cursor'], full['cursor'])
+        self.assertFalse(any(empty['changes'].values()) or any(empty['deleted'].values()))
+        
+        with self.commit():
+            taxi = self.add_expense(self.flat, self.bob, '30.00')
+            dinner.is_settled = True
+            dinner.save()
+        with self.commit():
+            split_id = dinner.splits.get(member=self.bob).id
+            ExpenseSplit.objects.filter(id=split_id).delete()
+        with self.commit():
+            entry = LedgerEntry.objects.create(from_member=self.bob, to_member=self.alice, amount=Decimal('45.00'))
+            payment = Payment.objects.create(ledger_entry=entry, method='CASH', amount=entry.amount)
+        
+        delta = SyncService(self.bob).changes(full['cursor'])
+        self.assertEqual(self.ids(delta, 'expenses'), [dinner.id, taxi.id])
+        self.assertEqual(delta['changes']['expenses'][0]['is_settled'], True)
+        self.assertEqual(delta['deleted']['expense_splits'], [split_id])
+        self.assertEqual(self.ids(delta, 'ledger_entries'), [entry.id])
+        self.assertEqual(self.ids(delta, 'payments'), [payment.id])
+        self.assertEqual(delta['changes']['groups'], [])
+        
+        # Ledger tombstones reach both parties and nobody else
+        entry_id = entry.id
+        with self.commit():
+            entry.delete()
+        for user, expected in ((self.alice, [entry_id]), (self.bob, [entry_id]), (self.carol, [])):
+            deleted = SyncService(user).changes(delta['cursor'])['deleted']
+            self.assertEqual(deleted['ledger_entries'], expected)
+            # Payments go with their ledger entry
+            self.assertEqual(deleted['payments'], [])
+    
+    def test_joining_and_leaving_groups(self):
+        with self.commit():
+            history = self.add_expense(self.other, self.carol, members=[self.carol])
+        cursor = SyncService(self.bob).changes()['cursor']
+        
+        with self.commit():
+            membership = GroupMember.objects.create(group=self.other, user=self.bob)
+        joined = SyncService(self.bob).changes(cursor)
+        # History from before the cursor comes along with the new group
+        self.assertEqual(self.ids(joined, 'groups'), [self.other.id])
+        self.assertEqual(self.ids(joined, 'expenses'), [history.id])
+        self.assertEqual(len(joined['changes']['group_members']), 2)
+        
+        with self.commit():
+            membership.is_active = False
+            membership.save()
+        left = SyncService(self.bob).changes(joined['cursor'])
+        self.assertEqual(left['deleted']['groups'], [self.other.id])
+        
+        flat_id = self.flat.id
+        with self.commit():
+            self.flat.delete()
+        deleted = SyncService(self.bob).changes(left['cursor'])['deleted']
+        self.assertEqual(deleted['groups'], [flat_id])
+        # Only his own membership is visible once the group is gone
+        self.assertEqual(len(deleted['group_members']), 1)
+        # Expenses of a deleted group are implied, not tombstoned one by one
+        self.assertEqual(deleted['expenses'], [])
+    
+    def test_only_joining_resends_group_history(self):
+        with self.commit():
+            history = self.add_expense(self.other, self.carol, members=[self.carol])
+            membership = GroupMember.objects.create(group=self.other, user=self.bob)
+        cursor = SyncService(self.bob).changes()['cursor']
+        
+        with self.commit():
+            membership.role = 'treasurer'
+            membership.save(update_fields=['role'])
+        edited = SyncService(self.bob).changes(cursor)
+        self.assertEqual(self.ids(edited, 'group_members'), [membership.id])
+        self.assertEqual(edited['changes']['expenses'], [])
+        
+        with self.commit():
+            membership.is_active = False
+            membership.save(update_fields=['is_active'])
+        with self.commit():
+            membership.is_active = True
+            membership.save(update_fields=['is_active'])
+        rejoined = SyncService(self.bob).changes(edited['cursor'])
+        self.assertEqual(self.ids(rejoined, 'expenses'), [history.id])
+    
+    def test_pages_never_split_a_transaction(self):
+        cursor = SyncService(self.alice).changes()['cursor']
+        with self.commit():
+            bulk = [self.add_expense(self.flat, self.alice).id for _ in range(4)]
+        with self.commit():
+            last = self.add_expense(self.flat, self.alice)
+        
+        first = SyncService(self.alice, page_size=2).changes(cursor)
+        self.assertTrue(first['has_more'])
+        self.assertEqual(self.ids(first, 'expenses'), bulk)
+        
+        second = SyncService(self.alice, page_size=2).changes(first['cursor'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(self.ids(second, 'expenses'), [last.id])
+
+
+class SyncViewTest(CommittedSyncTestCase):
+    def test_delta_sync_endpoint(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/sync/').status_code, 401)
+        
+        client.force_authenticate(user=self.alice)
+        response = client.get('/api/sync/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['changes']['groups']], [self.flat.id])
+        
+        cursor = response.data['cursor']
+        self.assertEqual(client.get(f'/api/sync/?since={cursor}').data['changes']['groups'], [])
+        self.assertEqual(client.get('/api/sync/?since=abc').status_code, 400)
+
+
+class ReplayBatchTest(SyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.bob)
+        with self.commit():
+            self.dinner = self.add_expense(self.flat, self.alice, members=[self.alice, self.bob])
+            self.entry = LedgerEntry.objects.create(from_member=self.bob, to_member=self.alice, amount=Decimal('45.00'))
+        self.split = self.dinner.splits.get(member=self.bob)
+    
+    def replay(self, operations):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/sync/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+    
+    def test_replay_is_idempotent(self):
+        operations = [
+            {'key': 'k1', 'op': 'create_expense', 'args': {
+                'group_id': self.flat.id, 'amount_subtotal': '100.00', 'date': '2026-10-01T12:00:00Z',
+            }},
+            {'key': 'k2', 'op': 'mark_split_paid', 'args': {'split_id': self.split.id},
+             'version': self.split.change_seq},
+            {'key': 'k3', 'op': 'initiate_payment', 'args': {'ledger_entry_id': self.entry.id, 'method': 'CASH'},
+             'version': self.entry.change_seq},
+        ]
+        results = self.replay(operations)
+        self.assertEqual([r['key'] for r in results], ['k1', 'k2', 'k3'])
+        self.assertEqual([r['status'] for r in results], [201, 200, 201])
+        
+        expense = Expense.objects.get(id=results[0]['result']['id'])
+        self.assertEqual(expense.payer, self.bob)
+        # One split per member, adding up to the paisa
+        self.assertEqual(sorted(s.amount_owed for s in expense.splits.all()), [Decimal('50.00'), Decimal('50.00')])
+        self.split.refresh_from_db()
+        self.assertTrue(self.split.is_paid)
+        self.assertEqual(results[1]['result']['version'], self.split.change_seq)
+        
+        again = self.replay(operations)
+        self.assertTrue(all(r.get('replayed') for r in again))
+        self.assertEqual([r['result'] for r in again][:2], [r['result'] for r in results][:2])
+        self.assertEqual(Expense.objects.filter(group=self.flat).count(), 2)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(AppliedOperation.objects.filter(user=self.bob).count(), 3)
+    
+    def test_conflicts_and_errors_are_isolated(self):
+        stale = self.split.change_seq
+        with self.commit():
+            self.split.amount_owed = Decimal('40.00')
+            self.split.save()
+        
+        results = self.replay([
+            {'key': 'a', 'op': 'mark_split_paid', 'args': {'split_id': self.split.id}, 'version': stale},
+            {'key': 'b', 'op': 'create_expense', 'args': {
+                'group_id': self.flat.id, 'amount_subtotal': '10.00', 'date': '2026-10-01T12:00:00Z',
+            }},
+            {'key': 'c', 'op': 'create_expense', 'args': {
+                'group_id': self.other.id, 'amount_subtotal': '10.00', 'date': '2026-10-01T12:00:00Z',
+            }},
+            {'key': 'd', 'op': 'delete_everything'},
+        ])
+        self.assertEqual([r['status'] for r in results], [409, 201, 400, 400])
+        self.assertEqual(results[0]['result']['current']['amount_owed'], Decimal('40.00'))
+        self.split.refresh_from_db()
+        self.assertFalse(self.split.is_paid)
+        # Only applied operations are remembered, so a resolved conflict can be sent again
+        self.assertEqual(list(AppliedOperation.objects.values_list('key', flat=True)), ['b'])
+        
+        retried = self.replay([
+            {'key': 'a', 'op': 'mark_split_paid', 'args': {'split_id': self.split.id},
+             'version': self.split.change_seq},
+        ])
+        self.assertEqual(retried[0]['status'], 200)
+    
+    def test_operations_apply_in_queued_order(self):
+        results = self.replay([
+            {'key': 'x', 'op': 'create_expense', 'args': {
+                'group_id': self.flat.id, 'amount_subtotal': '10.00', 'date': '2026-10-01T12:00:00Z',
+            }},
+            {'key': 'y', 'op': 'initiate_payment', 'args': {'ledger_entry_id': self.entry.id, 'method': 'CASH'}},
+            {'key': 'z', 'op': 'mark_split_paid', 'args': {'split_id': self.split.id}},
+        ])
+        self.assertEqual([r['status'] for r in results], [201, 201, 200])
+        # The payment queued between two flat writes is applied between them, not after both
+        self.assertEqual(list(AppliedOperation.objects.order_by('id').values_list('key', flat=True)), ['x', 'y', 'z'])
+    
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self.client.post('/api/sync/batch/', {}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/sync/batch/', [], format='json').status_code, 400)
+
+
+class VersionTest(SyncTestCase):
+    def version(self, scope, object_id):
+        return Version.objects.filter(scope=scope, object_id=object_id).values_list('value', flat=True).first()
+    
+    def test_writes_bump_their_scopes(self):
+        with self.commit():
+            self.add_expense(self.flat, self.alice, members=[self.alice, self.bob])
+            seq = next_change_seq()
+        self.assertEqual(self.version(Version.GROUP, self.flat.id), seq)
+        before = self.version(Version.GROUP, self.other.id)
+        
+        with self.commit():
+            entry = LedgerEntry.objects.create(from_member=self.bob, to_member=self.alice, amount=Decimal('45.00'))
+        for user in (self.alice, self.bob):
+            self.assertEqual(self.version(Version.USER, user.id), entry.change_seq)
+        self.assertEqual(self.version(Version.GROUP, self.other.id), before)
+        
+        # Logins leave every version alone
+        with self.commit():
+            self.bob.last_login = timezone.now()
+            self.bob.save(update_fields=['last_login'])
+        self.assertEqual(self.version(Version.USER, self.bob.id), entry.change_seq)
+    
+    def test_savepoint_rollback_is_bumped_again(self):
+        before = self.version(Version.GROUP, self.other.id)
+        with self.commit():
+            seq = next_change_seq()
+            try:
+                with transaction.atomic():
+                    bump_versions([(Version.GROUP, self.other.id)])
+                    raise ValueError
+            except ValueError:
+                pass
+            self.assertEqual(self.version(Version.GROUP, self.other.id), before)
+            self.other.save()
+        self.assertEqual(self.version(Version.GROUP, self.other.id), seq)
+
+
+class ConditionalGetTest(SyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+    
+    def assertRevalidates(self, path, change):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        
+        # Only the version lookup runs for an unchanged resource
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.commit():
+            change()
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+    
+    def test_group_and_expense_views(self):
+        with self.commit():
+            expense = self.add_expense(self.flat, self.alice, members=[self.alice, self.bob])
+        self.assertRevalidates('/api/groups/groups/', lambda: self.add_expense(self.flat, self.bob))
+        self.assertRevalidates(f'/api/expenses/expenses/{expense.id}/', lambda: expense.splits.first().save())
+        self.assertRevalidates(
+            f'/api/fairness/groups/{self.flat.id}/settlement_graph/',
+            lambda: GroupMember.objects.create(group=self.flat, user=self.carol)
+        )
+    
+    def test_non_members_get_no_etag(self):
+        for path in (f'/api/fairness/groups/{self.flat.id}/settlement_graph/',
+                     f'/api/fairness/groups/{self.flat.id}/explain/'):
+            etag = self.client.get(path)['ETag']
+            outsider = APIClient()
+            outsider.force_authenticate(user=self.carol)
+            response = outsider.get(path)
+            self.assertEqual(response.status_code, 403)
+            self.assertFalse(response.has_header('ETag'))
+            self.assertEqual(outsider.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+            # Leaving the group stops revalidation too
+            GroupMember.objects.filter(group=self.flat, user=self.alice).update(is_active=False)
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+            GroupMember.objects.filter(group=self.flat, user=self.alice).update(is_active=True)
+    
+    def test_ledger_view(self):
+        with self.commit():
+            entry = LedgerEntry.objects.create(from_member=self.alice, to_member=self.bob, amount=Decimal('45.00'))
+        self.assertRevalidates(
+            '/api/payments/ledger/',
+            lambda: Payment.objects.create(ledger_entry=entry, method='CASH', amount=entry.amount)
+        )
+        # Other users' writes keep the tag
+        etag = self.client.get('/api/payments/ledger/')['ETag']
+        with self.commit():
+            self.add_expense(self.other, self.carol)
+        self.assertEqual(self.client.get('/api/payments/ledger/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
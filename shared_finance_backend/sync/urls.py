@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.delta_sync, name='delta-sync'),
+    path('batch/', views.replay_batch, name='replay-batch'),
+]
@@ -0,0 +1,41 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .services import ReplayService, SyncService
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def delta_sync(request):
+    """Changes and deletions visible to the user since ``?since=<cursor>``"""
+    since = request.query_params.get('since')
+    if since is not None:
+        if not since.isdigit():
+            return Response(
+                {'error': 'since must be a cursor returned by a previous sync'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        since = int(since)
+    
+    return Response(SyncService(request.user).changes(since))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def replay_batch(request):
+    """Apply writes queued offline, in order; one result per operation"""
+    operations = request.data.get('operations') if isinstance(request.data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return Response(
+            {'error': 'operations must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(operations) > settings.SYNC_BATCH_MAX_OPERATIONS:
+        return Response(
+            {'error': f'At most {settings.SYNC_BATCH_MAX_OPERATIONS} operations per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({'results': ReplayService(request).replay(operations)})
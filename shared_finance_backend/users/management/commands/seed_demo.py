@@ -3,7 +3,10 @@ from django.contrib.auth import get_user_model
 from groups.models import Group, GroupMember, FairnessPolicy
 from expenses.models import Expense, ExpenseSplit
 from payments.models import LedgerEntry
-from datetime import datetime, timedelta
+from analytics.services import rebuild_balances, rebuild_rollups
+from users.synthetic import SyntheticDataGenerator
+from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
 import random
 
@@ -13,7 +16,26 @@ User = get_user_model()
 class Command(BaseCommand):
     help = 'Seed demo data for Shared Finance OS'
     
+    def add_arguments(self, parser):
+        scale = parser.add_argument_group(
+            'load testing',
+            'Passing --users generates synthetic data in bulk instead of the small demo set'
+        )
+        scale.add_argument('--users', type=int, help='Number of users to generate')
+        scale.add_argument('--groups', type=int, default=100, help='Number of groups')
+        scale.add_argument('--members-per-group', type=int, default=6,
+                           help='Mean group size (sizes are heavy-tailed)')
+        scale.add_argument('--expenses-per-group', type=int, default=50,
+                           help='Mean expenses per group of average size')
+        scale.add_argument('--payments', type=int, default=0, help='Ledger entries with payments')
+        scale.add_argument('--seed', type=int, default=42, help='Random seed for reproducible data')
+        scale.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert')
+        scale.add_argument('--prefix', default='load', help='Username and group name prefix')
+    
     def handle(self, *args, **options):
+        if options['users']:
+            return self.seed_load_data(options)
+        
         self.stdout.write('Seeding demo data...')
         
         # Create demo users
@@ -32,6 +54,34 @@ class Command(BaseCommand):
             self.style.SUCCESS('Successfully seeded demo data!')
         )
     
+    def seed_load_data(self, options):
+        """Generate a large deterministic dataset with bulk inserts"""
+        self.stdout.write(f"Generating load test data (seed={options['seed']})...")
+        
+        generator = SyntheticDataGenerator(
+            users=options['users'],
+            groups=options['groups'],
+            members_per_group=options['members_per_group'],
+            expenses_per_group=options['expenses_per_group'],
+            payments=options['payments'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            prefix=options['prefix'],
+            log=self.stdout.write,
+        )
+        stats = generator.run()
+        
+        # Bulk inserts skip the signals that maintain the rollups and pair balances
+        rebuild_rollups()
+        rebuild_balances()
+        
+        rate = stats.get('expense_splits', 0) / max(stats['seconds'], 0.1)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {stats} ({rate:,.0f} splits/s)"
+            )
+        )
+    
     def create_demo_users(self):
         """Create demo users"""
         users_data = [
@@ -150,7 +200,7 @@ class Command(BaseCommand):
                     vendor=random.choice(vendors),
                     category=random.choice(categories),
                     description=f'Demo expense for {group.name}',
-                    date=datetime.now() - timedelta(days=random.randint(1, 30))
+                    date=timezone.now() - timedelta(days=random.randint(1, 30))
                 )
                 
                 # Create equal splits
@@ -0,0 +1,98 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, Q, Sum
+from typing import Any, Dict, Optional
+from analytics.models import MonthlyRollup
+from analytics.services import converted_total, rollup_day
+from expenses.models import Expense
+from groups.models import GroupMember
+from notifications.services import NotificationService
+from payments.models import LedgerEntry
+from shared_finance.money import MoneyField
+from .serializers import UserSerializer
+
+
+def _person(user) -> Dict[str, Any]:
+    return {'id': user.id, 'username': user.username, 'first_name': user.first_name, 'last_name': user.last_name}
+
+
+class BootstrapService:
+    """Everything the dashboard shows on first load, read with a fixed number of queries"""
+    
+    def __init__(self, user):
+        self.user = user
+    
+    def payload(self, unread_notifications: Optional[int] = None) -> Dict[str, Any]:
+        memberships = list(
+            GroupMember.objects.filter(user=self.user, is_active=True).select_related('group').annotate(
+                member_count=Count('group__members', filter=Q(group__members__is_active=True))
+            ).order_by('group_id')
+        )
+        group_ids = [membership.group_id for membership in memberships]
+        
+        # The user's outstanding balance per group, from the monthly rollups, in the group's currency
+        rollups = defaultdict(list)
+        for row in MonthlyRollup.objects.filter(user=self.user, group_id__in=group_ids).values(
+            'group_id', 'month', 'currency'
+        ).annotate(
+            balance=ExpressionWrapper(Sum('unsettled_paid') - Sum('unsettled_owed'), output_field=MoneyField())
+        ):
+            rollups[row['group_id']].append(row)
+        
+        expenses = Expense.objects.filter(group_id__in=group_ids).select_related('payer').order_by('-date', '-id')[
+            :settings.BOOTSTRAP_RECENT_EXPENSES
+        ]
+        ledger = LedgerEntry.objects.filter(
+            Q(from_member=self.user) | Q(to_member=self.user), status='pending'
+        ).select_related('from_member', 'to_member').order_by('-created_at')
+        
+        return {
+            'profile': UserSerializer(self.user).data,
+            'groups': [
+                {
+                    'id': membership.group.id,
+                    'name': membership.group.name,
+                    'description': membership.group.description,
+                    'group_type': membership.group.group_type,
+                    'currency': membership.group.currency,
+                    'is_active': membership.group.is_active,
+                    'role': membership.role,
+                    'member_count': membership.member_count,
+                    'balance': converted_total(
+                        rollups[membership.group_id], membership.group.currency, 'balance', rollup_day
+                    ),
+                }
+                for membership in memberships
+            ],
+            'recent_expenses': [
+                {
+                    'id': expense.id,
+                    'group_id': expense.group_id,
+                    'payer': _person(expense.payer),
+                    'total_amount': expense.total_amount,
+                    'currency': expense.currency,
+                    'vendor': expense.vendor,
+                    'category': expense.category,
+                    'description': expense.description,
+                    'date': expense.date,
+                    'is_settled': expense.is_settled,
+                }
+                for expense in expenses
+            ],
+            'pending_ledger': [
+                {
+                    'id': entry.id,
+                    'from_member': _person(entry.from_member),
+                    'to_member': _person(entry.to_member),
+                    'amount': entry.amount,
+                    'description': entry.description,
+                    'ref_expense_id': entry.ref_expense_id,
+                    'direction': 'outgoing' if entry.from_member_id == self.user.id else 'incoming',
+                    'created_at': entry.created_at,
+                }
+                for entry in ledger
+            ],
+            'unread_notifications': (
+                NotificationService.unread_count(self.user) if unread_notifications is None else unread_notifications
+            ),
+        }
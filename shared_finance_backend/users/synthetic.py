@@ -0,0 +1,273 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from groups.models import Group, GroupMember
+from expenses.models import Expense, ExpenseSplit
+from payments.models import LedgerEntry, Payment
+from sync.models import Version, bump_versions, next_change_seq
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+import math
+import random
+import time
+
+User = get_user_model()
+
+# Relative frequency of each split type in generated expenses
+SPLIT_TYPE_WEIGHTS = [('equal', 60), ('percentage', 15), ('amount', 15), ('share_factor', 10)]
+GROUP_SIZE_ALPHA = 2.0
+PAYMENT_STATUSES = [('completed', 50), ('pending', 30), ('processing', 10), ('failed', 10)]
+
+
+def allocate(total: int, weights: List[int]) -> List[int]:
+    """Split ``total`` paise proportionally to ``weights`` so the parts sum exactly to ``total``"""
+    weight_sum = sum(weights)
+    parts = [total * weight // weight_sum for weight in weights]
+    remainders = sorted(
+        range(len(weights)), key=lambda i: (total * weights[i]) % weight_sum, reverse=True
+    )
+    for i in remainders[:total - sum(parts)]:
+        parts[i] += 1
+    return parts
+
+
+def paise(amount: int) -> Decimal:
+    return Decimal(amount) / 100
+
+
+class SyntheticDataGenerator:
+    """
+    Deterministic, bulk-inserted data for capacity planning.
+
+    Rows are built in memory and written with ``bulk_create`` in chunks, so
+    model signals (audit logs, rollups) do not fire; callers rebuild derived
+    tables afterwards. Each chunk is one transaction: its rows carry that
+    transaction's ``change_seq`` and it bumps the versions of the groups and
+    users it wrote, so delta sync and conditional GETs see the data.
+    """
+
+    def __init__(self, users: int, groups: int, members_per_group: int, expenses_per_group: int,
+                 payments: int = 0, seed: int = 42, chunk_size: int = 5000, prefix: str = 'load',
+                 anchor: Optional[datetime] = None, log: Optional[Callable[[str], None]] = None):
+        self.user_count = users
+        self.group_count = groups
+        self.members_per_group = max(2, members_per_group)
+        self.expenses_per_group = expenses_per_group
+        self.payment_count = payments
+        self.chunk_size = chunk_size
+        self.prefix = f'{prefix}{seed}'
+        self.rng = random.Random(seed)
+        self.anchor = anchor or timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.log = log or (lambda message: None)
+        self.stats: Dict[str, int] = {}
+
+    def run(self) -> Dict[str, int]:
+        started = time.perf_counter()
+        user_ids = self.create_users()
+        groups = self.create_groups(user_ids)
+        self.create_expenses(groups)
+        self.create_payments(groups)
+        self.stats['seconds'] = round(time.perf_counter() - started, 1)
+        return self.stats
+
+    def _count(self, key: str, amount: int):
+        self.stats[key] = self.stats.get(key, 0) + amount
+
+    def _weighted(self, choices):
+        values, weights = zip(*choices)
+        return self.rng.choices(values, weights=weights)[0]
+
+    @staticmethod
+    def _stamp(rows: List, seq: int) -> List:
+        for row in rows:
+            row.change_seq = seq
+        return rows
+
+    def create_users(self) -> List[int]:
+        password = make_password('demo123')
+        user_ids = []
+        for start in range(0, self.user_count, self.chunk_size):
+            batch = [
+                User(
+                    username=f'{self.prefix}_user{i}',
+                    email=f'{self.prefix}_user{i}@example.com',
+                    password=password,
+                    phone=f'+91{self.rng.randint(9000000000, 9999999999)}',
+                    kyc_status='verified' if self.rng.random() < 0.7 else 'pending',
+                )
+                for i in range(start, min(start + self.chunk_size, self.user_count))
+            ]
+            user_ids.extend(user.pk for user in User.objects.bulk_create(batch))
+        self._count('users', len(user_ids))
+        self.log(f'Created {len(user_ids)} users')
+        return user_ids
+
+    def group_size(self) -> int:
+        """Pareto-distributed group size with the requested mean: most groups small, a few huge"""
+        scale = self.members_per_group * (GROUP_SIZE_ALPHA - 1) / GROUP_SIZE_ALPHA
+        size = round(scale * self.rng.paretovariate(GROUP_SIZE_ALPHA))
+        return max(2, min(size, self.user_count))
+
+    def create_groups(self, user_ids: List[int]) -> List[Dict]:
+        group_types = [choice[0] for choice in Group.GROUP_TYPES]
+        brackets = [choice[0] for choice in GroupMember.INCOME_BRACKETS]
+        groups = []
+
+        for start in range(0, self.group_count, self.chunk_size):
+            plans = []
+            for i in range(start, min(start + self.chunk_size, self.group_count)):
+                members = self.rng.sample(user_ids, self.group_size())
+                plans.append({
+                    'members': members,
+                    'share_factors': {
+                        user_id: self.rng.choice([100, 100, 100, 50, 150, 200]) for user_id in members
+                    },
+                    'group': Group(
+                        name=f'{self.prefix} group {i}',
+                        group_type=self.rng.choice(group_types),
+                        owner_id=members[0],
+                    ),
+                })
+            with transaction.atomic():
+                seq = next_change_seq()
+                Group.objects.bulk_create(self._stamp([plan['group'] for plan in plans], seq))
+                memberships = [
+                    GroupMember(
+                        group_id=plan['group'].pk,
+                        user_id=user_id,
+                        role='owner' if index == 0 else 'member',
+                        share_factor=paise(plan['share_factors'][user_id]),
+                        income_bracket=self.rng.choice(brackets),
+                        change_seq=seq,
+                        joined_seq=seq,
+                    )
+                    for plan in plans
+                    for index, user_id in enumerate(plan['members'])
+                ]
+                GroupMember.objects.bulk_create(memberships, batch_size=self.chunk_size)
+                bump_versions((Version.GROUP, plan['group'].pk) for plan in plans)
+            self._count('group_members', len(memberships))
+            groups.extend(plans)
+
+        self._count('groups', len(groups))
+        self.log(f'Created {len(groups)} groups with {self.stats["group_members"]} memberships')
+        return groups
+
+    def expense_count(self, group: Dict) -> int:
+        """Lognormal around the requested mean, scaled with group size"""
+        sigma = 0.75
+        size_factor = len(group['members']) / self.members_per_group
+        noise = self.rng.lognormvariate(0, sigma) / math.exp(sigma ** 2 / 2)
+        return max(1, round(self.expenses_per_group * size_factor * noise))
+
+    def split_rows(self, expense: Expense, total: int, group: Dict) -> List[ExpenseSplit]:
+        split_type = self._weighted(SPLIT_TYPE_WEIGHTS)
+        members = group['members']
+        if split_type == 'equal' and len(members) > 2 and self.rng.random() < 0.3:
+            # Some expenses only involve part of the group
+            members = self.rng.sample(members, self.rng.randint(2, len(members)))
+
+        if split_type == 'equal':
+            weights = [1] * len(members)
+        elif split_type == 'share_factor':
+            weights = [group['share_factors'][user_id] for user_id in members]
+        else:
+            weights = [self.rng.randint(1, 10) for _ in members]
+        amounts = allocate(total, weights)
+
+        splits = []
+        for user_id, weight, amount in zip(members, weights, amounts):
+            metadata = {}
+            if split_type == 'percentage':
+                metadata = {'percentage': str((Decimal(weight * 100) / sum(weights)).quantize(Decimal('0.01')))}
+            elif split_type == 'share_factor':
+                metadata = {'share_factor': str(paise(weight))}
+            splits.append(ExpenseSplit(
+                expense_id=expense.pk,
+                member_id=user_id,
+                amount_owed=paise(amount),
+                split_type=split_type,
+                metadata=metadata,
+                is_paid=expense.is_settled,
+            ))
+        return splits
+
+    def create_expenses(self, groups: List[Dict]):
+        categories = [choice[0] for choice in Expense.CATEGORIES]
+        vendors = ['Swiggy', 'Uber', 'Electricity Board', 'Netflix', 'Amazon', 'Zomato', 'Ola', 'BigBasket']
+        pending = []
+
+        def flush():
+            with transaction.atomic():
+                seq = next_change_seq()
+                Expense.objects.bulk_create(self._stamp([expense for expense, _, _ in pending], seq))
+                splits = []
+                for expense, total, group in pending:
+                    splits.extend(self.split_rows(expense, total, group))
+                ExpenseSplit.objects.bulk_create(self._stamp(splits, seq), batch_size=self.chunk_size)
+                bump_versions((Version.GROUP, expense.group_id) for expense, _, _ in pending)
+            self._count('expenses', len(pending))
+            self._count('expense_splits', len(splits))
+            pending.clear()
+
+        for group in groups:
+            for _ in range(self.expense_count(group)):
+                subtotal = round(self.rng.lognormvariate(7, 1.2) * 100)
+                tax = subtotal * 18 // 100 if self.rng.random() < 0.4 else 0
+                expense = Expense(
+                    group_id=group['group'].pk,
+                    payer_id=self.rng.choice(group['members']),
+                    amount_subtotal=paise(subtotal),
+                    amount_tax=paise(tax),
+                    vendor=self.rng.choice(vendors),
+                    category=self.rng.choice(categories),
+                    date=self.anchor - timedelta(minutes=self.rng.randint(0, 365 * 24 * 60)),
+                    is_settled=self.rng.random() < 0.25,
+                )
+                pending.append((expense, subtotal + tax, group))
+                if len(pending) >= self.chunk_size:
+                    flush()
+                    self.log(f'  {self.stats["expenses"]} expenses, {self.stats["expense_splits"]} splits')
+        if pending:
+            flush()
+        self.log(f'Created {self.stats.get("expenses", 0)} expenses with {self.stats.get("expense_splits", 0)} splits')
+
+    def create_payments(self, groups: List[Dict]):
+        methods = [choice[0] for choice in Payment.PAYMENT_METHODS]
+        for start in range(0, self.payment_count, self.chunk_size):
+            entries, statuses = [], []
+            for _ in range(min(self.chunk_size, self.payment_count - start)):
+                group = self.rng.choice(groups)
+                from_id, to_id = self.rng.sample(group['members'], 2)
+                status = self._weighted(PAYMENT_STATUSES)
+                statuses.append(status)
+                entries.append(LedgerEntry(
+                    from_member_id=from_id,
+                    to_member_id=to_id,
+                    amount=paise(round(self.rng.lognormvariate(7, 1) * 100)),
+                    status='paid' if status == 'completed' else 'pending',
+                    description=f'Settlement in {group["group"].name}',
+                ))
+
+            with transaction.atomic():
+                seq = next_change_seq()
+                LedgerEntry.objects.bulk_create(self._stamp(entries, seq))
+                Payment.objects.bulk_create([
+                    Payment(
+                        ledger_entry_id=entry.pk,
+                        method=self.rng.choice(methods),
+                        status=status,
+                        amount=entry.amount,
+                        payment_ref=f'TXN{entry.pk}' if status == 'completed' else '',
+                        change_seq=seq,
+                    )
+                    for entry, status in zip(entries, statuses)
+                ])
+                bump_versions(
+                    (Version.USER, user_id) for entry in entries for user_id in (entry.from_member_id, entry.to_member_id)
+                )
+            self._count('payments', len(entries))
+        if self.payment_count:
+            self.log(f'Created {self.stats["payments"]} ledger entries with payments')
@@ -1,8 +1,19 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from django.db.models import Sum
+from django.utils import timezone
+from decimal import Decimal
+from expenses.models import Expense, ExpenseSplit
+from expenses.services import ExpenseService
+from groups.models import Group, GroupMember
+from notifications.models import UnreadCounter
+from payments.models import LedgerEntry, Payment
+from sync.models import Version, current_change_seq
+from sync.services import SyncService
+from .synthetic import SyntheticDataGenerator, allocate
 
 User = get_user_model()
 
@@ -65,4 +76,127 @@ class UserAPITest(APITestCase):
         url = reverse('user-me')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['username'], 'testuser')
\ No newline at end of file
+        self.assertEqual(response.data['username'], 'testuser')
+
+
+class BootstrapTest(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@test.com')
+        self.bob = User.objects.create_user(username='bob', email='bob@test.com')
+        self.client.force_authenticate(user=self.alice)
+    
+    def add_group(self, name):
+        group = Group.objects.create(name=name, owner=self.alice)
+        GroupMember.objects.create(group=group, user=self.alice, role='owner')
+        GroupMember.objects.create(group=group, user=self.bob)
+        ExpenseService.create_with_equal_splits(
+            group=group, payer=self.alice, amount_subtotal=Decimal('90.00'), date=timezone.now()
+        )
+        return group
+    
+    def test_bootstrap(self):
+        flat = self.add_group('Flat')
+        LedgerEntry.objects.create(from_member=self.bob, to_member=self.alice, amount=Decimal('45.00'))
+        
+        response = self.client.get(reverse('bootstrap'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['profile']['username'], 'alice')
+        self.assertEqual(response.data['groups'], [{
+            'id': flat.id, 'name': 'Flat', 'description': '', 'group_type': flat.group_type,
+            'currency': flat.currency, 'is_active': True, 'role': 'owner', 'member_count': 2, 'balance': 45.0,
+        }])
+        self.assertEqual(len(response.data['recent_expenses']), 1)
+        self.assertEqual(response.data['pending_ledger'][0]['direction'], 'incoming')
+        
+        # Unchanged data revalidates to a 304
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('bootstrap'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.add_group('Club')
+        response = self.client.get(reverse('bootstrap'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        
+        # Reading notifications changes no version but does change the payload
+        etag = response['ETag']
+        self.assertEqual(response.data['unread_notifications'], 0)
+        UnreadCounter.objects.create(user=self.alice, unread=2)
+        self.assertEqual(self.client.get(reverse('bootstrap'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+    
+    def test_not_modified_reads_versions_only(self):
+        self.add_group('Flat')
+        etag = self.client.get(reverse('bootstrap'))['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('bootstrap'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_query_count_does_not_grow_with_groups(self):
+        self.add_group('Flat')
+        with self.assertNumQueries(6):
+            self.client.get(reverse('bootstrap'))
+        for index in range(3):
+            self.add_group(f'Group {index}')
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('bootstrap'))
+        self.assertEqual(len(response.data['groups']), 4)
+
+
+class SyntheticDataGeneratorTest(TestCase):
+    def generate(self, prefix):
+        return SyntheticDataGenerator(
+            users=30, groups=5, members_per_group=4, expenses_per_group=6,
+            payments=10, seed=7, chunk_size=8, prefix=prefix
+        ).run()
+    
+    def test_allocate_is_exact(self):
+        self.assertEqual(allocate(1000, [1, 1, 1]), [334, 333, 333])
+        self.assertEqual(sum(allocate(99999, [3, 7, 11, 2])), 99999)
+    
+    def test_splits_sum_to_expense_totals(self):
+        stats = self.generate('a')
+        self.assertEqual(stats['users'], 30)
+        self.assertEqual(Expense.objects.count(), stats['expenses'])
+        self.assertEqual(ExpenseSplit.objects.count(), stats['expense_splits'])
+        self.assertEqual(Payment.objects.count(), 10)
+        
+        owed = dict(ExpenseSplit.objects.values_list('expense_id').annotate(total=Sum('amount_owed')))
+        for expense in Expense.objects.all():
+            self.assertEqual(owed[expense.id], expense.total_amount)
+    
+    def test_same_seed_same_shape(self):
+        first = self.generate('a')
+        second = self.generate('b')
+        first.pop('seconds')
+        second.pop('seconds')
+        self.assertEqual(first, second)
+    
+    def test_rows_are_stamped_and_bump_versions(self):
+        cursor = current_change_seq()
+        self.generate('a')
+        for model in (Group, GroupMember, Expense, ExpenseSplit, LedgerEntry, Payment):
+            self.assertFalse(model.objects.filter(change_seq__lte=cursor).exists(), model.__name__)
+        
+        versions = dict(Version.objects.filter(scope=Version.GROUP).values_list('object_id', 'value'))
+        for group in Group.objects.all():
+            latest = max(group.change_seq, *Expense.objects.filter(group=group).values_list('change_seq', flat=True))
+            self.assertEqual(versions[group.id], latest)
+        for entry in LedgerEntry.objects.all():
+            for user_id in (entry.from_member_id, entry.to_member_id):
+                self.assertGreaterEqual(
+                    Version.objects.get(scope=Version.USER, object_id=user_id).value, entry.change_seq
+                )
+
+
+
+class SyntheticDataSyncTest(TransactionTestCase):
+    """Commits the load for real, so that on PostgreSQL the sync cursor moves past it"""
+    
+    def test_delta_sync_carries_the_load(self):
+        cursor = current_change_seq()
+        SyntheticDataGenerator(users=30, groups=5, members_per_group=4, expenses_per_group=6, payments=10,
+                               seed=7, chunk_size=8, prefix='sync').run()
+        member = GroupMember.objects.order_by('id').first()
+        changes = SyncService(member.user, page_size=10000).changes(cursor)['changes']
+        self.assertIn(member.group_id, [row['id'] for row in changes['groups']])
+        self.assertEqual(
+            sorted(row['id'] for row in changes['expenses']),
+            sorted(Expense.objects.filter(group__members__user=member.user).values_list('id', flat=True)),
+        )
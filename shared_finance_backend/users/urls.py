@@ -12,4 +12,5 @@ urlpatterns = [
     # User profile
     path('profile/', views.UserProfileView.as_view(), name='user-profile'),
     path('me/', views.user_profile, name='user-me'),
+    path('me/balances/', views.my_balances, name='user-balances'),
 ]
\ No newline at end of file
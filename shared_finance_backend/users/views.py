@@ -4,8 +4,15 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+from analytics.services import BalanceService
+from notifications.services import NotificationService
+from sync.conditional import member_groups, version_etag
 from .models import User
 from .serializers import UserSerializer, UserRegistrationSerializer, LoginSerializer
+from .services import BootstrapService
 
 
 class UserRegistrationView(generics.CreateAPIView):
@@ -67,4 +74,31 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 def user_profile(request):
     """Get current user profile"""
     serializer = UserSerializer(request.user)
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def my_balances(request):
+    """What the user owes and is owed across all groups, per counterparty"""
+    return Response(BalanceService(request.user).summary())
+
+
+def bootstrap_etag(request) -> str:
+    """Versions of the user's ledger and active groups, plus the unread count and today's rates"""
+    # Read once here and reused by the payload
+    request.unread_notifications = NotificationService.unread_count(request.user)
+    return version_etag(request, user=request.user, groups=member_groups(request.user),
+                        extra=(request.unread_notifications, timezone.localdate()))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@condition(etag_func=bootstrap_etag)
+def bootstrap(request):
+    """Profile, groups with the user's balances, recent expenses and pending ledger entries in one call"""
+    # The client revalidates with If-None-Match and skips the download when nothing changed
+    response = Response(BootstrapService(request.user).payload(unread_notifications=request.unread_notifications))
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response